@@ -16,6 +16,10 @@ Layer on top of the upload APIs to perform many of the common client-side tasks
 around uploading a content unit, such as the ability to resume a cancelled
 download, uploading a file in multiple chunks instead of a single call, and
 client-side tracking of upload requests on the server.
+
+The chunks of a file, as well as several files, may be uploaded concurrently.
+The server accepts chunks at any offset, so chunks are tracked individually
+and a resumed upload only sends the chunks that were not uploaded yet.
 """
 
 import copy
@@ -23,6 +27,8 @@ import errno
 import os
 import pickle
 import sys
+import threading
+import time
 
 from pulp.common.lock import LockFile
 
@@ -30,6 +36,20 @@ from pulp.common.lock import LockFile
 
 DEFAULT_CHUNKSIZE = 1048576 # 1 MB per upload call
 
+# number of chunks of a single file uploaded at once
+DEFAULT_CONCURRENCY = 1
+
+# number of files uploaded at once by upload_multiple()
+DEFAULT_FILE_CONCURRENCY = 4
+
+# minimum number of seconds between saves of a tracker file while its upload
+# is running; chunks uploaded since the last save are uploaded again on resume
+TRACKER_SAVE_INTERVAL = 1
+
+# number of seconds to wait for worker threads at a time, so the waiting
+# thread can still be interrupted
+JOIN_INTERVAL = 0.5
+
 # -- exceptions ---------------------------------------------------------------
 
 class ManagerUninitializedException(Exception):
@@ -71,8 +91,9 @@ class UploadManager(object):
 
     This class' thread safety admittedly isn't the best. The intention, at least
     initially, is to be used in a CLI where there will only be a single thread
-    per process. As such, there are no in memory locks. The tracker files per
-    upload will carry some state information to prevent two processes from
+    per process. As such, apart from the threads used to upload a file's chunks
+    and several files at once, there are no in memory locks. The tracker files
+    per upload will carry some state information to prevent two processes from
     concurrently modifying the same tracker.
 
     Likewise, the working directory contents are only read once and cached. This
@@ -85,7 +106,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -98,10 +120,14 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of chunks of a file to upload at once
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -122,10 +148,11 @@ class UploadManager(object):
         :return:    a new UploadManager instance with a default working directory
         :rtype:     UploadManager
         """
-        upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
-                                          'default')
+        filesystem = context.config['filesystem']
+        upload_working_dir = os.path.join(filesystem['upload_working_dir'], 'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        concurrency = int(filesystem.get('upload_concurrency', DEFAULT_CONCURRENCY))
+        return cls(upload_working_dir, context.server, concurrency=concurrency)
 
     def initialize(self):
         """
@@ -193,23 +220,33 @@ class UploadManager(object):
 
         return upload_id
 
-    def upload(self, upload_id, callback_func=None, force=False):
+    def upload(self, upload_id, callback_func=None, force=False, rate_callback_func=None):
         """
         Begins or resumes the upload process for the given upload request.
         This call will not return until the upload is complete. The other
         expected exit point is a KeyboardError to kill the process. The
-        client-side on disk tracker files will store the current offset and
-        resume the upload from where it left off on the next call to this method.
+        client-side on disk tracker files will store the uploaded chunks and
+        resume the upload with the remaining chunks on the next call to this
+        method.
+
+        Up to the manager's concurrency chunks are uploaded at once. When
+        interrupted, the chunks already being uploaded are finished before the
+        KeyboardInterrupt is raised again.
 
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
+        will be invoked with the number of bytes uploaded so far and the file
+        size (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
         depends on the chunk_size value for this instance.
 
         The callback_func should have a signature of (int, int).
 
+        The rate_callback_func is invoked at the same points with the number of
+        bytes uploaded so far, the file size and the average number of bytes
+        uploaded per second by this call. It should have a signature of
+        (int, int, float).
+
         This call will raise an exception if an upload is already in progress
         for the given upload_id. If that isn't the case and the tracker file's
         running flag is stale, the force parameter will bypass this check and
@@ -226,11 +263,85 @@ class UploadManager(object):
                uploads
         @type  force: bool
 
+        @param rate_callback_func: optional method to be called with the upload
+               rate after each upload call to the server
+        @type  rate_callback_func: func
+
         @raise MissingUploadRequestException: if a tracker file for upload_id
                cannot be found
         @raise ConcurrentUploadException: if an upload is already in progress
                for upload_id
         """
+        self._upload(upload_id, callback_func, force, rate_callback_func, threading.Event())
+
+    def upload_multiple(self, upload_ids, callback_func=None, force=False,
+                        rate_callback_func=None, file_concurrency=DEFAULT_FILE_CONCURRENCY):
+        """
+        Begins or resumes the upload process for several upload requests,
+        uploading up to file_concurrency of them at once. This call will not
+        return until all uploads have ended. A failed upload does not stop the
+        others; its exception is returned instead. When interrupted, the
+        uploads stop once the chunks being uploaded are finished and the
+        KeyboardInterrupt is raised again.
+
+        The callbacks are the same as for upload() but are invoked with the
+        upload ID as an additional first argument, from the thread uploading
+        the file.
+
+        @param upload_ids: identifies the upload requests
+        @type  upload_ids: list
+
+        @param callback_func: optional method to be called after each upload
+               call to the server; signature of (str, int, int)
+        @type  callback_func: func
+
+        @param force: if true will bypass the running check to prevent concurrent
+               uploads
+        @type  force: bool
+
+        @param rate_callback_func: optional method to be called with the upload
+               rate after each upload call to the server; signature of
+               (str, int, int, float)
+        @type  rate_callback_func: func
+
+        @param file_concurrency: number of files to upload at once
+        @type  file_concurrency: int
+
+        @return: upload ID to the exception raised by its upload, or None if it
+                 completed
+        @rtype:  dict
+        """
+        stop = threading.Event()
+        remaining = list(upload_ids)
+        results = {}
+        lock = threading.Lock()
+
+        def bind(func, upload_id):
+            if func is None:
+                return None
+            return lambda *args: func(upload_id, *args)
+
+        def work():
+            while not stop.isSet():
+                lock.acquire()
+                try:
+                    if not remaining:
+                        return
+                    upload_id = remaining.pop(0)
+                finally:
+                    lock.release()
+
+                try:
+                    self._upload(upload_id, bind(callback_func, upload_id), force,
+                                 bind(rate_callback_func, upload_id), stop)
+                    results[upload_id] = None
+                except Exception, e:
+                    results[upload_id] = e
+
+        _run_threads(work, file_concurrency, stop)
+        return results
+
+    def _upload(self, upload_id, callback_func, force, rate_callback_func, stop):
         tracker_file = self._get_tracker_file_by_id(upload_id)
 
         if tracker_file is None:
@@ -241,6 +352,7 @@ class UploadManager(object):
         if not force and tracker_file.is_running:
             raise ConcurrentUploadException()
 
+        uploader = None
         try:
             # Flag the upload request as running so other processes don't
             # attempt to run it as well
@@ -249,29 +361,22 @@ class UploadManager(object):
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
 
-            f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
+            uploader = _ChunkUploader(self.bindings, tracker_file, source_file_size,
+                                      self.chunk_size, callback_func, rate_callback_func, stop)
+            uploader.run(self.concurrency)
 
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
-                # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
-
-                callback_func(tracker_file.offset, source_file_size)
-
-            tracker_file.is_finished_uploading = True
+            tracker_file.is_finished_uploading = not stop.isSet()
         finally:
             # Regardless of how this ends, it's no longer running, so make sure
             # we update the tracker accordingly.
-            tracker_file.is_running = False
-            tracker_file.save()
+            if uploader is not None:
+                uploader.lock.acquire()
+            try:
+                tracker_file.is_running = False
+                tracker_file.save()
+            finally:
+                if uploader is not None:
+                    uploader.lock.release()
 
     def import_upload(self, upload_id):
         """
@@ -413,7 +518,8 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None # URL to the upload request on the server
-        self.offset = None # start of next chunk to upload
+        self.offset = None # everything before this offset has been uploaded
+        self.uploaded_segments = {} # start to end offset of chunks uploaded past offset
         self.source_filename = None # path on disk to the file to upload
 
         # Import call information
@@ -452,6 +558,70 @@ class UploadTracker(object):
     def delete(self):
         os.remove(self.filename)
 
+    def segment_uploaded(self, start, end):
+        """
+        Records that the bytes from start up to end have been uploaded. The
+        offset is advanced past all segments contiguous with it.
+
+        @param start: offset of the first uploaded byte
+        @type  start: int
+        @param end: offset after the last uploaded byte
+        @type  end: int
+        """
+        if start > self.offset:
+            self.uploaded_segments[start] = max(end, self.uploaded_segments.get(start, end))
+            return
+
+        self.offset = max(self.offset, end)
+        for start in sorted(self.uploaded_segments):
+            if start > self.offset:
+                break
+            self.offset = max(self.offset, self.uploaded_segments.pop(start))
+
+    def remaining_segments(self, file_size, chunk_size):
+        """
+        @param file_size: size of the file being uploaded
+        @type  file_size: int
+        @param chunk_size: maximum length of a segment
+        @type  chunk_size: int
+
+        @return: list of the offset and length of each segment of the file that
+                 has not been uploaded yet, in order
+        @rtype:  list of tuple
+        """
+        segments = []
+        for start, end in self._gaps(file_size):
+            while start < end:
+                length = min(chunk_size, end - start)
+                segments.append((start, length))
+                start += length
+        return segments
+
+    def uploaded_bytes(self, file_size):
+        """
+        @param file_size: size of the file being uploaded
+        @type  file_size: int
+
+        @return: number of bytes of the file uploaded so far
+        @rtype:  int
+        """
+        return file_size - sum([end - start for start, end in self._gaps(file_size)])
+
+    def _gaps(self, file_size):
+        gaps = []
+        position = self.offset
+        for start, end in sorted(self.uploaded_segments.items()) + [(file_size, file_size)]:
+            start = min(start, file_size)
+            if position < start:
+                gaps.append((position, start))
+            position = max(position, end)
+        return gaps
+
+    def __setstate__(self, state):
+        # trackers saved before chunks were tracked individually
+        state.setdefault('uploaded_segments', {})
+        self.__dict__.update(state)
+
     @classmethod
     def load(cls, filename):
         """
@@ -466,3 +636,127 @@ class UploadTracker(object):
         f.close()
 
         return status_file
+
+
+class _ChunkUploader(object):
+    """
+    Uploads the remaining chunks of a single file on one or more threads,
+    recording each uploaded chunk in the file's tracker.
+    """
+
+    def __init__(self, bindings, tracker_file, file_size, chunk_size, callback_func,
+                 rate_callback_func, stop):
+        self.bindings = bindings
+        self.tracker_file = tracker_file
+        self.file_size = file_size
+        self.callback_func = callback_func
+        self.rate_callback_func = rate_callback_func
+        self.stop = stop
+
+        # guards the tracker and the remaining segments
+        self.lock = threading.Lock()
+        self.segments = tracker_file.remaining_segments(file_size, chunk_size)
+        self.started = time.time()
+        self.start_bytes = tracker_file.uploaded_bytes(file_size)
+        self.last_save = self.started
+        self.error = None
+
+    def run(self, concurrency):
+        """
+        Uploads the remaining chunks using up to concurrency threads. An
+        exception raised while uploading a chunk stops the upload and is
+        raised again once the threads finished.
+        """
+        if concurrency <= 1:
+            # the calling thread does the work, just as before chunks could be
+            # uploaded concurrently
+            self._work()
+        else:
+            _run_threads(self._work, min(concurrency, len(self.segments)), self.stop)
+
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+
+    def _work(self):
+        f = open(self.tracker_file.source_filename, 'r')
+        try:
+            while not self.stop.isSet():
+                self.lock.acquire()
+                try:
+                    if not self.segments or self.error is not None:
+                        return
+                    offset, length = self.segments.pop(0)
+                finally:
+                    self.lock.release()
+
+                # Load the chunk to upload
+                f.seek(offset)
+                data = f.read(length)
+                if not data:
+                    return
+
+                # Server request
+                try:
+                    self.bindings.uploads.upload_segment(self.tracker_file.upload_id, offset,
+                                                         data)
+                except Exception:
+                    self.lock.acquire()
+                    try:
+                        if self.error is None:
+                            self.error = sys.exc_info()
+                    finally:
+                        self.lock.release()
+                    return
+
+                self._uploaded(offset, len(data))
+        finally:
+            f.close()
+
+    def _uploaded(self, offset, length):
+        self.lock.acquire()
+        try:
+            # Status update and callback notification
+            self.tracker_file.segment_uploaded(offset, offset + length)
+            now = time.time()
+            if now - self.last_save >= TRACKER_SAVE_INTERVAL or not self.segments:
+                self.tracker_file.save()
+                self.last_save = now
+
+            uploaded = self.tracker_file.uploaded_bytes(self.file_size)
+            if self.callback_func:
+                self.callback_func(uploaded, self.file_size)
+            if self.rate_callback_func:
+                elapsed = now - self.started
+                rate = 0.0
+                if elapsed > 0:
+                    rate = (uploaded - self.start_bytes) / elapsed
+                self.rate_callback_func(uploaded, self.file_size, rate)
+        finally:
+            self.lock.release()
+
+
+def _run_threads(target, count, stop):
+    """
+    Runs target on count daemon threads and waits for them to finish. If the
+    waiting thread is interrupted, the stop event is set so the threads end
+    after their current work, and the interrupt is raised again once they
+    have.
+    """
+    threads = []
+    for i in range(max(1, count)):
+        thread = threading.Thread(target=target)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+
+    interrupted = False
+    for thread in threads:
+        while thread.isAlive():
+            try:
+                thread.join(JOIN_INTERVAL)
+            except KeyboardInterrupt:
+                stop.set()
+                interrupted = True
+
+    if interrupted:
+        raise KeyboardInterrupt()
@@ -313,6 +313,165 @@ class UploadManagerTests(unittest.TestCase):
         # Test
         self.assertRaises(upload_util.ConcurrentUploadException, self.upload_manager.upload, upload_id)
 
+    def test_upload_parallel_segments(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+        mock_rate_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status,
+                                   rate_callback_func=mock_rate_callback.update_rate)
+
+        # Verify every chunk was sent exactly once
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected = f.read()
+        f.close()
+
+        uploaded = {}
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            self.assertEqual(upload_id, single_call_args[0][0])
+            offset, body = single_call_args[0][1:3]
+            self.assertFalse(offset in uploaded)
+            uploaded[offset] = body
+        self.assertEqual(expected, ''.join([uploaded[o] for o in sorted(uploaded)]))
+
+        # Progress never goes backwards and ends with the whole file
+        progress = [c[0][0] for c in mock_callback.update_status.call_args_list]
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(rpm_size, progress[-1])
+        rate_args = mock_rate_callback.update_rate.call_args[0]
+        self.assertEqual((rpm_size, rpm_size), rate_args[:2])
+        self.assertTrue(rate_args[2] >= 0)
+
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual({}, tracker.uploaded_segments)
+        self.assertEqual(True, tracker.is_finished_uploading)
+
+    def test_upload_resume_out_of_order(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        # Simulate an interrupted parallel upload with two chunks uploaded
+        # past the first gap
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.segment_uploaded(0, 100)
+        tracker.segment_uploaded(200, 300)
+        tracker.segment_uploaded(400, 500)
+        tracker.save()
+        self.assertEqual(100, tracker.offset)
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        offsets = [c[0][1] for c in self.mock_upload_bindings.upload_segment.call_args_list]
+        self.assertEqual(offsets[:3], [100, 300, 500])
+        self.assertFalse(0 in offsets)
+        self.assertFalse(200 in offsets)
+        self.assertFalse(400 in offsets)
+
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual({}, tracker.uploaded_segments)
+
+    def test_upload_parallel_failure(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 3
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        def upload_segment(upload_id, offset, data):
+            if offset == 500:
+                raise IOError('network down')
+            return Response(200, {})
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.assertRaises(IOError, self.upload_manager.upload, upload_id)
+
+        # Verify the chunks before the failed one are kept for resume
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(False, tracker.is_running)
+        self.assertEqual(False, tracker.is_finished_uploading)
+        self.assertEqual(500, tracker.offset)
+        remaining = tracker.remaining_segments(os.path.getsize(TEST_RPM_FILENAME), 100)
+        self.assertEqual((500, 100), remaining[0])
+
+    def test_upload_multiple(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        self.upload_manager.initialize()
+        self.mock_upload_bindings.initialize_upload.side_effect = [
+            Response(201, {'upload_id': 'id-%s' % i, '_href': MOCK_LOCATION}) for i in range(4)]
+        upload_ids = []
+        for i in range(3):
+            upload_ids.append(self.upload_manager.initialize_upload(
+                TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : i}, 'm-1'))
+        missing_id = self.upload_manager.initialize_upload('/missing', 'repo-1', 'type-1', {}, 'm')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        results = self.upload_manager.upload_multiple(upload_ids + [missing_id],
+                                                      mock_callback.update_status,
+                                                      file_concurrency=2)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        self.assertEqual(results[missing_id].__class__, OSError)
+        for upload_id in upload_ids:
+            self.assertEqual(results[upload_id], None)
+            tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+            self.assertEqual(rpm_size, tracker.offset)
+            self.assertEqual(True, tracker.is_finished_uploading)
+        called_ids = set([c[0][0] for c in mock_callback.update_status.call_args_list])
+        self.assertEqual(called_ids, set(upload_ids))
+
+    def test_tracker_segments(self):
+        tracker = upload_util.UploadTracker('/tmp/tracker')
+        tracker.offset = 0
+
+        tracker.segment_uploaded(20, 30)
+        tracker.segment_uploaded(40, 50)
+        self.assertEqual(0, tracker.offset)
+        self.assertEqual(20, tracker.uploaded_bytes(100))
+        self.assertEqual([(0, 10), (10, 10), (30, 10), (50, 10), (60, 10), (70, 10),
+                          (80, 10), (90, 10)], tracker.remaining_segments(100, 10))
+
+        tracker.segment_uploaded(0, 20)
+        self.assertEqual(30, tracker.offset)
+        self.assertEqual({40: 50}, tracker.uploaded_segments)
+
+        tracker.segment_uploaded(30, 40)
+        self.assertEqual(50, tracker.offset)
+        self.assertEqual({}, tracker.uploaded_segments)
+        self.assertEqual([(50, 50)], tracker.remaining_segments(100, 1000))
+
+    def test_tracker_without_segments(self):
+        # Trackers saved before segments were tracked
+        os.makedirs(self.upload_working_dir)
+        tracker = upload_util.UploadTracker(os.path.join(self.upload_working_dir, 't'))
+        tracker.offset = 10
+        del tracker.uploaded_segments
+        tracker.save()
+
+        tracker = upload_util.UploadTracker.load(tracker.filename)
+
+        self.assertEqual({}, tracker.uploaded_segments)
+        self.assertEqual([(10, 90)], tracker.remaining_segments(100, 1000))
+
     def test_delete_upload(self):
         # Setup
         self.upload_manager.initialize()
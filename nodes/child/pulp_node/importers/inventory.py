@@ -10,103 +10,133 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 from pulp_node import constants
+from pulp_node.manifest import UnitRef, UnitReader, unique_key
 
 
-class UniqueKey(object):
+class ParentUnits(object):
     """
-    A unique unit key consisting of a unit's type_id & unit_key.
-    The unit key is sorted to ensure consistency.
-    :ivar uid: The unique ID.
-    :type uid: A tuple of: (type_id, unit_key)
+    Iterates the parent units referenced by the inventory.  Each unit is
+    read from the units file as it is iterated, in units file order.
+    The total number of units is reported by __len__().
+    :ivar refs: The (path, offset, length) of each unit.
+    :type refs: list
+    :ivar reader: The reader used to read the units.
+    :type reader: UnitReader
     """
 
-    def __init__(self, unit):
+    def __init__(self, refs, reader):
         """
-        :param unit: A content unit.
-        :type unit: dict
+        :param refs: The (path, offset, length) of each unit.
+        :type refs: list
+        :param reader: The reader used to read the units.
+        :type reader: UnitReader
         """
-        type_id = unit['type_id']
-        unit_key = tuple(sorted(unit['unit_key'].items()))
-        self.uid = (type_id, unit_key)
+        self.refs = refs
+        self.reader = reader
 
-    def __hash__(self):
-        return hash(self.uid)
-
-    def __eq__(self, other):
-        return self.uid == other.uid
+    def __iter__(self):
+        refs = [UnitRef(path, offset, length, self.reader) for path, offset, length in self.refs]
+        for unit, ref in self.reader.fetch_all(refs):
+            unit.pop('metadata', None)
+            yield (unit, ref)
 
-    def __ne__(self, other):
-        return self.uid != other.uid
+    def __len__(self):
+        return len(self.refs)
 
 
 class UnitInventory(object):
     """
     The unit inventory contains both the parent and child inventory
-    of content units associated with a specific repository.  Each is contained
-    within a dictionary keyed by {UnitKey} to ensure uniqueness.
+    of content units associated with a specific repository.  Units are
+    identified by the digest of their unique key.  Parent units are held as
+    references into the units file and are only read from the file when
+    listed.  Child units are compared with the parent units as they are
+    read; only units that are on the child only are kept.
+    :ivar reader: The reader used to read parent units.  Kept open
+        until the inventory is closed.
+    :type reader: UnitReader
+    :ivar manifest_id: The ID of the parent manifest the units were read from.
+    :type manifest_id: str
     """
 
-    @staticmethod
-    def _import_parent_units(units):
-        _units = {}
-        for unit, ref in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = (unit, ref)
-        return _units
-
-    @staticmethod
-    def _import_child_units(units):
-        _units = {}
-        for unit in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = unit
-        return _units
-
-    def __init__(self, base_URL, parent_units, child_units):
+    def __init__(self, base_URL, parent_units, child_units, manifest_id=None):
         """
         :param base_URL: The base URL for downloading parent units.
         :param parent_units: The content units in the parent node.
-        :type parent_units: iterable
+        :type parent_units: iterable of: (unit, UnitRef)
         :param child_units: The content units in the child node.
         :type child_units: iterable
+        :param manifest_id: The ID of the parent manifest the units were read from.
+        :type manifest_id: str
         """
         self.base_URL = base_URL
-        self.parent_units = self._import_parent_units(parent_units)
-        self.child_units = self._import_child_units(child_units)
+        self.manifest_id = manifest_id
+        self.reader = UnitReader()
+        # unique key: (path, offset, length, last_updated)
+        self.parent_units = {}
+        # unique keys of all child units
+        self.child_keys = set()
+        # unique key: unit
+        self.child_only = {}
+        # unique keys of units updated on the parent
+        self.updated_keys = set()
+        self._import_parent_units(parent_units)
+        self._import_child_units(child_units)
+
+    def _import_parent_units(self, units):
+        for unit, ref in units:
+            key = unique_key(unit)
+            last_updated = unit.get(constants.LAST_UPDATED, 0)
+            self.parent_units[key] = (ref.path, ref.offset, ref.length, last_updated)
+
+    def _import_child_units(self, units):
+        for unit in units:
+            key = unique_key(unit)
+            self.child_keys.add(key)
+            parent = self.parent_units.get(key)
+            if parent is None:
+                unit.pop('metadata', None)
+                self.child_only[key] = unit
+                continue
+            parent_last_updated = parent[3]
+            child_last_updated = unit.get(constants.LAST_UPDATED, 0)
+            if parent_last_updated > child_last_updated:
+                self.updated_keys.add(key)
+            else:
+                self.updated_keys.discard(key)
 
     def units_on_parent_only(self):
         """
         Listing of units contained in the parent inventory
         but not contained in the child inventory.
-        :return: List of (unit, ref).
-        :rtype: list
+        :return: Iterable of (unit, ref).
+        :rtype: ParentUnits
         """
-        return [r for k, r in self.parent_units.items() if k not in self.child_units]
+        refs = [r[:3] for k, r in self.parent_units.iteritems() if k not in self.child_keys]
+        return ParentUnits(refs, self.reader)
 
     def units_on_child_only(self):
         """
         Listing of units contained in the child inventory
         but not contained in the parent inventory.
-        :return: List of units that need to be purged.
-        :rtype: list
+        :return: Generator of units that need to be purged.
+        :rtype: generator
         """
-        return [u for k, u in self.child_units.items() if k not in self.parent_units]
+        for unit in self.child_only.itervalues():
+            yield unit
 
     def updated_units(self):
         """
         Listing of units updated on the parent.
-        :return: List of (unit, ref).
-        :rtype: list
+        :return: Generator of (unit, ref).
+        :rtype: generator
         """
-        updated = []
-        for key, (unit, ref) in self.parent_units.items():
-            child_unit = self.child_units.get(key)
-            if child_unit is None:
-                continue
-            parent_last_updated = unit.get(constants.LAST_UPDATED, 0)
-            child_last_updated = child_unit.get(constants.LAST_UPDATED, 0)
-            if parent_last_updated > child_last_updated:
-                updated.append((unit, ref))
-        return updated
\ No newline at end of file
+        refs = [self.parent_units[k][:3] for k in self.updated_keys]
+        for unit, ref in ParentUnits(refs, self.reader):
+            yield (unit, ref)
+
+    def close(self):
+        """
+        Close the files opened to read parent units.
+        """
+        self.reader.close()
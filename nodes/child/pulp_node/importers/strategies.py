@@ -28,11 +28,12 @@ from pulp.server.content.sources import ContentContainer
 from pulp_node import constants
 from pulp_node import pathlib
 from pulp_node.conduit import NodesConduit
-from pulp_node.manifest import Manifest, RemoteManifest
+from pulp_node.manifest import (Manifest, RemoteManifest, Delta, applied_manifest_id,
+    manifest_applied)
 from pulp_node.importers.inventory import UnitInventory
 from pulp_node.importers.download import ContentDownloadListener
 from pulp_node.error import (NodeError, GetChildUnitsError, GetParentUnitsError, AddUnitError,
-    DeleteUnitError, InvalidManifestError, CaughtException)
+    DeleteUnitError, InvalidManifestError, ManifestDownloadError, CaughtException)
 
 
 log = getLogger(__name__)
@@ -116,8 +117,16 @@ class ImporterStrategy(object):
     """
     This object provides the transport independent content unit
     synchronization strategies used by nodes importer plugins.
+    :cvar name: The strategy name recorded with the applied manifest.
+    :type name: str
+    :cvar delta_when_unchanged: Skip the child inventory when nothing has
+        been published since the applied manifest.
+    :type delta_when_unchanged: bool
     """
 
+    name = None
+    delta_when_unchanged = True
+
     def synchronize(self, request):
         """
         Synchronize the content units associated with the specified repository.
@@ -169,22 +178,50 @@ class ImporterStrategy(object):
     def _unit_inventory(self, request):
         """
         Build the unit inventory.
+        When the parent published a delta from the manifest last applied to
+        the child, the inventory only contains the units changed or removed
+        since that manifest.
         :param request: A synchronization request.
         :type request: SyncRequest
         :return: The built inventory.
         :rtype: UnitInventory
         """
+        manifest, delta = self._fetch_manifest(request)
+
         # fetch child units
         try:
             conduit = NodesConduit()
-            child_units = conduit.get_units(request.repo_id)
+            if delta is None:
+                child_units = conduit.get_units(request.repo_id)
+            else:
+                units = [u for u, r in delta.get_units()]
+                units.extend(delta.get_removed())
+                child_units = list(conduit.get_units_by_keys(request.repo_id, units))
         except NodeError:
             raise
         except Exception:
             log.exception(request.repo_id)
             raise GetChildUnitsError(request.repo_id)
 
-        # fetch parent units
+        # build the inventory
+        if delta is None:
+            parent_units = manifest.get_units()
+        else:
+            parent_units = delta.get_units()
+        base_URL = manifest.publishing_details[constants.BASE_URL]
+        inventory = UnitInventory(base_URL, parent_units, child_units, manifest.id)
+        return inventory
+
+    def _fetch_manifest(self, request):
+        """
+        Fetch the parent manifest along with either the delta from the
+        manifest last applied to the child or the units file.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :return: A tuple of: (manifest, delta).  The delta is None when
+            the full units file needs to be used.
+        :rtype: tuple
+        """
         try:
             request.progress.begin_manifest_download()
             url = request.config.get(constants.MANIFEST_URL_KEYWORD)
@@ -199,6 +236,9 @@ class ImporterStrategy(object):
                 pass
             fetched_manifest = RemoteManifest(url, request.downloader, request.working_dir)
             fetched_manifest.fetch()
+            delta = self._fetch_delta(request, fetched_manifest)
+            if delta is not None:
+                return fetched_manifest, delta
             if manifest != fetched_manifest or \
                     not manifest.is_valid() or not manifest.has_valid_units():
                 fetched_manifest.write()
@@ -206,17 +246,58 @@ class ImporterStrategy(object):
                 manifest = fetched_manifest
             if not manifest.is_valid():
                 raise InvalidManifestError()
+            return manifest, None
         except NodeError:
             raise
         except Exception:
             log.exception(request.repo_id)
             raise GetParentUnitsError(request.repo_id)
 
-        # build the inventory
-        parent_units = manifest.get_units()
-        base_URL = manifest.publishing_details[constants.BASE_URL]
-        inventory = UnitInventory(base_URL, parent_units, child_units)
-        return inventory
+    def _fetch_delta(self, request, manifest):
+        """
+        Fetch the delta from the manifest last applied to the child.
+        The delta is only used when the manifest was applied by the same
+        strategy and the units associated with the child repository have
+        not changed since.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :param manifest: The fetched parent manifest.
+        :type manifest: RemoteManifest
+        :return: The fetched delta or None when not published.
+        :rtype: Delta
+        """
+        if not manifest.is_valid():
+            return None
+        marker = NodesConduit().content_marker(request.repo_id)
+        applied_id = applied_manifest_id(request.working_dir, self.name, marker)
+        if not applied_id:
+            return None
+        if applied_id == manifest.id:
+            # nothing published since
+            if not self.delta_when_unchanged:
+                return None
+            return Delta(None, applied_id)
+        try:
+            return manifest.fetch_delta(applied_id)
+        except ManifestDownloadError:
+            # the full units file is used instead
+            log.exception(request.repo_id)
+            return None
+
+    def _manifest_applied(self, request, unit_inventory):
+        """
+        Record the manifest used to build the inventory as applied so that
+        the next synchronization only needs the changes published since.
+        Nothing is recorded when cancelled or when any unit failed.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :param unit_inventory: The inventory of both parent and child content units.
+        :type unit_inventory: UnitInventory
+        """
+        if request.cancelled() or request.summary.errors:
+            return
+        marker = NodesConduit().content_marker(request.repo_id)
+        manifest_applied(request.working_dir, unit_inventory.manifest_id, self.name, marker)
 
     def _reset_storage_path(self, unit):
         """
@@ -359,8 +440,13 @@ class Mirror(ImporterStrategy):
     The *mirror* strategy is used to ensure that the content units associated
     with a child repository exactly matches the units associated with the same
     repository in the parent.  Maintains an exact mirror.
+    The full child inventory is checked when nothing has been published
+    since the last synchronization.
     """
 
+    name = constants.MIRROR_STRATEGY
+    delta_when_unchanged = False
+
     def _synchronize(self, request):
         """
         Performs the following steps:
@@ -372,9 +458,13 @@ class Mirror(ImporterStrategy):
         :type request: SyncRequest
         """
         unit_inventory = self._unit_inventory(request)
-        self._add_units(request, unit_inventory)
-        self._update_units(request, unit_inventory)
-        self._delete_units(request, unit_inventory)
+        try:
+            self._add_units(request, unit_inventory)
+            self._update_units(request, unit_inventory)
+            self._delete_units(request, unit_inventory)
+            self._manifest_applied(request, unit_inventory)
+        finally:
+            unit_inventory.close()
 
 
 class Additive(ImporterStrategy):
@@ -385,6 +475,8 @@ class Additive(ImporterStrategy):
     that are not contained in the parent inventory are permitted to remain.
     """
 
+    name = constants.ADDITIVE_STRATEGY
+
     def _synchronize(self, request):
         """
         Performs the following steps:
@@ -395,8 +487,12 @@ class Additive(ImporterStrategy):
         :type request: SyncRequest
         """
         unit_inventory = self._unit_inventory(request)
-        self._add_units(request, unit_inventory)
-        self._update_units(request, unit_inventory)
+        try:
+            self._add_units(request, unit_inventory)
+            self._update_units(request, unit_inventory)
+            self._manifest_applied(request, unit_inventory)
+        finally:
+            unit_inventory.close()
 
 
 # --- factory ---------------------------------------------------------------------------
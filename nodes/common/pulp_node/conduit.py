@@ -30,7 +30,8 @@ class NodesConduit(object):
         units = {}
         types = {}
         collection = RepoContentUnit.get_collection()
-        for unit in collection.find({'repo_id': repo_id}):
+        fields = ['unit_id', 'unit_type_id', 'owner_type', 'owner_id']
+        for unit in collection.find({'repo_id': repo_id}, fields=fields):
             unit_id = unit['unit_id']
             type_id = unit['unit_type_id']
             units[unit_id] = unit
@@ -38,6 +39,57 @@ class NodesConduit(object):
             unit_list.append(unit['unit_id'])
         return UnitsIterator(units, types)
 
+    def get_units_by_keys(self, repo_id, units, batch_size=100):
+        """
+        Get the units associated with a repository that match the
+        type_id and unit_key of the specified units.
+        :param repo_id: The repository ID used to query the units.
+        :type repo_id: str
+        :param units: Units (dict) containing the type_id and unit_key to match.
+        :type units: iterable
+        :param batch_size: The maximum number of unit keys in a single query.
+        :type batch_size: int
+        :return: A generator of matching associated units.
+        :rtype: generator
+        """
+        unit_keys = {}
+        for unit in units:
+            unit_keys.setdefault(unit['type_id'], []).append(unit['unit_key'])
+        typedefs = Typedef()
+        association_collection = RepoContentUnit.get_collection()
+        fields = ['unit_id', 'unit_type_id', 'owner_type', 'owner_id']
+        for type_id, keys in unit_keys.items():
+            typedef = typedefs.get(type_id)
+            if typedef is None:
+                continue
+            collection = types_db.type_units_collection(type_id)
+            for i in range(0, len(keys), batch_size):
+                query = {'$or': keys[i:i + batch_size]}
+                for metadata in collection.find(query):
+                    spec = {'repo_id': repo_id, 'unit_type_id': type_id, 'unit_id': metadata['_id']}
+                    for unit in association_collection.find(spec, fields=fields):
+                        yield UnitsIterator.associated_unit(typedef, unit, dict(metadata))
+
+    def content_marker(self, repo_id):
+        """
+        Get a marker that changes whenever units are associated with or
+        unassociated from a repository.
+        :param repo_id: The repository ID.
+        :type repo_id: str
+        :return: The number of associated units and the ID of the
+            newest association.
+        :rtype: dict
+        """
+        collection = RepoContentUnit.get_collection()
+        spec = {'repo_id': repo_id}
+        count = collection.find(spec).count()
+        newest = list(collection.find(spec, fields=['_id']).sort('_id', -1).limit(1))
+        if newest:
+            newest = str(newest[0]['_id'])
+        else:
+            newest = None
+        return {'units': count, 'newest': newest}
+
 
 # --- typedef -----------------------------------------------------------------
 
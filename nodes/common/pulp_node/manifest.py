@@ -14,11 +14,22 @@ Provides classes for managing the content unit manifest.
 The manifest is a json encoded file that defines content units
 associated with repository.  The units themselves are stored in a separate
 json encoded file.  For performance reasons, the unit files are compressed.
+The units are compressed in blocks, each a separate gzip member, and an index
+of the blocks is published along with the units file so that single units can
+be read without decompressing the whole file.
+Along with the full units file, deltas listing the units changed and removed
+since recently published manifests are published so that a child that has
+applied one of those manifests only needs to fetch the changes.
 """
 
 import os
 import gzip
+import hashlib
+import zlib
 import errno
+import threading
+
+from bisect import bisect_right
 
 from logging import getLogger
 
@@ -39,6 +50,13 @@ log = getLogger(__name__)
 MANIFEST_VERSION = 2
 MANIFEST_FILE_NAME = 'manifest.json'
 UNITS_FILE_NAME = 'units.json.gz'
+INDEX_SUFFIX = '.idx'
+REMOVED_FILE_NAME = 'removed.json.gz'
+DELTAS_DIR = 'deltas'
+APPLIED_FILE_NAME = 'applied.json'
+
+# uncompressed size of the blocks in the units file
+BLOCK_SIZE = 65536
 
 ID = 'id'
 VERSION = 'version'
@@ -48,6 +66,15 @@ UNITS = 'units'
 UNITS_PATH = 'path'
 UNITS_TOTAL = 'total'
 UNITS_SIZE = 'size'
+UNITS_INDEX = 'index'
+
+INDEX_BLOCKS = 'blocks'
+
+DELTAS = 'deltas'
+DELTA_REMOVED = 'removed'
+
+APPLIED_STRATEGY = 'strategy'
+APPLIED_MARKER = 'marker'
 
 
 # --- utils -----------------------------------------------------------------------------
@@ -76,6 +103,81 @@ def unzip(path, destination, bfrlen=65535):
         fp_in.close()
 
 
+def index_path(path):
+    """
+    Get the path to the block index of the units file at the specified path.
+    :param path: The path to a units file.
+    :type path: str
+    :return: The path to the index.
+    :rtype: str
+    """
+    return path + INDEX_SUFFIX
+
+
+def unique_key(unit):
+    """
+    A fixed size digest of the unit's type_id & unit_key.
+    The unit key (including nested dictionaries) is sorted to ensure consistency.
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The unique key.
+    :rtype: str
+    """
+    uid = (unit['type_id'], sorted(unit['unit_key'].items()))
+    return hashlib.sha1(json.dumps(uid, sort_keys=True)).digest()
+
+
+def applied_manifest_id(dir_path, strategy, marker):
+    """
+    Get the ID of the last manifest applied to the child repository.
+    The ID is only returned when the manifest was applied using the same
+    strategy and the content of the child repository has not changed since.
+    :param dir_path: The working directory of the repository.
+    :type dir_path: str
+    :param strategy: The name of the strategy being used.
+    :type strategy: str
+    :param marker: The current content marker of the child repository.
+    :type marker: dict
+    :return: The manifest ID or None when unknown or no longer valid.
+    :rtype: str
+    """
+    try:
+        with open(pathlib.join(dir_path, APPLIED_FILE_NAME)) as fp:
+            applied = json.load(fp)
+        if applied.get(APPLIED_STRATEGY) != strategy:
+            return None
+        if applied.get(APPLIED_MARKER) != marker:
+            return None
+        return applied.get(ID)
+    except IOError, e:
+        if e.errno != errno.ENOENT:
+            raise
+    except ValueError:
+        # json decoding failed
+        pass
+    return None
+
+
+def manifest_applied(dir_path, manifest_id, strategy=None, marker=None):
+    """
+    Record the ID of the last manifest applied to the child repository
+    along with the strategy used and the content marker of the child
+    repository once applied.
+    :param dir_path: The working directory of the repository.
+    :type dir_path: str
+    :param manifest_id: The applied manifest ID or None to clear it.
+    :type manifest_id: str
+    :param strategy: The name of the strategy used.
+    :type strategy: str
+    :param marker: The content marker of the child repository.
+    :type marker: dict
+    :raise IOError: on I/O errors.
+    """
+    applied = {ID: manifest_id, APPLIED_STRATEGY: strategy, APPLIED_MARKER: marker}
+    with open(pathlib.join(dir_path, APPLIED_FILE_NAME), 'w+') as fp:
+        json.dump(applied, fp)
+
+
 # --- manifest --------------------------------------------------------------------------
 
 
@@ -90,6 +192,8 @@ class Manifest(object):
     :type total_units: int
     :param publishing_details: Details of how units have been published.
     :type publishing_details: dict
+    :ivar deltas: The deltas published along with the units, newest first.
+    :type deltas: list
     """
 
     def __init__(self, path, manifest_id=None):
@@ -104,6 +208,7 @@ class Manifest(object):
         self.version = MANIFEST_VERSION
         self.units = {UNITS_PATH: None, UNITS_TOTAL: 0, UNITS_SIZE: 0}
         self.publishing_details = {}
+        self.deltas = []
         if os.path.isdir(path):
             path = pathlib.join(path, MANIFEST_FILE_NAME)
         self.path = path
@@ -118,7 +223,8 @@ class Manifest(object):
             ID: self.id,
             VERSION: self.version,
             UNITS: self.units,
-            PUBLISHING_DETAILS: self.publishing_details
+            PUBLISHING_DETAILS: self.publishing_details,
+            DELTAS: self.deltas,
         }
         with open(self.path, 'w+') as fp:
             json.dump(state, fp, indent=2)
@@ -138,6 +244,7 @@ class Manifest(object):
         self.version = d.get(VERSION, 0)
         self.units = d.get(UNITS, {UNITS_PATH: None, UNITS_TOTAL: 0, UNITS_SIZE: 0})
         self.publishing_details = d.get(PUBLISHING_DETAILS, {})
+        self.deltas = d.get(DELTAS, [])
 
     def get_units(self):
         """
@@ -150,7 +257,10 @@ class Manifest(object):
         total = self.units[UNITS_TOTAL]
         if total:
             path = self.units_path()
-            path = self.unzip_units(path)
+            if not self.has_index():
+                # published without an index, the units can only be read
+                # once uncompressed
+                path = self.unzip_units(path)
             return UnitIterator(path, total)
         else:
             return []
@@ -163,6 +273,38 @@ class Manifest(object):
         """
         self.units[UNITS_TOTAL] = unit_writer.total_units
         self.units[UNITS_SIZE] = unit_writer.bytes_written
+        self.units[UNITS_INDEX] = os.path.basename(index_path(unit_writer.path))
+
+    def delta_published(self, delta):
+        """
+        Add a delta published along with the units.
+        Deltas are expected to be added newest first.
+        :param delta: A published delta.
+        :type delta: Delta
+        """
+        relative_path = os.path.relpath(delta.path, os.path.dirname(self.path))
+        self.deltas.append({
+            ID: delta.manifest_id,
+            PATH: relative_path,
+            UNITS_TOTAL: delta.total_units,
+            DELTA_REMOVED: delta.total_removed,
+        })
+
+    def get_delta(self, manifest_id):
+        """
+        Get the delta from a previously published manifest.
+        :param manifest_id: The ID of the previously published manifest.
+        :type manifest_id: str
+        :return: The delta or None when not published.
+        :rtype: Delta
+        """
+        for entry in self.deltas:
+            if entry[ID] == manifest_id:
+                return Delta(
+                    pathlib.join(os.path.dirname(self.path), entry[PATH]),
+                    manifest_id,
+                    entry[UNITS_TOTAL],
+                    entry[DELTA_REMOVED])
 
     def published(self, details):
         """
@@ -194,12 +336,28 @@ class Manifest(object):
         try:
             path = self.units_path()
             size = os.path.getsize(path)
-            return size == self.units[UNITS_SIZE]
+            if size != self.units[UNITS_SIZE]:
+                return False
+            if self.units.get(UNITS_INDEX) and path.endswith('.gz'):
+                return os.path.exists(index_path(path))
+            return True
         except OSError, e:
             if e.errno != errno.ENOENT:
                 raise
         return False
 
+    def has_index(self):
+        """
+        Get whether the units file is block compressed and has been
+        published along with its index.
+        :return: True if indexed.
+        :rtype: bool
+        """
+        path = self.units_path()
+        if not self.units.get(UNITS_INDEX) or not path.endswith('.gz'):
+            return False
+        return os.path.exists(index_path(path))
+
     def unzip_units(self, path):
         """
         Uncompress the unit file at the specified path and update
@@ -282,21 +440,142 @@ class RemoteManifest(Manifest):
         :raise ValueError: on json decoding errors
         """
         base_url = self.url.rsplit('/', 1)[0]
-        url = pathlib.join(base_url, UNITS_FILE_NAME)
-        destination = pathlib.join(os.path.dirname(self.path), UNITS_FILE_NAME)
-        request = DownloadRequest(str(url), destination)
+        file_names = [UNITS_FILE_NAME]
+        if self.units.get(UNITS_INDEX):
+            file_names.append(index_path(UNITS_FILE_NAME))
+        requests = []
+        for file_name in file_names:
+            url = pathlib.join(base_url, file_name)
+            destination = pathlib.join(os.path.dirname(self.path), file_name)
+            requests.append(DownloadRequest(str(url), destination))
         listener = AggregatingEventListener()
         self.downloader.event_listener = listener
-        self.downloader.download([request])
+        self.downloader.download(requests)
         if listener.failed_reports:
             report = listener.failed_reports[0]
             raise ManifestDownloadError(self.url, report.error_msg)
 
+    def fetch_delta(self, manifest_id):
+        """
+        Fetch the delta from a previously published manifest.
+        :param manifest_id: The ID of the previously published manifest.
+        :type manifest_id: str
+        :return: The fetched delta or None when not published.
+        :rtype: Delta
+        :raise ManifestDownloadError: on downloading errors.
+        """
+        delta = self.get_delta(manifest_id)
+        if delta is None:
+            return None
+        base_url = self.url.rsplit('/', 1)[0]
+        relative_path = os.path.relpath(delta.path, os.path.dirname(self.path))
+        pathlib.mkdir(delta.path)
+        requests = []
+        for file_name in (UNITS_FILE_NAME, index_path(UNITS_FILE_NAME), REMOVED_FILE_NAME):
+            url = pathlib.url_join(base_url, relative_path, file_name)
+            destination = pathlib.join(delta.path, file_name)
+            requests.append(DownloadRequest(str(url), destination))
+        listener = AggregatingEventListener()
+        self.downloader.event_listener = listener
+        self.downloader.download(requests)
+        if listener.failed_reports:
+            report = listener.failed_reports[0]
+            raise ManifestDownloadError(self.url, report.error_msg)
+        return delta
+
+
+class Delta(object):
+    """
+    The units changed and removed since a previously published manifest.
+    The changed units are written to a (block compressed) units file and
+    the type_id & unit_key of the removed units to a separate file.
+    :ivar path: The absolute path to the directory containing the delta files.
+    :type path: str
+    :ivar manifest_id: The ID of the manifest the changes are relative to.
+    :type manifest_id: str
+    :ivar total_units: The number of changed units.
+    :type total_units: int
+    :ivar total_removed: The number of removed units.
+    :type total_removed: int
+    """
+
+    def __init__(self, path, manifest_id, total_units=0, total_removed=0):
+        """
+        :param path: The absolute path to the directory containing the delta files.
+        :type path: str
+        :param manifest_id: The ID of the manifest the changes are relative to.
+        :type manifest_id: str
+        :param total_units: The number of changed units.
+        :type total_units: int
+        :param total_removed: The number of removed units.
+        :type total_removed: int
+        """
+        self.path = path
+        self.manifest_id = manifest_id
+        self.total_units = total_units
+        self.total_removed = total_removed
+
+    def write(self, units, removed):
+        """
+        Write the delta files.
+        :param units: The changed units.
+        :type units: iterable
+        :param removed: The type_id & unit_key of the removed units.
+        :type removed: iterable
+        :raise IOError: on I/O errors.
+        """
+        pathlib.mkdir(self.path)
+        with UnitWriter(pathlib.join(self.path, UNITS_FILE_NAME)) as writer:
+            for unit in units:
+                writer.add(unit)
+        self.total_units = writer.total_units
+        self.total_removed = 0
+        fp = gzip.open(pathlib.join(self.path, REMOVED_FILE_NAME), 'wb')
+        try:
+            for unit in removed:
+                fp.write(json.dumps(dict(type_id=unit['type_id'], unit_key=unit['unit_key'])))
+                fp.write('\n')
+                self.total_removed += 1
+        finally:
+            fp.close()
+
+    def get_units(self):
+        """
+        Get the changed units.
+        :return: An iterator of (unit, ref).
+        :rtype: iterable
+        """
+        if self.total_units:
+            return UnitIterator(pathlib.join(self.path, UNITS_FILE_NAME), self.total_units)
+        else:
+            return []
+
+    def get_removed(self):
+        """
+        Get the removed units.
+        :return: A generator of units containing the type_id & unit_key.
+        :rtype: generator
+        """
+        if not self.total_removed:
+            return
+        fp = gzip.open(pathlib.join(self.path, REMOVED_FILE_NAME))
+        try:
+            while True:
+                json_unit = fp.readline()
+                if not json_unit:
+                    break
+                yield json.loads(json_unit)
+        finally:
+            fp.close()
+
 
 class UnitWriter(object):
     """
     Writes json encoded content units to a file.
     This approach is 30x faster than opening, appending, and closing for each unit.
+    The units are compressed in blocks of about BLOCK_SIZE bytes, each written as
+    a separate gzip member so that the file can still be read as a single gzip
+    stream.  The offset of each block is written to an index file on close.
     :ivar path:  The absolute path to a file or directory.  When a directory is specified,
         the standard file name is appended.
     :type path: str
@@ -306,36 +585,41 @@ class UnitWriter(object):
     :type total_units: int
     :ivar bytes_written: The total number of bytes written.
     :type bytes_written: int
+    :ivar block_size: The uncompressed size of each block.
+    :type block_size: int
+    :ivar blocks: The (uncompressed offset, offset, length) of each written block.
+    :type blocks: list
     """
 
-    def __init__(self, path):
+    def __init__(self, path, block_size=BLOCK_SIZE):
         """
         :param path: The absolute path to a file or directory.
             When a directory is specified, the standard file name is appended.
         :type path: str
+        :param block_size: The uncompressed size of each block.
+        :type block_size: int
         :raise IOError: on I/O errors
         """
         if os.path.isdir(path):
             path = pathlib.join(path, UNITS_FILE_NAME)
         self.path = path
-        self.fp = gzip.open(path, 'wb')
+        self.fp = open(path, 'wb')
         self.total_units = 0
         self.bytes_written = 0
+        self.block_size = block_size
+        self.blocks = []
+        self.block = []
+        self.block_length = 0
+        self.uncompressed_offset = 0
 
     @property
     def closed(self):
         """
-        Determines if the file is closed or not. This exists because
-        the gzip API changed drastically from python 2.6 to 2.7.
+        Determines if the file is closed or not.
         :return: True if the file is closed.
         :rtype: bool
         """
-        try:
-            # python 2.7
-            return self.fp.closed
-        except AttributeError:
-            # python 2.6
-            return self.fp.fileobj.closed
+        return self.fp.closed
 
     def add(self, unit):
         """
@@ -346,21 +630,41 @@ class UnitWriter(object):
         :raise ValueError: json encoding errors
         """
         self.total_units += 1
-        json_unit = json.dumps(unit)
-        self.fp.write(json_unit)
-        self.fp.write('\n')
+        json_unit = json.dumps(unit) + '\n'
+        self.block.append(json_unit)
+        self.block_length += len(json_unit)
+        if self.block_length >= self.block_size:
+            self._write_block()
 
     def close(self):
         """
-        Close and compress the associated file.  This method is idempotent.
+        Close and compress the associated file and write the index.
+        This method is idempotent.
         :return: The number of units written.
         :rtype: int
         """
         if not self.closed:
+            self._write_block()
             self.fp.close()
             self.bytes_written = os.path.getsize(self.path)
+            with open(index_path(self.path), 'w+') as fp:
+                json.dump({INDEX_BLOCKS: self.blocks}, fp)
         return self.total_units
 
+    def _write_block(self):
+        """
+        Compress the buffered units as a gzip member.
+        """
+        if not self.block:
+            return
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = compressor.compress(''.join(self.block)) + compressor.flush()
+        self.blocks.append((self.uncompressed_offset, self.fp.tell(), len(data)))
+        self.fp.write(data)
+        self.uncompressed_offset += self.block_length
+        self.block = []
+        self.block_length = 0
+
     def __enter__(self):
         return self
 
@@ -381,8 +685,12 @@ class UnitIterator:
     """
 
     @staticmethod
-    def get_units(path):
-        with open(path) as fp:
+    def get_units(path, reader):
+        if path.endswith('.gz'):
+            fp = gzip.open(path)
+        else:
+            fp = open(path)
+        try:
             while True:
                 begin = fp.tell()
                 json_unit = fp.readline()
@@ -390,19 +698,25 @@ class UnitIterator:
                 if json_unit:
                     unit = json.loads(json_unit)
                     length = (end - begin)
-                    ref = UnitRef(path, begin, length)
+                    ref = UnitRef(path, begin, length, reader)
                     yield (unit, ref)
                 else:
                     break
+        finally:
+            fp.close()
 
-    def __init__(self, path, total_units):
+    def __init__(self, path, total_units, reader=None):
         """
         :param path: The absolute path to the units file to be iterated.
         :type path: str
         :param total_units: The number of units contained in the units file.
         :type total_units: int
+        :param reader: The reader used by the references to fetch units.
+            When not specified, a reader is created for this file.
+        :type reader: UnitReader
         """
-        self.unit_generator = UnitIterator.get_units(path)
+        self.reader = reader or UnitReader()
+        self.unit_generator = UnitIterator.get_units(path, self.reader)
         self.total_units = total_units
 
     def next(self):
@@ -424,20 +738,27 @@ class UnitRef(object):
     :type offset: int
     :ivar length: The length of a specific unit within the file.
     :type length: int
+    :ivar reader: The reader used to fetch the unit.
+    :type reader: UnitReader
     """
 
-    def __init__(self, path, offset, length):
+    def __init__(self, path, offset, length, reader=None):
         """
         :param path: The absolute path to the units file.
         :type path: str
         :param offset: The offset for a specific unit with the file.
+            The offset is within the uncompressed units for block compressed files.
         :type offset: int
         :param length: The length of a specific unit within the file.
         :type length: int
+        :param reader: The reader used to fetch the unit.  When not specified,
+            the file is opened for each fetch.
+        :type reader: UnitReader
         """
         self.path = path
         self.offset = offset
         self.length = length
+        self.reader = reader
 
     def fetch(self):
         """
@@ -447,7 +768,113 @@ class UnitRef(object):
         :raise IOError: on I/O errors.
         :raise ValueError: json decoding errors
         """
-        with open(self.path) as fp:
-            fp.seek(self.offset)
-            json_unit = fp.read(self.length)
-            return json.loads(json_unit)
+        if self.reader is not None:
+            return self.reader.fetch(self)
+        reader = UnitReader()
+        try:
+            return reader.fetch(self)
+        finally:
+            reader.close()
+
+
+class UnitReader(object):
+    """
+    Reads units referenced by UnitRef from units files.
+    Each units file is opened once and kept open until the reader is closed.
+    Block compressed units files are read using their index; the most
+    recently decompressed block of each file is kept so that units fetched
+    in offset order decompress each block once.  Safe to be shared by
+    threads.
+    :ivar files: Open files keyed by path.
+    :type files: dict
+    :ivar indexes: The uncompressed offsets and blocks of each indexed file,
+        keyed by path; None for files that are not block compressed.
+    :type indexes: dict
+    :ivar blocks: The (uncompressed offset, data) of the last decompressed
+        block keyed by path.
+    :type blocks: dict
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.indexes = {}
+        self.blocks = {}
+        self.lock = threading.RLock()
+
+    def fetch(self, ref):
+        """
+        Fetch the referenced content unit.
+        :param ref: A unit reference.
+        :type ref: UnitRef
+        :return: The json decoded unit.
+        :rtype: dict
+        :raise IOError: on I/O errors.
+        :raise ValueError: json decoding errors
+        """
+        with self.lock:
+            json_unit = self._read(ref.path, ref.offset, ref.length)
+        return json.loads(json_unit)
+
+    def fetch_all(self, refs):
+        """
+        Fetch the referenced content units in file and offset order.
+        :param refs: Unit references.
+        :type refs: iterable
+        :return: A generator of (unit, ref).
+        :rtype: generator
+        :raise IOError: on I/O errors.
+        :raise ValueError: json decoding errors
+        """
+        for ref in sorted(refs, key=lambda r: (r.path, r.offset)):
+            yield (self.fetch(ref), ref)
+
+    def close(self):
+        """
+        Close all open files.  This method is idempotent.
+        """
+        with self.lock:
+            for fp in self.files.values():
+                fp.close()
+            self.files = {}
+            self.blocks = {}
+
+    def _read(self, path, offset, length):
+        fp = self.files.get(path)
+        if fp is None:
+            fp = open(path, 'rb')
+            self.files[path] = fp
+        index = self._index(path)
+        if index is None:
+            fp.seek(offset)
+            return fp.read(length)
+        start, data = self._block(path, fp, index, offset)
+        return data[offset - start:offset - start + length]
+
+    def _index(self, path):
+        if path in self.indexes:
+            return self.indexes[path]
+        index = None
+        if path.endswith('.gz') and os.path.exists(index_path(path)):
+            with open(index_path(path)) as fp:
+                blocks = json.load(fp)[INDEX_BLOCKS]
+            index = ([b[0] for b in blocks], blocks)
+        self.indexes[path] = index
+        return index
+
+    def _block(self, path, fp, index, offset):
+        block = self.blocks.get(path)
+        if block is not None:
+            start, data = block
+            if start <= offset < start + len(data):
+                return block
+        starts, blocks = index
+        start, block_offset, block_length = blocks[bisect_right(starts, offset) - 1]
+        fp.seek(block_offset)
+        data = zlib.decompress(fp.read(block_length), 16 + zlib.MAX_WBITS)
+        block = (start, data)
+        self.blocks[path] = block
+        return block
+
+    def __del__(self):
+        # just in case the reader is not properly closed.
+        self.close()
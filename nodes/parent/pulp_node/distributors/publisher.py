@@ -18,12 +18,23 @@ from logging import getLogger
 
 from pulp_node import constants
 from pulp_node import pathlib
-from pulp_node.manifest import Manifest, UnitWriter
+from pulp_node.manifest import (Manifest, UnitWriter, UnitRef, UnitReader, Delta, ID,
+    DELTAS_DIR, UNITS_TOTAL, unique_key)
 
 
 log = getLogger(__name__)
 
 
+# --- constants ----------------------------------------------------
+
+# the number of previously published manifests deltas are published for
+MAX_DELTAS = 10
+
+# deltas with more changes than this fraction of the published units are
+# not published; fetching the full units file is about as cheap
+MAX_DELTA_RATIO = 0.5
+
+
 # --- utils --------------------------------------------------------
 
 def tar_path(path):
@@ -130,10 +141,83 @@ class FilePublisher(Publisher):
         manifest_id = str(uuid4())
         manifest = Manifest(self.tmp_dir, manifest_id)
         manifest.units_published(writer)
+        self.publish_deltas(manifest)
         manifest.write()
         self.staged = True
         return manifest.path
 
+    def publish_deltas(self, manifest):
+        """
+        Publish deltas from the previously published manifest and from the
+        manifests it published deltas for.  The delta from the previous
+        manifest is found by comparing the units files.  The older deltas are
+        compacted by merging them with it, so a child only ever fetches a
+        single delta.  Only the MAX_DELTAS newest deltas are kept; deltas
+        containing more changes than MAX_DELTA_RATIO of the units are dropped.
+        :param manifest: The manifest being published.
+        :type manifest: Manifest
+        """
+        previous = Manifest(pathlib.join(self.publish_dir, self.repo_id))
+        try:
+            previous.read()
+        except (IOError, ValueError):
+            # never published
+            return
+        if not previous.id or not previous.is_valid() or not previous.has_index():
+            # the previous units can't be read without uncompressing them
+            return
+
+        # unique key: (offset, length, last_updated)
+        published = {}
+        for unit, ref in manifest.get_units():
+            published[unique_key(unit)] = \
+                (ref.offset, ref.length, unit.get(constants.LAST_UPDATED, 0))
+
+        # changes since the previous manifest
+        changed = set()
+        removed = {}
+        found = set()
+        for unit, ref in previous.get_units():
+            key = unique_key(unit)
+            entry = published.get(key)
+            if entry is None:
+                removed[key] = unit
+                continue
+            found.add(key)
+            if entry[2] != unit.get(constants.LAST_UPDATED, 0):
+                changed.add(key)
+        changed.update([k for k in published if k not in found])
+        deltas = [(previous.id, changed, removed)]
+
+        # changes since older manifests
+        for entry in previous.deltas[:MAX_DELTAS - 1]:
+            delta = previous.get_delta(entry[ID])
+            delta_changed = set(changed)
+            delta_changed.update([unique_key(u) for u, r in delta.get_units()])
+            delta_changed = set([k for k in delta_changed if k in published])
+            delta_removed = dict(removed)
+            for unit in delta.get_removed():
+                key = unique_key(unit)
+                if key not in published:
+                    delta_removed[key] = unit
+            deltas.append((delta.manifest_id, delta_changed, delta_removed))
+
+        units_path = manifest.units_path()
+        reader = UnitReader()
+        try:
+            for manifest_id, changed, removed in deltas:
+                if len(changed) + len(removed) > manifest.units[UNITS_TOTAL] * MAX_DELTA_RATIO:
+                    continue
+                refs = []
+                for key in changed:
+                    offset, length = published[key][:2]
+                    refs.append(UnitRef(units_path, offset, length, reader))
+                delta = Delta(pathlib.join(self.tmp_dir, DELTAS_DIR, manifest_id), manifest_id)
+                delta.write((u for u, r in reader.fetch_all(refs)), removed.itervalues())
+                manifest.delta_published(delta)
+        finally:
+            reader.close()
+
     def publish_unit(self, unit):
         """
         Publish the file associated with the unit into the publish directory.
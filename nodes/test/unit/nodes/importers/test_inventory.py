@@ -0,0 +1,116 @@
+import os
+import shutil
+
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from pulp_node.importers.inventory import UnitInventory, unique_key
+from pulp_node.manifest import UnitWriter, Manifest
+
+
+def parent_unit(n, last_updated=0):
+    return dict(
+        type_id='T',
+        unit_key={'name': 'unit-%d' % n, 'version': n},
+        last_updated=last_updated,
+        metadata={'description': 'x' * 100})
+
+
+def child_unit(n, last_updated=0):
+    unit = parent_unit(n, last_updated)
+    unit['unit_id'] = 'id-%d' % n
+    return unit
+
+
+class TestUniqueKey(TestCase):
+
+    def test_key(self):
+        unit = dict(type_id='T', unit_key={'a': 1, 'b': u'2'})
+        same = dict(type_id=u'T', unit_key={'b': '2', 'a': 1})
+        other = dict(type_id='R', unit_key={'a': 1, 'b': '2'})
+        self.assertEqual(unique_key(unit), unique_key(same))
+        self.assertNotEqual(unique_key(unit), unique_key(other))
+        self.assertEqual(len(unique_key(unit)), 20)
+
+    def test_nested_key(self):
+        # 'a' and 'i' collide in a small dict, so the insertion order
+        # determines the order in which the keys are iterated
+        nested = {}
+        nested['a'] = 1
+        nested['i'] = 2
+        reordered = {}
+        reordered['i'] = 2
+        reordered['a'] = 1
+        unit = dict(type_id='T', unit_key={'n': nested})
+        same = dict(type_id='T', unit_key={'n': reordered})
+        self.assertEqual(unique_key(unit), unique_key(same))
+
+
+class TestUnitInventory(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def parent_units(self, units):
+        manifest = Manifest(os.path.join(self.tmp_dir, 'manifest.json'))
+        writer = UnitWriter(self.tmp_dir)
+        for unit in units:
+            writer.add(unit)
+        writer.close()
+        manifest.units_published(writer)
+        manifest.write()
+        return manifest.get_units()
+
+    def test_diff(self):
+        parent = [parent_unit(n, last_updated=10) for n in range(5)]
+        child = [child_unit(3, last_updated=10), child_unit(4, last_updated=5),
+                 child_unit(7), child_unit(8)]
+
+        inventory = UnitInventory('http://parent', self.parent_units(parent), child)
+
+        parent_only = inventory.units_on_parent_only()
+        self.assertEqual(len(parent_only), 3)
+        units = list(parent_only)
+        self.assertEqual([u['unit_key']['version'] for u, r in units], [0, 1, 2])
+        for unit, ref in units:
+            # listed units are stripped, the reference is to the full unit
+            self.assertFalse('metadata' in unit)
+            self.assertEqual(ref.fetch()['metadata'], {'description': 'x' * 100})
+
+        updated = list(inventory.updated_units())
+        self.assertEqual([u['unit_key']['version'] for u, r in updated], [4])
+
+        child_only = sorted(inventory.units_on_child_only(), key=lambda u: u['unit_id'])
+        self.assertEqual([u['unit_id'] for u in child_only], ['id-7', 'id-8'])
+        self.assertFalse('metadata' in child_only[0])
+
+    def test_only_references_kept(self):
+        parent = [parent_unit(n) for n in range(3)]
+
+        inventory = UnitInventory('http://parent', self.parent_units(parent), [])
+
+        for key, entry in inventory.parent_units.items():
+            self.assertEqual(len(key), 20)
+            self.assertEqual(len(entry), 4)
+            self.assertFalse(isinstance(entry[0], dict))
+
+    def test_duplicate_child_units(self):
+        parent = [parent_unit(1, last_updated=10)]
+        child = [child_unit(1, last_updated=5), child_unit(1, last_updated=10),
+                 child_unit(2), child_unit(2)]
+
+        inventory = UnitInventory('http://parent', self.parent_units(parent), child)
+
+        self.assertEqual(len(inventory.units_on_parent_only()), 0)
+        self.assertEqual(list(inventory.updated_units()), [])
+        self.assertEqual(len(list(inventory.units_on_child_only())), 1)
+
+    def test_empty(self):
+        inventory = UnitInventory('http://parent', [], [])
+
+        self.assertEqual(list(inventory.units_on_parent_only()), [])
+        self.assertEqual(list(inventory.updated_units()), [])
+        self.assertEqual(list(inventory.units_on_child_only()), [])
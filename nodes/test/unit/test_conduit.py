@@ -122,4 +122,20 @@ class QueryTests(ServerTests):
             unit_key = u['unit_key']
             self.assertEqual(unit_key['N'], n)
             self.assertEqual(u['storage_path'], create_storage_path(unit_id))
-            n += 1
\ No newline at end of file
+            n += 1
+    def test_query_by_keys(self):
+        num_units = 5
+        populate(num_units)
+        conduit = NodesConduit()
+        keys = [
+            dict(type_id=TYPE_A, unit_key=dict(UNIT_METADATA, N=1)),
+            dict(type_id=TYPE_B, unit_key=dict(UNIT_METADATA, N=7)),
+            dict(type_id=TYPE_B, unit_key=dict(UNIT_METADATA, N=1000)),
+            dict(type_id='unknown', unit_key=dict(UNIT_METADATA, N=1)),
+        ]
+        units = list(conduit.get_units_by_keys(REPO_ID, keys, batch_size=1))
+        unit_ids = sorted([u['unit_id'] for u in units])
+        self.assertEqual(unit_ids, [create_unit_id(TYPE_A, 1), create_unit_id(TYPE_B, 7)])
+        for u in units:
+            self.assertEqual(u['storage_path'], create_storage_path(u['unit_id']))
+            self.assertEqual(u['owner_id'], constants.HTTP_IMPORTER)
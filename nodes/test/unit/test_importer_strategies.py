@@ -18,10 +18,12 @@ from tempfile import mkdtemp
 from uuid import uuid4
 
 from pulp.plugins.model import Unit
+from pulp.server.compat import json
 from pulp.server.config import config as pulp_conf
 
 from pulp_node.importers.strategies import *
 from pulp_node.importers.inventory import UnitInventory
+from pulp_node.manifest import UnitRef, Delta, applied_manifest_id, manifest_applied
 from pulp_node.importers.reports import SummaryReport, ProgressListener
 from pulp_node.reports import RepositoryProgress
 from pulp_node.error import *
@@ -61,8 +63,15 @@ class TestRepo(object):
 
 class TestManifest:
 
-    def __init__(self, units):
-        self.units = [(u, TestUnitRef(u)) for u in units]
+    def __init__(self, dir_path, units):
+        path = os.path.join(dir_path, 'units.json')
+        self.units = []
+        with open(path, 'w+') as fp:
+            for unit in units:
+                offset = fp.tell()
+                fp.write(json.dumps(unit))
+                fp.write('\n')
+                self.units.append((unit, UnitRef(path, offset, fp.tell() - offset)))
         self.publishing_details = {constants.BASE_URL: BASE_URL}
 
     def get_units(self):
@@ -75,20 +84,12 @@ class TestManifest:
         pass
 
 
-class TestUnitRef:
-
-    def __init__(self, unit):
-        self.unit = unit
-
-    def fetch(self):
-        return self.unit
-
-
 REPO_ID = 'foo'
 BASE_URL = 'file://'
 DOWNLOADER_ERROR_REPORT = dict(response_code=401, message='go fish')
 MANIFEST_ERROR = ManifestDownloadError('http://redhat.com/manifest', DOWNLOADER_ERROR_REPORT)
 UNIT_ERROR = UnitDownloadError('http://redhat.com/unit', REPO_ID, DOWNLOADER_ERROR_REPORT)
+MARKER = {'units': 3, 'newest': '5267fb2fe138230c8c000001'}
 
 
 class TestBase(TestCase):
@@ -178,6 +179,8 @@ class TestBase(TestCase):
         self.assertEqual(len(request.summary.errors), 1)
         self.assertEqual(request.summary.errors[0].error_id, DeleteUnitError.ERROR_ID)
 
+    @patch('pulp_node.importers.strategies.ImporterStrategy._fetch_manifest',
+           return_value=(Mock(), None))
     @patch('pulp_node.conduit.NodesConduit.get_units', side_effect=ValueError())
     def test_get_child_units_exception(self, *unused):
         # Setup
@@ -211,7 +214,7 @@ class TestBase(TestCase):
         request.downloader.download = Mock()
         unit = dict(unit_id='abc', type_id='T', unit_key={}, metadata={})
         units = [unit]
-        manifest = TestManifest(units)
+        manifest = TestManifest(self.tmp_dir, units)
         inventory = UnitInventory(BASE_URL, manifest.get_units(), [])
         # Test
         strategy = ImporterStrategy()
@@ -245,7 +248,7 @@ class TestBase(TestCase):
             storage_path=os.path.join(self.tmp_dir, unit_id),
             relative_path=os.path.join(self.tmp_dir, 'testing', unit_id))
         units = [unit]
-        manifest = TestManifest(units)
+        manifest = TestManifest(self.tmp_dir, units)
         inventory = UnitInventory(BASE_URL, manifest.get_units(), [])
         # Test
         strategy = ImporterStrategy()
@@ -253,6 +256,94 @@ class TestBase(TestCase):
         self.assertEqual(request.cancel_event.call_count, 2)
         self.assertFalse(mock_download.called)
 
+    @patch('pulp_node.conduit.NodesConduit.get_units')
+    @patch('pulp_node.conduit.NodesConduit.get_units_by_keys')
+    def test_delta_inventory(self, mock_get_units_by_keys, mock_get_units):
+        # Setup
+        request = self.request()
+        changed = dict(type_id='T', unit_key={'n': 1}, last_updated=2, metadata={})
+        removed = dict(type_id='T', unit_key={'n': 2})
+        delta_dir = os.path.join(self.tmp_dir, 'delta')
+        delta = Delta(delta_dir, 'm-1')
+        delta.write([changed], [removed])
+        manifest = Mock(id='m-2', publishing_details={constants.BASE_URL: BASE_URL})
+        child_unit = dict(unit_id='abc', type_id='T', unit_key={'n': 2}, metadata={})
+        mock_get_units_by_keys.return_value = iter([child_unit])
+        strategy = ImporterStrategy()
+        # Test
+        with patch.object(strategy, '_fetch_manifest', return_value=(manifest, delta)):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertFalse(mock_get_units.called)
+        keys = mock_get_units_by_keys.call_args[0][1]
+        self.assertEqual([u['unit_key'] for u in keys], [{'n': 1}, {'n': 2}])
+        self.assertEqual([u['unit_key'] for u, r in inventory.units_on_parent_only()],
+                         [{'n': 1}])
+        self.assertEqual(list(inventory.units_on_child_only()), [child_unit])
+        self.assertEqual(inventory.manifest_id, 'm-2')
+        inventory.close()
+
+    @patch('pulp_node.conduit.NodesConduit.content_marker', return_value=MARKER)
+    def test_fetch_delta(self, *unused):
+        # Setup
+        request = self.request()
+        manifest = Mock(id='m-2')
+        manifest.is_valid.return_value = True
+        strategy = Additive()
+        # Test
+        # nothing applied
+        self.assertEqual(strategy._fetch_delta(request, manifest), None)
+        # nothing published since applied
+        manifest_applied(self.tmp_dir, 'm-2', constants.ADDITIVE_STRATEGY, MARKER)
+        delta = strategy._fetch_delta(request, manifest)
+        self.assertEqual(list(delta.get_units()), [])
+        self.assertEqual(list(delta.get_removed()), [])
+        # published since applied
+        manifest_applied(self.tmp_dir, 'm-1', constants.ADDITIVE_STRATEGY, MARKER)
+        delta = strategy._fetch_delta(request, manifest)
+        self.assertEqual(delta, manifest.fetch_delta.return_value)
+        manifest.fetch_delta.assert_called_with('m-1')
+        # delta not downloaded
+        manifest.fetch_delta.side_effect = MANIFEST_ERROR
+        self.assertEqual(strategy._fetch_delta(request, manifest), None)
+
+    @patch('pulp_node.conduit.NodesConduit.content_marker', return_value=MARKER)
+    def test_fetch_delta_invalidated(self, *unused):
+        # Setup
+        request = self.request()
+        manifest = Mock(id='m-2')
+        manifest.is_valid.return_value = True
+        # Test
+        # child units changed since applied
+        manifest_applied(self.tmp_dir, 'm-1', constants.ADDITIVE_STRATEGY,
+                         {'units': 9, 'newest': 'abc'})
+        self.assertEqual(Additive()._fetch_delta(request, manifest), None)
+        # applied by another strategy
+        manifest_applied(self.tmp_dir, 'm-1', constants.ADDITIVE_STRATEGY, MARKER)
+        self.assertEqual(Mirror()._fetch_delta(request, manifest), None)
+        # mirror with nothing published since applied
+        manifest_applied(self.tmp_dir, 'm-2', constants.MIRROR_STRATEGY, MARKER)
+        self.assertEqual(Mirror()._fetch_delta(request, manifest), None)
+        self.assertFalse(manifest.fetch_delta.called)
+
+    @patch('pulp_node.conduit.NodesConduit.content_marker', return_value=MARKER)
+    def test_manifest_applied(self, *unused):
+        # Setup
+        request = self.request()
+        inventory = UnitInventory(BASE_URL, [], [], 'm-1')
+        strategy = Mirror()
+        # Test
+        request.summary.errors.append(UNIT_ERROR)
+        strategy._manifest_applied(request, inventory)
+        self.assertEqual(applied_manifest_id(self.tmp_dir, constants.MIRROR_STRATEGY, MARKER),
+                         None)
+        request.summary.errors = []
+        strategy._manifest_applied(request, inventory)
+        self.assertEqual(applied_manifest_id(self.tmp_dir, constants.MIRROR_STRATEGY, MARKER),
+                         'm-1')
+        self.assertEqual(applied_manifest_id(self.tmp_dir, constants.ADDITIVE_STRATEGY, MARKER),
+                         None)
+
     def test_needs_update(self):
         # Setup
         path = os.path.join(self.tmp_dir, 'unit_1')
@@ -14,6 +14,7 @@ import tempfile
 import shutil
 import gzip
 import json
+import zlib
 
 from unittest import TestCase
 
@@ -122,13 +123,108 @@ class TestManifest(TestCase):
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
         self.verify(units, units_in)
-        # should already be unzipped
+        # indexed, so never unzipped
         self.assertTrue(manifest.is_valid())
         self.assertTrue(manifest.has_valid_units())
-        self.assertFalse(manifest.units_path().endswith('.gz'))
+        self.assertTrue(manifest.has_index())
+        self.assertTrue(manifest.units_path().endswith('.gz'))
         units_in = []
         for unit, ref in manifest.get_units():
             units_in.append(unit)
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
-        self.verify(units, units_in)
\ No newline at end of file
+        self.verify(units, units_in)
+
+    def test_round_trip_without_index(self):
+        # Setup
+        units = []
+        manifest_path = os.path.join(self.tmp_dir, MANIFEST_FILE_NAME)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={})
+            units.append(unit)
+        units_path = os.path.join(self.tmp_dir, UNITS_FILE_NAME)
+        writer = UnitWriter(units_path)
+        for u in units:
+            writer.add(u)
+        writer.close()
+        manifest = Manifest(manifest_path, self.MANIFEST_ID)
+        manifest.units_published(writer)
+        # published before units files were indexed
+        del manifest.units[UNITS_INDEX]
+        manifest.write()
+        os.unlink(index_path(units_path))
+        # Test
+        cfg = DownloaderConfig()
+        downloader = LocalFileDownloader(cfg)
+        working_dir = os.path.join(self.tmp_dir, 'working_dir')
+        os.makedirs(working_dir)
+        url = 'file://%s' % manifest_path
+        manifest = RemoteManifest(url, downloader, working_dir)
+        manifest.fetch()
+        manifest.fetch_units()
+        # Verify
+        self.assertTrue(manifest.has_valid_units())
+        self.assertFalse(manifest.has_index())
+        units_in = []
+        for unit, ref in manifest.get_units():
+            units_in.append(unit)
+            self.assertEqual(unit, ref.fetch())
+        self.verify(units, units_in)
+        self.assertFalse(manifest.units_path().endswith('.gz'))
+
+
+class TestUnitReader(TestCase):
+
+    NUM_UNITS = 500
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.units_path = os.path.join(self.tmp_dir, UNITS_FILE_NAME)
+        self.units = []
+        writer = UnitWriter(self.units_path, block_size=1024)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={'name': 'unit-%d' % i})
+            self.units.append(unit)
+            writer.add(unit)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_block_index(self):
+        with open(index_path(self.units_path)) as fp:
+            blocks = json.load(fp)[INDEX_BLOCKS]
+        self.assertTrue(len(blocks) > 1)
+        uncompressed_offset = 0
+        for start, offset, length in blocks:
+            self.assertEqual(start, uncompressed_offset)
+            with open(self.units_path) as fp:
+                fp.seek(offset)
+                data = zlib.decompress(fp.read(length), 16 + zlib.MAX_WBITS)
+            uncompressed_offset += len(data)
+        # the blocks are a single gzip stream
+        fp = gzip.open(self.units_path)
+        try:
+            self.assertEqual(len(fp.read()), uncompressed_offset)
+        finally:
+            fp.close()
+
+    def test_fetch(self):
+        reader = UnitReader()
+        refs = [ref for unit, ref in UnitIterator(self.units_path, self.NUM_UNITS, reader)]
+        self.assertEqual(len(refs), self.NUM_UNITS)
+        # random access
+        for i in (499, 0, 250, 251, 3):
+            self.assertEqual(reader.fetch(refs[i]), self.units[i])
+            self.assertEqual(refs[i].fetch(), self.units[i])
+        # batched fetch in offset order
+        fetched = list(reader.fetch_all(reversed(refs)))
+        self.assertEqual([u for u, r in fetched], self.units)
+        self.assertEqual(len(reader.files), 1)
+        reader.close()
+        self.assertEqual(reader.files, {})
+
+    def test_fetch_without_reader(self):
+        unit, ref = list(UnitIterator(self.units_path, self.NUM_UNITS))[42]
+        ref = UnitRef(ref.path, ref.offset, ref.length)
+        self.assertEqual(ref.fetch(), self.units[42])
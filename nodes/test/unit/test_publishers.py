@@ -15,13 +15,14 @@ import tempfile
 import tarfile
 
 from unittest import TestCase
+from mock import patch
 from nectar.downloaders.local import LocalFileDownloader
 from nectar.config import DownloaderConfig
 
 from pulp_node import constants
 from pulp_node import pathlib
 from pulp_node.distributors.http.publisher import HttpPublisher
-from pulp_node.manifest import RemoteManifest
+from pulp_node.manifest import RemoteManifest, Manifest
 
 
 class TestHttp(TestCase):
@@ -154,3 +155,80 @@ class TestHttp(TestCase):
             p.publish(units)
         # verify
         self.assertFalse(os.path.exists(p.tmp_dir))
+
+    @patch('pulp_node.distributors.publisher.MAX_DELTA_RATIO', 1.0)
+    def test_deltas(self):
+        # setup
+        units = self.populate()
+        repo_id = 'test_repo'
+        base_url = 'file://'
+        publish_dir = os.path.join(self.tmpdir, 'nodes/repos')
+        virtual_host = (publish_dir, publish_dir)
+        # test
+        # no delta on the first publish
+        with HttpPublisher(base_url, virtual_host, repo_id) as p:
+            p.publish([dict(u, last_updated=1) for u in units])
+            p.commit()
+        manifest_path = os.path.join(publish_dir, p.manifest_path())
+        manifest = Manifest(manifest_path)
+        manifest.read()
+        first_id = manifest.id
+        self.assertEqual(manifest.deltas, [])
+        # update unit 1, remove unit 2 and add unit 3
+        republished = [
+            dict(units[0], last_updated=1),
+            dict(units[1], last_updated=2),
+            {'type_id': 'unit', 'unit_key': {'n': 3}, 'last_updated': 1},
+        ]
+        with HttpPublisher(base_url, virtual_host, repo_id) as p:
+            p.publish(republished)
+            p.commit()
+        manifest.read()
+        second_id = manifest.id
+        self.assertEqual([d['id'] for d in manifest.deltas], [first_id])
+        # add unit 4
+        republished.append({'type_id': 'unit', 'unit_key': {'n': 4}, 'last_updated': 1})
+        with HttpPublisher(base_url, virtual_host, repo_id) as p:
+            p.publish(republished)
+            p.commit()
+        # verify
+        conf = DownloaderConfig()
+        downloader = LocalFileDownloader(conf)
+        working_dir = os.path.join(self.tmpdir, 'working_dir')
+        os.makedirs(working_dir)
+        url = pathlib.url_join(base_url, p.manifest_path())
+        manifest = RemoteManifest(url, downloader, working_dir)
+        manifest.fetch()
+        self.assertEqual([d['id'] for d in manifest.deltas], [second_id, first_id])
+        self.assertEqual(manifest.fetch_delta('unknown'), None)
+        delta = manifest.fetch_delta(second_id)
+        self.assertEqual([u['unit_key'] for u, r in delta.get_units()], [{'n': 4}])
+        self.assertEqual(list(delta.get_removed()), [])
+        delta = manifest.fetch_delta(first_id)
+        changed = sorted([u['unit_key']['n'] for u, r in delta.get_units()])
+        self.assertEqual(changed, [1, 3, 4])
+        self.assertEqual(list(delta.get_removed()), [{'type_id': 'unit', 'unit_key': {'n': 2}}])
+        for unit, ref in delta.get_units():
+            self.assertEqual(unit, ref.fetch())
+            if unit['unit_key']['n'] == 1:
+                self.assertEqual(unit[constants.FILE_SIZE], len('test_1'))
+
+    def test_deltas_compacted(self):
+        # setup
+        units = self.populate()
+        repo_id = 'test_repo'
+        base_url = 'file://'
+        publish_dir = os.path.join(self.tmpdir, 'nodes/repos')
+        virtual_host = (publish_dir, publish_dir)
+        with HttpPublisher(base_url, virtual_host, repo_id) as p:
+            p.publish(units)
+            p.commit()
+        # test
+        # every unit changed, so the delta is as large as the units file
+        with HttpPublisher(base_url, virtual_host, repo_id) as p:
+            p.publish([dict(u, last_updated=1) for u in units])
+            p.commit()
+        # verify
+        manifest = Manifest(os.path.join(publish_dir, p.manifest_path()))
+        manifest.read()
+        self.assertEqual(manifest.deltas, [])
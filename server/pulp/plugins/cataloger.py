@@ -41,3 +41,21 @@ class Cataloger(object):
         :type url: str
         """
         raise NotImplementedError()
+
+    def get_checksum(self, conduit, config, url):
+        """
+        Get a checksum of the metadata published at the URL.
+        When a checksum is returned and it matches the checksum returned
+        the last time the URL was refreshed successfully, the refresh is
+        skipped.  Catalogers that cannot provide a checksum return None
+        and the URL is always refreshed.
+        :param conduit: Access to pulp platform API.
+        :type conduit: pulp.server.plugins.conduits.cataloger.CatalogerConduit
+        :param config: The content source configuration.
+        :type config: dict
+        :param url: The URL for the content source.
+        :type url: str
+        :return: The checksum or None.
+        :rtype: str
+        """
+        return None
@@ -10,26 +10,47 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 
+from uuid import uuid4
+
 from pulp.server.managers import factory as managers
 
 
+# The number of buffered entries that triggers a flush.
+BATCH_SIZE = 1000
+
+
 class CatalogerConduit(object):
     """
     Provides access to pulp platform API.
+    Added and deleted entries are buffered and written to the content catalog
+    in bulk when (BATCH_SIZE) entries are buffered and when flush() is called.
+    Each conduit has a generation that is stored with the entries it adds so
+    that swap_generation() can replace all of the source's entries at once.
+    :ivar generation: The generation stored with added entries.
+    :type generation: str
+    :ivar url: The content source URL being refreshed, stored with added entries.
+    :type url: str
     """
 
-    def __init__(self, source_id, expires):
+    def __init__(self, source_id, expires, generation=None):
         """
         :param source_id: The content source ID.
         :type source_id: str
         :param expires: The content expiration in seconds.
         :type expires: int
+        :param generation: An optional generation shared with other conduits.
+            A new generation is used when not specified.
+        :type generation: str
         :return:
         """
         self.source_id = source_id
         self.expires = expires
+        self.generation = generation or str(uuid4())
+        self.url = None
         self.added_count = 0
         self.deleted_count = 0
+        self._added = []
+        self._deleted = []
 
     def add_entry(self, type_id, unit_key, url):
         """
@@ -41,9 +62,10 @@ class CatalogerConduit(object):
         :param url: The URL used to download content associated with the unit.
         :type url: str
         """
-        manager = managers.content_catalog_manager()
-        manager.add_entry(self.source_id, self.expires, type_id, unit_key, url)
+        self._added.append((type_id, unit_key, url))
         self.added_count += 1
+        if len(self._added) >= BATCH_SIZE:
+            self.flush()
 
     def delete_entry(self, type_id, unit_key):
         """
@@ -53,13 +75,95 @@ class CatalogerConduit(object):
         :param unit_key: The content unit key.
         :type unit_key: dict
         """
-        manager = managers.content_catalog_manager()
-        manager.delete_entry(self.source_id, type_id, unit_key)
+        # buffered deletes are written before buffered adds so
+        # an add buffered before the delete must be dropped
+        self._added = [e for e in self._added if e[0] != type_id or e[1] != unit_key]
+        self._deleted.append((type_id, unit_key))
         self.deleted_count += 1
+        if len(self._deleted) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered entries to the content catalog.
+        Deleted entries are removed using a single query and added entries
+        are inserted using a single bulk insert.
+        """
+        manager = managers.content_catalog_manager()
+        if self._deleted:
+            manager.delete_entries(self.source_id, self._deleted)
+            self._deleted = []
+        if self._added:
+            manager.add_entries(
+                self.source_id, self.expires, self._added, self.generation, self.url)
+            self._added = []
+
+    def swap_generation(self):
+        """
+        Replace the entries contributed by the content source with the
+        entries added using this conduit.  Buffered entries are flushed
+        and the entries of all other generations are purged.
+        """
+        self.flush()
+        manager = managers.content_catalog_manager()
+        manager.purge_generations(self.source_id, self.generation)
+
+    def has_entries(self, url=None, grace_period=0):
+        """
+        Get whether the content source has unexpired entries in the catalog.
+        :param url: An optional content source URL.  When specified, only
+            entries added by refreshing the URL are considered.
+        :type url: str
+        :param grace_period: Entries that expired less than this number of seconds
+            ago are considered unexpired.
+        :type grace_period: int
+        :return: True if has entries.
+        :rtype: bool
+        """
+        manager = managers.content_catalog_manager()
+        return manager.has_entries(self.source_id, url, grace_period)
 
-    def reset(self):
+    def extend_expiration(self, url):
+        """
+        Extend the expiration of the entries added by refreshing the URL
+        as if they had just been added.
+        :param url: The content source URL.
+        :type url: str
+        """
+        manager = managers.content_catalog_manager()
+        manager.extend_expiration(self.source_id, url, self.expires)
+
+    def get_checksum(self, url):
+        """
+        Get the checksum recorded by the last successful refresh using the URL.
+        :param url: The content source URL.
+        :type url: str
+        :return: The checksum or None when not recorded.
+        :rtype: str
+        """
+        manager = managers.content_catalog_manager()
+        return manager.get_checksum(self.source_id, url)
+
+    def set_checksum(self, url, checksum):
+        """
+        Record the checksum of a successful refresh using the URL.
+        :param url: The content source URL.
+        :type url: str
+        :param checksum: The checksum reported by the cataloger.
+        :type checksum: str
+        """
+        manager = managers.content_catalog_manager()
+        manager.set_checksum(self.source_id, url, checksum)
+
+    def reset(self, url=None):
         """
         Reset statistics.
+        Entries that have not been flushed are discarded.
+        :param url: The content source URL about to be refreshed.
+        :type url: str
         """
+        self.url = url
         self.added_count = 0
-        self.deleted_count = 0
\ No newline at end of file
+        self.deleted_count = 0
+        self._added = []
+        self._deleted = []
@@ -33,6 +33,9 @@ from pulp.server.db.model.criteria import UnitAssociationCriteria, Criteria
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of units whose keys are resolved in a single query by save_units
+SAVE_UNITS_BATCH_SIZE = 1000
+
 # -- exceptions ---------------------------------------------------------------
 
 class ImporterConduitException(Exception):
@@ -487,6 +490,84 @@ class AddUnitMixin(object):
             logger.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def save_units(self, units):
+        """
+        Bulk equivalent of save_unit. The units may be of mixed types.
+
+        For each type, the keys of all units are resolved against the
+        database with a single query per batch, new units are added with a
+        single bulk insert and the repository associations are created in
+        bulk. Existing units are updated with the attributes on the passed-in
+        units, same as with save_unit.
+
+        Each unit's id field will be populated with the UUID for the unit.
+
+        :param units: unit objects returned from the init_unit call
+        :type  units: list of Unit
+
+        :return: the provided units, their state updated from the call
+        :rtype:  list of Unit
+        """
+        try:
+            association_manager = manager_factory.repo_unit_association_manager()
+
+            units_by_type = {}
+            for unit in units:
+                units_by_type.setdefault(unit.type_id, []).append(unit)
+
+            for type_id, type_units in units_by_type.items():
+                for i in range(0, len(type_units), SAVE_UNITS_BATCH_SIZE):
+                    batch = type_units[i:i + SAVE_UNITS_BATCH_SIZE]
+                    self._save_units_batch(type_id, batch)
+                    association_manager.associate_all_by_ids(
+                        self.repo_id, type_id, [u.id for u in batch],
+                        self.association_owner_type, self.association_owner_id)
+
+            return units
+        except Exception, e:
+            logger.exception(_('Content unit association failed for [%d] units' % len(units)))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
+    def _save_units_batch(self, type_id, units):
+        """
+        Add or update a batch of units of the same type, populating the id
+        field on each of them.
+
+        :param type_id: type of all of the units in the batch
+        :type  type_id: str
+        :param units:   units to be saved
+        :type  units:   list of pulp.plugins.model.Unit
+        """
+        content_query_manager = manager_factory.content_query_manager()
+        content_manager = manager_factory.content_manager()
+
+        key_fields = types_db.type_units_unit_key(type_id)
+        existing_units = content_query_manager.get_multiple_units_by_keys_dicts(
+            type_id, [u.unit_key for u in units], model_fields=list(key_fields) + ['_id'])
+        existing_ids = dict((tuple(u[f] for f in key_fields), u['_id']) for u in existing_units)
+
+        new_units = []
+        for unit in units:
+            pulp_unit = common_utils.to_pulp_unit(unit)
+            unit_id = existing_ids.get(tuple(unit.unit_key[f] for f in key_fields))
+            if unit_id is None:
+                new_units.append((unit, pulp_unit))
+                continue
+            content_manager.update_content_unit(type_id, unit_id, pulp_unit)
+            self._updated_count += 1
+            unit.id = unit_id
+
+        new_ids = content_manager.add_content_units(type_id, [p for u, p in new_units])
+        for (unit, pulp_unit), unit_id in zip(new_units, new_ids):
+            if unit_id is None:
+                # Same race as in _add_unit; the unit was added by another
+                # workflow (or appeared twice in this batch) since the lookup
+                logger.debug(_('cannot add unit; already exists. updating instead.'))
+                unit.id = self._update_unit(unit, pulp_unit)
+            else:
+                self._added_count += 1
+                unit.id = unit_id
+
     def _update_unit(self, unit, pulp_unit):
         """
         Update a unit. If it is not found, add it.
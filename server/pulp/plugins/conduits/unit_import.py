@@ -110,6 +110,37 @@ class ImportUnitConduit(ImporterScratchPadMixin, RepoScratchPadMixin,
             _LOG.exception(_('Content unit association failed [%s]' % str(unit)))
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
+    def associate_units(self, units):
+        """
+        Associates the given units with the destination repository for the
+        import, using bulk database operations for each unit type.
+
+        This call is idempotent. Associations that already exist are left
+        unchanged.
+
+        :param units: unit objects returned from the init_unit call or
+                      retrieved from the source repository
+        :type  units: list of pulp.plugins.model.Unit
+
+        :return: the provided units
+        :rtype:  list of pulp.plugins.model.Unit
+        """
+
+        try:
+            unit_ids_by_type = {}
+            for unit in units:
+                unit_ids_by_type.setdefault(unit.type_id, []).append(unit.id)
+
+            for type_id, unit_ids in unit_ids_by_type.items():
+                self.__association_manager.associate_all_by_ids(self.dest_repo_id, type_id,
+                                                                unit_ids,
+                                                                self.association_owner_type,
+                                                                self.association_owner_id)
+            return units
+        except Exception, e:
+            _LOG.exception(_('Content unit association failed for [%d] units' % len(units)))
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
+
     def get_source_units(self, criteria=None):
         """
         Returns the collection of content units associated with the source
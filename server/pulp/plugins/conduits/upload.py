@@ -11,15 +11,48 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+from gettext import gettext as _
+import logging
+import sys
+
 from pulp.plugins.conduits.mixins import (
     AddUnitMixin, SingleRepoUnitsMixin, SearchUnitsMixin,
     ImporterConduitException)
+import pulp.server.managers.factory as manager_factory
+
+
+logger = logging.getLogger(__name__)
+
 
 class UploadConduit(AddUnitMixin, SingleRepoUnitsMixin, SearchUnitsMixin):
 
     def __init__(self, repo_id, importer_id, association_owner_type,
-                 association_owner_id):
+                 association_owner_id, upload_id=None):
         AddUnitMixin.__init__(self, repo_id, importer_id,
                               association_owner_type, association_owner_id)
         SingleRepoUnitsMixin.__init__(self, repo_id, ImporterConduitException)
         SearchUnitsMixin.__init__(self, ImporterConduitException)
+
+        self.upload_id = upload_id
+
+    def get_upload_checksum(self, checksum_type):
+        """
+        Returns the checksum of the uploaded file. The md5, sha1 and sha256
+        checksums are calculated while the file is uploaded, so asking for one
+        of them usually does not read the file again.
+
+        :param checksum_type: name of a hashlib algorithm, such as sha256
+        :type  checksum_type: str
+        :return: hex digest of the uploaded file
+        :rtype:  str
+        :raise ImporterConduitException: if there is no uploaded file or its
+               checksum cannot be calculated
+        """
+        if self.upload_id is None:
+            raise ImporterConduitException(_('No file was uploaded'))
+        try:
+            upload_manager = manager_factory.content_upload_manager()
+            return upload_manager.upload_checksum(self.upload_id, checksum_type)
+        except Exception, e:
+            logger.exception(_('Error getting checksum of upload [%(u)s]') % {'u': self.upload_id})
+            raise ImporterConduitException(e), None, sys.exc_info()[2]
@@ -73,6 +73,9 @@ def initialize(validate=True):
     for entry_point in plugin_entry_points:
         loading.load_plugins_from_entry_point(*entry_point)
 
+    # prime the type definition cache used by the unit hot paths
+    database.refresh_type_cache()
+
     # post-initialization validation
     if not validate:
         return
@@ -17,7 +17,9 @@ This module covers both the ContentType collection itself as well as any
 type-specific collections that exist to suit the type needs.
 """
 
+import copy
 import logging
+import threading
 
 from pymongo import ASCENDING
 
@@ -30,6 +32,19 @@ TYPE_COLLECTION_PREFIX = 'units_'
 
 LOG = logging.getLogger('db')
 
+# -- type cache ---------------------------------------------------------------
+
+# Type definitions only change when update_database runs, so they are cached
+# for the life of the process along with the handles to their unit collections.
+# The cache is tied to the database object it was loaded from and is dropped
+# when the connection is re-initialized.
+
+_TYPE_CACHE_LOCK = threading.RLock()
+_TYPE_CACHE_DATABASE = None
+_TYPE_DEFINITIONS = {}
+_TYPE_UNITS_COLLECTIONS = {}
+_TYPE_CACHE_STATS = {'hits': 0, 'misses': 0}
+
 # -- database exceptions ------------------------------------------------------
 
 class UpdateFailed(Exception):
@@ -127,6 +142,8 @@ def update_database(definitions, error_on_missing_definitions=False):
             error_defs.append(type_def)
             continue
 
+    refresh_type_cache()
+
     if len(error_defs) > 0:
         raise UpdateFailed(error_defs)
 
@@ -152,6 +169,8 @@ def clean():
     type_collection = ContentType.get_collection()
     type_collection.remove(safe=True)
 
+    invalidate_type_cache()
+
 
 def type_units_collection(type_id):
     """
@@ -163,9 +182,14 @@ def type_units_collection(type_id):
     @return: database collection holding units of the given type
     @rtype:  L{pymongo.collection.Collection}
     """
-    collection_name = unit_collection_name(type_id)
-    collection = pulp_db.get_collection(collection_name, create=False)
-    return collection
+    with _TYPE_CACHE_LOCK:
+        _check_type_cache_database()
+        collection = _TYPE_UNITS_COLLECTIONS.get(type_id)
+        if collection is None:
+            collection_name = unit_collection_name(type_id)
+            collection = pulp_db.get_collection(collection_name, create=False)
+            _TYPE_UNITS_COLLECTIONS[type_id] = collection
+        return collection
 
 
 def all_type_ids():
@@ -211,15 +235,39 @@ def all_type_definitions():
 
 def type_definition(type_id):
     """
-    Return a type definition
+    Return a type definition. The caller gets its own copy that may be
+    modified without affecting the cached definition.
     @param type_id: unique type id
     @type type_id: str
     @return: corresponding type definition, None if not found
     @rtype: SON or None
     """
-    collection = ContentType.get_collection()
-    type_ = collection.find_one({'id': type_id})
-    return type_
+    return copy.deepcopy(_cached_type_definition(type_id))
+
+
+def _cached_type_definition(type_id):
+    """
+    Return the cached type definition, loading it if needed. The returned
+    object is shared and must not be modified.
+    @param type_id: unique type id
+    @type type_id: str
+    @return: corresponding type definition, None if not found
+    @rtype: SON or None
+    """
+    with _TYPE_CACHE_LOCK:
+        _check_type_cache_database()
+        type_ = _TYPE_DEFINITIONS.get(type_id)
+        if type_ is not None:
+            _TYPE_CACHE_STATS['hits'] += 1
+            return type_
+
+        _TYPE_CACHE_STATS['misses'] += 1
+        collection = ContentType.get_collection()
+        type_ = collection.find_one({'id': type_id})
+        # unknown types are not cached so they are picked up once loaded
+        if type_ is not None:
+            _TYPE_DEFINITIONS[type_id] = type_
+        return type_
 
 
 def unit_collection_name(type_id):
@@ -246,14 +294,64 @@ def type_units_unit_key(type_id):
              content type collection
     @rtype: list of str or None
     """
-    collection = ContentType.get_collection()
-    type_def = collection.find_one({'id': type_id})
+    type_def = _cached_type_definition(type_id)
     if type_def is None:
         return None
-    return type_def['unit_key']
+    return list(type_def['unit_key'])
+
+
+def refresh_type_cache():
+    """
+    Drops the cached type definitions and unit collection handles and reloads
+    all type definitions from the database. This is called whenever the types
+    are updated and when the plugins are loaded.
+    """
+    global _TYPE_CACHE_DATABASE
+
+    with _TYPE_CACHE_LOCK:
+        invalidate_type_cache()
+        database = pulp_db.get_database()
+        if database is None:
+            return
+        for type_def in ContentType.get_collection().find():
+            _TYPE_DEFINITIONS[type_def['id']] = type_def
+        _TYPE_CACHE_DATABASE = database
+
+
+def invalidate_type_cache():
+    """
+    Drops the cached type definitions and unit collection handles; they will
+    be loaded from the database again as they are requested.
+    """
+    global _TYPE_CACHE_DATABASE
+
+    with _TYPE_CACHE_LOCK:
+        _TYPE_DEFINITIONS.clear()
+        _TYPE_UNITS_COLLECTIONS.clear()
+        _TYPE_CACHE_DATABASE = pulp_db.get_database()
+
+
+def type_cache_stats():
+    """
+    @return: number of type definition lookups that were served from the cache
+             (hits) and that had to go to the database (misses) for the life
+             of the process
+    @rtype:  dict
+    """
+    with _TYPE_CACHE_LOCK:
+        return dict(_TYPE_CACHE_STATS)
 
 # -- private -----------------------------------------------------------------
 
+def _check_type_cache_database():
+    """
+    Drops the type cache if the database connection has been re-initialized
+    since it was populated. Must be called with the cache lock held.
+    """
+    if _TYPE_CACHE_DATABASE is not pulp_db.get_database():
+        invalidate_type_cache()
+
+
 def _create_or_update_type(type_def):
 
     # Make sure a collection exists for the type
@@ -274,6 +372,9 @@ def _create_or_update_type(type_def):
     # XXX this still causes a potential race condition when 2 users are updating the same type
     content_type_collection.save(content_type, safe=True)
 
+    with _TYPE_CACHE_LOCK:
+        _TYPE_DEFINITIONS.pop(type_def.id, None)
+
 def _update_indexes(type_def, unique):
 
     collection_name = unit_collection_name(type_def.id)
@@ -10,13 +10,70 @@ from verification import CHECKSUM_FUNCTIONS
 
 _LOG = logging.getLogger(__name__)
 
+# Number of bytes read at a time when a checksum has to be calculated from the file on disk
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+class HashingFileWrapper(object):
+    """
+    File-like wrapper that updates one or more checksums with every chunk of data written
+    through it, so the checksums of a file are known as soon as it has been written without
+    reading it back.
+    """
+
+    def __init__(self, file_object, checksum_types):
+        """
+        :param file_object: file object opened for writing
+        :type  file_object: file
+        :param checksum_types: checksum types to calculate; each must be a key in
+                               CHECKSUM_FUNCTIONS
+        :type  checksum_types: list of str
+        """
+        self.file_object = file_object
+        self.hashers = dict((t, CHECKSUM_FUNCTIONS[t]()) for t in checksum_types)
+
+    def write(self, data):
+        """
+        Write the data to the wrapped file object and update the checksums with it.
+
+        :param data: data to write
+        :type  data: str
+        """
+        for hasher in self.hashers.values():
+            hasher.update(data)
+        self.file_object.write(data)
+
+    def writelines(self, lines):
+        """
+        Write each of the lines to the wrapped file object.
+
+        :param lines: iterable of strings to write
+        :type  lines: iterable
+        """
+        for line in lines:
+            self.write(line)
+
+    @property
+    def closed(self):
+        return self.file_object.closed
+
+    def hexdigests(self):
+        """
+        :return: dict of checksum type to hex digest of the data written so far
+        :rtype:  dict
+        """
+        return dict((t, h.hexdigest()) for t, h in self.hashers.items())
+
+    def __getattr__(self, name):
+        return getattr(self.file_object, name)
+
 
 class MetadataFileContext(object):
     """
     Context manager class for metadata file generation.
     """
 
-    def __init__(self, metadata_file_path, checksum_type=None):
+    def __init__(self, metadata_file_path, checksum_type=None, additional_checksum_types=None):
         """
         :param metadata_file_path: full path to metadata file to be generated
         :type  metadata_file_path: str
@@ -24,12 +81,18 @@ class MetadataFileContext(object):
                               to the file names of files. If checksum_type is None,
                               no checksum is added to the filename
         :type checksum_type: str or None
+        :param additional_checksum_types: other checksum types to calculate while the file is
+                                          written; the results are available in the checksums
+                                          attribute after finalize
+        :type additional_checksum_types: list of str or None
         """
 
         self.metadata_file_path = metadata_file_path
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
         self.checksum = None
+        self.checksums = {}
+        self.hashing_file_handle = None
         if self.checksum_type is not None:
             checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
             if not checksum_function:
@@ -37,6 +100,15 @@ class MetadataFileContext(object):
                     [PulpCodedException(error_codes.PLP1005, checksum_type=checksum_type)])
             self.checksum_constructor = checksum_function
 
+        self.checksum_types = []
+        for t in [checksum_type] + list(additional_checksum_types or []):
+            if t is None or t in self.checksum_types:
+                continue
+            if t not in CHECKSUM_FUNCTIONS:
+                raise PulpCodedValidationException(
+                    [PulpCodedException(error_codes.PLP1005, checksum_type=t)])
+            self.checksum_types.append(t)
+
     def __enter__(self):
 
         self.initialize()
@@ -87,12 +159,13 @@ class MetadataFileContext(object):
         except Exception, e:
             _LOG.exception(e)
 
+        if self.checksum_types:
+            self.checksums = self._calculate_checksums()
+
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            checksum = self.checksums[self.checksum_type]
 
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
@@ -103,6 +176,30 @@ class MetadataFileContext(object):
 
         # Set the metadata_file_handle to None so we don't double call finalize
         self.metadata_file_handle = None
+        self.hashing_file_handle = None
+
+    def _calculate_checksums(self):
+        """
+        Get the checksums of the finished metadata file. They are taken from the hashing
+        wrapper the file was written through; if a subclass opened the file handle itself,
+        the file is read back in chunks instead.
+
+        :return: dict of checksum type to hex digest
+        :rtype:  dict
+        """
+        if self.hashing_file_handle is not None:
+            return self.hashing_file_handle.hexdigests()
+
+        hashers = dict((t, CHECKSUM_FUNCTIONS[t]()) for t in self.checksum_types)
+        with open(self.metadata_file_path, 'rb') as file_handle:
+            while True:
+                chunk = file_handle.read(CHECKSUM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+
+        return dict((t, h.hexdigest()) for t, h in hashers.items())
 
     def _open_metadata_file_handle(self):
         """
@@ -136,11 +233,22 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        file_handle = open(self.metadata_file_path, 'wb')
+
+        if self.checksum_types:
+            # checksums are calculated from the bytes on disk, so the hashing wrapper sits
+            # below any compression
+            file_handle = HashingFileWrapper(file_handle, self.checksum_types)
+            self.hashing_file_handle = file_handle
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = gzip.GzipFile(self.metadata_file_path, 'wb',
+                                                      fileobj=file_handle)
+            # gzip.open would own the underlying file; make sure close() still closes it
+            self.metadata_file_handle.myfileobj = file_handle
 
         else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = file_handle
 
     def _write_file_header(self):
         """
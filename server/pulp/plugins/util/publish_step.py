@@ -1,10 +1,12 @@
 from gettext import gettext as _
 from itertools import chain, imap
+import filecmp
 import logging
 import os
 import shutil
 import sys
 import tarfile
+import threading
 import time
 import traceback
 import uuid
@@ -604,9 +606,16 @@ class AtomicDirectoryPublishStep(PublishStep):
             link each file in the source directory to a file with the same name in the target
             directory
     :type only_publish_directory_contents: bool
+    :param incremental: If true, build the master directory with hard links instead of copying
+            the source directory. When the source directory is on a different filesystem than
+            the master directory, only files that changed since the previous master are copied
+            and the rest are hard linked from it. Previous masters are removed by a background
+            thread once the new master has been published. The files in the source directory
+            must not be modified in place once this step has run.
+    :type incremental: bool
     """
     def __init__(self, source_dir, publish_locations, master_publish_dir, step_type=None,
-                 only_publish_directory_contents=False):
+                 only_publish_directory_contents=False, incremental=False):
         step_type = step_type if step_type else reporting_constants.PUBLISH_STEP_DIRECTORY
         super(AtomicDirectoryPublishStep, self).__init__(step_type)
         self.context = None
@@ -614,6 +623,8 @@ class AtomicDirectoryPublishStep(PublishStep):
         self.publish_locations = publish_locations
         self.master_publish_dir = master_publish_dir
         self.only_publish_directory_contents = only_publish_directory_contents
+        self.incremental = incremental
+        self.prune_thread = None
 
     def process_main(self):
         """
@@ -629,8 +640,12 @@ class AtomicDirectoryPublishStep(PublishStep):
         # Given that it is timestamped for this publish/repo we could skip the copytree
         # for items where http & https are published to a separate directory
 
-        _LOG.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
-        shutil.copytree(self.source_dir, timestamp_master_dir, symlinks=True)
+        if self.incremental:
+            _LOG.debug('Linking tree from %s to %s' % (self.source_dir, timestamp_master_dir))
+            self._link_tree(timestamp_master_dir)
+        else:
+            _LOG.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
+            shutil.copytree(self.source_dir, timestamp_master_dir, symlinks=True)
 
         for source_relative_location, publish_location in self.publish_locations:
             if source_relative_location.startswith('/'):
@@ -669,7 +684,133 @@ class AtomicDirectoryPublishStep(PublishStep):
                     os.rename(tmp_link_name, final_name)
 
         # Clear out any previously published masters
-        self._clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
+        if self.incremental:
+            self._prune_masters_in_background()
+        else:
+            self._clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
+
+    def _link_tree(self, master_dir):
+        """
+        Build the master directory from the source directory without copying files where
+        possible. Symbolic links are recreated, regular files are hard linked from the
+        source directory when both directories are on the same filesystem, otherwise files
+        that are identical to those in the previous master are hard linked from it and the
+        others are copied.
+
+        :param master_dir: the master directory to create
+        :type  master_dir: str
+        """
+        if not os.path.exists(self.master_publish_dir):
+            os.makedirs(self.master_publish_dir, 0750)
+
+        same_filesystem = self._same_filesystem(self.source_dir, self.master_publish_dir)
+        previous_master_dir = None
+        if not same_filesystem:
+            previous_master_dir = self._previous_master_dir()
+
+        for dir_path, dir_names, file_names in os.walk(self.source_dir):
+            relative_dir = os.path.relpath(dir_path, self.source_dir)
+            target_dir = os.path.normpath(os.path.join(master_dir, relative_dir))
+            os.mkdir(target_dir)
+            shutil.copymode(dir_path, target_dir)
+
+            # os.walk lists links to directories with the directories but does not follow them
+            link_names = [d for d in dir_names if os.path.islink(os.path.join(dir_path, d))]
+
+            for name in file_names + link_names:
+                source_path = os.path.join(dir_path, name)
+                target_path = os.path.join(target_dir, name)
+
+                if os.path.islink(source_path):
+                    os.symlink(os.readlink(source_path), target_path)
+                elif same_filesystem:
+                    os.link(source_path, target_path)
+                else:
+                    previous_path = None
+                    if previous_master_dir:
+                        previous_path = os.path.normpath(
+                            os.path.join(previous_master_dir, relative_dir, name))
+                    if previous_path and self._unchanged_file(source_path, previous_path):
+                        os.link(previous_path, target_path)
+                    else:
+                        shutil.copy2(source_path, target_path)
+
+    def _previous_master_dir(self):
+        """
+        Find the most recently created master directory other than the one for this publish.
+
+        :return: path to the previous master directory or None if there is not one
+        :rtype:  str or None
+        """
+        masters = []
+        for entry in os.listdir(self.master_publish_dir):
+            if entry == self.parent.timestamp:
+                continue
+            entry_path = os.path.join(self.master_publish_dir, entry)
+            if os.path.islink(entry_path) or not os.path.isdir(entry_path):
+                continue
+            try:
+                masters.append((float(entry), entry_path))
+            except ValueError:
+                continue
+
+        if not masters:
+            return None
+        return max(masters)[1]
+
+    def _prune_masters_in_background(self):
+        """
+        Remove the masters that existed before this publish in a background thread. The
+        entries to remove are determined before the thread is started so that a master
+        created by a later publish is never removed.
+        """
+        old_masters = [os.path.join(self.master_publish_dir, entry)
+                       for entry in os.listdir(self.master_publish_dir)
+                       if entry != self.parent.timestamp]
+        if not old_masters:
+            return
+
+        self.prune_thread = threading.Thread(target=self._remove_paths, args=(old_masters,))
+        self.prune_thread.setDaemon(True)
+        self.prune_thread.start()
+
+    @staticmethod
+    def _remove_paths(paths):
+        """
+        Remove the given files and directories, logging rather than raising any errors.
+
+        :param paths: list of paths to remove
+        :type  paths: list of str
+        """
+        for path in paths:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.lexists(path):
+                    os.unlink(path)
+            except OSError:
+                _LOG.exception(_('Error removing [%(p)s]') % {'p': path})
+
+    @staticmethod
+    def _same_filesystem(path_1, path_2):
+        """
+        :return: whether or not the two existing paths are on the same filesystem
+        :rtype:  bool
+        """
+        return os.stat(path_1).st_dev == os.stat(path_2).st_dev
+
+    @staticmethod
+    def _unchanged_file(source_path, previous_path):
+        """
+        :return: whether or not the previous path is a regular file with the same content
+                 as the source path
+        :rtype:  bool
+        """
+        if os.path.islink(previous_path) or not os.path.isfile(previous_path):
+            return False
+        if os.path.getsize(source_path) != os.path.getsize(previous_path):
+            return False
+        return filecmp.cmp(source_path, previous_path, shallow=False)
 
 
 class SaveTarFilePublishStep(PublishStep):
@@ -143,6 +143,7 @@ class TaskStatusManager(object):
         * error
         * spawned_tasks
         * progress_report
+        * db_operations
         Other fields found in delta will be ignored.
 
         :param task_id: identity of the task this status corresponds to
@@ -159,7 +160,7 @@ class TaskStatusManager(object):
             raise MissingResource(task_id)
 
         updatable_attributes = ['state', 'result', 'traceback', 'start_time', 'finish_time',
-                                'error', 'spawned_tasks', 'progress_report']
+                                'error', 'spawned_tasks', 'progress_report', 'db_operations']
         for key, value in delta.items():
             if key in updatable_attributes:
                 task_status[key] = value
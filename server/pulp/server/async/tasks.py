@@ -12,6 +12,7 @@ from pulp.common.error_codes import PLP0023
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE
 from pulp.server.async.task_status_manager import TaskStatusManager
 from pulp.server.exceptions import PulpException, MissingResource, PulpCodedException
+from pulp.server.db import profiler
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model.dispatch import TaskStatus
 from pulp.server.db.model.resources import DoesNotExist, ReservedResource
@@ -318,11 +319,13 @@ class Task(CeleryTask, ReservedTaskMixin):
         :param kwargs:  Original keyword arguments for the executed task.
         """
         logger.debug("Task successful : [%s]" % task_id)
+        db_operations = profiler.pop_task_report(task_id)
         if not self.request.called_directly:
             now = datetime.now(dateutils.utc_tz())
             finish_time = dateutils.format_iso8601_datetime(now)
             delta = {'finish_time': finish_time,
-                     'result': retval}
+                     'result': retval,
+                     'db_operations': db_operations}
             task_status = TaskStatusManager.find_by_task_id(task_id)
             # Only set the state to finished if it's not already in a complete state. This is
             # important for when the task has been canceled, so we don't move the task from canceled
@@ -346,6 +349,8 @@ class Task(CeleryTask, ReservedTaskMixin):
                 delta['result'] = None
 
             TaskStatusManager.update_task_status(task_id=task_id, delta=delta)
+        # drop the counters for the status updates made by this handler
+        profiler.pop_task_report(task_id)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """
@@ -360,17 +365,21 @@ class Task(CeleryTask, ReservedTaskMixin):
         :param einfo:   celery's ExceptionInfo instance, containing serialized traceback.
         """
         logger.debug("Task failed : [%s]" % task_id)
+        db_operations = profiler.pop_task_report(task_id)
         if not self.request.called_directly:
             now = datetime.now(dateutils.utc_tz())
             finish_time = dateutils.format_iso8601_datetime(now)
             delta = {'state': constants.CALL_ERROR_STATE,
                      'finish_time': finish_time,
-                     'traceback': einfo.traceback}
+                     'traceback': einfo.traceback,
+                     'db_operations': db_operations}
             if not isinstance(exc, PulpException):
                 exc = PulpException(str(exc))
             delta['error'] = exc.to_dict()
 
             TaskStatusManager.update_task_status(task_id=task_id, delta=delta)
+        # drop the counters for the status updates made by this handler
+        profiler.pop_task_report(task_id)
 
 
 def cancel(task_id):
@@ -23,12 +23,16 @@ _default_values = {
     'authentication': {
         'rsa_key': '/etc/pki/pulp/rsa.key',
         'rsa_pub': '/etc/pki/pulp/rsa_pub.key',
+        'credential_cache_ttl': '60',
+        'credential_cache_size': '1000',
     },
     'consumer_history': {
         'lifetime': '180',  # in days
     },
     'data_reaping': {
         'reaper_interval': '0.25',
+        'reaper_chunk_size': '1000',
+        'reaper_duty_cycle': '0.5',
         'archived_calls': '0.5',
         'consumer_history': '60',
         'repo_sync_history': '60',
@@ -41,6 +45,7 @@ _default_values = {
         'name': 'pulp_database',
         'seeds': 'localhost:27017',
         'operation_retries': '2',
+        'slow_query_threshold': '0',
     },
     'email': {
         'host': 'localhost',
@@ -48,6 +53,14 @@ _default_values = {
         'enabled': 'false',
         'from': 'pulp@localhost',
     },
+    'notifications': {
+        'listener_cache_ttl': '30',
+        'http_workers': '4',
+        'http_queue_size': '1000',
+        'http_queue_timeout': '0',
+        'http_idle_connections': '2',
+        'http_batch_size': '100',
+    },
     'oauth': {
         'enabled': 'true',
         'oauth_key': '',
@@ -10,10 +10,14 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 from logging import getLogger
+from Queue import Queue, Empty
+from threading import Thread, RLock, Condition, Event
+from time import time
 
 from nectar.listener import DownloadEventListener
 from nectar.request import DownloadRequest
 
+from pulp.server.db.model.content import ContentCatalog
 from pulp.server.managers import factory as managers
 from pulp.server.content.sources.model import ContentSource, PrimarySource, \
     DownloadReport, DownloadDetails, RefreshReport
@@ -22,6 +26,13 @@ from pulp.server.content.sources.model import ContentSource, PrimarySource, \
 log = getLogger(__name__)
 
 
+# Seconds between checks of the cancel event while waiting.
+POLL_INTERVAL = 0.5
+
+# The maximum number of content source URLs refreshed concurrently.
+REFRESH_THREADS = 4
+
+
 class ContentContainer(object):
     """
     The content container represents a virtual collection of content that is
@@ -30,29 +41,6 @@ class ContentContainer(object):
     :type sources: dict
     """
 
-    @staticmethod
-    def collated(request_list):
-        """
-        Get a dictionary of nectar download requests collated
-        (keyed) by content source.
-        :param request_list: A list of pulp.server.content.sources.model.Request.
-        :type request_list: list
-        :return: A dictionary of nectar download requests
-            collated by content source.
-        :rtype: dict
-        """
-        collated = {}
-        for request in request_list:
-            if request.downloaded:
-                continue
-            source = request.next_source()
-            if source is None:
-                continue
-            nectar_list = collated.setdefault(source[0], [])
-            nectar_request = DownloadRequest(source[1], request.destination, data=request)
-            nectar_list.append(nectar_request)
-        return collated
-
     def __init__(self, path=None):
         """
         :param path: The absolute path to a directory containing
@@ -68,6 +56,8 @@ class ContentContainer(object):
         content sources in the order specified by priority.  The specified
         downloader is designated as the primary source and is used in the event that
         the request cannot be completed using alternate sources.
+        All sources download concurrently and a failed request is immediately
+        queued on its next source.
         :param cancel_event: An event that indicates the download has been canceled.
         :type cancel_event: threading.Event
         :param downloader: A primary nectar downloader.  Used to download the
@@ -84,52 +74,54 @@ class ContentContainer(object):
         self.refresh(cancel_event)
         report = DownloadReport()
         primary = PrimarySource(downloader)
-        for request in request_list:
-            request.find_sources(primary, self.sources)
+        self.find_sources(primary, request_list)
         report.total_sources = len(self.sources)
-        while not cancel_event.isSet():
-            collated = self.collated(request_list)
-            if not collated:
-                #  Either we have exhausted our content sources or all
-                #  of the requests have been satisfied.
-                break
-            report.total_passes += 1
-            for source, nectar_list in collated.items():
-                downloader = source.get_downloader()
-                nectar_listener = NectarListener(cancel_event, downloader, listener)
-                downloader.event_listener = nectar_listener
-                downloader.download(nectar_list)
-                downloads = report.downloads.setdefault(source.id, DownloadDetails())
-                downloads.total_succeeded += nectar_listener.total_succeeded
-                downloads.total_failed += nectar_listener.total_failed
-                if cancel_event.isSet():
-                    break
+        if cancel_event.isSet():
+            return report
+        scheduler = DownloadScheduler(cancel_event, report, listener)
+        scheduler.download(request_list)
         return report
 
-    def refresh(self, cancel_event, force=False):
+    def find_sources(self, primary, request_list):
+        """
+        Find the content sources for each of the requests.
+        The catalog entries for all of the requests are fetched using
+        a few bulk queries rather than querying the catalog for each request.
+        :param primary: The primary content source.
+        :type primary: PrimarySource
+        :param request_list: A list of pulp.server.content.sources.model.Request.
+        :type request_list: list
+        """
+        if not request_list:
+            return
+        locators = [ContentCatalog.get_locator(r.type_id, r.unit_key) for r in request_list]
+        catalog = managers.content_catalog_manager()
+        found = catalog.find_all(locators)
+        for request, locator in zip(request_list, locators):
+            request.find_sources(primary, self.sources, found.get(locator, []))
+
+    def refresh(self, cancel_event, force=False, threads=REFRESH_THREADS):
         """
         Refresh the content catalog using available content sources.
+        The URLs of all the content sources are refreshed concurrently.
         :param cancel_event: An event that indicates the refresh has been canceled.
         :type cancel_event: threading.Event
         :param force: Force refresh of content sources with unexpired catalog entries.
         :type force: bool
+        :param threads: The maximum number of URLs refreshed concurrently.
+        :type threads: int
         :return: A list of refresh reports.
         :rtype: list of: pulp.server.content.sources.model.RefreshReport
         """
-        reports = []
+        sources = []
         catalog = managers.content_catalog_manager()
-        for source_id, source in self.sources.items():
+        for source_id, source in sorted(self.sources.items()):
             if cancel_event.isSet():
                 break
             if force or not catalog.has_entries(source_id):
-                try:
-                    report = source.refresh(cancel_event)
-                    reports.extend(report)
-                except Exception, e:
-                    log.error('refresh %s, failed: %s', source_id, e)
-                    report = RefreshReport(source_id, '')
-                    report.errors.append(str(e))
-                    reports.append(report)
+                sources.append(source)
+        scheduler = RefreshScheduler(cancel_event, threads)
+        reports = scheduler.refresh(sources, force)
         catalog.purge_expired()
         return reports
 
@@ -144,6 +136,422 @@ class ContentContainer(object):
         catalog.purge_orphans(valid_ids)
 
 
+class RefreshScheduler(object):
+    """
+    Refreshes the content catalog using the URLs of content sources
+    on a bounded pool of threads.  Each URL is refreshed using its own
+    conduit.  The conduits of a source share the catalog generation so that
+    the source's entries can be replaced once all of its URLs are refreshed.
+    :ivar cancel_event: An event that indicates the refresh has been canceled.
+    :type cancel_event: threading.Event
+    :ivar threads: The maximum number of URLs refreshed concurrently.
+    :type threads: int
+    """
+
+    def __init__(self, cancel_event, threads=REFRESH_THREADS):
+        """
+        :param cancel_event: An event that indicates the refresh has been canceled.
+        :type cancel_event: threading.Event
+        :param threads: The maximum number of URLs refreshed concurrently.
+        :type threads: int
+        """
+        self.cancel_event = cancel_event
+        self.threads = max(1, threads)
+        self.queue = Queue()
+
+    def refresh(self, sources, force=False):
+        """
+        Refresh the content catalog using the URLs of the specified sources.
+        URLs not yet started when canceled are not refreshed or reported.
+        :param sources: A list of content sources.
+        :type sources: list of: ContentSource
+        :param force: Refresh URLs even when their checksum has not changed.
+        :type force: bool
+        :return: The list of refresh reports ordered by source and URL.
+        :rtype: list of: pulp.server.content.sources.model.RefreshReport
+        """
+        refreshed = []
+        tasks = []
+        for source in sources:
+            try:
+                conduit = source.get_conduit()
+                urls = source.urls
+            except Exception, e:
+                log.error('refresh %s, failed: %s', source.id, e)
+                report = RefreshReport(source.id, '')
+                report.errors.append(str(e))
+                refreshed.append((source, None, [report]))
+                continue
+            reports = [None] * len(urls)
+            refreshed.append((source, conduit, reports))
+            for n, url in enumerate(urls):
+                tasks.append((source, conduit.generation, url, force, reports, n))
+        for task in tasks:
+            self.queue.put(task)
+        workers = []
+        for n in range(min(self.threads, len(tasks))):
+            worker = Thread(target=self._run, name='refresh:%d' % n)
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        return self._finished(refreshed)
+
+    def _run(self):
+        """
+        Worker thread: refresh queued URLs until the queue is
+        empty or the refresh is canceled.
+        """
+        while not self.cancel_event.isSet():
+            try:
+                source, generation, url, force, reports, index = self.queue.get_nowait()
+            except Empty:
+                break
+            conduit = source.get_conduit(generation)
+            reports[index] = source.refresh_url(conduit, url, force)
+
+    def _finished(self, refreshed):
+        """
+        Notify the sources that their URLs have been refreshed
+        and aggregate the reports.
+        :param refreshed: A list of tuple: (source, conduit, reports).
+        :type refreshed: list
+        :return: The list of refresh reports.
+        :rtype: list of: pulp.server.content.sources.model.RefreshReport
+        """
+        aggregated = []
+        for source, conduit, reports in refreshed:
+            reports = [r for r in reports if r is not None]
+            if conduit is not None:
+                try:
+                    source.refreshed(conduit, reports)
+                except Exception, e:
+                    log.error('refresh %s, failed: %s', source.id, e)
+                    report = RefreshReport(source.id, '')
+                    report.errors.append(str(e))
+                    reports.append(report)
+            aggregated.extend(reports)
+        return aggregated
+
+
+class DownloadScheduler(object):
+    """
+    Drives the downloaders of all content sources concurrently.
+    Each request is queued on one source at a time.  When a download fails, the
+    request is immediately queued on its next source rather than waiting for
+    the other sources to finish.
+    :ivar cancel_event: An event that indicates the download has been canceled.
+    :type cancel_event: threading.Event
+    :ivar report: The download report being updated.
+    :type report: DownloadReport
+    :ivar listener: An optional download request listener.
+    :type listener: Listener
+    :ivar batches: Dictionary of: SourceBatch keyed by source ID.
+    :type batches: dict
+    :ivar pending: The number of requests not yet succeeded or exhausted.
+    :type pending: int
+    :ivar finished: Set when no requests are pending.
+    :type finished: threading.Event
+    """
+
+    def __init__(self, cancel_event, report, listener=None):
+        """
+        :param cancel_event: An event that indicates the download has been canceled.
+        :type cancel_event: threading.Event
+        :param report: The download report to be updated.
+        :type report: DownloadReport
+        :param listener: An optional download request listener.
+        :type listener: Listener
+        """
+        self.cancel_event = cancel_event
+        self.report = report
+        self.listener = listener
+        self.batches = {}
+        self.pending = 0
+        self.finished = Event()
+        self._lock = RLock()
+
+    def download(self, request_list):
+        """
+        Download the requests and wait until all of them have succeeded
+        or exhausted their sources, or until canceled.
+        :param request_list: A list of pulp.server.content.sources.model.Request.
+        :type request_list: list
+        """
+        request_list = [r for r in request_list if not r.downloaded]
+        if not request_list:
+            return
+        # count everything before routing so that early completions
+        # cannot be mistaken for the end of the download
+        self.pending = len(request_list)
+        try:
+            for request in request_list:
+                self.route(request)
+            while not self.finished.isSet():
+                if self.cancel_event.isSet():
+                    break
+                self.finished.wait(POLL_INTERVAL)
+        finally:
+            self.shutdown()
+
+    def route(self, request):
+        """
+        Queue the request on its next source.
+        The request is finished when it has no more sources.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        if self.cancel_event.isSet():
+            return
+        while True:
+            source = request.next_source()
+            if source is None:
+                self.exhausted(request)
+                return
+            with self._lock:
+                self.report.total_passes = max(self.report.total_passes, request.index)
+                batch = self.batches.get(source[0].id)
+                if batch is None:
+                    batch = SourceBatch(self, source[0])
+                    self.batches[source[0].id] = batch
+                    self.report.downloads[source[0].id] = batch.details
+                    batch.start()
+            if batch.put(request, source[1]):
+                return
+
+    def succeeded(self, request):
+        """
+        Notification that the request has been downloaded.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        self._done()
+
+    def failed(self, request):
+        """
+        Notification that downloading the request from its current source failed.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        if request.has_source():
+            self.route(request)
+        else:
+            self._done()
+
+    def exhausted(self, request):
+        """
+        The request could not be queued on any of its remaining sources.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        if self.listener:
+            NectarListener._notify(self.listener.download_failed, request)
+        self._done()
+
+    def shutdown(self):
+        """
+        Stop all of the source batches and wait for them to finish.
+        """
+        with self._lock:
+            batches = self.batches.values()
+        for batch in batches:
+            batch.close()
+        for batch in batches:
+            batch.join()
+
+    def _done(self):
+        """
+        A request has either succeeded or exhausted its sources.
+        """
+        with self._lock:
+            self.pending -= 1
+            if self.pending <= 0:
+                self.finished.set()
+
+
+class SourceBatch(Thread):
+    """
+    Downloads the requests queued for a content source using the
+    source's nectar downloader.  The downloader is fed lazily so requests
+    may be added while it is running.  The number of requests handed to
+    the downloader and not yet finished is limited by the source's
+    max_concurrent setting.
+    :ivar scheduler: The scheduler that owns the batch.
+    :type scheduler: DownloadScheduler
+    :ivar source: The content source.
+    :type source: ContentSource
+    :ivar details: The download details for the source.
+    :type details: DownloadDetails
+    :ivar in_flight: The requests handed to the downloader and not yet finished.
+        Dictionary of: [request, start time] keyed by request object ID.
+    :type in_flight: dict
+    """
+
+    def __init__(self, scheduler, source):
+        """
+        :param scheduler: The scheduler that owns the batch.
+        :type scheduler: DownloadScheduler
+        :param source: The content source.
+        :type source: ContentSource
+        """
+        Thread.__init__(self, name='download:%s' % source.id)
+        self.setDaemon(True)
+        self.scheduler = scheduler
+        self.source = source
+        self.details = DownloadDetails()
+        self.queue = Queue()
+        self.closed = False
+        self.in_flight = {}
+        self._first_started = None
+        self._last_finished = None
+        self._condition = Condition(RLock())
+
+    def put(self, request, url):
+        """
+        Queue a request to be downloaded from this source.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        :param url: The URL of the file on this source.
+        :type url: str
+        :return: False if the batch is no longer accepting requests.
+        :rtype: bool
+        """
+        with self._condition:
+            if self.closed:
+                return False
+            self.queue.put(DownloadRequest(url, request.destination, data=request))
+            return True
+
+    def close(self):
+        """
+        Stop feeding the downloader once the queued requests are consumed.
+        """
+        self.queue.put(None)
+
+    def requests(self):
+        """
+        Generate the queued nectar requests as the downloader asks for them.
+        Ends when closed or canceled.
+        :return: A generator of nectar download requests.
+        :rtype: generator
+        """
+        limit = self.source.max_concurrent
+        cancel_event = self.scheduler.cancel_event
+        while not cancel_event.isSet():
+            with self._condition:
+                while limit and len(self.in_flight) >= limit:
+                    if cancel_event.isSet():
+                        return
+                    self._condition.wait(POLL_INTERVAL)
+            try:
+                nectar_request = self.queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+            if nectar_request is None:
+                return
+            with self._condition:
+                self.in_flight[id(nectar_request.data)] = [nectar_request.data, None]
+            yield nectar_request
+
+    def started(self, request):
+        """
+        Notification that downloading the request has started.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        """
+        with self._condition:
+            now = time()
+            if self._first_started is None:
+                self._first_started = now
+            entry = self.in_flight.get(id(request))
+            if entry is not None:
+                entry[1] = now
+
+    def succeeded(self, request, report):
+        """
+        Notification that the request has been downloaded from this source.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        :param report: A nectar download report.
+        :type report: nectar.report.DownloadReport
+        """
+        size = getattr(report, 'bytes_downloaded', 0)
+        if not isinstance(size, (int, long)):
+            size = 0
+        self._finished(request, True, size)
+        self.scheduler.succeeded(request)
+
+    def failed(self, request, report):
+        """
+        Notification that downloading the request from this source failed.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        :param report: A nectar download report.
+        :type report: nectar.report.DownloadReport
+        """
+        self._finished(request, False)
+        self.scheduler.failed(request)
+
+    def run(self):
+        """
+        Run the source's downloader until the batch is closed.
+        Requests left unfinished when the downloader stops are passed
+        on to their next source.
+        """
+        try:
+            downloader = self.source.get_downloader()
+            listener = NectarListener(self.scheduler.cancel_event, downloader,
+                                      self.scheduler.listener, self)
+            downloader.event_listener = listener
+            downloader.download(self.requests())
+        except Exception:
+            log.exception('download from source [%s] failed', self.source.id)
+        finally:
+            if self._first_started is not None and self._last_finished is not None:
+                self.details.total_seconds = self._last_finished - self._first_started
+            self._abandon()
+
+    def _finished(self, request, succeeded, size=0):
+        """
+        Update the counters for a finished download.
+        :param request: A download request.
+        :type request: pulp.server.content.sources.model.Request
+        :param succeeded: Whether the download succeeded.
+        :type succeeded: bool
+        :param size: The number of bytes downloaded.
+        :type size: int
+        """
+        with self._condition:
+            now = time()
+            self._last_finished = now
+            entry = self.in_flight.pop(id(request), None)
+            latency = 0.0
+            if entry is not None and entry[1] is not None:
+                latency = now - entry[1]
+            self.details.add_download(succeeded, latency, size)
+            self._condition.notify()
+
+    def _abandon(self):
+        """
+        Stop accepting requests and pass any requests that were queued or
+        handed to the downloader but never finished on to their next source.
+        """
+        with self._condition:
+            self.closed = True
+            abandoned = [entry[0] for entry in self.in_flight.values()]
+            self.in_flight = {}
+            while True:
+                try:
+                    nectar_request = self.queue.get_nowait()
+                except Empty:
+                    break
+                if nectar_request is not None:
+                    abandoned.append(nectar_request.data)
+        for request in abandoned:
+            self.scheduler.route(request)
+
+
 class Listener(object):
     """
     Download event listener.
@@ -188,7 +596,7 @@ class NectarListener(DownloadEventListener):
         except Exception:
             log.exception(str(method))
 
-    def __init__(self, cancel_event, downloader, listener=None):
+    def __init__(self, cancel_event, downloader, listener=None, batch=None):
         """
         :param cancel_event: An event that indicates the download has been canceled.
         :type cancel_event: threading.Event
@@ -196,10 +604,13 @@ class NectarListener(DownloadEventListener):
         :type downloader: nectar.downloaders.base.Downloader
         :param listener: An optional download request listener.
         :type listener: Listener
+        :param batch: An optional source batch notified of each download.
+        :type batch: SourceBatch
         """
         self.cancel_event = cancel_event
         self.downloader = downloader
         self.listener = listener
+        self.batch = batch
         self.total_succeeded = 0
         self.total_failed = 0
 
@@ -210,10 +621,12 @@ class NectarListener(DownloadEventListener):
         :param report: A nectar download report.
         :type report: nectar.report.DownloadReport
         """
+        request = report.data
+        if self.batch is not None:
+            self.batch.started(request)
         if self.cancel_event.isSet():
             self.downloader.cancel()
             return
-        request = report.data
         listener = self.listener
         if not listener:
             return
@@ -228,15 +641,19 @@ class NectarListener(DownloadEventListener):
         :type report: nectar.report.DownloadReport
         """
         self.total_succeeded += 1
-        if self.cancel_event.isSet():
-            self.downloader.cancel()
-            return
         request = report.data
-        request.downloaded = True
-        listener = self.listener
-        if not listener:
-            return
-        self._notify(listener.download_succeeded, request)
+        try:
+            if self.cancel_event.isSet():
+                self.downloader.cancel()
+                return
+            request.downloaded = True
+            listener = self.listener
+            if not listener:
+                return
+            self._notify(listener.download_succeeded, request)
+        finally:
+            if self.batch is not None:
+                self.batch.succeeded(request, report)
 
     def download_failed(self, report):
         """
@@ -248,14 +665,19 @@ class NectarListener(DownloadEventListener):
         :type report: nectar.report.DownloadReport
         """
         self.total_failed += 1
-        if self.cancel_event.isSet():
-            self.downloader.cancel()
-            return
         request = report.data
-        request.errors.append(report.error_msg)
-        listener = self.listener
-        if not listener:
-            return
-        if request.has_source():
-            return
-        self._notify(listener.download_failed, request)
+        try:
+            if self.cancel_event.isSet():
+                self.downloader.cancel()
+                return
+            request.errors.append(report.error_msg)
+            listener = self.listener
+            if not listener:
+                return
+            if request.has_source():
+                return
+            self._notify(listener.download_failed, request)
+        finally:
+            # the batch queues the request on its next source
+            if self.batch is not None:
+                self.batch.failed(request, report)
@@ -18,6 +18,7 @@ from logging import getLogger
 from ConfigParser import ConfigParser
 
 from pulp.server.managers import factory as managers
+from pulp.server.managers.content.catalog import GRACE_PERIOD
 from pulp.plugins.loader import api as plugins
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 
@@ -33,6 +34,7 @@ PATHS_REGEX = re.compile(r'\s+')
 
 REFRESHING = 'Refreshing [%s] url:%s'
 REFRESH_SUCCEEDED = 'Refresh [%s] succeeded.  Added: %d, Deleted: %d'
+REFRESH_SKIPPED = 'Refresh [%s] url: %s, skipped: checksum not changed'
 REFRESH_FAILED = 'Refresh [%s] url: %s, failed: %s'
 
 PRIMARY_ID = '___/primary/___'
@@ -81,7 +83,7 @@ class Request(object):
         self.errors = []
         self.data = None
 
-    def find_sources(self, primary, alternates):
+    def find_sources(self, primary, alternates, entries=None):
         """
         Find and set the list of content sources in the order they are to
         be used to satisfy the request.  The alternate sources are
@@ -90,10 +92,15 @@ class Request(object):
         :type primary: ContentSource
         :param alternates: A list of alternative sources.
         :type list of: ContentSource
+        :param entries: Optional catalog entries already found for the request.
+            When not specified, the content catalog is queried.
+        :type entries: list
         """
         resolved = [(primary, self.url)]
-        catalog = managers.content_catalog_manager()
-        for entry in catalog.find(self.type_id, self.unit_key):
+        if entries is None:
+            catalog = managers.content_catalog_manager()
+            entries = catalog.find(self.type_id, self.unit_key)
+        for entry in entries:
             source_id = entry[constants.SOURCE_ID]
             source = alternates.get(source_id)
             if source is None:
@@ -223,6 +230,17 @@ class ContentSource(object):
         """
         return to_seconds(self.descriptor.get(constants.EXPIRES, '24h'))
 
+    @property
+    def max_concurrent(self):
+        """
+        Get the maximum number of concurrent downloads from this source.
+        :return: The limit defined in the descriptor or None when not limited.
+        :rtype: int
+        """
+        limit = self.descriptor.get(constants.MAX_CONCURRENT)
+        if limit:
+            return int(limit)
+
     @property
     def base_url(self):
         """
@@ -257,13 +275,15 @@ class ContentSource(object):
             url_list.append(url)
         return url_list
 
-    def get_conduit(self):
+    def get_conduit(self, generation=None):
         """
         Get a plugin conduit.
+        :param generation: An optional catalog generation shared with other conduits.
+        :type generation: str
         :return: A plugin conduit.
         :rtype CatalogerConduit
         """
-        return CatalogerConduit(self.id, self.expires)
+        return CatalogerConduit(self.id, self.expires, generation)
 
     def get_cataloger(self):
         """
@@ -287,36 +307,87 @@ class ContentSource(object):
         plugin = self.get_cataloger()
         return plugin.get_downloader(conduit, self.descriptor, self.base_url)
 
-    def refresh(self, cancel_event):
+    def refresh(self, cancel_event, force=False):
         """
         Refresh the content catalog using the cataloger plugin as
         defined by the "type" descriptor property.
+        When all of the URLs are refreshed successfully, the entries added
+        by the refresh replace all of the source's existing entries.
         :param cancel_event: An event that indicates the refresh has been canceled.
         :type cancel_event: threading.Event
+        :param force: Refresh URLs even when their checksum has not changed.
+        :type force: bool
         :return: The list of refresh reports.
         :rtype: list of: RefreshReport
         """
         reports = []
         conduit = self.get_conduit()
-        plugin = self.get_cataloger()
         for url in self.urls:
             if cancel_event.isSet():
                 break
-            conduit.reset()
-            report = RefreshReport(self.id, url)
-            log.info(REFRESHING, self.id, url)
-            try:
+            report = self.refresh_url(conduit, url, force)
+            reports.append(report)
+        self.refreshed(conduit, reports)
+        return reports
+
+    def refresh_url(self, conduit, url, force=False):
+        """
+        Refresh the content catalog using the specified URL.
+        Unless forced, the refresh is skipped when the cataloger plugin reports
+        a checksum for the URL that matches the checksum stored by the last
+        successful refresh and the catalog still has entries added using the
+        URL that have not been purged: either unexpired or expired within the
+        grace period.  The expiration of those entries is extended instead.
+        :param conduit: The conduit used to update the catalog.
+        :type conduit: CatalogerConduit
+        :param url: One of the source's URLs.
+        :type url: str
+        :param force: Refresh the URL even when its checksum has not changed.
+        :type force: bool
+        :return: The refresh report.
+        :rtype: RefreshReport
+        """
+        conduit.reset(url)
+        report = RefreshReport(self.id, url)
+        log.info(REFRESHING, self.id, url)
+        try:
+            plugin = self.get_cataloger()
+            checksum = plugin.get_checksum(conduit, self.descriptor, url)
+            if not force and checksum and checksum == conduit.get_checksum(url) \
+                    and conduit.has_entries(url, GRACE_PERIOD):
+                conduit.extend_expiration(url)
+                log.info(REFRESH_SKIPPED, self.id, url)
+                report.skipped = True
+            else:
                 plugin.refresh(conduit, self.descriptor, url)
+                conduit.flush()
+                if checksum:
+                    conduit.set_checksum(url, checksum)
                 log.info(REFRESH_SUCCEEDED, self.id, conduit.added_count, conduit.deleted_count)
-                report.succeeded = True
-                report.added_count = conduit.added_count
-                report.deleted_count = conduit.deleted_count
-            except Exception, e:
-                log.error(REFRESH_FAILED, self.id, url, e)
-                report.errors.append(str(e))
-            finally:
-                reports.append(report)
-        return reports
+            report.succeeded = True
+            report.added_count = conduit.added_count
+            report.deleted_count = conduit.deleted_count
+        except Exception, e:
+            log.error(REFRESH_FAILED, self.id, url, e)
+            report.errors.append(str(e))
+        return report
+
+    def refreshed(self, conduit, reports):
+        """
+        Notification that refreshing the source's URLs has finished.
+        When every URL was refreshed (not skipped) successfully, the entries
+        added by the refresh replace all of the source's existing entries.
+        :param conduit: A conduit of the refresh generation.
+        :type conduit: CatalogerConduit
+        :param reports: The refresh reports for the source's URLs.
+        :type reports: list of: RefreshReport
+        """
+        if len(reports) != len(self.urls):
+            return
+        for report in reports:
+            if report.skipped or not report.succeeded:
+                return
+        conduit.swap_generation()
 
     def __eq__(self, other):
         return self.id == other.id
@@ -354,6 +425,18 @@ class PrimarySource(ContentSource):
         """
         return sys.maxint
 
+    @property
+    def max_concurrent(self):
+        """
+        Get the concurrency limit configured on the wrapped downloader.
+        :return: The limit or None when not limited.
+        :rtype: int
+        """
+        config = getattr(self._downloader, 'config', None)
+        limit = getattr(config, 'max_concurrent', None)
+        if isinstance(limit, int) and limit > 0:
+            return limit
+
     def get_downloader(self):
         """
         Get the wrapped downloader.
@@ -376,11 +459,64 @@ class DownloadDetails(object):
     :type total_succeeded: int
     :ivar total_failed: The total number of downloads that failed.
     :type total_failed: int
+    :ivar total_bytes: The total number of bytes downloaded.
+    :type total_bytes: int
+    :ivar total_seconds: The number of seconds the source was downloading.
+    :type total_seconds: float
+    :ivar total_latency: The sum of the seconds taken by each download.
+    :type total_latency: float
+    :ivar max_latency: The number of seconds taken by the slowest download.
+    :type max_latency: float
     """
 
     def __init__(self):
         self.total_succeeded = 0
         self.total_failed = 0
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def throughput(self):
+        """
+        Get the average download rate.
+        :return: Bytes per second.
+        :rtype: float
+        """
+        if self.total_seconds:
+            return self.total_bytes / self.total_seconds
+        return 0.0
+
+    @property
+    def average_latency(self):
+        """
+        Get the average number of seconds taken by a download.
+        :return: The average latency.
+        :rtype: float
+        """
+        total = self.total_succeeded + self.total_failed
+        if total:
+            return self.total_latency / total
+        return 0.0
+
+    def add_download(self, succeeded, latency, size=0):
+        """
+        Add a finished download to the counters.
+        :param succeeded: Whether the download succeeded.
+        :type succeeded: bool
+        :param latency: The number of seconds the download took.
+        :type latency: float
+        :param size: The number of bytes downloaded.
+        :type size: int
+        """
+        if succeeded:
+            self.total_succeeded += 1
+        else:
+            self.total_failed += 1
+        self.total_bytes += size
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
 
     def dict(self):
         """
@@ -388,13 +524,16 @@ class DownloadDetails(object):
         :return: A dictionary representation.
         :rtype: dict
         """
-        return self.__dict__
+        _dict = dict(self.__dict__)
+        _dict['throughput'] = self.throughput
+        _dict['average_latency'] = self.average_latency
+        return _dict
 
 
 class DownloadReport(object):
     """
     Download report.
-    :ivar total_passes: The total number of passes through the download logic.
+    :ivar total_passes: The largest number of sources tried for a single request.
     :type total_passes: int
     :ivar total_sources: The total number of loaded sources.
     :type total_sources: int
@@ -426,6 +565,9 @@ class RefreshReport(object):
     :type source_id: str
     :ivar succeeded: Indicates whether the refresh was successful.
     :type succeeded: bool
+    :ivar skipped: Indicates the refresh was skipped because the
+        URL's checksum was not changed.
+    :type skipped: bool
     :ivar added_count: The number of entries added to the catalog.
     :type added_count: int
     :ivar deleted_count: The number of entries deleted from the catalog.
@@ -444,6 +586,7 @@ class RefreshReport(object):
         self.source_id = source_id
         self.url = url
         self.succeeded = False
+        self.skipped = False
         self.added_count = 0
         self.deleted_count = 0
         self.errors = []
\ No newline at end of file
@@ -12,16 +12,19 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import logging
+import threading
 import time
 from gettext import gettext as _
 
 import pymongo
 from pymongo.collection import Collection
+from pymongo.cursor import Cursor
 from pymongo.errors import AutoReconnect
 from pymongo.son_manipulator import NamespaceInjector
 
 from pulp.server import config
 from pulp.server.compat import wraps
+from pulp.server.db import profiler
 from pulp.server.exceptions import PulpException
 
 # globals ----------------------------------------------------------------------
@@ -29,6 +32,10 @@ from pulp.server.exceptions import PulpException
 _CONNECTION = None
 _DATABASE = None
 
+# collection handles keyed by name, built once per initialized database
+_COLLECTIONS = {}
+_COLLECTIONS_LOCK = threading.Lock()
+
 _LOG = logging.getLogger(__name__)
 _DEFAULT_MAX_POOL_SIZE = 10
 
@@ -40,6 +47,10 @@ def initialize(name=None, seeds=None, max_pool_size=None, replica_set=None):
     """
     global _CONNECTION, _DATABASE
 
+    # handles are bound to the previous database
+    clear_collections()
+    profiler.configure()
+
     try:
         connection_kwargs = {}
 
@@ -111,47 +122,109 @@ class PulpCollectionFailure(PulpException):
     """
 
 
-def _retry_decorator(full_name=None, retries=0):
+def _retry_decorator(method):
     """
-    Collection instance method decorator providing retry support for pymongo
-    AutoReconnect exceptions
-    :param full_name: the full name of the database collection
-    :type  full_name: str
-    :param retries: the number of times to retry the operation before allowing 
-                    the exception to blow the stack
-    :type  retries: int
+    PulpCollection method decorator providing retry support for pymongo
+    AutoReconnect exceptions. The number of retries and the collection name
+    are read from the collection instance the method is called on.
+
+    Each call is also recorded by the profiler. Cursors returned by find() are
+    converted to PulpCursor instances, which record the queries they issue
+    when they are iterated.
+    :param method: unbound collection method to decorate
+    :type  method: instancemethod
     """
+    operation = method.__name__
+
+    @wraps(method)
+    def retry(self, *args, **kwargs):
+
+        if operation == 'find':
+            cursor = _call_with_retries(self, method, args, kwargs)
+            if isinstance(cursor, Cursor):
+                cursor.__class__ = PulpCursor
+                cursor.pulp_spec = _operation_spec(args, kwargs)
+                cursor.pulp_queried = False
+            return cursor
+
+        started = profiler.start()
+        result = None
+        failed = True
+        try:
+            result = _call_with_retries(self, method, args, kwargs)
+            failed = False
+            return result
+        finally:
+            profiler.finish(started, self.name, operation,
+                            documents=_document_count(operation, result, args),
+                            spec=_operation_spec(args, kwargs), failed=failed)
+
+    return retry
+
 
-    def _decorator(method):
+def _call_with_retries(collection, method, args, kwargs):
+    """
+    Call a collection method, retrying up to collection.retries times when the
+    database connection is lost.
+    :raise PulpCollectionFailure: if the connection is still down after the
+                                  last try
+    """
+    retries = collection.retries
+    tries = 0
 
-        @wraps(method)
-        def retry(*args, **kwargs):
+    while tries <= retries:
 
-            tries = 0
+        try:
+            return method(collection, *args, **kwargs)
 
-            while tries <= retries:
+        except AutoReconnect:
+            tries += 1
 
-                try:
-                    return method(*args, **kwargs)
+            _LOG.warn(_('%(method)s operation failed on %(name)s: tries remaining: %(tries)d') %
+                      {'method': method.__name__, 'name': collection.full_name,
+                       'tries': retries - tries + 1})
 
-                except AutoReconnect:
-                    tries += 1
+            if tries <= retries:
+                time.sleep(0.3)
 
-                    _LOG.warn(_('%(method)s operation failed on %(name)s: tries remaining: %(tries)d') %
-                              {'method': method.__name__, 'name': full_name,
-                               'tries': retries - tries + 1})
+    raise PulpCollectionFailure(
+        _('%(method)s operation failed on %(name)s: database connection '
+          'still down after %(tries)d tries') %
+        {'method': method.__name__, 'name': collection.full_name, 'tries': (retries + 1)})
 
-                    if tries <= retries:
-                        time.sleep(0.3)
 
-            raise PulpCollectionFailure(
-                _('%(method)s operation failed on %(name)s: database connection '
-                  'still down after %(tries)d tries') %
-                {'method': method.__name__, 'name': full_name, 'tries': (retries + 1)})
+def _operation_spec(args, kwargs):
+    """
+    :return: the query spec passed to a collection method, if any
+    :rtype:  dict or None
+    """
+    if args:
+        return args[0]
+    for key in ('spec', 'spec_or_id', 'query'):
+        if key in kwargs:
+            return kwargs[key]
+    return None
 
-        return retry
 
-    return _decorator
+def _document_count(operation, result, args):
+    """
+    :return: the number of documents written or returned by an operation,
+             as far as it can be told from its arguments and result
+    :rtype:  int
+    """
+    if operation == 'insert':
+        if args and isinstance(args[0], (list, tuple)):
+            return len(args[0])
+        return 1
+    if operation in ('find_one', 'find_and_modify', 'save'):
+        return int(result is not None)
+    if operation in ('update', 'remove') and isinstance(result, dict):
+        return result.get('n') or 0
+    if operation == 'distinct' and isinstance(result, list):
+        return len(result)
+    if operation == 'aggregate' and isinstance(result, dict):
+        return len(result.get('result') or [])
+    return 0
 
 
 def _end_request_decorator(method):
@@ -182,16 +255,13 @@ class PulpCollection(Collection):
                           'insert', 'save', 'update', 'remove', 'drop', 'find', 'find_one', 'count',
                           'create_index', 'ensure_index', 'drop_index', 'drop_indexes', 'reindex',
                           'index_information', 'options', 'group', 'rename', 'distinct', 'map_reduce',
-                          'inline_map_reduce', 'find_and_modify')
+                          'inline_map_reduce', 'find_and_modify', 'aggregate')
 
     def __init__(self, database, name, create=False, retries=0, **kwargs):
         super(PulpCollection, self).__init__(database, name, create=create, **kwargs)
 
         self.retries = retries
 
-        for m in self._decorated_methods:
-            setattr(self, m, _retry_decorator(self.full_name, self.retries)(getattr(self, m)))
-
     def __getstate__(self):
         return {'name': self.name}
 
@@ -220,20 +290,75 @@ class PulpCollection(Collection):
 
         return cursor
 
+
+class PulpCursor(Cursor):
+    """
+    pymongo.cursor.Cursor wrapper that records each query and each subsequent
+    batch fetch with the profiler, as the "find" and "getmore" operations.
+    Instances are created by converting the cursors returned by
+    PulpCollection.find().
+    """
+
+    def _refresh(self):
+        if not self.alive:
+            return super(PulpCursor, self)._refresh()
+
+        operation = self.pulp_queried and 'getmore' or 'find'
+        self.pulp_queried = True
+        started = profiler.start()
+        count = 0
+        failed = True
+        try:
+            count = super(PulpCursor, self)._refresh()
+            failed = False
+            return count
+        finally:
+            profiler.finish(started, self.collection.name, operation, documents=count,
+                            spec=self.pulp_spec, failed=failed)
+
+
+# the retry support is applied once to the class instead of to every instance
+for _method_name in PulpCollection._decorated_methods:
+    setattr(PulpCollection, _method_name, _retry_decorator(getattr(Collection, _method_name)))
+del _method_name
+
 # -- public --------------------------------------------------------------------
 
 def get_collection(name, create=False):
     """
-    Factory function to instantiate PulpConnection objects using configurable
-    parameters.
+    Return the PulpCollection handle for the named collection. Handles are
+    built once and shared for the life of the database connection; passing
+    create=True always builds (and caches) a new handle so that the collection
+    is explicitly created in the database.
+    :param name: name of the database collection
+    :type  name: str
+    :param create: create the collection in the database
+    :type  create: bool
+    :return: collection handle
+    :rtype:  PulpCollection
     """
-    global _DATABASE
-
     if _DATABASE is None:
         raise PulpCollectionFailure(_('Cannot get collection from uninitialized database'))
 
-    retries = config.config.getint('database', 'operation_retries')
-    return PulpCollection(_DATABASE, name, retries=retries, create=create)
+    collection = _COLLECTIONS.get(name)
+    if collection is not None and collection.database is _DATABASE and not create:
+        return collection
+
+    with _COLLECTIONS_LOCK:
+        collection = _COLLECTIONS.get(name)
+        if collection is None or collection.database is not _DATABASE or create:
+            retries = config.config.getint('database', 'operation_retries')
+            collection = PulpCollection(_DATABASE, name, retries=retries, create=create)
+            _COLLECTIONS[name] = collection
+        return collection
+
+
+def clear_collections():
+    """
+    Drop all cached collection handles so that they are rebuilt on next use.
+    """
+    with _COLLECTIONS_LOCK:
+        _COLLECTIONS.clear()
 
 
 def get_database():
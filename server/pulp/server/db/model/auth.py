@@ -96,3 +96,4 @@ class Permission(Model):
 
         self.resource = resource
         self.users = users or {}
+
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+from pulp.server.db.model.base import Model
+
+
+class CacheVersion(Model):
+    """
+    Named counters used to invalidate data that server processes keep in
+    memory. A counter is incremented every time the data it covers changes in
+    the database, and a process discards its copy of the data when the counter
+    no longer matches the value the copy was built under. The _id of each
+    document is the name of the counter.
+
+    @ivar version: number of changes made so far
+    @type version: int
+    """
+
+    collection_name = 'cache_versions'
+    unique_indices = ()
+
+    # counter names
+    CREDENTIALS = 'credentials'
+    EVENT_LISTENERS = 'event_listeners'
+    PERMISSIONS = 'permissions'
+
+    @staticmethod
+    def get_version(name):
+        """
+        Get the current value of the named counter.
+        :param name: The counter name.
+        :type name: str
+        :return: The counter value; 0 if it has never been incremented.
+        :rtype: int
+        """
+        counter = CacheVersion.get_collection().find_one({'_id': name})
+        if counter is None:
+            return 0
+        return counter['version']
+
+    @staticmethod
+    def bump_version(name):
+        """
+        Increment the named counter, creating it when needed.
+        :param name: The counter name.
+        :type name: str
+        :return: The new counter value.
+        :rtype: int
+        """
+        counter = CacheVersion.get_collection().find_and_modify(
+            {'_id': name}, {'$inc': {'version': 1}}, upsert=True, new=True)
+        return counter['version']
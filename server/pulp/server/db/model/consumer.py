@@ -182,7 +182,8 @@ class RepoProfileApplicability(Model):
         ('profile_hash', 'repo_id'),
     )
 
-    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None, **kwargs):
+    def __init__(self, profile_hash, repo_id, profile, applicability, _id=None,
+                 repo_content_revision=None, **kwargs):
         """
         Construct a RepoProfileApplicability object.
 
@@ -197,6 +198,9 @@ class RepoProfileApplicability(Model):
         :type  applicability: dict
         :param _id:           The MongoDB ID for this object, if it exists in the database
         :type  _id:           bson.objectid.ObjectId
+        :param repo_content_revision: The content revision of the repo the applicability data
+                                      was calculated against
+        :type  repo_content_revision: int
         :param kwargs:        unused, but collected to allow instantiation from Mongo query results
         :type  kwargs:        dict
         """
@@ -206,6 +210,7 @@ class RepoProfileApplicability(Model):
         self.repo_id = repo_id
         self.profile = profile
         self.applicability = applicability
+        self.repo_content_revision = repo_content_revision
         self._id = _id
 
         # The superclass puts an unnecessary (and confusingly named) id attribute on this model.
@@ -226,7 +231,8 @@ class RepoProfileApplicability(Model):
         # If this object's _id attribute is not None, then it represents an existing DB object.
         # Else, we need to create an object with this object's attributes
         new_document = {'profile_hash': self.profile_hash, 'repo_id': self.repo_id,
-                        'profile': self.profile, 'applicability': self.applicability}
+                        'profile': self.profile, 'applicability': self.applicability,
+                        'repo_content_revision': self.repo_content_revision}
         if self._id is not None:
             self.get_collection().update({'_id': self._id}, new_document, safe=True)
         else:
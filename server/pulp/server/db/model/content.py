@@ -92,6 +92,10 @@ class ContentCatalog(Model):
     :type locator: str
     :ivar url: The URL used to download the file associated with the unit.
     :type url: str
+    :ivar generation: The (optional) refresh generation that added the entry.
+    :type generation: str
+    :ivar source_url: The (optional) content source URL refreshed to add the entry.
+    :type source_url: str
     """
 
     collection_name = 'content_catalog'
@@ -128,7 +132,8 @@ class ContentCatalog(Model):
         dt = now + timedelta(seconds=duration)
         return dateutils.datetime_to_utc_timestamp(dt)
 
-    def __init__(self, source_id, expiration, type_id, unit_key, url):
+    def __init__(self, source_id, expiration, type_id, unit_key, url, generation=None,
+                 source_url=None):
         """
         :param source_id: The ID of the contributing content source.
         :type source_id: str
@@ -140,6 +145,10 @@ class ContentCatalog(Model):
         :type unit_key: dict
         :param url: The URL used to download the file associated with the unit.
         :type url: str
+        :param generation: The (optional) refresh generation that added the entry.
+        :type generation: str
+        :param source_url: The (optional) content source URL refreshed to add the entry.
+        :type source_url: str
         """
         Model.__init__(self)
         self.source_id = source_id
@@ -148,3 +157,36 @@ class ContentCatalog(Model):
         self.unit_key = unit_key
         self.locator = self.get_locator(type_id, unit_key)
         self.url = url
+        self.generation = generation
+        self.source_url = source_url
+
+
+class ContentCatalogChecksum(Model):
+    """
+    The checksum of the metadata at a content source URL recorded by the
+    last successful refresh of the content catalog using the URL.
+    :ivar source_id: The content source ID.
+    :type source_id: str
+    :ivar url: The content source URL.
+    :type url: str
+    :ivar checksum: The checksum reported by the cataloger.
+    :type checksum: str
+    """
+
+    collection_name = 'content_catalog_checksums'
+    unique_indices = (('source_id', 'url'),)
+    search_indices = ()
+
+    def __init__(self, source_id, url, checksum):
+        """
+        :param source_id: The content source ID.
+        :type source_id: str
+        :param url: The content source URL.
+        :type url: str
+        :param checksum: The checksum reported by the cataloger.
+        :type checksum: str
+        """
+        Model.__init__(self)
+        self.source_id = source_id
+        self.url = url
+        self.checksum = checksum
@@ -112,7 +112,8 @@ class UnitAssociationCriteria(Model):
 
     def __init__(self, type_ids=None, association_filters=None, unit_filters=None,
                  association_sort=None, unit_sort=None, limit=None, skip=None,
-                 association_fields=None, unit_fields=None, remove_duplicates=False):
+                 association_fields=None, unit_fields=None, remove_duplicates=False,
+                 after=None):
         """
         There are a number of entry points into creating one of these instances:
         multiple REST interfaces, the plugins, etc. As such, this constructor
@@ -155,6 +156,13 @@ class UnitAssociationCriteria(Model):
         @param remove_duplicates: if True, units with multiple associations will
                only return a single association; defaults to False
         @type  remove_duplicates: bool
+
+        @param after: opaque page token returned by a previous keyset paginated
+               query; when specified, results are ordered by unit type and unit
+               ID and start immediately after the unit the token refers to. An
+               empty string requests the first page. Sorts and skip are ignored
+               in this mode.
+        @type  after: str
         """
         super(UnitAssociationCriteria, self).__init__()
 
@@ -186,6 +194,8 @@ class UnitAssociationCriteria(Model):
 
         self.remove_duplicates = remove_duplicates
 
+        self.after = after
+
     @classmethod
     def from_client_input(cls, query):
         """
@@ -212,6 +222,14 @@ class UnitAssociationCriteria(Model):
           "remove_duplicates" : True
         }
 
+        A keyset paginated query replaces "sort" and "skip" with an "after"
+        page token; an empty string requests the first page:
+        {
+          "type_ids" : ["rpm"],
+          "limit" : 100,
+          "after" : ""
+        }
+
         @param query: user-provided query details
         @type  query: dict
 
@@ -253,6 +271,11 @@ class UnitAssociationCriteria(Model):
 
         remove_duplicates = bool(query.pop('remove_duplicates', False))
 
+        after = _validate_after(query.pop('after', None))
+        if after is not None and (association_sort or unit_sort or skip):
+            # keyset pagination defines its own ordering and position
+            raise pulp_exceptions.InvalidValue(['after'])
+
         # report any superfluous doc key, value pairs as errors
         for d in (query, filters, sort, fields):
             if d:
@@ -269,7 +292,7 @@ class UnitAssociationCriteria(Model):
         return cls(type_ids=type_ids, association_filters=association_filters, unit_filters=unit_filters,
                    association_sort=association_sort, unit_sort=unit_sort, limit=limit, skip=skip,
                    association_fields=association_fields, unit_fields=unit_fields,
-                   remove_duplicates=remove_duplicates)
+                   remove_duplicates=remove_duplicates, after=after)
 
     @property
     def association_spec(self):
@@ -298,6 +321,7 @@ class UnitAssociationCriteria(Model):
         if self.skip: s += 'Skip [%s] ' % self.skip
         if self.association_fields: s += 'Assoc Fields [%s] ' % self.association_fields
         if self.unit_fields: s += 'Unit Fields [%s] ' % self.unit_fields
+        if self.after is not None: s += 'After [%s] ' % self.after
         s += 'Remove Duplicates [%s]' % self.remove_duplicates
         return s
 
@@ -371,6 +395,14 @@ def _validate_skip(skip):
         return skip
 
 
+def _validate_after(after):
+    if after is None:
+        return None
+    if not isinstance(after, basestring):
+        raise pulp_exceptions.InvalidValue(['after'])
+    return after
+
+
 def _validate_fields(fields):
     if fields is None:
         return None
@@ -504,6 +504,9 @@ class TaskStatus(Model, ReaperMixin):
     :type spawned_tasks: list of str
     :ivar progress_report: A report containing information about task's progress
     :type progress_report: dict
+    :ivar db_operations: counters for the database operations issued by the task, as
+                         reported by pulp.server.db.profiler
+    :type db_operations: list of dict
     """
 
     collection_name = 'task_status'
@@ -512,7 +515,8 @@ class TaskStatus(Model, ReaperMixin):
 
     def __init__(
             self, task_id, queue, tags=None, state=None, error=None, spawned_tasks=None,
-            progress_report=None, task_type=None, start_time=None, finish_time=None, result=None):
+            progress_report=None, task_type=None, start_time=None, finish_time=None, result=None,
+            db_operations=None):
         """
         Initialize the TaskStatus based on the provided attributes. All parameters besides task_id
         and queue are optional.
@@ -540,6 +544,8 @@ class TaskStatus(Model, ReaperMixin):
         :type  finish_time:     datetime.datetime
         :param result:          return value of the callable, if any
         :type  result:          any
+        :param db_operations:   counters for the database operations issued by the task
+        :type  db_operations:   list of dict
         """
         super(TaskStatus, self).__init__()
 
@@ -554,6 +560,7 @@ class TaskStatus(Model, ReaperMixin):
         self.progress_report = progress_report or {}
         self.result = result
         self.error = error
+        self.db_operations = db_operations or []
         # These are deprecated, and will always be None
         self.exception = None
         self.traceback = None
@@ -38,4 +38,5 @@ class EventListener(Model):
 
         self.notifier_type_id = notifier_type_id
         self.notifier_config = notifier_config
-        self.event_types = event_types
\ No newline at end of file
+        self.event_types = event_types
+
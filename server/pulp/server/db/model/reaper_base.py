@@ -1,9 +1,19 @@
 from datetime import timedelta, datetime
+import time
+
+from pymongo import ASCENDING
 
 from pulp.common import dateutils
 from pulp.server.compat import ObjectId
 
 
+# The default maximum number of documents removed by each remove operation.
+DEFAULT_CHUNK_SIZE = 1000
+
+# The default fraction of time spent removing documents.
+DEFAULT_DUTY_CYCLE = 0.5
+
+
 class ReaperMixin(object):
     """
     A Mixin class providing default reaping functionality.
@@ -13,19 +23,79 @@ class ReaperMixin(object):
     """
 
     @classmethod
-    def reap_old_documents(cls, config_days):
+    def reap_old_documents(cls, config_days, chunk_size=DEFAULT_CHUNK_SIZE, duty_cycle=1.0):
         """
         Remove documents from that are older than config_days.
 
+        Documents are removed oldest first in _id ranges of at most chunk_size documents so that
+        no single remove operation holds the database lock for long. Since the oldest documents
+        are always removed first, a reap that is interrupted is resumed by the next one.
+
         :param config_days: Remove all records older than the number of days set by config_days.
         :type config_days: float
+        :param chunk_size: The maximum number of documents removed by each remove operation.
+        :type chunk_size: int
+        :param duty_cycle: The fraction of time spent removing documents. After each chunk, the
+                           reaper sleeps so that removing documents takes at most this fraction
+                           of the total time. 1.0 means no sleeping.
+        :type duty_cycle: float
+        :return: A dictionary with the number of documents 'removed', the number of 'chunks'
+                 and the total 'seconds' spent, including sleeping.
+        :rtype: dict
         """
+        started = time.time()
         age = timedelta(days=config_days)
         # Generate an ObjectId that we can use to know which objects to remove
         expired_object_id = _create_expired_object_id(age)
-        # Remove all objects older than the timestamp encoded into the generated ObjectId
         collection = cls.get_collection()
-        collection.remove({'_id': {'$lte': expired_object_id}})
+        removed = 0
+        chunks = 0
+        while True:
+            chunk_started = time.time()
+            # The last _id of the chunk, or None when no more than a chunk is left
+            last_id = _chunk_last_id(collection, expired_object_id, chunk_size)
+            spec = {'_id': {'$lte': last_id or expired_object_id}}
+            result = collection.remove(spec, safe=True)
+            removed += result.get('n') or 0
+            chunks += 1
+            if last_id is None:
+                break
+            _throttle(time.time() - chunk_started, duty_cycle)
+        return {'removed': removed, 'chunks': chunks, 'seconds': time.time() - started}
+
+
+def _chunk_last_id(collection, expired_object_id, chunk_size):
+    """
+    Find the _id of the last document in the next chunk of expired documents.
+
+    :param collection: The collection being reaped.
+    :type  collection: pymongo.collection.Collection
+    :param expired_object_id: Documents with an _id up to this ObjectId are expired.
+    :type  expired_object_id: pulp.server.compat.ObjectId
+    :param chunk_size: The maximum number of documents in a chunk; values below 1 are
+                       treated as 1.
+    :type  chunk_size: int
+    :return: The _id of the chunk_size'th oldest expired document, or None if there are not
+             that many expired documents.
+    :rtype:  pulp.server.compat.ObjectId
+    """
+    cursor = collection.find({'_id': {'$lte': expired_object_id}}, fields=['_id'],
+                             sort=[('_id', ASCENDING)]).skip(max(1, chunk_size) - 1).limit(1)
+    for document in cursor:
+        return document['_id']
+
+
+def _throttle(elapsed, duty_cycle):
+    """
+    Sleep long enough that elapsed is duty_cycle of the time since the chunk was started.
+
+    :param elapsed: The number of seconds spent removing the chunk.
+    :type  elapsed: float
+    :param duty_cycle: The fraction of time spent removing documents.
+    :type  duty_cycle: float
+    """
+    if 0 < duty_cycle < 1:
+        time.sleep(elapsed * (1 - duty_cycle) / duty_cycle)
 
 
 def _create_expired_object_id(age):
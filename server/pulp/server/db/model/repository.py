@@ -49,6 +49,11 @@ class Repo(Model):
                     the values may change as the contents of the repo change,
                     either set by the user or by an importer or distributor
     @type metadata: dict
+
+    @ivar content_revision: incremented each time the content of the repo
+                            changes; used to tell if data calculated from the
+                            content, such as applicability, is out of date
+    @type content_revision: int
     """
 
     collection_name = 'repos'
@@ -63,6 +68,7 @@ class Repo(Model):
         self.notes = notes or {}
         self.scratchpad = {}  # default to dict in hopes the plugins will just add/remove from it
         self.content_unit_counts = content_unit_counts or {}
+        self.content_revision = 0
 
         # Timeline
         # TODO: figure out how to track repo modified states
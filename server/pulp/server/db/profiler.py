@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the License
+# (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied, including the
+# implied warranties of MERCHANTABILITY, NON-INFRINGEMENT, or FITNESS FOR A
+# PARTICULAR PURPOSE.
+# You should have received a copy of GPLv2 along with this software; if not,
+# see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
+
+"""
+Per-process profiling of the database operations issued through PulpCollection.
+
+Every operation is counted per collection and operation name, both for the
+whole process and for the Celery task that issued it. Operations that take
+longer than the configured slow query threshold are logged along with their
+spec and the manager that issued them.
+"""
+
+import logging
+import sys
+import threading
+import time
+from gettext import gettext as _
+
+from pulp.server import config
+
+
+# upper bounds (in milliseconds) of the latency histogram buckets; anything
+# slower is counted in the last, unbounded bucket
+LATENCY_BUCKETS = (1, 10, 100, 1000, 10000)
+UNBOUNDED_BUCKET = 'inf'
+
+# the most tasks tracked at once; protects against tasks that never report
+MAX_TRACKED_TASKS = 1000
+
+# operations whose first argument is a query spec worth logging
+QUERY_OPERATIONS = ('find', 'getmore', 'find_one', 'update', 'remove', 'count',
+                    'find_and_modify', 'distinct')
+
+_LOG = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+_STATS = {}
+_TASK_STATS = {}
+
+# milliseconds, 0 disables the slow query log; loaded by configure()
+_SLOW_QUERY_THRESHOLD = None
+
+_get_current_task_id = None
+
+
+class OperationStats(object):
+    """
+    Counters for a single operation on a single collection.
+
+    :ivar calls: number of times the operation was issued
+    :type calls: int
+    :ivar failures: number of times the operation raised an exception
+    :type failures: int
+    :ivar documents: number of documents returned or written
+    :type documents: int
+    :ivar total_ms: total time spent in the operation in milliseconds
+    :type total_ms: float
+    :ivar max_ms: longest single operation in milliseconds
+    :type max_ms: float
+    :ivar histogram: operation count for each of LATENCY_BUCKETS followed by
+                     the unbounded bucket
+    :type histogram: list of int
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.documents = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, elapsed_ms, documents, failed):
+        """
+        Add a single operation to the counters.
+
+        :param elapsed_ms: time the operation took in milliseconds
+        :type  elapsed_ms: float
+        :param documents: number of documents returned or written
+        :type  documents: int
+        :param failed: whether the operation raised an exception
+        :type  failed: bool
+        """
+        self.calls += 1
+        if failed:
+            self.failures += 1
+        self.documents += documents
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed_ms <= bound:
+                self.histogram[index] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def dict(self):
+        """
+        :return: a serializable representation of the counters
+        :rtype:  dict
+        """
+        labels = [str(b) for b in LATENCY_BUCKETS] + [UNBOUNDED_BUCKET]
+        average_ms = 0.0
+        if self.calls:
+            average_ms = self.total_ms / self.calls
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'documents': self.documents,
+            'total_ms': round(self.total_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'average_ms': round(average_ms, 3),
+            'histogram': dict(zip(labels, self.histogram)),
+        }
+
+
+# -- recording api ------------------------------------------------------------
+
+def start():
+    """
+    Mark the start of an operation. Operations issued from within another
+    operation (such as the find() issued by find_one()) are not recorded
+    separately; in that case None is returned.
+
+    :return: start time of the operation or None when nested
+    :rtype:  float or None
+    """
+    depth = getattr(_LOCAL, 'depth', 0)
+    _LOCAL.depth = depth + 1
+    if depth:
+        return None
+    return time.time()
+
+
+def finish(started, collection_name, operation, documents=0, spec=None, failed=False):
+    """
+    Mark the end of an operation started with start() and record it.
+
+    :param started: value returned by start()
+    :type  started: float or None
+    :param collection_name: name of the collection operated on
+    :type  collection_name: str
+    :param operation: name of the operation
+    :type  operation: str
+    :param documents: number of documents returned or written
+    :type  documents: int
+    :param spec: query spec used by the operation, if any
+    :type  spec: dict
+    :param failed: whether the operation raised an exception
+    :type  failed: bool
+    """
+    _LOCAL.depth -= 1
+    if started is None:
+        return
+    elapsed_ms = (time.time() - started) * 1000
+    task_id = _current_task_id()
+
+    with _LOCK:
+        _stats(_STATS, collection_name, operation).record(elapsed_ms, documents, failed)
+        if task_id is not None:
+            task_stats = _TASK_STATS.get(task_id)
+            if task_stats is None:
+                if len(_TASK_STATS) >= MAX_TRACKED_TASKS:
+                    _TASK_STATS.popitem()
+                task_stats = _TASK_STATS[task_id] = {}
+            _stats(task_stats, collection_name, operation).record(elapsed_ms, documents, failed)
+
+    threshold = _slow_query_threshold()
+    if threshold and elapsed_ms >= threshold:
+        _log_slow_query(collection_name, operation, elapsed_ms, spec, task_id)
+
+
+# -- reporting api ------------------------------------------------------------
+
+def report():
+    """
+    :return: counters for every operation issued by this process, sorted by
+             collection and operation name
+    :rtype:  list of dict
+    """
+    with _LOCK:
+        return _report(_STATS)
+
+
+def pop_task_report(task_id):
+    """
+    Remove and return the counters for every operation issued by a task.
+
+    :param task_id: ID of the Celery task
+    :type  task_id: str
+    :return: counters sorted by collection and operation name; empty if the
+             task did not issue any operation
+    :rtype:  list of dict
+    """
+    with _LOCK:
+        return _report(_TASK_STATS.pop(task_id, {}))
+
+
+def configure():
+    """
+    Load the slow query threshold from the server configuration.
+    """
+    global _SLOW_QUERY_THRESHOLD
+    _SLOW_QUERY_THRESHOLD = config.config.getint('database', 'slow_query_threshold')
+
+
+def reset():
+    """
+    Discard all counters.
+    """
+    with _LOCK:
+        _STATS.clear()
+        _TASK_STATS.clear()
+
+# -- private ------------------------------------------------------------------
+
+def _stats(stats, collection_name, operation):
+    operations = stats.setdefault(collection_name, {})
+    operation_stats = operations.get(operation)
+    if operation_stats is None:
+        operation_stats = operations[operation] = OperationStats()
+    return operation_stats
+
+
+def _report(stats):
+    entries = []
+    for collection_name in sorted(stats):
+        operations = stats[collection_name]
+        for operation in sorted(operations):
+            entry = operations[operation].dict()
+            entry['collection'] = collection_name
+            entry['operation'] = operation
+            entries.append(entry)
+    return entries
+
+
+def _slow_query_threshold():
+    if _SLOW_QUERY_THRESHOLD is None:
+        configure()
+    return _SLOW_QUERY_THRESHOLD
+
+
+def _current_task_id():
+    """
+    The task module imports the database layer, so it is imported on first
+    use; None is returned until it has been loaded.
+    """
+    global _get_current_task_id
+    if _get_current_task_id is None:
+        try:
+            from pulp.server.async.tasks import get_current_task_id
+        except ImportError:
+            return None
+        _get_current_task_id = get_current_task_id
+    return _get_current_task_id()
+
+
+def _calling_manager():
+    """
+    :return: name of the innermost pulp manager module on the call stack, or
+             the innermost pulp module outside of the database layer
+    :rtype:  str or None
+    """
+    frame = sys._getframe(1)
+    caller = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('pulp.server.managers'):
+            return '%s.%s' % (module, frame.f_code.co_name)
+        if caller is None and module.startswith('pulp') and not module.startswith('pulp.server.db'):
+            caller = '%s.%s' % (module, frame.f_code.co_name)
+        frame = frame.f_back
+    return caller
+
+
+def _log_slow_query(collection_name, operation, elapsed_ms, spec, task_id):
+    msg = _('Slow database operation: %(operation)s on %(collection)s took %(elapsed)d ms; '
+            'spec: %(spec)s; caller: %(caller)s; task: %(task)s')
+    if operation not in QUERY_OPERATIONS:
+        spec = None
+    _LOG.warn(msg % {'operation': operation, 'collection': collection_name,
+                     'elapsed': elapsed_ms, 'spec': spec, 'caller': _calling_manager(),
+                     'task': task_id})
@@ -18,7 +18,8 @@ from celery import task
 
 from pulp.server import config as pulp_config
 from pulp.server.async.tasks import Task
-from pulp.server.db.model import celery_result, consumer, dispatch, repo_group, repository
+from pulp.server.db.model import (celery_result, consumer, dispatch, reaper_base, repo_group,
+                                  repository)
 
 
 # Add collections to reap here. The keys in this datastructure are the Model classes that represent
@@ -45,11 +46,32 @@ def reap_expired_documents():
     For each collection in _COLLECTION_TIMEDELTAS, call the class method reap_old_documents().
 
     This method gets the number of days from the pulp_config, and calls reap_old_documents with the
-    number of days as the argument.
+    number of days as the argument. Documents are removed in chunks of reaper_chunk_size and the
+    reaper spends reaper_duty_cycle of its time removing them. Invalid values for either setting
+    are logged and replaced by their defaults.
+
+    :return: The number of documents removed, the number of chunks and the seconds spent, keyed
+             by collection name.
+    :rtype:  dict
     """
     _logger.info(_('The reaper task is cleaning out old documents from the database.'))
+    chunk_size = pulp_config.config.getint('data_reaping', 'reaper_chunk_size')
+    duty_cycle = pulp_config.config.getfloat('data_reaping', 'reaper_duty_cycle')
+    if chunk_size < 1:
+        _logger.warn(_('reaper_chunk_size must be at least 1, not %(v)s; using %(d)s.') %
+                     {'v': chunk_size, 'd': reaper_base.DEFAULT_CHUNK_SIZE})
+        chunk_size = reaper_base.DEFAULT_CHUNK_SIZE
+    if duty_cycle <= 0:
+        _logger.warn(_('reaper_duty_cycle must be greater than 0, not %(v)s; using %(d)s.') %
+                     {'v': duty_cycle, 'd': reaper_base.DEFAULT_DUTY_CYCLE})
+        duty_cycle = reaper_base.DEFAULT_DUTY_CYCLE
+    metrics = {}
     for model, config_name in _COLLECTION_TIMEDELTAS.items():
         # Get the config for how old documents should be before they are reaped.
         config_days = pulp_config.config.getfloat('data_reaping', config_name)
-        model.reap_old_documents(config_days)
+        reaped = model.reap_old_documents(config_days, chunk_size, duty_cycle)
+        _logger.info(_('Reaped %(n)d documents from %(c)s in %(s).1f seconds.') %
+                     {'n': reaped['removed'], 'c': model.collection_name, 's': reaped['seconds']})
+        metrics[model.collection_name] = reaped
     _logger.info(_('The reaper task has completed.'))
+    return metrics
@@ -19,26 +19,52 @@ url
   Full URL to contact with the event data. A POST request will be made to this
   URL with the contents of the events in the body.
 
+batch_interval
+  Optional number of seconds to collect events for before sending them in a
+  single POST whose body is a JSON list of events. Events are sent one per
+  request if this is not specified.
+
 Eventually this should be enhanced to support authentication credentials as well.
+
+Events are posted by a bounded pool of worker threads fed from a bounded
+queue, and connections to each server are kept alive and reused. If the queue
+is full, events are dropped rather than blocking the caller for longer than
+the configured queue timeout. A request is sent again on a new connection only
+when the server closed a reused connection before responding to it. A request
+that fails after it may have been received, for instance on a response timeout,
+is not sent again, so such an event may be lost but is not delivered twice.
 """
 
 import base64
+import errno
 import httplib
 import logging
+import os
+import Queue
+import socket
+import sys
 import threading
+import time
 
 from pulp.server.compat import json, json_util
+from pulp.server.config import config
 
 # -- constants ----------------------------------------------------------------
 
 TYPE_ID = 'http'
 
+# minimum number of seconds between two warnings about dropped events
+DROP_WARNING_INTERVAL = 60
+
 LOG = logging.getLogger(__name__)
 
+_DISPATCHER = None
+_DISPATCHER_LOCK = threading.Lock()
+
 # -- framework hook -----------------------------------------------------------
 
 def handle_event(notifier_config, event):
-    # fire the actual http push function off in a separate thread to keep
+    # the actual http push is done by a pool of worker threads to keep
     # pulp from blocking or deadlocking due to the tasking subsystem
 
     data = event.data()
@@ -47,22 +73,353 @@ def handle_event(notifier_config, event):
 
     body = json.dumps(data, default=json_util.default)
 
-    thread = threading.Thread(target=_send_post, args=[notifier_config, body])
-    thread.setDaemon(True)
-    thread.start()
+    dispatcher().submit(notifier_config, body)
 
-# -- private ------------------------------------------------------------------
 
-def _send_post(notifier_config, body):
+def dispatcher():
+    """
+    Returns the dispatcher used to post events from this process, creating it
+    from the server configuration on first use. A process forked after the
+    dispatcher was created gets a new one, since the worker threads are not
+    carried over by the fork.
+
+    :return: process wide event dispatcher
+    :rtype:  NotificationDispatcher
+    """
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None or _DISPATCHER.pid != os.getpid():
+            _DISPATCHER = NotificationDispatcher(
+                config.getint('notifications', 'http_workers'),
+                config.getint('notifications', 'http_queue_size'),
+                config.getfloat('notifications', 'http_queue_timeout'),
+                config.getint('notifications', 'http_idle_connections'),
+                config.getint('notifications', 'http_batch_size'))
+        return _DISPATCHER
+
+
+def stats():
+    """
+    :return: counts of the events handled by the dispatcher of this process
+    :rtype:  dict
+    """
+    return dispatcher().stats()
+
+
+def reset():
+    """
+    Discards the dispatcher so that the next event creates a new one. Events
+    still queued in the old dispatcher are sent by its worker threads.
+    """
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        _DISPATCHER = None
+
+# -- dispatch -----------------------------------------------------------------
+
+class NotificationDispatcher(object):
+    """
+    Posts events from a bounded queue using a fixed number of worker threads.
+    Events for listeners that are configured with a batch interval are
+    collected per endpoint and queued as a single request once the interval
+    has passed or the batch is full.
+
+    :ivar pid: ID of the process that created the dispatcher
+    :type pid: int
+    :ivar queue: requests waiting for a worker; each item is a tuple of the
+                 endpoint, the body and the number of events in the body
+    :type queue: Queue.Queue
+    """
+
+    def __init__(self, workers, queue_size, queue_timeout, idle_connections, batch_size):
+        """
+        :param workers: number of worker threads posting events
+        :type  workers: int
+        :param queue_size: maximum number of requests waiting for a worker
+        :type  queue_size: int
+        :param queue_timeout: seconds to wait for room in a full queue before
+                              dropping the request; 0 drops it immediately
+        :type  queue_timeout: float
+        :param idle_connections: maximum number of idle connections kept open
+                                 to each server
+        :type  idle_connections: int
+        :param batch_size: maximum number of events sent in a single request
+        :type  batch_size: int
+        """
+        self.pid = os.getpid()
+        self.workers = max(1, workers)
+        self.queue = Queue.Queue(max(1, queue_size))
+        self.queue_timeout = queue_timeout
+        self.idle_connections = idle_connections
+        self.batch_size = max(1, batch_size)
+
+        self._lock = threading.Lock()
+        self._batch_added = threading.Condition(self._lock)
+        self._threads = []
+        # endpoint: ConnectionPool
+        self._pools = {}
+        # endpoint: [deadline, list of event bodies]
+        self._batches = {}
+        self._last_drop_warning = 0
+
+        self.events = 0
+        self.requests = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.backpressure = 0
+
+    def submit(self, notifier_config, body):
+        """
+        Queues an event to be posted to the URL in the notifier configuration.
+
+        :param notifier_config: configuration of the listener being notified
+        :type  notifier_config: dict
+        :param body: JSON serialized event
+        :type  body: str
+        """
+        endpoint = _endpoint(notifier_config)
+        if endpoint is None:
+            return
+
+        with self._lock:
+            self.events += 1
+
+        interval = _batch_interval(notifier_config)
+        if interval:
+            self._add_to_batch(endpoint, body, interval)
+        else:
+            self._enqueue(endpoint, body, 1)
+
+    def stats(self):
+        """
+        :return: counts of the events handled by the dispatcher
+        :rtype:  dict
+        """
+        with self._lock:
+            batched = sum([len(b[1]) for b in self._batches.values()])
+            pools = self._pools.values()
+            return {
+                'events': self.events,
+                'requests': self.requests,
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'backpressure': self.backpressure,
+                'queued': self.queue.qsize(),
+                'batched': batched,
+                'connections': sum([p.created for p in pools]),
+                'idle_connections': sum([len(p.idle) for p in pools]),
+            }
+
+    def _add_to_batch(self, endpoint, body, interval):
+        with self._lock:
+            batch = self._batches.get(endpoint)
+            if batch is None:
+                batch = self._batches[endpoint] = [time.time() + interval, []]
+                self._batch_added.notify()
+            batch[1].append(body)
+            if len(batch[1]) < self.batch_size:
+                batch = None
+            else:
+                del self._batches[endpoint]
+
+        self._start()
+        if batch is not None:
+            self._enqueue_batch(endpoint, batch[1])
+
+    def _enqueue_batch(self, endpoint, bodies):
+        self._enqueue(endpoint, '[%s]' % ', '.join(bodies), len(bodies))
+
+    def _enqueue(self, endpoint, body, count):
+        self._start()
+        item = (endpoint, body, count)
+        try:
+            self.queue.put_nowait(item)
+            return
+        except Queue.Full:
+            pass
+
+        if self.queue_timeout > 0:
+            with self._lock:
+                self.backpressure += 1
+            try:
+                self.queue.put(item, True, self.queue_timeout)
+                return
+            except Queue.Full:
+                pass
+
+        now = time.time()
+        with self._lock:
+            self.dropped += count
+            dropped = self.dropped
+            warn = now - self._last_drop_warning >= DROP_WARNING_INTERVAL
+            if warn:
+                self._last_drop_warning = now
+        if warn:
+            LOG.warn('HTTP notifier queue is full; %(d)s events dropped so far' % {'d': dropped})
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            targets = [self._send_loop] * self.workers + [self._batch_loop]
+            for target in targets:
+                thread = threading.Thread(target=target)
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
 
-    # Basic headers
-    headers = {'Accept': 'application/json',
-               'Content-Type': 'application/json'}
+    def _batch_loop(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                due = [e for e, b in self._batches.items() if b[0] <= now]
+                if not due:
+                    deadlines = [b[0] for b in self._batches.values()]
+                    timeout = None
+                    if deadlines:
+                        timeout = min(deadlines) - now
+                    self._batch_added.wait(timeout)
+                    continue
+                ready = [(e, self._batches.pop(e)[1]) for e in due]
+
+            for endpoint, bodies in ready:
+                self._enqueue_batch(endpoint, bodies)
+
+    def _send_loop(self):
+        while True:
+            endpoint, body, count = self.queue.get()
+            try:
+                try:
+                    sent = self._send_post(endpoint, body)
+                except Exception:
+                    LOG.exception('Error sending event to HTTP notifier: %(u)s' % {'u': endpoint[1]})
+                    sent = False
+                with self._lock:
+                    self.requests += 1
+                    if sent:
+                        self.sent += count
+                    else:
+                        self.failed += count
+            finally:
+                self.queue.task_done()
+
+    def _send_post(self, endpoint, body):
+        scheme, server, path, authorization = endpoint
+
+        # Basic headers
+        headers = {'Accept': 'application/json',
+                   'Content-Type': 'application/json'}
+
+        if authorization is not None:
+            headers['Authorization'] = authorization
+
+        pool = self._pool(scheme, server)
+
+        connection, reused = pool.get()
+        try:
+            response, response_body = _request(connection, path, body, headers)
+        except _ConnectionClosed:
+            connection.close()
+            if not reused:
+                raise
+            # the server may close an idle connection at any time; the event
+            # was not received, so it is safe to send it again
+            connection = pool.create()
+            try:
+                response, response_body = _request(connection, path, body, headers)
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                raise
+        except (httplib.HTTPException, socket.error):
+            # the server may have received the event, so it is not sent again
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.put(connection)
+
+        if response.status != httplib.OK:
+            LOG.warn('Error response from HTTP notifier: %(e)s' % {'e': response_body})
+            return False
+        return True
+
+    def _pool(self, scheme, server):
+        with self._lock:
+            pool = self._pools.get((scheme, server))
+            if pool is None:
+                pool = ConnectionPool(scheme, server, self.idle_connections)
+                self._pools[(scheme, server)] = pool
+            return pool
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connections to a single server.
+
+    :ivar created: number of connections opened to the server
+    :type created: int
+    :ivar idle: connections waiting to be reused
+    :type idle: list
+    """
+
+    def __init__(self, scheme, server, max_idle):
+        self.scheme = scheme
+        self.server = server
+        self.max_idle = max_idle
+        self.created = 0
+        self.idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        :return: tuple of an idle connection, or a new one if there are none,
+                 and whether the connection was used before
+        :rtype:  tuple
+        """
+        with self._lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self.create(), False
+
+    def create(self):
+        """
+        :return: a new connection to the server
+        :rtype:  httplib.HTTPConnection
+        """
+        with self._lock:
+            self.created += 1
+        return _create_connection(self.scheme, self.server)
+
+    def put(self, connection):
+        """
+        Returns a connection whose last response has been read, closing it
+        if there are enough idle connections already.
+        """
+        with self._lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+# -- private ------------------------------------------------------------------
+
+def _endpoint(notifier_config):
+    """
+    :return: tuple of scheme, server, path and authorization header, or None
+             if the notifier is not configured with a usable URL
+    :rtype:  tuple
+    """
 
     # Parse the URL for the pieces we need
     if 'url' not in notifier_config or not notifier_config['url']:
         LOG.warn('HTTP notifier configured without a URL; cannot fire event')
-        return
+        return None
 
     url = notifier_config['url']
 
@@ -70,22 +427,55 @@ def _send_post(notifier_config, body):
         scheme, empty, server, path = url.split('/', 3)
     except ValueError:
         LOG.warn('Improperly configured post_sync_url: %(u)s' % {'u': url})
-        return
-
-    connection = _create_connection(scheme, server)
+        return None
 
     # Process authentication
+    authorization = None
     if 'username' in notifier_config and 'password' in notifier_config:
         raw = ':'.join((notifier_config['username'], notifier_config['password']))
         encoded = base64.encodestring(raw)[:-1]
-        headers['Authorization'] = 'Basic ' + encoded
-
-    connection.request('POST', '/' + path, body=body, headers=headers)
-    response = connection.getresponse()
-    if response.status != httplib.OK:
-        error_msg = response.read()
-        LOG.warn('Error response from HTTP notifier: %(e)s' % {'e': error_msg})
-    connection.close()
+        authorization = 'Basic ' + encoded
+
+    return scheme, server, '/' + path, authorization
+
+def _batch_interval(notifier_config):
+    interval = notifier_config.get('batch_interval')
+    if not interval:
+        return 0
+    try:
+        return max(0, float(interval))
+    except (TypeError, ValueError):
+        LOG.warn('Improperly configured batch_interval: %(i)s' % {'i': interval})
+        return 0
+
+class _ConnectionClosed(httplib.HTTPException):
+    """
+    Raised when the server closed the connection before a request could be
+    written or before any of the response was received.
+    """
+    pass
+
+def _request(connection, path, body, headers):
+    """
+    :return: tuple of the response and its body; the body is read so that the
+             connection can be reused
+    :rtype:  tuple
+    :raise _ConnectionClosed: if the server closed the connection before
+                              responding to the request
+    """
+    try:
+        connection.request('POST', path, body=body, headers=headers)
+    except (httplib.HTTPException, socket.error), e:
+        raise _ConnectionClosed(e), None, sys.exc_info()[2]
+    try:
+        response = connection.getresponse()
+    except httplib.BadStatusLine, e:
+        raise _ConnectionClosed(e), None, sys.exc_info()[2]
+    except socket.error, e:
+        if isinstance(e, socket.timeout) or e.args[:1] != (errno.ECONNRESET,):
+            raise
+        raise _ConnectionClosed(e), None, sys.exc_info()[2]
+    return response, response.read()
 
 def _create_connection(scheme, server):
     if scheme.startswith('https'):
@@ -14,6 +14,7 @@ from celery import task
 
 from pulp.server.db import connection
 from pulp.server.managers.consumer.applicability import RepoProfileApplicabilityManager
+from pulp.server.managers.repo.cud import RepoManager
 
 
 # This module is generally called from the pulp-monthly script, so let's set up the DB connection
@@ -25,3 +26,4 @@ def monthly_maintenance():
     Perform tasks that should happen on a monthly basis.
     """
     RepoProfileApplicabilityManager().remove_orphans()
+    RepoManager().check_content_unit_counts()
@@ -9,10 +9,16 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
+import hmac
 import logging
+import os
+import threading
+import time
 
 import oauth2
 
+from pulp.server.db.model.cache_version import CacheVersion
 from pulp.server.db.model.consumer import Consumer
 from pulp.server.managers import factory
 from pulp.server.auth import ldap_connection
@@ -23,10 +29,187 @@ from pulp.server.exceptions import PulpException
 
 _LOG = logging.getLogger(__name__)
 
+# owner kinds of cached credentials
+USER = 'user'
+CONSUMER = 'consumer'
+
+# credentials are cached under an HMAC keyed with this per-process secret so
+# that neither passwords nor certificates are kept in memory
+_CREDENTIAL_KEY_SECRET = os.urandom(32)
+
+_CREDENTIAL_CACHE = None
+_CREDENTIAL_CACHE_LOCK = threading.Lock()
+
 
 # -- classes ------------------------------------------------------------------
 
 
+class CredentialCache(object):
+    """
+    Bounded cache of successfully verified credentials. Entries map a digest of
+    the credentials to the principal (user login or consumer id) they
+    authenticate and expire after a fixed time. Failed verifications are never
+    cached.
+
+    Entries are filled under a credential version, the counter stored in the
+    database that is incremented on every change to a user, its roles or a
+    consumer. Every lookup passes the current version, and the whole cache is
+    dropped when it differs, so that changes made by other processes take
+    effect on the next request.
+
+    :ivar ttl: number of seconds an entry is valid for; 0 disables the cache
+    :type ttl: int
+    :ivar max_size: maximum number of entries
+    :type max_size: int
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # credential version the entries were verified under
+        self.version = 0
+        # key: (principal, owner, expiration)
+        self._entries = {}
+        # owner: set of keys
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*credentials):
+        """
+        :param credentials: the credential components, such as login and password
+        :type  credentials: str or None
+        :return: digest of the credentials to be used as a cache key
+        :rtype:  str
+        """
+        parts = []
+        for c in credentials:
+            if c is None:
+                parts.append('-')
+                continue
+            if isinstance(c, unicode):
+                c = c.encode('utf-8')
+            parts.append('%d:%s' % (len(c), c))
+        return hmac.new(_CREDENTIAL_KEY_SECRET, ''.join(parts), hashlib.sha256).hexdigest()
+
+    def get(self, key, version=0):
+        """
+        :param key: digest returned by key()
+        :type  key: str
+        :param version: the current credential version
+        :type  version: int
+        :return: the cached principal or None if not cached, expired or
+                 cached under another version
+        :rtype:  str or None
+        """
+        if not self.ttl:
+            return None
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, principal, owner, version=0):
+        """
+        Cache a verified principal. Principals verified under a version older
+        than the one the cache holds are not cached.
+
+        :param key: digest returned by key()
+        :type  key: str
+        :param principal: the authenticated user login or consumer id
+        :type  principal: str
+        :param owner: (kind, id) tuple identifying the user or consumer the
+                      entry is invalidated with
+        :type  owner: tuple
+        :param version: the credential version read before the principal was
+                        verified
+        :type  version: int
+        """
+        if not self.ttl or self.max_size <= 0:
+            return
+        with self._lock:
+            if version < self.version:
+                return
+            self._sync(version)
+            now = time.time()
+            self._remove(key)
+            if len(self._entries) >= self.max_size:
+                self._evict(now)
+            self._entries[key] = (principal, owner, now + self.ttl)
+            self._owners.setdefault(owner, set()).add(key)
+
+    def invalidate(self, owner=None):
+        """
+        Drop the cached entries for a user or consumer.
+
+        :param owner: (kind, id) tuple identifying the user or consumer;
+                      None drops all entries
+        :type  owner: tuple or None
+        """
+        with self._lock:
+            if owner is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._owners.clear()
+            else:
+                keys = self._owners.pop(owner, set())
+                removed = len(keys)
+                for key in keys:
+                    self._entries.pop(key, None)
+            self.invalidations += removed
+
+    def stats(self):
+        """
+        :return: hit, miss, eviction and invalidation counts and the number of entries
+        :rtype:  dict
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'entries': len(self._entries)}
+
+    def _sync(self, version):
+        # drop everything cached under another credential version
+        if version == self.version:
+            return
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._owners.clear()
+        self.version = version
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._owners.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owners[entry[1]]
+
+    def _evict(self, now):
+        # expired entries go first; if there are none, the oldest entry goes
+        expired = [k for k, e in self._entries.items() if e[2] <= now]
+        if not expired:
+            expired = [min(self._entries, key=lambda k: self._entries[k][2])]
+        for key in expired:
+            self._remove(key)
+        self.evictions += len(expired)
+
+
 class AuthenticationManager(object):
     """
     Manages user and consumer authentication in pulp.
@@ -109,10 +292,18 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
+        cache = credential_cache()
+        version = self.credential_version()
+        key = cache.key('password', username, password)
+        login = cache.get(key, version)
+        if login is not None:
+            return login
+
         user = self._check_username_password_local(username, password)
         if user is None and config.getboolean('ldap', 'enabled'):
             user = self._check_username_password_ldap(username, password)
         if user is not None:
+            cache.put(key, user['login'], (USER, user['login']), version)
             return user['login']
         return None
 
@@ -129,6 +320,13 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
+        cache = credential_cache()
+        version = self.credential_version()
+        key = cache.key('user_cert', cert_pem)
+        login = cache.get(key, version)
+        if login is not None:
+            return login
+
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         encoded_user = subject.get('CN', None)
@@ -147,7 +345,10 @@ class AuthenticationManager(object):
         except PulpException:
             return None
     
-        return self.check_username_password(username)
+        login = self.check_username_password(username)
+        if login is not None:
+            cache.put(key, login, (USER, login), version)
+        return login
     
     def check_consumer_cert(self, cert_pem):
         """
@@ -160,6 +361,13 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: id of a consumer corresponding to the credentials
         """
+        cache = credential_cache()
+        version = self.credential_version()
+        key = cache.key('consumer_cert', cert_pem)
+        consumerid = cache.get(key, version)
+        if consumerid is not None:
+            return consumerid
+
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         consumerid = subject.get('CN', None)
@@ -172,8 +380,63 @@ class AuthenticationManager(object):
             _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' %
                        consumerid)
             return None
-    
+
+        cache.put(key, consumerid, (CONSUMER, consumerid), version)
         return consumerid
+
+    # -- credential cache ----------------------------------------------------------
+
+    def invalidate_user_credentials(self, login):
+        """
+        Drop the cached credentials of a user in every server process. Must be
+        called after the user is updated or deleted, or its roles change.
+
+        :param login: login of the user
+        :type  login: str
+        """
+        self.credentials_changed()
+        credential_cache().invalidate((USER, login))
+
+    def invalidate_consumer_credentials(self, consumer_id):
+        """
+        Drop the cached certificates of a consumer in every server process.
+        Must be called after the consumer is registered, unregistered or its
+        certificate is regenerated.
+
+        :param consumer_id: id of the consumer
+        :type  consumer_id: str
+        """
+        self.credentials_changed()
+        credential_cache().invalidate((CONSUMER, consumer_id))
+
+    @staticmethod
+    def credential_version():
+        """
+        :return: the current credential version, which changes every time a
+                 user, its roles or a consumer change
+        :rtype:  int
+        """
+        return CacheVersion.get_version(CacheVersion.CREDENTIALS)
+
+    @staticmethod
+    def credentials_changed():
+        """
+        Record that a user, its roles or a consumer changed by incrementing the
+        credential version, which drops the credential cache of every process
+        on its next lookup.
+
+        :return: the new credential version
+        :rtype:  int
+        """
+        return CacheVersion.bump_version(CacheVersion.CREDENTIALS)
+
+    def credential_cache_stats(self):
+        """
+        :return: hit, miss, eviction and invalidation counts of the credential
+                 cache and its number of entries
+        :rtype:  dict
+        """
+        return credential_cache().stats()
     
     # oauth authentication --------------------------------------------------------
     
@@ -235,3 +498,21 @@ class AuthenticationManager(object):
             return consumer['id'], is_consumer
 
         return None, is_consumer
+
+
+# -- functions ----------------------------------------------------------------
+
+def credential_cache():
+    """
+    :return: the process wide credential cache, configured from the
+             [authentication] section of the server configuration
+    :rtype:  CredentialCache
+    """
+    global _CREDENTIAL_CACHE
+    if _CREDENTIAL_CACHE is None:
+        with _CREDENTIAL_CACHE_LOCK:
+            if _CREDENTIAL_CACHE is None:
+                ttl = config.getint('authentication', 'credential_cache_ttl')
+                max_size = config.getint('authentication', 'credential_cache_size')
+                _CREDENTIAL_CACHE = CredentialCache(ttl, max_size)
+    return _CREDENTIAL_CACHE
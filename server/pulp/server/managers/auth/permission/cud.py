@@ -23,6 +23,7 @@ from celery import task
 from pulp.server.async.tasks import Task
 from pulp.server.auth import authorization
 from pulp.server.db.model.auth import Permission, User
+from pulp.server.db.model.cache_version import CacheVersion
 from pulp.server.exceptions import (
     DuplicateResource, InvalidValue, MissingResource, PulpDataException,
     PulpExecutionException)
@@ -88,6 +89,7 @@ class PermissionManager(object):
             raise PulpDataException(_("Update Keyword [%s] is not supported" % key))
 
         Permission.get_collection().save(found, safe=True)
+        PermissionManager.permissions_changed()
 
     @staticmethod
     def delete_permission(resource_uri):
@@ -110,6 +112,7 @@ class PermissionManager(object):
             raise MissingResource(resource_uri)
 
         Permission.get_collection().remove({'resource' : resource_uri}, safe=True)
+        PermissionManager.permissions_changed()
 
     @staticmethod
     def grant(resource, login, operations):
@@ -147,6 +150,7 @@ class PermissionManager(object):
             current_ops.append(o)
 
         Permission.get_collection().save(permission, safe=True)
+        PermissionManager.permissions_changed()
 
     @staticmethod
     def revoke(resource, login, operations):
@@ -191,6 +195,20 @@ class PermissionManager(object):
             return
 
         Permission.get_collection().save(permission, safe=True)
+        PermissionManager.permissions_changed()
+
+    @staticmethod
+    def permissions_changed():
+        """
+        Record that the permissions or roles of a user changed by incrementing
+        the permission version. Must be called after the change is saved so
+        that the authorization index of each process is rebuilt from the new
+        state.
+
+        :return: the new permission version
+        :rtype:  int
+        """
+        return CacheVersion.bump_version(CacheVersion.PERMISSIONS)
 
     def grant_automatic_permissions_for_resource(self, resource):
         """
@@ -261,6 +279,7 @@ class PermissionManager(object):
             else:
                 # Delete entire permission if there are no more users
                 Permission.get_collection().remove({'resource':permission['resource']}, safe=True)
+        self.permissions_changed()
 
     def operation_name_to_value(self, name):
         """
@@ -17,6 +17,7 @@ Contains permissions query classes
 from gettext import gettext as _
 
 from pulp.server.db.model.auth import Permission
+from pulp.server.db.model.cache_version import CacheVersion
 from logging import getLogger
 
 # -- constants ----------------------------------------------------------------
@@ -55,5 +56,12 @@ class PermissionQueryManager(object):
         permission = Permission.get_collection().find_one({'resource' : resource_uri})
         return permission
 
+    def get_version(self):
+        """
+        Returns the current permission version, which changes every time a
+        user's permissions or roles change.
 
-    
\ No newline at end of file
+        @return: permission version
+        @rtype:  int
+        """
+        return CacheVersion.get_version(CacheVersion.PERMISSIONS)
@@ -245,6 +245,8 @@ class RoleManager(object):
 
         user['roles'].append(role_id)
         User.get_collection().save(user, safe=True)
+        factory.authentication_manager().invalidate_user_credentials(login)
+        factory.permission_manager().permissions_changed()
 
         for resource, operations in role['permissions'].items():
             factory.permission_manager().grant(resource, login, operations)
@@ -282,6 +284,8 @@ class RoleManager(object):
 
         user['roles'].remove(role_id)
         User.get_collection().save(user, safe=True)
+        factory.authentication_manager().invalidate_user_credentials(login)
+        factory.permission_manager().permissions_changed()
 
         for resource, operations in role['permissions'].items():
             other_roles = factory.role_query_manager().get_other_roles(role, user['roles'])
@@ -154,6 +154,9 @@ class UserManager(object):
             raise InvalidValue(invalid_values)
 
         User.get_collection().save(user, safe=True)
+        factory.authentication_manager().invalidate_user_credentials(login)
+        if 'roles' in delta:
+            factory.permission_manager().permissions_changed()
 
         # Retrieve the user to return the SON object
         updated = User.get_collection().find_one({'login' : login})
@@ -191,6 +194,8 @@ class UserManager(object):
         permission_manager.revoke_all_permissions_from_user(login)
 
         User.get_collection().remove({'login' : login}, safe=True)
+        factory.authentication_manager().invalidate_user_credentials(login)
+        permission_manager.permissions_changed()
 
     def ensure_admin(self):
         """
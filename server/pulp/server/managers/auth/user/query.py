@@ -15,6 +15,7 @@ Contains users query classes
 """
 
 from gettext import gettext as _
+import threading
 
 from pulp.server.db.model.auth import User, Permission, Role
 from pulp.server.exceptions import PulpDataException, MissingResource
@@ -22,6 +23,136 @@ from pulp.server.managers import factory
 from pulp.server.managers.auth.role.cud import SUPER_USER_ROLE
 
 
+_AUTHORIZATION_INDEX = None
+_AUTHORIZATION_INDEX_LOCK = threading.Lock()
+
+
+class AuthorizationIndex(object):
+    """
+    In-memory index of the operations each user is permitted on each resource.
+    The permissions of a user are stored in a trie of resource path segments,
+    so that the operations granted on a resource and on all of its parents
+    are collected in a single walk down the path.
+
+    The index is tagged with the permission version it was built from; when
+    the version in the database changes, the index is dropped and users are
+    indexed again as they are authorized.
+    """
+
+    def __init__(self):
+        self.version = None
+        # login: (is superuser, trie root)
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def is_authorized(self, resource, login, operation):
+        """
+        @type resource: str
+        @param resource: pulp resource path
+
+        @type login: str
+        @param login: login of user to check permissions for
+
+        @type operation: int
+        @param operation: operation to be performed on resource
+
+        @rtype: bool
+        @return: True if the user is authorized for the operation on the resource
+
+        @raise MissingResource: if the user does not exist
+        """
+        version = factory.permission_query_manager().get_version()
+        with self._lock:
+            if version != self.version:
+                self._users.clear()
+                self.version = version
+            entry = self._users.get(login)
+
+        if entry is None:
+            entry = self._index_user(login)
+            with self._lock:
+                if self.version == version:
+                    self._users[login] = entry
+
+        superuser, node = entry
+        if superuser:
+            return True
+        if operation in node[0]:
+            return True
+        for part in _resource_parts(resource):
+            node = node[1].get(part)
+            if node is None:
+                return False
+            if operation in node[0]:
+                return True
+        return False
+
+    def clear(self):
+        """
+        Drop the index so that it is rebuilt on next use.
+        """
+        with self._lock:
+            self._users.clear()
+            self.version = None
+
+    @staticmethod
+    def _index_user(login):
+        """
+        @return: tuple of whether the user is a super user and the root of the
+                 user's permission trie; each trie node is a tuple of the set of
+                 operations granted on the resource and a dict of child nodes
+                 keyed by path segment
+        @rtype:  tuple
+        """
+        user = User.get_collection().find_one({'login': login}, fields=['roles'])
+        if user is None:
+            raise MissingResource(login)
+        root = (set(), {})
+        if SUPER_USER_ROLE in user['roles']:
+            return True, root
+
+        # permissions are keyed by login, so logins that are not valid field
+        # names cannot have any
+        if '.' in login or login.startswith('$'):
+            return False, root
+
+        user_field = 'users.%s' % login
+        spec = {user_field: {'$exists': True}}
+        for permission in Permission.get_collection().find(spec, fields=['resource', user_field]):
+            parts = _resource_parts(permission['resource'])
+            # only resources in the canonical /a/b/ form are ever looked up
+            if permission['resource'] != _resource_path(parts):
+                continue
+            node = root
+            for part in parts:
+                node = node[1].setdefault(part, (set(), {}))
+            node[0].update(permission['users'][login])
+        return False, root
+
+
+def authorization_index():
+    """
+    @return: the process wide authorization index
+    @rtype:  AuthorizationIndex
+    """
+    global _AUTHORIZATION_INDEX
+    if _AUTHORIZATION_INDEX is None:
+        with _AUTHORIZATION_INDEX_LOCK:
+            if _AUTHORIZATION_INDEX is None:
+                _AUTHORIZATION_INDEX = AuthorizationIndex()
+    return _AUTHORIZATION_INDEX
+
+
+def _resource_parts(resource):
+    return [p for p in resource.split('/') if p]
+
+
+def _resource_path(parts):
+    if not parts:
+        return '/'
+    return '/%s/' % '/'.join(parts)
+
+
 class UserQueryManager(object):
 
     """
@@ -127,24 +258,10 @@ class UserQueryManager(object):
         @rtype: bool
         @return: True if the user is authorized for the operation on the resource,
                  False otherwise
-        """
-        if self.is_superuser(login):
-            return True
-
-        permission_query_manager = factory.permission_query_manager()
 
-        parts = [p for p in resource.split('/') if p]
-        while parts:
-            current_resource = '/%s/' % '/'.join(parts)
-            permission = permission_query_manager.find_by_resource(current_resource)
-            if permission is not None:
-                if operation in permission['users'].get(login, []):
-                    return True
-            parts = parts[:-1]
-
-        permission = Permission.get_collection().find_one({'resource' : '/'})
-        return (permission is not None and
-                operation in permission['users'].get(login, []))
+        @raise MissingResource: if the user does not exist
+        """
+        return authorization_index().is_authorized(resource, login, operation)
 
 
     def is_last_super_user(self, login):
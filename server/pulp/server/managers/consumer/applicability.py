@@ -17,6 +17,9 @@ Contains content applicability management classes
 
 from gettext import gettext as _
 from logging import getLogger
+from multiprocessing.pool import ThreadPool
+import threading
+import time
 
 from celery import task
 
@@ -29,11 +32,23 @@ from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model.repository import Repo
 from pulp.server.managers import factory as managers
 from pulp.server.managers.consumer.query import ConsumerQueryManager
-from pulp.server.async.tasks import Task
+from pulp.server.async.task_status_manager import TaskStatusManager
+from pulp.server.async.tasks import Task, get_current_task_id
 
 
 logger = getLogger(__name__)
 
+# Number of existing applicabilities whose profiles are looked up together and
+# regenerated as a unit when regenerating applicability for repositories
+REGENERATION_BATCH_SIZE = 100
+
+# Number of threads calculating applicability concurrently; profilers spend
+# most of their time waiting on the database
+REGENERATION_WORKERS = 4
+
+# Key in the task's progress report under which regeneration progress is reported
+REGENERATION_PROGRESS_KEY = 'applicability_regeneration'
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -117,12 +132,20 @@ class ApplicabilityRegenerationManager(object):
             manager.regenerate_applicability(profile_hash, content_type, profile_id, repo_id)
 
     @staticmethod
-    def regenerate_applicability_for_repos(repo_criteria):
+    def regenerate_applicability_for_repos(repo_criteria, force=False):
         """
         Regenerate and save applicability data affected by given updated repositories.
 
+        Applicability data already calculated against the current content
+        revision of a repository is skipped unless force is True. Since the
+        applicability data is stored per profile hash, a changed profile always
+        results in new applicability data.
+
         :param repo_criteria: The repo selection criteria
         :type repo_criteria: dict
+        :param force: regenerate all applicability data, even if the repository
+                      content has not changed since it was calculated
+        :type force: bool
         """
         repo_criteria = Criteria.from_dict(repo_criteria)
         repo_query_manager = managers.repo_query_manager()
@@ -131,33 +154,115 @@ class ApplicabilityRegenerationManager(object):
         repo_criteria.fields = ['id']
         repo_ids = [r['id'] for r in repo_query_manager.find_by_criteria(repo_criteria)]
 
-        for repo_id in repo_ids:
-            # Find all existing applicabilities for given repo_id
-            existing_applicabilities = RepoProfileApplicability.get_collection().find(
-                {'repo_id': repo_id})
-            for existing_applicability in existing_applicabilities:
-                # Convert cursor to RepoProfileApplicability object
-                existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
-                profile_hash = existing_applicability['profile_hash']
-                unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     fields=['id', 'content_type'])
-                if unit_profile is None:
-                    # Unit profiles change whenever packages are installed or removed on consumers,
-                    # and it is possible that existing_applicability references a UnitProfile
-                    # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
-                    # that will identify these dangling references and remove them.
-                    continue
-
-                # Regenerate applicability data for given unit_profile and repo id
-                ApplicabilityRegenerationManager.regenerate_applicability(profile_hash, 
-                                                                          unit_profile['content_type'],
-                                                                          unit_profile['id'],
-                                                                          repo_id,
-                                                                          existing_applicability)
+        progress = RegenerationProgress(len(repo_ids))
+        pool = ThreadPool(REGENERATION_WORKERS)
+        try:
+            for repo_id in repo_ids:
+                ApplicabilityRegenerationManager._regenerate_applicability_for_repo(
+                    repo_id, pool, progress, force)
+                progress.repo_processed()
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _regenerate_applicability_for_repo(repo_id, pool, progress, force=False):
+        """
+        Regenerate all existing applicability data for a single repository.
+
+        The existing applicabilities are streamed in batches. The unit profiles
+        for each batch are looked up with a single query and the applicability
+        is calculated on the given thread pool.
+
+        :param repo_id:  id of the repository whose applicability data is regenerated
+        :type  repo_id:  basestring
+        :param pool:     thread pool used to calculate applicability
+        :type  pool:     multiprocessing.pool.ThreadPool
+        :param progress: tracks and reports the progress of the regeneration
+        :type  progress: RegenerationProgress
+        :param force:    if False, applicabilities calculated against the current content
+                         revision of the repository are skipped
+        :type  force:    bool
+        """
+        # The repo content types and revision are the same for every profile. The
+        # revision is read before the content types so a concurrent change in the
+        # repo results in an outdated revision rather than outdated data
+        repo_content_revision = ApplicabilityRegenerationManager._get_repo_content_revision(
+            repo_id)
+        repo_content_types = ApplicabilityRegenerationManager._get_existing_repo_content_types(
+            repo_id)
+
+        # Find all existing applicabilities for given repo_id; the old applicability
+        # data is not needed since it is about to be replaced
+        spec = {'repo_id': repo_id}
+        if not force:
+            spec['repo_content_revision'] = {'$ne': repo_content_revision}
+        existing_applicabilities = RepoProfileApplicability.get_collection().find(
+            spec, fields=['profile_hash', 'repo_id', 'profile'])
+
+        batch = []
+        for existing_applicability in existing_applicabilities:
+            batch.append(existing_applicability)
+            if len(batch) >= REGENERATION_BATCH_SIZE:
+                ApplicabilityRegenerationManager._regenerate_applicability_batch(
+                    repo_id, repo_content_types, repo_content_revision, batch, pool)
+                progress.applicabilities_processed(len(batch))
+                batch = []
+
+        if batch:
+            ApplicabilityRegenerationManager._regenerate_applicability_batch(
+                repo_id, repo_content_types, repo_content_revision, batch, pool)
+            progress.applicabilities_processed(len(batch))
+
+    @staticmethod
+    def _regenerate_applicability_batch(repo_id, repo_content_types, repo_content_revision,
+                                        existing_applicabilities, pool):
+        """
+        Regenerate a batch of existing applicabilities of a single repository.
+
+        :param repo_id:                  id of the repository
+        :type  repo_id:                  basestring
+        :param repo_content_types:       content types with units in the repository
+        :type  repo_content_types:       list
+        :param repo_content_revision:    content revision of the repository
+        :type  repo_content_revision:    int
+        :param existing_applicabilities: RepoProfileApplicability documents, without the
+                                         applicability data
+        :type  existing_applicabilities: list of dict
+        :param pool:                     thread pool used to calculate applicability
+        :type  pool:                     multiprocessing.pool.ThreadPool
+        """
+        profile_hashes = list(set(a['profile_hash'] for a in existing_applicabilities))
+        unit_profiles = UnitProfile.get_collection().find(
+            {'profile_hash': {'$in': profile_hashes}}, fields=['id', 'profile_hash', 'content_type'])
+        unit_profiles_by_hash = dict((p['profile_hash'], p) for p in unit_profiles)
+
+        regenerate_args = []
+        for existing_applicability in existing_applicabilities:
+            profile_hash = existing_applicability['profile_hash']
+            unit_profile = unit_profiles_by_hash.get(profile_hash)
+            if unit_profile is None:
+                # Unit profiles change whenever packages are installed or removed on consumers,
+                # and it is possible that existing_applicability references a UnitProfile
+                # that no longer exists. This is harmless, as Pulp has a monthly cleanup task
+                # that will identify these dangling references and remove them.
+                continue
+
+            # Convert the document to a RepoProfileApplicability object
+            existing_applicability = RepoProfileApplicability(applicability=None,
+                                                              **dict(existing_applicability))
+            regenerate_args.append((profile_hash, unit_profile['content_type'],
+                                    unit_profile['id'], repo_id, existing_applicability,
+                                    repo_content_types, repo_content_revision))
+
+        # Iterating the results re-raises any exception from the workers
+        for result in pool.imap_unordered(_regenerate_applicability, regenerate_args):
+            pass
 
     @staticmethod
     def regenerate_applicability(profile_hash, content_type, profile_id,
-                                 bound_repo_id, existing_applicability=None):
+                                 bound_repo_id, existing_applicability=None,
+                                 repo_content_types=None, repo_content_revision=None):
         """
         Regenerate and save applicability data for given profile and bound repo id.
         If existing_applicability is not None, replace it with the new applicability data.
@@ -177,6 +282,14 @@ class ApplicabilityRegenerationManager(object):
 
         :param existing_applicability: existing RepoProfileApplicability object to be replaced
         :type existing_applicability: pulp.server.db.model.consumer.RepoProfileApplicability
+
+        :param repo_content_types: content types with units in the bound repo; looked up
+                                   if not specified
+        :type repo_content_types: list or None
+
+        :param repo_content_revision: content revision of the bound repo, recorded with the
+                                      applicability data; looked up if not specified
+        :type repo_content_revision: int or None
         """
         profiler_conduit = ProfilerConduit()
         # Get the profiler for content_type of given unit_profile
@@ -189,8 +302,14 @@ class ApplicabilityRegenerationManager(object):
             return
 
         # Find out which content types have unit counts greater than zero in the bound repo
-        repo_content_types = ApplicabilityRegenerationManager._get_existing_repo_content_types(
-            bound_repo_id)
+        if repo_content_revision is None:
+            # Read before the content types so a concurrent change in the repo
+            # results in an outdated revision rather than outdated data
+            repo_content_revision = ApplicabilityRegenerationManager._get_repo_content_revision(
+                bound_repo_id)
+        if repo_content_types is None:
+            repo_content_types = ApplicabilityRegenerationManager._get_existing_repo_content_types(
+                bound_repo_id)
         # Get the intersection of existing types in the repo and the types that the profiler
         # handles. If the intersection is not empty, regenerate applicability
         if (set(repo_content_types) & set(profiler.metadata()['types'])):
@@ -216,13 +335,15 @@ class ApplicabilityRegenerationManager(object):
             if existing_applicability:
                 # Update existing applicability object
                 existing_applicability.applicability = applicability
+                existing_applicability.repo_content_revision = repo_content_revision
                 existing_applicability.save()
             else:
                 # Create a new RepoProfileApplicability object and save it in the db
                 RepoProfileApplicability.objects.create(profile_hash,
                                                         bound_repo_id,
                                                         unit_profile['profile'],
-                                                        applicability)
+                                                        applicability,
+                                                        repo_content_revision)
 
     @staticmethod
     def _get_existing_repo_content_types(repo_id):
@@ -242,6 +363,22 @@ class ApplicabilityRegenerationManager(object):
                     repo_content_types_with_non_zero_unit_count.append(content_type)
         return repo_content_types_with_non_zero_unit_count
 
+    @staticmethod
+    def _get_repo_content_revision(repo_id):
+        """
+        Return the current content revision of the given repository.
+
+        :param repo_id: The repo_id for the repository
+        :type  repo_id: basestring
+        :return:        content revision of the repository; 0 if the repository
+                        does not exist or its content never changed
+        :rtype:         int
+        """
+        repo = Repo.get_collection().find_one({'id': repo_id}, fields=['content_revision'])
+        if repo is None:
+            return 0
+        return repo.get('content_revision', 0)
+
     @staticmethod
     def _is_existing_applicability(repo_id, profile_hash):
         """
@@ -279,6 +416,79 @@ class ApplicabilityRegenerationManager(object):
         return plugin, cfg
 
 
+def _regenerate_applicability(args):
+    """
+    Thread pool entry point for ApplicabilityRegenerationManager.regenerate_applicability.
+
+    :param args: positional arguments to regenerate_applicability
+    :type  args: tuple
+    """
+    ApplicabilityRegenerationManager.regenerate_applicability(*args)
+
+
+class RegenerationProgress(object):
+    """
+    Tracks the progress and throughput of an applicability regeneration and
+    reports it on the progress report of the current task, if any.
+    """
+
+    def __init__(self, total_repos):
+        """
+        :param total_repos: number of repositories whose applicability is regenerated
+        :type  total_repos: int
+        """
+        self.total_repos = total_repos
+        self.processed_repos = 0
+        self.processed_applicabilities = 0
+        self.start_time = time.time()
+        self.task_id = get_current_task_id()
+        self._lock = threading.Lock()
+        self.update_task()
+
+    def repo_processed(self):
+        """
+        Record that all applicabilities of a repository were regenerated.
+        """
+        with self._lock:
+            self.processed_repos += 1
+        self.update_task()
+
+    def applicabilities_processed(self, count):
+        """
+        Record that a number of applicabilities were regenerated.
+
+        :param count: number of applicabilities regenerated
+        :type  count: int
+        """
+        with self._lock:
+            self.processed_applicabilities += count
+        self.update_task()
+
+    def report(self):
+        """
+        :return: progress and throughput of the regeneration
+        :rtype:  dict
+        """
+        with self._lock:
+            elapsed = time.time() - self.start_time
+            rate = self.processed_applicabilities / elapsed if elapsed > 0 else 0.0
+            return {'repos_total': self.total_repos,
+                    'repos_processed': self.processed_repos,
+                    'applicabilities_processed': self.processed_applicabilities,
+                    'elapsed_seconds': elapsed,
+                    'applicabilities_per_second': rate}
+
+    def update_task(self):
+        """
+        Write the current progress to the status of the task running the
+        regeneration. This has no effect when not running within a task.
+        """
+        if self.task_id is None:
+            return
+        delta = {'progress_report': {REGENERATION_PROGRESS_KEY: self.report()}}
+        TaskStatusManager.update_task_status(self.task_id, delta)
+
+
 regenerate_applicability_for_consumers = task(
     ApplicabilityRegenerationManager.regenerate_applicability_for_consumers, base=Task,
     ignore_result=True)
@@ -307,7 +517,7 @@ class RepoProfileApplicabilityManager(object):
     """
     This class is useful for querying for RepoProfileApplicability objects in the database.
     """
-    def create(self, profile_hash, repo_id, profile, applicability):
+    def create(self, profile_hash, repo_id, profile, applicability, repo_content_revision=None):
         """
         Create and return a RepoProfileApplicability object.
 
@@ -321,12 +531,15 @@ class RepoProfileApplicabilityManager(object):
         :param applicability: A dictionary structure mapping unit type IDs to lists of applicable
                               Unit IDs.
         :type  applicability: dict
+        :param repo_content_revision: The content revision of the repo the applicability
+                                      data was calculated against
+        :type  repo_content_revision: int
         :return:              A new RepoProfileApplicability object
         :rtype:               pulp.server.db.model.consumer.RepoProfileApplicability
         """
         applicability = RepoProfileApplicability(
             profile_hash=profile_hash, repo_id=repo_id, profile=profile,
-            applicability=applicability)
+            applicability=applicability, repo_content_revision=repo_content_revision)
         applicability.save()
         return applicability
 
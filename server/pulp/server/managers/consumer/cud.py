@@ -95,6 +95,8 @@ class ConsumerManager(object):
         cert_gen_manager = factory.cert_generation_manager()
         expiration_date = config.config.getint('security', 'consumer_cert_expiration')
         key, certificate = cert_gen_manager.make_cert(consumer_id, expiration_date, uid=str(_id))
+        # certificates cached for an earlier consumer with the same id are no longer valid
+        factory.authentication_manager().invalidate_consumer_credentials(consumer_id)
 
         factory.consumer_history_manager().record_event(consumer_id, 'consumer_registered')
 
@@ -145,6 +147,8 @@ class ConsumerManager(object):
                 'consumer [%s]' % consumer_id)
             raise PulpExecutionException("database-error"), None, sys.exc_info()[2]
 
+        factory.authentication_manager().invalidate_consumer_credentials(consumer_id)
+
         # remove the consumer from any groups it was a member of
         group_manager = factory.consumer_group_manager()
         group_manager.remove_consumer_from_groups(consumer_id)
@@ -13,7 +13,7 @@ from logging import getLogger
 
 from pymongo import ASCENDING
 
-from pulp.server.db.model.content import ContentCatalog
+from pulp.server.db.model.content import ContentCatalog, ContentCatalogChecksum
 
 
 log = getLogger(__name__)
@@ -24,6 +24,9 @@ log = getLogger(__name__)
 # in the catalog after it has expired.
 GRACE_PERIOD = 3600  # 1 hour.
 
+# The maximum number of locators included in each query issued by find_all().
+FIND_BATCH_SIZE = 1000
+
 
 class ContentCatalogManager(object):
     """
@@ -60,6 +63,31 @@ class ContentCatalogManager(object):
         entry = ContentCatalog(source_id, expires, type_id, unit_key, url)
         collection.insert(entry, safe=True)
 
+    def add_entries(self, source_id, expires, entries, generation=None, source_url=None):
+        """
+        Add entries to the content catalog using a single bulk insert.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        :param entries: A list of tuple: (type_id, unit_key, url).
+        :type entries: list
+        :param generation: An optional generation stored with the entries.
+            See: purge_generations().
+        :type generation: str
+        :param source_url: The optional content source URL refreshed to add the entries.
+            See: extend_expiration().
+        :type source_url: str
+        """
+        collection = ContentCatalog.get_collection()
+        documents = []
+        for type_id, unit_key, url in entries:
+            entry = ContentCatalog(
+                source_id, expires, type_id, unit_key, url, generation, source_url)
+            documents.append(entry)
+        if documents:
+            collection.insert(documents, safe=True)
+
     def delete_entry(self, source_id, type_id, unit_key):
         """
         Delete an entry from the content catalog.
@@ -75,15 +103,47 @@ class ContentCatalogManager(object):
         query = {'source_id': source_id, 'locator': locator}
         collection.remove(query, safe=True)
 
+    def delete_entries(self, source_id, keys):
+        """
+        Delete entries from the content catalog using a single query.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param keys: A list of tuple: (type_id, unit_key).
+        :type keys: list
+        """
+        collection = ContentCatalog.get_collection()
+        locators = list(set([ContentCatalog.get_locator(t, k) for t, k in keys]))
+        if not locators:
+            return
+        query = {'source_id': source_id, 'locator': {'$in': locators}}
+        collection.remove(query, safe=True)
+
     def purge(self, source_id):
         """
         Purge (delete) entries from the content catalog belonging
-        to the specified content source by ID.
+        to the specified content source by ID.  The checksums recorded
+        for the source's URLs are purged as well.
         :param source_id: A content source ID.
         :type source_id: str
         """
-        collection = ContentCatalog.get_collection()
         query = {'source_id': source_id}
+        collection = ContentCatalog.get_collection()
+        collection.remove(query, safe=True)
+        collection = ContentCatalogChecksum.get_collection()
+        collection.remove(query, safe=True)
+
+    def purge_generations(self, source_id, generation):
+        """
+        Purge (delete) entries from the content catalog belonging to the
+        specified content source that were not added in the specified generation.
+        Used to replace all of the source's entries at once after a refresh.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param generation: The generation to be kept.
+        :type generation: str
+        """
+        collection = ContentCatalog.get_collection()
+        query = {'source_id': source_id, 'generation': {'$ne': generation}}
         collection.remove(query, safe=True)
 
     def purge_expired(self, grace_period=GRACE_PERIOD):
@@ -127,29 +187,107 @@ class ContentCatalogManager(object):
         :return: A list of matching entries.
         :rtype: list
         """
-        collection = ContentCatalog.get_collection()
         locator = ContentCatalog.get_locator(type_id, unit_key)
-        query = {
-            'locator': locator,
-            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
-        }
-        newest_by_source = {}
-        for entry in collection.find(query, sort=[('_id', ASCENDING)]):
-            newest_by_source[entry['source_id']] = entry
-        return newest_by_source.values()
+        return self.find_all([locator]).get(locator, [])
 
-    def has_entries(self, source_id):
+    def find_all(self, locators, batch_size=FIND_BATCH_SIZE):
         """
-        Get whether the specified content source has entries in the catalog.
+        Find entries in the content catalog matching any of the specified
+        locators.  The locators are queried in batches of (batch_size) using $in
+        so that resolving a large number of units takes a few round trips
+        rather than one query per unit.  As with find(), only the newest
+        entry for each source is included for each locator.
+        :param locators: A list of locators.
+            See: ContentCatalog.get_locator().
+        :type locators: iterable
+        :param batch_size: The maximum number of locators included in each query.
+        :type batch_size: int
+        :return: A dictionary of: list of matching entries keyed by locator.
+            Locators without entries are not included.
+        :rtype: dict
+        """
+        collection = ContentCatalog.get_collection()
+        locators = list(set(locators))
+        expiration = ContentCatalog.get_expiration(0)
+        newest = {}
+        for n in range(0, len(locators), batch_size):
+            query = {
+                'locator': {'$in': locators[n:n + batch_size]},
+                'expiration': {'$gte': expiration}
+            }
+            for entry in collection.find(query, sort=[('_id', ASCENDING)]):
+                newest[(entry['locator'], entry['source_id'])] = entry
+        found = {}
+        for key, entry in newest.items():
+            found.setdefault(key[0], []).append(entry)
+        return found
+
+    def has_entries(self, source_id, source_url=None, grace_period=0):
+        """
+        Get whether the specified content source has unexpired entries in the catalog.
         :param source_id: A content source ID.
         :type source_id: str
+        :param source_url: An optional content source URL.  When specified, only
+            entries added by refreshing the URL are considered.
+        :type source_url: str
+        :param grace_period: Entries that expired less than this number of seconds
+            ago are considered unexpired.  See: purge_expired().
+        :type grace_period: int
         :return: True if has entries.
         :rtype: bool
         """
         collection = ContentCatalog.get_collection()
         query = {
             'source_id': source_id,
-            'expiration': {'$gte': ContentCatalog.get_expiration(0)}
+            'expiration': {'$gte': ContentCatalog.get_expiration(0) - grace_period}
         }
+        if source_url is not None:
+            query['source_url'] = source_url
         cursor = collection.find(query)
         return cursor.count() > 0
+
+    def extend_expiration(self, source_id, source_url, expires):
+        """
+        Extend the expiration of the entries added by refreshing the specified
+        content source URL.  Used when the URL is not refreshed because its
+        content has not changed.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param source_url: A content source URL.
+        :type source_url: str
+        :param expires: The entry expiration in seconds.
+        :type expires: int
+        """
+        collection = ContentCatalog.get_collection()
+        query = {'source_id': source_id, 'source_url': source_url}
+        update = {'$set': {'expiration': ContentCatalog.get_expiration(expires)}}
+        collection.update(query, update, multi=True, safe=True)
+
+    def get_checksum(self, source_id, url):
+        """
+        Get the checksum recorded by the last successful refresh using the URL.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param url: A content source URL.
+        :type url: str
+        :return: The checksum or None when not recorded.
+        :rtype: str
+        """
+        collection = ContentCatalogChecksum.get_collection()
+        document = collection.find_one({'source_id': source_id, 'url': url})
+        if document is not None:
+            return document['checksum']
+
+    def set_checksum(self, source_id, url, checksum):
+        """
+        Record the checksum of a successful refresh using the URL.
+        :param source_id: A content source ID.
+        :type source_id: str
+        :param url: A content source URL.
+        :type url: str
+        :param checksum: The checksum reported by the cataloger.
+        :type checksum: str
+        """
+        collection = ContentCatalogChecksum.get_collection()
+        query = {'source_id': source_id, 'url': url}
+        collection.update(query, {'$set': {'checksum': checksum}}, upsert=True, safe=True)
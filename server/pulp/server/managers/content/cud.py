@@ -1,8 +1,11 @@
 import uuid
 
+from pymongo.errors import DuplicateKeyError
+
 from pulp.common import dateutils
 from pulp.plugins.types import database as content_types_db
 from pulp.server.exceptions import InvalidValue
+import pulp.server.managers.factory as manager_factory
 
 
 class ContentManager(object):
@@ -35,6 +38,46 @@ class ContentManager(object):
         collection.insert(unit_doc, safe=True)
         return unit_id
 
+    def add_content_units(self, content_type, units_metadata):
+        """
+        Add multiple content units of the same type to the corresponding pulp
+        db collection using a single bulk insert.
+
+        Inserts that fail because a unit with the same unit key already exists
+        do not prevent the remaining units from being added. The id for each
+        such unit is returned as None so the caller can decide how to reconcile
+        it with the existing unit.
+        @param content_type: unique id of content collection
+        @type content_type: str
+        @param units_metadata: list of content unit metadata
+        @type units_metadata: list of dict
+        @return: list of generated unit ids, in the same order as
+                 units_metadata; None for each unit that was not inserted
+        @rtype: list of str or None
+        """
+        if not units_metadata:
+            return []
+        collection = content_types_db.type_units_collection(content_type)
+        now = dateutils.now_utc_timestamp()
+        unit_docs = []
+        for unit_metadata in units_metadata:
+            unit_doc = {
+                '_id': str(uuid.uuid4()),
+                '_content_type_id': content_type,
+                '_last_updated': now
+            }
+            unit_doc.update(unit_metadata)
+            unit_docs.append(unit_doc)
+        unit_ids = [d['_id'] for d in unit_docs]
+        try:
+            collection.insert(unit_docs, safe=True, continue_on_error=True)
+        except DuplicateKeyError:
+            # only the last error is reported, so ask the db which ones made it
+            cursor = collection.find({'_id': {'$in': unit_ids}}, fields=['_id'])
+            inserted = set(d['_id'] for d in cursor)
+            return [i if i in inserted else None for i in unit_ids]
+        return unit_ids
+
     def update_content_unit(self, content_type, unit_id, unit_metadata_delta):
         """
         Update a content unit's stored metadata.
@@ -48,6 +91,8 @@ class ContentManager(object):
         unit_metadata_delta['_last_updated'] = dateutils.now_utc_timestamp()
         collection = content_types_db.type_units_collection(content_type)
         collection.update({'_id': unit_id}, {'$set': unit_metadata_delta}, safe=True)
+        # the unit may be in any number of repos, all of which now have changed content
+        manager_factory.repo_manager().bump_content_revision_for_units(content_type, [unit_id])
 
     def remove_content_unit(self, content_type, unit_id):
         """
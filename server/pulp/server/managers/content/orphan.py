@@ -18,6 +18,7 @@ import shutil
 from gettext import gettext as _
 
 from celery import task
+import pymongo
 
 from pulp.plugins.types import database as content_types_db
 from pulp.server import config as pulp_config, exceptions as pulp_exceptions
@@ -28,6 +29,12 @@ from pulp.server.db.model.repository import RepoContentUnit
 
 logger = logging.getLogger(__name__)
 
+# Number of orphan candidates re-checked and removed per database round trip
+ORPHAN_BATCH_SIZE = 1000
+
+# Marks the end of the stream of associated unit ids during the merge
+_END_OF_IDS = object()
+
 
 class OrphanManager(object):
 
@@ -107,18 +114,65 @@ class OrphanManager(object):
 
         fields = fields if fields is not None else ['_id']
         content_units_collection = content_types_db.type_units_collection(content_type_id)
-        repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, fields=fields):
+        # Both the content units and their associations are streamed sorted by
+        # unit id, so the orphans fall out of a single merge of the two cursors
+        # without a query per unit or holding either side in memory.
+        content_units_cursor = content_units_collection.find({}, fields=fields)
+        content_units_cursor.sort('_id', pymongo.ASCENDING)
+        associated_unit_ids = OrphanManager._generate_associated_unit_ids(content_type_id)
+        associated_unit_id = next(associated_unit_ids, _END_OF_IDS)
+
+        for content_unit in content_units_cursor:
 
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+            while associated_unit_id is not _END_OF_IDS and \
+                    associated_unit_id < content_unit['_id']:
+                associated_unit_id = next(associated_unit_ids, _END_OF_IDS)
 
-            if repo_content_units_cursor.count() > 0:
+            if associated_unit_id == content_unit['_id']:
                 continue
 
             yield content_unit
 
+    @staticmethod
+    def _generate_associated_unit_ids(content_type_id):
+        """
+        Return a generator of the ids of all units of the given content type
+        that are associated with at least one repository, in ascending order.
+        Ids associated with multiple repositories are repeated.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :return: generator of associated unit ids
+        :rtype: generator
+        """
+        repo_content_units_collection = RepoContentUnit.get_collection()
+        cursor = repo_content_units_collection.find({'unit_type_id': content_type_id},
+                                                    fields=['unit_id'])
+        # force the unit_id index so the sort is never done in memory
+        cursor.hint([('unit_id', pymongo.DESCENDING)])
+        cursor.sort('unit_id', pymongo.ASCENDING)
+
+        for repo_content_unit in cursor:
+            yield repo_content_unit['unit_id']
+
+    @staticmethod
+    def _associated_unit_ids(content_type_id, content_unit_ids):
+        """
+        Determine which of the given units are associated with a repository.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :param content_unit_ids: ids of the content units to check
+        :type content_unit_ids: list
+        :return: ids of the given units that are associated with a repository
+        :rtype: set
+        """
+        repo_content_units_collection = RepoContentUnit.get_collection()
+        spec = {'unit_type_id': content_type_id, 'unit_id': {'$in': content_unit_ids}}
+        cursor = repo_content_units_collection.find(spec, fields=['unit_id'])
+        return set(repo_content_unit['unit_id'] for repo_content_unit in cursor)
+
     @staticmethod
     def generate_orphans_by_type_with_unit_keys(content_type_id):
         """
@@ -153,15 +207,15 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id):
-
-            if content_unit['_id'] != content_unit_id:
-                continue
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        content_unit = content_units_collection.find_one({'_id': content_unit_id}, fields=['_id'])
 
-            return content_unit
+        if content_unit is None or \
+                OrphanManager._associated_unit_ids(content_type_id, [content_unit_id]):
+            raise pulp_exceptions.MissingResource(content_type=content_type_id,
+                                                  content_unit=content_unit_id)
 
-        raise pulp_exceptions.MissingResource(content_type=content_type_id,
-                                              content_unit=content_unit_id)
+        return content_unit
 
     @staticmethod
     def delete_all_orphans(flush=True):
@@ -232,24 +286,87 @@ class OrphanManager(object):
         """
 
         content_units_collection = content_types_db.type_units_collection(content_type_id)
+        fields = ['_id', '_storage_path']
+
+        if content_unit_ids is None:
+            orphans = OrphanManager.generate_orphans_by_type(content_type_id, fields=fields)
+        else:
+            orphans = OrphanManager._generate_orphans_by_ids(content_type_id, content_unit_ids,
+                                                             fields)
+
+        batch = []
+        for content_unit in orphans:
+            batch.append(content_unit)
+            if len(batch) >= ORPHAN_BATCH_SIZE:
+                OrphanManager._delete_orphan_batch(content_type_id, content_units_collection,
+                                                   batch)
+                batch = []
+
+        if batch:
+            OrphanManager._delete_orphan_batch(content_type_id, content_units_collection, batch)
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id,
-                                                                   fields=['_id', '_storage_path']):
+        # this forces the database to flush any cached changes to the disk
+        # in the background; for example: the unsafe deletes in the batches above
+        if flush:
+            db_connection.flush_database()
+
+    @staticmethod
+    def _generate_orphans_by_ids(content_type_id, content_unit_ids, fields):
+        """
+        Return a generator of the content units among the given ids that are
+        orphaned, looking them up in batches.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :param content_unit_ids: ids of the content units to consider
+        :type content_unit_ids: iterable
+        :param fields: list of fields to include in each content unit
+        :type fields: list
+        :return: generator of orphaned content units
+        :rtype: generator
+        """
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        content_unit_ids = list(set(content_unit_ids))
 
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
+        for i in range(0, len(content_unit_ids), ORPHAN_BATCH_SIZE):
+            batch_ids = content_unit_ids[i:i + ORPHAN_BATCH_SIZE]
+            associated_ids = OrphanManager._associated_unit_ids(content_type_id, batch_ids)
+            orphaned_ids = [u for u in batch_ids if u not in associated_ids]
+            if not orphaned_ids:
                 continue
+            for content_unit in content_units_collection.find({'_id': {'$in': orphaned_ids}},
+                                                              fields=fields):
+                yield content_unit
+
+    @staticmethod
+    def _delete_orphan_batch(content_type_id, content_units_collection, content_units):
+        """
+        Delete a batch of orphaned content units along with their bits on disk.
+
+        The units are checked once more for associations right before removal
+        so that units associated since they were found to be orphaned survive.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :param content_units_collection: collection the content units are stored in
+        :type content_units_collection: pulp.server.db.connection.PulpCollection
+        :param content_units: orphaned content units, with the `_storage_path` field
+        :type content_units: list of dict
+        """
+        associated_ids = OrphanManager._associated_unit_ids(
+            content_type_id, [u['_id'] for u in content_units])
+        content_units = [u for u in content_units if u['_id'] not in associated_ids]
+        if not content_units:
+            return
 
-            content_units_collection.remove(content_unit['_id'], safe=False)
+        content_units_collection.remove({'_id': {'$in': [u['_id'] for u in content_units]}},
+                                        safe=False)
 
+        for content_unit in content_units:
             storage_path = content_unit.get('_storage_path', None)
             if storage_path is not None:
                 OrphanManager.delete_orphaned_file(storage_path)
 
-        # this forces the database to flush any cached changes to the disk
-        # in the background; for example: the unsafe deletes in the loop above
-        if flush:
-            db_connection.flush_database()
-
     @staticmethod
     def delete_orphaned_file(path):
         """
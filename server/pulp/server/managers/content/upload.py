@@ -11,26 +11,195 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 from celery import task
+from cStringIO import StringIO
 from gettext import gettext as _
 from uuid import uuid4
+import hashlib
 import logging
 import os
+import itertools
 import sys
+import threading
 
 from pulp.plugins.conduits.upload import UploadConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.server import config as pulp_config
 from pulp.server.async.tasks import Task
+from pulp.server.compat import json
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.exceptions import (PulpDataException, MissingResource, PulpExecutionException,
-                                    PulpException)
+                                    PulpException, InvalidValue)
 import pulp.server.managers.factory as manager_factory
 import pulp.server.managers.repo._common as repo_common_utils
 
 
 logger = logging.getLogger(__name__)
 
+# size of the chunks uploaded segments are streamed to disk in
+CHUNK_SIZE = 256 * 1024
+
+# checksums calculated while an upload is being written
+CHECKSUM_TYPES = ('md5', 'sha1', 'sha256')
+
+# the most uploads whose running checksums are kept in memory at once
+MAX_UPLOAD_STATES = 100
+
+_UPLOAD_STATES = {}
+_UPLOAD_STATES_LOCK = threading.Lock()
+_STATE_SEQUENCE = itertools.count()
+
+
+class UploadState(object):
+    """
+    Running checksums of an upload in progress in this process. The checksums
+    cover the bytes written contiguously from the start of the file. A segment
+    that starts where they end is digested while it is streamed to disk;
+    segments written further into the file are remembered and digested from
+    the file once the gap before them has been filled.
+
+    Once the checksums are extended, they are recorded in a state file next to
+    the upload along with the size and modification time of the upload they
+    describe, so that the process importing the upload can use them.
+
+    @ivar size: number of bytes from the start of the upload the checksums cover
+    @type size: int
+    @ivar digests: running digest for each of CHECKSUM_TYPES
+    @type digests: dict
+    @ivar pending: start offset to end offset of the segments written past size
+    @type pending: dict
+    @ivar writing: start and end offsets of the segments being written
+    @type writing: list of tuple
+    @ivar digesting: True while a thread is extending the checksums
+    @type digesting: bool
+    @ivar valid: False once the upload was written in a way the checksums cannot
+                 follow, such as overlapping segments
+    @type valid: bool
+    """
+
+    def __init__(self, upload_id):
+        self.upload_id = upload_id
+        self.sequence = _STATE_SEQUENCE.next()
+        self.size = 0
+        self.digests = dict([(t, hashlib.new(t)) for t in CHECKSUM_TYPES])
+        self.pending = {}
+        self.writing = []
+        self.digesting = False
+        self.valid = True
+        self.lock = threading.Lock()
+
+    def start_segment(self, offset, length):
+        """
+        Registers a segment about to be written.
+
+        @return: True if the caller should feed the segment to update() as it
+                 is written
+        @rtype:  bool
+        """
+        end = offset + length
+        with self.lock:
+            ranges = self.writing + self.pending.items() + [(0, self.size)]
+            self.writing.append((offset, end))
+            if not self.valid:
+                return False
+            for start, stop in ranges:
+                if offset < stop and start < end:
+                    # the bytes may differ from those already digested
+                    self._invalidate()
+                    return False
+            if offset == self.size and not self.digesting:
+                self.digesting = True
+                return True
+            return False
+
+    def update(self, data):
+        """
+        Extends the checksums with the next chunk of the segment being streamed.
+        Only the thread that was told to do so by start_segment() may call this.
+        """
+        for digest in self.digests.values():
+            digest.update(data)
+
+    def finish_segment(self, offset, length, written, digested):
+        """
+        Records that a segment registered with start_segment() was written and
+        digests any segments that are now contiguous with the checksums.
+
+        @param offset: offset the segment started at
+        @type  offset: int
+        @param length: length the segment was registered with
+        @type  length: int
+        @param written: number of bytes of the segment written to disk
+        @type  written: int
+        @param digested: whether the segment was fed to update()
+        @type  digested: bool
+        """
+        file_path = ContentUploadManager._upload_file_path(self.upload_id)
+        with self.lock:
+            self.writing.remove((offset, offset + length))
+            if digested:
+                self.size = offset + written
+                self.digesting = False
+            elif self.valid and written:
+                self.pending[offset] = offset + written
+        self._catch_up(file_path)
+
+    def _catch_up(self, file_path):
+        while True:
+            with self.lock:
+                if not self.valid or self.digesting or self.size not in self.pending:
+                    self._record(file_path)
+                    return
+                start = self.size
+                end = self.pending.pop(start)
+                self.digesting = True
+            try:
+                f = open(file_path, 'rb')
+                try:
+                    f.seek(start)
+                    remaining = end - start
+                    while remaining > 0:
+                        data = f.read(min(CHUNK_SIZE, remaining))
+                        if not data:
+                            raise IOError(_('Upload is shorter than its written segments'))
+                        self.update(data)
+                        remaining -= len(data)
+                finally:
+                    f.close()
+            except (IOError, OSError):
+                logger.exception(_('Error digesting upload [%(u)s]') % {'u': self.upload_id})
+                with self.lock:
+                    self._invalidate()
+            with self.lock:
+                self.size = end
+                self.digesting = False
+
+    def _record(self, file_path):
+        # called with the lock held
+        state_path = ContentUploadManager._upload_state_path(self.upload_id)
+        if not self.valid or self.writing or self.pending or self.digesting:
+            return
+        try:
+            state = {'size': self.size, 'mtime': os.stat(file_path).st_mtime}
+            for checksum_type, digest in self.digests.items():
+                state[checksum_type] = digest.hexdigest()
+            temp_path = state_path + '.tmp'
+            f = open(temp_path, 'w')
+            try:
+                json.dump(state, f)
+            finally:
+                f.close()
+            os.rename(temp_path, state_path)
+        except (IOError, OSError):
+            logger.exception(_('Error recording the checksums of upload [%(u)s]') %
+                             {'u': self.upload_id})
+
+    def _invalidate(self):
+        # called with the lock held
+        self.valid = False
+        self.pending = {}
+        ContentUploadManager._remove_upload_state(self.upload_id)
+
 
 class ContentUploadManager(object):
     def initialize_upload(self):
@@ -77,6 +246,32 @@ class ContentUploadManager(object):
         @param data: content to write to the file
         @type  data: str
         """
+        self.save_stream(upload_id, offset, StringIO(data), len(data))
+
+    def save_stream(self, upload_id, offset, stream, length):
+        """
+        Saves bits read from a stream into the given upload request starting at
+        an offset value. The bits are written in chunks of CHUNK_SIZE, so the
+        segment is never held in memory as a whole. Segments written in order
+        extend the running checksums of the upload as they are written.
+
+        @param upload_id: upload request ID
+        @type  upload_id: str
+
+        @param offset: area in the uploaded file to start writing at
+        @type  offset: int
+
+        @param stream: file-like object to read the content from
+        @type  stream: file
+
+        @param length: number of bytes to read from the stream
+        @type  length: int
+
+        @raise InvalidValue: if the offset is negative
+        @raise MissingResource: if the upload does not exist
+        """
+        if offset < 0:
+            raise InvalidValue(['offset'])
 
         file_path = ContentUploadManager._upload_file_path(upload_id)
 
@@ -84,10 +279,25 @@ class ContentUploadManager(object):
         if not os.path.exists(file_path):
             raise MissingResource(upload_request=upload_id)
 
-        f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        state = _upload_state(upload_id)
+        digesting = state.start_segment(offset, length)
+        written = 0
+        try:
+            f = open(file_path, 'r+b')
+            try:
+                f.seek(offset)
+                while written < length:
+                    data = stream.read(min(CHUNK_SIZE, length - written))
+                    if not data:
+                        break
+                    f.write(data)
+                    if digesting:
+                        state.update(data)
+                    written += len(data)
+            finally:
+                f.close()
+        finally:
+            state.finish_segment(offset, length, written, digesting)
 
     def delete_upload(self, upload_id):
         """
@@ -99,6 +309,10 @@ class ContentUploadManager(object):
         @type  upload_id: str
         """
 
+        with _UPLOAD_STATES_LOCK:
+            _UPLOAD_STATES.pop(upload_id, None)
+        ContentUploadManager._remove_upload_state(upload_id)
+
         file_path = ContentUploadManager._upload_file_path(upload_id)
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -135,9 +349,56 @@ class ContentUploadManager(object):
         @rtype:  list
         """
         upload_dir = ContentUploadManager._upload_storage_dir()
-        upload_ids = os.listdir(upload_dir)
+        # the checksum state files are hidden
+        upload_ids = [f for f in os.listdir(upload_dir) if not f.startswith('.')]
         return upload_ids
 
+    @staticmethod
+    def upload_checksum(upload_id, checksum_type):
+        """
+        Returns the checksum of an uploaded file. Checksums of the types in
+        CHECKSUM_TYPES are calculated while the upload is written and are
+        returned without reading the file, provided the file has not been
+        written since; otherwise the file is read to calculate the checksum.
+
+        :param upload_id:     upload request ID
+        :type  upload_id:     str
+        :param checksum_type: name of a hashlib algorithm, such as sha256
+        :type  checksum_type: str
+        :return:              hex digest of the uploaded file
+        :rtype:               str
+        :raise MissingResource: if the upload does not exist
+        """
+        file_path = ContentUploadManager._upload_file_path(upload_id)
+        if not os.path.exists(file_path):
+            raise MissingResource(upload_request=upload_id)
+
+        try:
+            f = open(ContentUploadManager._upload_state_path(upload_id))
+            try:
+                state = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            state = {}
+
+        stat = os.stat(file_path)
+        if (checksum_type in state and state['size'] == stat.st_size and
+                state['mtime'] == stat.st_mtime):
+            return state[checksum_type]
+
+        digest = hashlib.new(checksum_type)
+        f = open(file_path, 'rb')
+        try:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+        finally:
+            f.close()
+        return digest.hexdigest()
+
     @staticmethod
     def is_valid_upload(repo_id, unit_type_id):
         """
@@ -209,7 +470,8 @@ class ContentUploadManager(object):
 
         # Assemble the data needed for the import
         conduit = UploadConduit(repo_id, repo_importer['id'], RepoContentUnit.OWNER_TYPE_USER,
-                                manager_factory.principal_manager().get_principal()['login'])
+                                manager_factory.principal_manager().get_principal()['login'],
+                                upload_id)
 
         call_config = PluginCallConfiguration(plugin_config, repo_importer['config'],
                                               override_config)
@@ -250,6 +512,33 @@ class ContentUploadManager(object):
         path = os.path.join(upload_storage_dir, upload_id)
         return path
 
+    @staticmethod
+    def _upload_state_path(upload_id):
+        """
+        Returns the full path to the file recording the checksums calculated
+        while the given upload was written.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :return:          full path on the server's filesystem
+        :rtype:           str
+        """
+        upload_storage_dir = ContentUploadManager._upload_storage_dir()
+        return os.path.join(upload_storage_dir, '.%s.checksums' % upload_id)
+
+    @staticmethod
+    def _remove_upload_state(upload_id):
+        """
+        Removes the recorded checksums of the given upload, if there are any.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        """
+        try:
+            os.remove(ContentUploadManager._upload_state_path(upload_id))
+        except OSError:
+            pass
+
     @staticmethod
     def _upload_storage_dir():
         """
@@ -270,4 +559,26 @@ class ContentUploadManager(object):
         return upload_storage_dir
 
 
+def _upload_state(upload_id):
+    """
+    Returns the running checksums of an upload in this process, creating them
+    if the upload has none yet. The least recently created state is discarded
+    once MAX_UPLOAD_STATES uploads are tracked; an upload whose state was
+    discarded or that is written by several processes has its checksums
+    calculated from the file when they are needed.
+
+    :param upload_id: upload request ID
+    :type  upload_id: str
+    :rtype:           UploadState
+    """
+    with _UPLOAD_STATES_LOCK:
+        state = _UPLOAD_STATES.get(upload_id)
+        if state is None:
+            while _UPLOAD_STATES and len(_UPLOAD_STATES) >= MAX_UPLOAD_STATES:
+                oldest = min(_UPLOAD_STATES.values(), key=lambda s: s.sequence)
+                del _UPLOAD_STATES[oldest.upload_id]
+            state = _UPLOAD_STATES[upload_id] = UploadState(upload_id)
+        return state
+
+
 import_uploaded_unit = task(ContentUploadManager.import_uploaded_unit, base=Task)
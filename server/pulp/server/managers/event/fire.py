@@ -19,13 +19,117 @@ in a consistent event format for that type.
 """
 
 import logging
+import threading
+import time
 
+from pulp.server.config import config
+from pulp.server.db.model.cache_version import CacheVersion
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import notifiers
 from pulp.server.event import data as e
 
 _LOG = logging.getLogger(__name__)
 
+_LISTENER_CACHE = None
+_LISTENER_CACHE_LOCK = threading.Lock()
+
+
+class ListenerCache(object):
+    """
+    Per-process copy of the event listener table, so that firing an event only
+    has to read the listener version instead of every listener. The table is
+    reloaded when the version, which is incremented by every change to the
+    listeners in any process, differs from the one it was loaded under, or
+    once it is older than the TTL.
+
+    @ivar ttl: number of seconds the table is valid for; 0 disables the cache
+    @type ttl: int
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._listeners = None
+        # event type: listeners for it, filled in as events are fired
+        self._by_type = {}
+        self._expires = 0
+        self._generation = 0
+        # listener version the table was loaded under
+        self._version = None
+
+    def listeners(self, event_type):
+        """
+        @param event_type: type of the event being fired
+        @type  event_type: str
+
+        @return: listeners for the event type or for all event types, in the
+                 order they are stored in the database
+        @rtype:  list
+        """
+        if self.ttl <= 0:
+            return list(EventListener.get_collection().find(
+                {'$or': ({'event_types' : event_type}, {'event_types' : '*'})}))
+
+        version = listener_version()
+        now = time.time()
+        with self._lock:
+            if self._listeners is not None and now < self._expires and \
+                    version == self._version:
+                found = self._by_type.get(event_type)
+                if found is None:
+                    found = self._by_type[event_type] = _matching(self._listeners, event_type)
+                return found
+            generation = self._generation
+
+        listeners = list(EventListener.get_collection().find())
+
+        with self._lock:
+            # don't store a table that was loaded before an invalidation
+            if generation == self._generation:
+                self._listeners = listeners
+                self._by_type = {}
+                self._expires = now + self.ttl
+                self._version = version
+        return _matching(listeners, event_type)
+
+    def invalidate(self):
+        """
+        Drop the table so that it is reloaded when the next event is fired.
+        """
+        with self._lock:
+            self._listeners = None
+            self._by_type = {}
+            self._generation += 1
+
+
+def listener_cache():
+    """
+    @return: the process wide event listener cache
+    @rtype:  ListenerCache
+    """
+    global _LISTENER_CACHE
+    if _LISTENER_CACHE is None:
+        with _LISTENER_CACHE_LOCK:
+            if _LISTENER_CACHE is None:
+                _LISTENER_CACHE = ListenerCache(
+                    config.getint('notifications', 'listener_cache_ttl'))
+    return _LISTENER_CACHE
+
+
+def listener_version():
+    """
+    @return: the current listener version, which changes every time an event
+             listener is created, updated or deleted
+    @rtype:  int
+    """
+    return CacheVersion.get_version(CacheVersion.EVENT_LISTENERS)
+
+
+def _matching(listeners, event_type):
+    return [l for l in listeners
+            if event_type in l['event_types'] or '*' in l['event_types']]
+
+
 class EventFireManager(object):
 
     # -- specific event fire methods ------------------------------------------
@@ -66,6 +170,15 @@ class EventFireManager(object):
         publish_result.pop('_id', None)
         self._do_fire(e.Event(e.TYPE_REPO_PUBLISH_FINISHED, publish_result))
 
+    def invalidate_listeners(self):
+        """
+        Drop the cached copy of the event listeners of every process by
+        incrementing the listener version. Must be called after a listener is
+        created, updated or deleted.
+        """
+        CacheVersion.bump_version(CacheVersion.EVENT_LISTENERS)
+        listener_cache().invalidate()
+
     # -- private --------------------------------------------------------------
 
     def _do_fire(self, event):
@@ -78,8 +191,7 @@ class EventFireManager(object):
         @type  event: pulp.server.event.data.Event
         """
         # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types' : event.event_type}, {'event_types' : '*'})}))
+        listeners = listener_cache().listeners(event.event_type)
 
         # For each listener, retrieve the notifier and invoke it. Be sure that
         # an exception from a notifier is logged but does not interrupt the
@@ -91,4 +203,4 @@ class EventFireManager(object):
             try:
                 f(l['notifier_config'], event)
             except Exception:
-                _LOG.exception('Exception from notifier of type [%s]' % notifier_type_id)
\ No newline at end of file
+                _LOG.exception('Exception from notifier of type [%s]' % notifier_type_id)
@@ -29,6 +29,7 @@ import pymongo
 
 from pulp.common import tags
 from pulp.server.async.tasks import Task, TaskResult
+from pulp.server.compat import SON
 from pulp.server.db.model.repository import (Repo, RepoDistributor, RepoImporter, RepoContentUnit,
                                              RepoSyncResult, RepoPublishResult)
 from pulp.server.exceptions import (DuplicateResource, InvalidValue, MissingResource,
@@ -41,6 +42,10 @@ import pulp.server.managers.repo._common as common_utils
 _REPO_ID_REGEX = re.compile(r'^[.\-_A-Za-z0-9]+$') # letters, numbers, underscore, hyphen
 _DISTRIBUTOR_ID_REGEX = _REPO_ID_REGEX # for now, use the same constraints
 
+# The number of repositories whose content unit counts are calculated
+# by each aggregation when rebuilding or checking the counts.
+_UNIT_COUNT_BATCH_SIZE = 500
+
 
 logger = logging.getLogger(__name__)
 
@@ -358,7 +363,9 @@ class RepoManager(object):
         :type  delta: int
         """
         spec = {'id' : repo_id}
-        operation = {'$inc' : {'content_unit_counts.%s' % unit_type_id: delta}}
+        # a change in the unit counts is a change in the repo's content
+        operation = {'$inc' : {'content_unit_counts.%s' % unit_type_id: delta,
+                               'content_revision': 1}}
         repo_coll = Repo.get_collection()
 
         if delta:
@@ -368,6 +375,28 @@ class RepoManager(object):
                 message = 'There was a problem updating repository %s' % repo_id
                 raise PulpExecutionException(message), None, sys.exc_info()[2]
 
+    @staticmethod
+    def bump_content_revision_for_units(unit_type_id, unit_ids):
+        """
+        Marks the content of every repo associated with the given units as
+        changed without a change in the unit counts. Units are shared across
+        repos, so this is called when units are updated in place.
+
+        :param unit_type_id: identifies the type of the units
+        :type  unit_type_id: str
+        :param unit_ids:     ids of the units that were updated
+        :type  unit_ids:     list of str
+        """
+        spec = {'unit_type_id': unit_type_id, 'unit_id': {'$in': unit_ids}}
+        repo_ids = RepoContentUnit.get_collection().find(spec, fields=['repo_id']).distinct(
+            'repo_id')
+        if not repo_ids:
+            return
+
+        spec = {'id': {'$in': repo_ids}}
+        operation = {'$inc': {'content_revision': 1}}
+        Repo.get_collection().update(spec, operation, multi=True, safe=True)
+
     @staticmethod
     def update_repo_and_plugins(repo_id, repo_delta, importer_config,
                                 distributor_configs):
@@ -503,38 +532,137 @@ class RepoManager(object):
     @staticmethod
     def rebuild_content_unit_counts(repo_ids=None):
         """
-        WARNING: This might take a long time, and it should not be used unless
-        absolutely necessary. Not responsible for melted servers.
-
         This will iterate through the given repositories, which defaults to ALL
         repositories, and recalculate the content unit counts for each content
         type.
 
+        The counts are calculated using an aggregation over the repo content
+        units grouped by repository and unit type. Repositories are processed
+        in batches so memory use is bounded regardless of the number of repositories.
+
         This method is called from platform migration 0004, so consult that
         migration before changing this method.
 
         :param repo_ids:    list of repository IDs. DEFAULTS TO ALL REPO IDs!!!
         :type  repo_ids:    list
         """
+        repo_collection = Repo.get_collection()
+
+        logger.info('regenerating content unit counts for %s repositories' %
+                    (len(repo_ids) if repo_ids else 'all'))
+
+        for repo, counts in RepoManager._calculate_content_unit_counts(repo_ids):
+            logger.debug('regenerating content unit count for repository "%s"' % repo['id'])
+            repo_collection.update({'id': repo['id']},
+                                   {'$set': {'content_unit_counts': counts}}, safe=True)
+
+    @staticmethod
+    def check_content_unit_counts(repo_ids=None):
+        """
+        Check that the content unit counts of the given repositories, which defaults
+        to ALL repositories, match the units associated with them. Only the counts
+        that have drifted are rewritten. Counts of zero are equivalent to the type
+        not being counted.
+
+        The counts are only rewritten when they are still the ones that were read,
+        so that units associated or unassociated during the check are not lost. A
+        repository whose counts changed during the check is skipped.
+
+        :param repo_ids:    list of repository IDs. DEFAULTS TO ALL REPO IDs!!!
+        :type  repo_ids:    list
+        :return:            list of IDs of the repositories whose counts were corrected
+        :rtype:             list
+        """
+        repo_collection = Repo.get_collection()
+        corrected = []
+
+        for repo, counts in RepoManager._calculate_content_unit_counts(repo_ids):
+            stored = repo.get('content_unit_counts')
+            if stored is not None:
+                stored = dict((k, v) for k, v in stored.items() if v)
+                if stored == counts:
+                    continue
+            spec = {'id': repo['id'], 'content_unit_counts': repo.get('content_unit_counts')}
+            result = repo_collection.update(spec, {'$set': {'content_unit_counts': counts}},
+                                            safe=True)
+            if result['n'] == 0:
+                logger.debug('content unit counts for repository "%s" changed during the check' %
+                             repo['id'])
+                continue
+            logger.warn(_('corrected content unit counts for repository [%(r)s]: %(o)s => %(n)s') %
+                        {'r': repo['id'], 'o': stored, 'n': counts})
+            corrected.append(repo['id'])
+
+        return corrected
+
+    @staticmethod
+    def _calculate_content_unit_counts(repo_ids=None, batch_size=None):
+        """
+        Calculate the content unit counts of the given repositories, which defaults to
+        ALL repositories. The repositories are read in batches of batch_size and the
+        counts for each batch are calculated by a single aggregation grouped by
+        repository and unit type.
+
+        The repositories are read using a snapshot cursor so that updating them
+        while the generator is consumed does not cause a repository to be returned
+        twice or missed. The stored counts are read in their stored key order so
+        that they can be matched exactly in an update spec.
+
+        :param repo_ids:    list of repository IDs. DEFAULTS TO ALL REPO IDs!!!
+        :type  repo_ids:    list
+        :param batch_size:  the number of repositories in each aggregation,
+                            defaults to _UNIT_COUNT_BATCH_SIZE
+        :type  batch_size:  int
+        :return:            generator of tuple: (repo, counts) where repo is the repository
+                            document with only the 'id' and 'content_unit_counts' fields and
+                            counts is a dict of unit counts keyed by unit type ID
+        :rtype:             generator
+        """
         association_collection = RepoContentUnit.get_collection()
         repo_collection = Repo.get_collection()
+        batch_size = batch_size or _UNIT_COUNT_BATCH_SIZE
+
+        spec = {}
+        if repo_ids:
+            spec = {'id': {'$in': repo_ids}}
+        cursor = repo_collection.find(spec, fields=['id', 'content_unit_counts'],
+                                      snapshot=True, as_class=SON)
+
+        batch = []
+        for repo in cursor:
+            batch.append(repo)
+            if len(batch) < batch_size:
+                continue
+            for item in RepoManager._aggregate_unit_counts(association_collection, batch):
+                yield item
+            batch = []
+        if batch:
+            for item in RepoManager._aggregate_unit_counts(association_collection, batch):
+                yield item
 
-        # default to all repos if none were specified
-        if not repo_ids:
-            repo_ids = [repo['id'] for repo in repo_collection.find(fields=['id'])]
-
-        logger.info('regenerating content unit counts for %d repositories' % len(repo_ids))
-
-        for repo_id in repo_ids:
-            logger.debug('regenerating content unit count for repository "%s"' % repo_id)
-            counts = {}
-            cursor = association_collection.find({'repo_id':repo_id})
-            type_ids = cursor.distinct('unit_type_id')
-            cursor.close()
-            for type_id in type_ids:
-                spec = {'repo_id': repo_id, 'unit_type_id': type_id}
-                counts[type_id] = association_collection.find(spec).count()
-            repo_collection.update({'id': repo_id}, {'$set':{'content_unit_counts': counts}}, safe=True)
+    @staticmethod
+    def _aggregate_unit_counts(association_collection, repos):
+        """
+        Calculate the content unit counts of a batch of repositories
+        using a single aggregation.
+
+        :param association_collection: the repo content unit collection
+        :type  association_collection: pymongo.collection.Collection
+        :param repos:   list of repository documents
+        :type  repos:   list
+        :return:        list of tuple: (repo, counts)
+        :rtype:         list
+        """
+        counts = dict((repo['id'], {}) for repo in repos)
+        pipeline = [
+            {'$match': {'repo_id': {'$in': counts.keys()}}},
+            {'$group': {'_id': {'repo_id': '$repo_id', 'unit_type_id': '$unit_type_id'},
+                        'count': {'$sum': 1}}},
+        ]
+        for result in association_collection.aggregate(pipeline)['result']:
+            key = result['_id']
+            counts[key['repo_id']][key['unit_type_id']] = result['count']
+        return [(repo, counts[repo['id']]) for repo in repos]
 
 
 create_and_configure_repo = task(RepoManager.create_and_configure_repo, base=Task)
@@ -21,6 +21,7 @@ import sys
 
 from celery import task
 import pymongo
+import pymongo.errors
 
 from pulp.plugins.conduits.unit_import import ImportUnitConduit
 from pulp.plugins.config import PluginCallConfiguration
@@ -56,6 +57,9 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Maximum number of unit ids sent to the database in a single $in query
+ASSOCIATION_BATCH_SIZE = 1000
+
 logger = logging.getLogger(__name__)
 
 
@@ -159,21 +163,69 @@ class RepoUnitAssociationManager(object):
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
+        if owner_type not in _OWNER_TYPES:
+            raise exceptions.InvalidValue(['owner_type'])
+
+        unit_id_list = list(set(unit_id_list))
 
         unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, owner_type, owner_id, False)
+        for i in range(0, len(unit_id_list), ASSOCIATION_BATCH_SIZE):
+            batch = unit_id_list[i:i + ASSOCIATION_BATCH_SIZE]
+            unique_count += self._associate_batch(repo_id, unit_type_id, batch, owner_type,
+                                                  owner_id)
 
         # update the count of associated units on the repo object
         if unique_count:
             manager_factory.repo_manager().update_unit_count(
                 repo_id, unit_type_id, unique_count)
 
+    @staticmethod
+    def _associate_batch(repo_id, unit_type_id, unit_ids, owner_type, owner_id):
+        """
+        Creates the missing associations for a batch of distinct unit ids with
+        one query for the existing associations and one bulk insert.
+
+        :param repo_id:      identifies the repo
+        :type  repo_id:      str
+        :param unit_type_id: identifies the type of the units being added
+        :type  unit_type_id: str
+        :param unit_ids:     distinct unit ids within the given type
+        :type  unit_ids:     list of str
+        :param owner_type:   category of the caller making the association
+        :type  owner_type:   str
+        :param owner_id:     identifies the caller making the association
+        :type  owner_id:     str
+        :return:             number of the units that were not previously associated
+                             with the repo by any owner
+        :rtype:              int
+        """
+        collection = RepoContentUnit.get_collection()
+
+        # Associations by other owners still count toward the unit being in
+        # the repo already.
+        spec = {'repo_id': repo_id,
+                'unit_type_id': unit_type_id,
+                'unit_id': {'$in': unit_ids}}
+        fields = ['unit_id', 'owner_type', 'owner_id']
+        associated_ids = set()
+        owned_ids = set()
+        for association in collection.find(spec, fields=fields):
+            associated_ids.add(association['unit_id'])
+            if association['owner_type'] == owner_type and association['owner_id'] == owner_id:
+                owned_ids.add(association['unit_id'])
+
+        new_associations = [RepoContentUnit(repo_id, unit_id, unit_type_id, owner_type, owner_id)
+                            for unit_id in unit_ids if unit_id not in owned_ids]
+        if new_associations:
+            try:
+                collection.insert(new_associations, safe=True, continue_on_error=True)
+            except pymongo.errors.DuplicateKeyError:
+                # Another workflow created some of the same associations
+                # concurrently; the end result is the same.
+                pass
+
+        return len([u for u in unit_ids if u not in associated_ids])
+
     @staticmethod
     def associate_from_repo(source_repo_id, dest_repo_id, criteria=None,
                             import_config_override=None):
@@ -346,12 +398,20 @@ class RepoUnitAssociationManager(object):
                removal
         @type  notify_plugins: bool
         """
-        association_filters = {'unit_id': {'$in': unit_id_list}}
-        criteria = UnitAssociationCriteria(type_ids=[unit_type_id],
-                                           association_filters=association_filters)
+        association_query_manager = manager_factory.repo_unit_association_query_manager()
+        unit_id_list = list(set(unit_id_list))
+        unassociate_units = []
+
+        # The units are looked up in batches so no single query has to match an
+        # unbounded list of IDs
+        for i in range(0, len(unit_id_list), ASSOCIATION_BATCH_SIZE):
+            association_filters = {'unit_id': {'$in': unit_id_list[i:i + ASSOCIATION_BATCH_SIZE]}}
+            criteria = UnitAssociationCriteria(type_ids=[unit_type_id],
+                                               association_filters=association_filters)
+            unassociate_units.extend(association_query_manager.get_units(repo_id,
+                                                                         criteria=criteria))
 
-        return self.unassociate_by_criteria(repo_id, criteria, owner_type, owner_id,
-                                            notify_plugins=notify_plugins)
+        return self._unassociate_units(repo_id, unassociate_units, notify_plugins)
 
     @staticmethod
     def unassociate_by_criteria(repo_id, criteria, owner_type, owner_id, notify_plugins=True):
@@ -371,6 +431,21 @@ class RepoUnitAssociationManager(object):
         association_query_manager = manager_factory.repo_unit_association_query_manager()
         unassociate_units = association_query_manager.get_units(repo_id, criteria=criteria)
 
+        return RepoUnitAssociationManager._unassociate_units(repo_id, unassociate_units,
+                                                             notify_plugins)
+
+    @staticmethod
+    def _unassociate_units(repo_id, unassociate_units, notify_plugins):
+        """
+        Remove the associations of the given units with the repo.
+
+        :param repo_id:           identifies the repo
+        :type  repo_id:           str
+        :param unassociate_units: units as returned by the association query manager
+        :type  unassociate_units: list
+        :param notify_plugins:    if true, relevant plugins will be informed of the removal
+        :type  notify_plugins:    bool
+        """
         if len(unassociate_units) == 0:
             return {}
 
@@ -384,15 +459,21 @@ class RepoUnitAssociationManager(object):
         repo_manager = manager_factory.repo_manager()
 
         for unit_type_id, unit_ids in unit_map.items():
-            spec = {'repo_id': repo_id,
-                    'unit_type_id': unit_type_id,
-                    'unit_id': {'$in': unit_ids}
-                    }
-            collection.remove(spec, safe=True)
+            unit_ids = list(set(unit_ids))
+            unique_count = 0
+
+            for i in range(0, len(unit_ids), ASSOCIATION_BATCH_SIZE):
+                batch = unit_ids[i:i + ASSOCIATION_BATCH_SIZE]
+                spec = {'repo_id': repo_id,
+                        'unit_type_id': unit_type_id,
+                        'unit_id': {'$in': batch}
+                        }
+                collection.remove(spec, safe=True)
+
+                remaining_ids = RepoUnitAssociationManager.associated_unit_ids(
+                    repo_id, unit_type_id, batch)
+                unique_count += len(batch) - len(remaining_ids)
 
-            unique_count = sum(
-                1 for unit_id in unit_ids if not RepoUnitAssociationManager.association_exists(
-                    repo_id, unit_id, unit_type_id))
             if not unique_count:
                 continue
 
@@ -443,6 +524,34 @@ class RepoUnitAssociationManager(object):
         return bool(existing_count)
 
 
+    @staticmethod
+    def associated_unit_ids(repo_id, unit_type_id, unit_ids):
+        """
+        Bulk equivalent of association_exists; determines which of the given
+        units are associated with the repo by any owner.
+
+        :param repo_id:      identifies the repo
+        :type  repo_id:      str
+        :param unit_type_id: identifies the type of the units
+        :type  unit_type_id: str
+        :param unit_ids:     unit ids within the given type
+        :type  unit_ids:     list of str
+        :return:             the subset of unit_ids that are associated with the repo
+        :rtype:              set
+        """
+        unit_coll = RepoContentUnit.get_collection()
+        associated_ids = set()
+
+        for i in range(0, len(unit_ids), ASSOCIATION_BATCH_SIZE):
+            spec = {'repo_id': repo_id,
+                    'unit_type_id': unit_type_id,
+                    'unit_id': {'$in': unit_ids[i:i + ASSOCIATION_BATCH_SIZE]}}
+            for association in unit_coll.find(spec, fields=['unit_id']):
+                associated_ids.add(association['unit_id'])
+
+        return associated_ids
+
+
 associate_from_repo = task(RepoUnitAssociationManager.associate_from_repo, base=Task)
 unassociate_by_criteria = task(RepoUnitAssociationManager.unassociate_by_criteria, base=Task)
 
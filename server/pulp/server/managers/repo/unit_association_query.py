@@ -2,11 +2,15 @@
 Contains the manager class for performing queries for repo-unit associations.
 """
 
+import base64
 import copy
+import sys
 
 import pymongo
 
+from pulp.common.compat import json
 from pulp.plugins.types import database as types_db
+from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
 
@@ -25,6 +29,50 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Number of association unit IDs examined per query when walking a repository
+# in keyset pagination mode
+KEYSET_BATCH_SIZE = 1000
+
+# Page token requesting the first page of a keyset paginated query
+FIRST_PAGE = ''
+
+
+def encode_page_token(unit_type_id, unit_id):
+    """
+    Build the opaque token identifying the position immediately after the
+    given unit in a keyset paginated query.
+
+    :param unit_type_id: type of the last unit in the page
+    :type  unit_type_id: str
+    :param unit_id: ID of the last unit in the page
+    :type  unit_id: str
+
+    :return: opaque page token
+    :rtype:  str
+    """
+    return base64.urlsafe_b64encode(json.dumps([unit_type_id, unit_id]))
+
+
+def decode_page_token(token):
+    """
+    Parse a page token created by encode_page_token.
+
+    :param token: opaque page token; FIRST_PAGE for the start of the results
+    :type  token: str
+
+    :return: tuple of unit type ID and unit ID; both are None for the first page
+    :rtype:  tuple
+
+    :raise pulp_exceptions.InvalidValue: if the token cannot be parsed
+    """
+    if not token:
+        return None, None
+    try:
+        unit_type_id, unit_id = json.loads(base64.urlsafe_b64decode(str(token)))
+    except (TypeError, ValueError):
+        raise pulp_exceptions.InvalidValue(['after']), None, sys.exc_info()[2]
+    return unit_type_id, unit_id
+
 
 class RepoUnitAssociationQueryManager(object):
 
@@ -114,6 +162,12 @@ class RepoUnitAssociationQueryManager(object):
 
         criteria = criteria or UnitAssociationCriteria()
 
+        if criteria.after is not None:
+            units_generator = self._keyset_units(repo_id, criteria)
+            if as_generator:
+                return units_generator
+            return list(units_generator)
+
         unit_associations_generator = self._unit_associations_cursor(repo_id, criteria)
 
         if criteria.remove_duplicates:
@@ -204,6 +258,40 @@ class RepoUnitAssociationQueryManager(object):
         # to a list. Should probably log this. Is there a log-level "stupid"?
         return list(units_generator)
 
+    def get_units_page(self, repo_id, criteria):
+        """
+        Get a single keyset paginated page of the units associated with the
+        repository, along with the token used to request the following page.
+
+        Units are ordered by unit type ID and then unit ID. The criteria limit
+        is the number of units in the page; all of the associations for a unit
+        are always returned on the same page. If the criteria does not carry a
+        page token, the first page is returned.
+
+        :param repo_id: identifies the repository
+        :type  repo_id: str
+
+        :param criteria: drives the query; sorts and skip are ignored
+        :type  criteria: UnitAssociationCriteria
+
+        :return: dict containing the list of units under "units" and the token
+                 for the next page under "next"; the token is None when there
+                 are no more units
+        :rtype:  dict
+        """
+        if criteria.after is None:
+            criteria.after = FIRST_PAGE
+
+        units = self.get_units(repo_id, criteria)
+
+        next_token = None
+        if criteria.limit and units:
+            page_unit_ids = set((u['unit_type_id'], u['unit_id']) for u in units)
+            if len(page_unit_ids) >= criteria.limit:
+                next_token = encode_page_token(units[-1]['unit_type_id'], units[-1]['unit_id'])
+
+        return {'units': units, 'next': next_token}
+
     def get_units_across_types(self, repo_id, criteria=None, as_generator=False):
         """
         Retrieves data describing units associated with the given repository
@@ -287,6 +375,169 @@ class RepoUnitAssociationQueryManager(object):
 
         return [t for t in cursor.distinct('unit_type_id')]
 
+    # -- keyset pagination methods ---------------------------------------------
+
+    def _keyset_units(self, repo_id, criteria):
+        """
+        Generate the units associated with the repository in unit type and
+        unit ID order, starting after the position in the criteria page token.
+
+        Unlike the skip and limit path, only the associations for units that
+        will actually be returned are loaded. The repository is walked in
+        batches of compact unit ID lists, the unit filters are applied to each
+        batch, and the association documents are fetched for the matching
+        units only.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
+        after_type_id, after_unit_id = decode_page_token(criteria.after)
+
+        unit_types = sorted(criteria.type_ids or self.unit_type_ids_for_repo(repo_id))
+        remaining = criteria.limit
+
+        for unit_type_id in unit_types:
+
+            if after_type_id is not None and unit_type_id < after_type_id:
+                continue
+
+            start_unit_id = None
+            if unit_type_id == after_type_id:
+                start_unit_id = after_unit_id
+
+            for unit_ids in self._keyset_unit_id_batches(repo_id, unit_type_id, criteria,
+                                                         start_unit_id):
+
+                units_by_id = self._keyset_units_by_id(unit_type_id, criteria, unit_ids)
+                unit_ids = [i for i in unit_ids if i in units_by_id]
+
+                if remaining:
+                    unit_ids = unit_ids[:remaining]
+
+                if not unit_ids:
+                    continue
+
+                associations = self._keyset_associations(repo_id, unit_type_id, criteria,
+                                                         unit_ids)
+
+                for unit_id in unit_ids:
+                    unit = units_by_id[unit_id]
+                    # the unit may have been unassociated since it was read
+                    for association in associations.get(unit_id, []):
+                        association['metadata'] = unit
+                        yield association
+
+                if remaining:
+                    remaining -= len(unit_ids)
+                    if remaining == 0:
+                        return
+
+    @staticmethod
+    def _keyset_unit_id_batches(repo_id, unit_type_id, criteria, start_unit_id):
+        """
+        Generate ordered lists of the distinct IDs of units of the given type
+        associated with the repository that meet the association filters.
+
+        Only the unit IDs are retrieved and each query resumes after the last
+        ID of the previous batch, so no skip is ever performed by the database.
+
+        :type repo_id: str
+        :type unit_type_id: str
+        :type criteria: UnitAssociationCriteria
+        :param start_unit_id: only IDs greater than this are generated; None for all
+        :type  start_unit_id: str or None
+        :rtype: generator of lists
+        """
+        collection = RepoContentUnit.get_collection()
+
+        while True:
+            spec = criteria.association_filters.copy()
+            spec['repo_id'] = repo_id
+            spec['unit_type_id'] = unit_type_id
+            if start_unit_id is not None:
+                resume_spec = {'unit_id': {'$gt': start_unit_id}}
+                if 'unit_id' in spec:
+                    # keep the caller's own unit_id filter in effect
+                    spec = {'$and': [spec, resume_spec]}
+                else:
+                    spec.update(resume_spec)
+
+            cursor = collection.find(spec, fields=['unit_id'])
+            cursor.sort('unit_id', SORT_ASCENDING)
+            cursor.limit(KEYSET_BATCH_SIZE)
+
+            unit_ids = []
+            fetched = 0
+            for association in cursor:
+                fetched += 1
+                # duplicate associations for a unit are adjacent in this ordering
+                if not unit_ids or unit_ids[-1] != association['unit_id']:
+                    unit_ids.append(association['unit_id'])
+
+            if not unit_ids:
+                return
+
+            yield unit_ids
+
+            if fetched < KEYSET_BATCH_SIZE:
+                return
+
+            start_unit_id = unit_ids[-1]
+
+    @staticmethod
+    def _keyset_units_by_id(unit_type_id, criteria, unit_ids):
+        """
+        Retrieve the units in the given list of IDs that meet the unit filters.
+
+        :type unit_type_id: str
+        :type criteria: UnitAssociationCriteria
+        :type unit_ids: list
+        :return: dict of unit ID to unit
+        :rtype: dict
+        """
+        collection = types_db.type_units_collection(unit_type_id)
+
+        spec = criteria.unit_filters.copy()
+        spec['_id'] = {'$in': unit_ids}
+
+        fields = criteria.unit_fields
+        if fields is not None and '_content_type_id' not in fields:
+            fields = list(fields)
+            fields.append('_content_type_id')
+
+        return dict((u['_id'], u) for u in collection.find(spec, fields=fields))
+
+    @staticmethod
+    def _keyset_associations(repo_id, unit_type_id, criteria, unit_ids):
+        """
+        Retrieve the associations that meet the association filters for the
+        given units, oldest first.
+
+        :type repo_id: str
+        :type unit_type_id: str
+        :type criteria: UnitAssociationCriteria
+        :type unit_ids: list
+        :return: dict of unit ID to list of associations
+        :rtype: dict
+        """
+        spec = criteria.association_filters.copy()
+        spec['repo_id'] = repo_id
+        spec['unit_type_id'] = unit_type_id
+        spec['unit_id'] = {'$in': unit_ids}
+
+        cursor = RepoContentUnit.get_collection().find(spec, fields=criteria.association_fields)
+        cursor.sort('created', SORT_ASCENDING)
+
+        associations = {}
+        for association in cursor:
+            unit_associations = associations.setdefault(association['unit_id'], [])
+            if criteria.remove_duplicates and unit_associations:
+                continue
+            unit_associations.append(association)
+
+        return associations
+
     # -- unit association methods ----------------------------------------------
 
     @staticmethod
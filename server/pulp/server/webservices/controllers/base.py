@@ -13,6 +13,7 @@
 
 import logging
 import sys
+from cStringIO import StringIO
 from gettext import gettext as _
 
 import web
@@ -74,6 +75,19 @@ class JSONController(object):
         """
         return web.data()
 
+    def data_stream(self):
+        """
+        Get binary POST/PUT payload as a stream, so that large payloads do not
+        have to be held in memory.
+        @return: tuple of a file-like object to read the payload from and the
+                 length of the payload
+        """
+        if 'data' in web.ctx:
+            # already read by web.data()
+            return StringIO(web.ctx.data), len(web.ctx.data)
+        length = web.intget(web.ctx.env.get('CONTENT_LENGTH'), 0)
+        return web.ctx.env['wsgi.input'], length
+
     def filters(self, valid):
         """
         Fetch any parameters passed on the url
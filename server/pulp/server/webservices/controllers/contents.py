@@ -256,8 +256,8 @@ class UploadSegmentResource(JSONController):
             raise InvalidValue(['offset'])
 
         upload_manager = factory.content_upload_manager()
-        data = self.data()
-        upload_manager.save_data(upload_id, offset, data)
+        stream, length = self.data_stream()
+        upload_manager.save_stream(upload_id, offset, stream, length)
 
         return self.ok(None)
 
@@ -898,6 +898,11 @@ class RepoUnitAdvancedSearch(JSONController):
 
         # Data lookup
         manager = manager_factory.repo_unit_association_query_manager()
+        if criteria.after is not None:
+            # Keyset pagination returns the page along with the next page token
+            page = manager.get_units_page(repo_id, criteria)
+            return self.ok(page)
+
         if criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
             units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
@@ -917,7 +922,7 @@ class ContentApplicabilityRegeneration(JSONController):
         Creates an async task to regenerate content applicability data for given updated
         repositories.
 
-        body {repo_criteria:<dict>}
+        body {repo_criteria:<dict>, force:<bool>}
         """
         body = self.params()
         repo_criteria = body.get('repo_criteria', None)
@@ -927,12 +932,16 @@ class ContentApplicabilityRegeneration(JSONController):
             repo_criteria = Criteria.from_client_input(repo_criteria)
         except:
             raise exceptions.InvalidValue('repo_criteria')
+        force = body.get('force', False)
+        if not isinstance(force, bool):
+            raise exceptions.InvalidValue('force')
 
         regeneration_tag = tags.action_tag('content_applicability_regeneration')
         async_result = regenerate_applicability_for_repos.apply_async_with_reservation(
                             tags.RESOURCE_REPOSITORY_PROFILE_APPLICABILITY_TYPE,
                             tags.RESOURCE_ANY_ID,
                             (repo_criteria.as_dict(),),
+                            {'force': force},
                             tags=[regeneration_tag])
         raise exceptions.OperationPostponed(async_result)
 
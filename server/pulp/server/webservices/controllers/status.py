@@ -12,12 +12,17 @@
 # see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
 
 """
-Unauthenticated status API so that other can make sure we're up (to no good).
+Unauthenticated status API so that other can make sure we're up (to no good),
+and the authenticated statistics of the server process.
 """
 
 import web
 
+from pulp.server.db import profiler
+from pulp.server.event import http
+from pulp.server.managers import factory
 from pulp.server.webservices.controllers.base import JSONController
+from pulp.server.webservices.controllers.decorators import auth_required
 
 # status controller ------------------------------------------------------------
 
@@ -27,8 +32,19 @@ class StatusController(JSONController):
         status_data = {'api_version': '2'}
         return self.ok(status_data)
 
+
+class StatisticsController(JSONController):
+
+    @auth_required(super_user_only=True)
+    def GET(self):
+        statistics = {'credential_cache': factory.authentication_manager().credential_cache_stats(),
+                      'db_operations': profiler.report(),
+                      'http_notifications': http.stats()}
+        return self.ok(statistics)
+
 # web.py application -----------------------------------------------------------
 
-URLS = ('/', StatusController)
+URLS = ('/', StatusController,
+        '/statistics/', StatisticsController)
 
 application = web.application(URLS, globals())
@@ -27,8 +27,11 @@ from pulp.server.db.model.dispatch import TaskStatus
 from pulp.server.db.model.resources import Worker, ReservedResource
 from pulp.server.logs import start_logging, stop_logging
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth.authentication import credential_cache
 from pulp.server.managers.auth.cert.cert_generator import SerialNumber
 from pulp.server.managers.auth.role.cud import SUPER_USER_ROLE
+from pulp.server.managers.auth.user.query import authorization_index
+from pulp.server.managers.event.fire import listener_cache
 from pulp.server.webservices import http
 from pulp.server.webservices.middleware.exception import ExceptionHandlerMiddleware
 from pulp.server.webservices.middleware.postponed import PostponedOperationMiddleware
@@ -76,6 +79,10 @@ class PulpServerTests(unittest.TestCase):
         super(PulpServerTests, self).setUp()
         self._mocks = {}
         self.config = PulpServerTests.CONFIG # shadow for simplicity
+        # documents are removed between tests without going through the managers
+        credential_cache().invalidate()
+        authorization_index().clear()
+        listener_cache().invalidate()
         self.clean()
 
     def tearDown(self):
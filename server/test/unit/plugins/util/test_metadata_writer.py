@@ -241,6 +241,62 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_checksum_calculated_while_writing(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, 'sha256', additional_checksum_types=['md5', 'sha256'])
+
+        context.initialize()
+        context.metadata_file_handle.write('<metadata/>')
+
+        with patch('pulp.plugins.util.metadata_writer.open', create=True) as mock_open:
+            context.finalize()
+
+        # the finished file is not read back to calculate the checksums
+        self.assertEqual(0, mock_open.call_count)
+
+        with open(context.metadata_file_path, 'rb') as h:
+            content = h.read()
+        self.assertEqual('<metadata/>', content)
+        self.assertEqual({'sha256': hashlib.sha256(content).hexdigest(),
+                          'md5': hashlib.md5(content).hexdigest()}, context.checksums)
+        self.assertEqual(context.checksums['sha256'], context.checksum)
+        self.assertEqual(os.path.join(self.metadata_file_dir, context.checksum + '-test.xml'),
+                         context.metadata_file_path)
+
+    def test_finalize_checksum_gzip(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, 'sha1')
+
+        context.initialize()
+        context.metadata_file_handle.write('<metadata/>')
+        context.finalize()
+
+        # the checksum is of the compressed file
+        with open(context.metadata_file_path, 'rb') as h:
+            self.assertEqual(hashlib.sha1(h.read()).hexdigest(), context.checksum)
+
+        h = gzip.open(context.metadata_file_path)
+        self.assertEqual('<metadata/>', h.read())
+        h.close()
+
+    def test_finalize_checksum_handle_opened_by_subclass(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, 'sha1')
+
+        context.metadata_file_handle = open(path, 'w')
+        context.metadata_file_handle.write('<metadata/>')
+        context.finalize()
+
+        self.assertEqual(hashlib.sha1('<metadata/>').hexdigest(), context.checksum)
+
+    def test_init_invalid_additional_checksum(self):
+        path = os.path.join(self.metadata_file_dir, 'foo', 'header.xml')
+        assert_validation_exception(MetadataFileContext, [PLP1005], path,
+                                    additional_checksum_types=['invalid'])
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -307,6 +363,19 @@ class TestJSONArrayFileContext(unittest.TestCase):
         self.context._write_file_footer()
         self.context.metadata_file_handle.write.assert_called_once_with(']')
 
+    def test_checksum_calculated_while_writing(self):
+        context = JSONArrayFileContext(self.file_name, 'sha256')
+
+        context.initialize()
+        context.add_unit_metadata('foo')
+        context.add_unit_metadata('bar')
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as h:
+            content = h.read()
+        self.assertEqual('[,]', content)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), context.checksum)
+
     def test_add_unit_metadata(self):
         self.context.add_unit_metadata('foo')
         self.assertEquals(self.context.metadata_file_handle.write.call_count, 0)
@@ -642,6 +642,83 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         self.assertTrue(os.path.exists(existing_file))
         self.assertEquals(1, len(os.listdir(master_dir)))
 
+    def test_process_main_incremental(self):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        step = AtomicDirectoryPublishStep(source_dir, [('/', publish_dir)], master_dir,
+                                          incremental=True)
+        step.parent = Mock(timestamp=str(time.time()))
+
+        sub_file = os.path.join(source_dir, 'foo', 'bar.html')
+        touch(sub_file)
+        os.symlink(sub_file, os.path.join(source_dir, 'link.html'))
+        os.symlink(os.path.join(source_dir, 'foo'), os.path.join(source_dir, 'link_dir'))
+
+        old_dir = os.path.join(master_dir, 'foo')
+        os.makedirs(old_dir)
+        step.process_main()
+        step.prune_thread.join()
+
+        master_file = os.path.join(master_dir, step.parent.timestamp, 'foo', 'bar.html')
+        self.assertEquals(os.stat(sub_file).st_ino, os.stat(master_file).st_ino)
+        self.assertTrue(os.path.exists(os.path.join(publish_dir, 'foo', 'bar.html')))
+        self.assertEquals(sub_file, os.readlink(os.path.join(publish_dir, 'link.html')))
+        self.assertTrue(os.path.islink(os.path.join(publish_dir, 'link_dir')))
+        self.assertEquals([step.parent.timestamp], os.listdir(master_dir))
+
+    @patch.object(AtomicDirectoryPublishStep, '_same_filesystem', return_value=False)
+    def test_process_main_incremental_other_filesystem(self, mock_same_filesystem):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        step = AtomicDirectoryPublishStep(source_dir, [('/', publish_dir)], master_dir,
+                                          incremental=True)
+        step.parent = Mock(timestamp='3.0')
+
+        os.makedirs(source_dir)
+        for name, content in (('same.txt', 'same'), ('changed.txt', 'new')):
+            with open(os.path.join(source_dir, name), 'w') as f:
+                f.write(content)
+
+        # older masters; the newest one is used for unchanged files
+        previous_dir = os.path.join(master_dir, '2.0')
+        os.makedirs(os.path.join(master_dir, '1.0'))
+        os.makedirs(previous_dir)
+        for name, content in (('same.txt', 'same'), ('changed.txt', 'old')):
+            with open(os.path.join(previous_dir, name), 'w') as f:
+                f.write(content)
+
+        step.process_main()
+        step.prune_thread.join()
+
+        new_dir = os.path.join(master_dir, '3.0')
+        self.assertEquals(os.stat(os.path.join(previous_dir, 'same.txt')).st_ino,
+                          os.stat(os.path.join(new_dir, 'same.txt')).st_ino)
+        self.assertNotEquals(os.stat(os.path.join(source_dir, 'changed.txt')).st_ino,
+                             os.stat(os.path.join(new_dir, 'changed.txt')).st_ino)
+        with open(os.path.join(publish_dir, 'changed.txt')) as f:
+            self.assertEquals('new', f.read())
+        self.assertEquals(['3.0'], os.listdir(master_dir))
+
+    def test_prune_masters_in_background_keeps_later_masters(self):
+        master_dir = os.path.join(self.working_directory, 'master')
+        step = AtomicDirectoryPublishStep('source', [], master_dir, incremental=True)
+        step.parent = Mock(timestamp='2.0')
+        for entry in ('1.0', '2.0'):
+            os.makedirs(os.path.join(master_dir, entry))
+
+        with patch('pulp.plugins.util.publish_step.threading.Thread') as mock_thread:
+            step._prune_masters_in_background()
+
+        # a master created after the prune list was built is not removed
+        os.makedirs(os.path.join(master_dir, '3.0'))
+        target = mock_thread.call_args[1]['target']
+        target(*mock_thread.call_args[1]['args'])
+
+        self.assertEquals(['2.0', '3.0'], sorted(os.listdir(master_dir)))
+        self.assertTrue(mock_thread.return_value.start.called)
+
 
 class TestSaveTarFilePublishStep(unittest.TestCase):
     def setUp(self):
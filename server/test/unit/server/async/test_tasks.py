@@ -478,6 +478,27 @@ class TestTask(ResourceReservationTests):
         # Make sure that parse_iso8601_datetime is able to parse the finish_time without errors
         dateutils.parse_iso8601_datetime(updated_task_status['finish_time'])
 
+    @mock.patch('pulp.server.db.profiler.pop_task_report')
+    @mock.patch('pulp.server.async.tasks.Task.request')
+    def test_on_success_db_operations(self, mock_request, mock_pop_task_report):
+        """
+        Make sure on_success() writes the database operation counters into the task status.
+        """
+        task_id = str(uuid.uuid4())
+        db_operations = [{'collection': 'repos', 'operation': 'find_one', 'calls': 3}]
+        mock_pop_task_report.return_value = db_operations
+        mock_request.called_directly = False
+        TaskStatusManager.create_task_status(task_id, 'some_queue')
+
+        task = tasks.Task()
+        task.on_success('random_return_value', task_id, [], {})
+
+        new_task_status = TaskStatusManager.find_by_task_id(task_id)
+        self.assertEqual(new_task_status['db_operations'], db_operations)
+        # popped once for the report and once to drop the handler's own operations
+        self.assertEqual(mock_pop_task_report.call_args_list,
+                         [mock.call(task_id), mock.call(task_id)])
+
     @mock.patch('pulp.server.async.tasks.Task.request')
     def test_on_failure_handler(self, mock_request):
         """
@@ -10,79 +10,21 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 from unittest import TestCase
+import threading
+import time
 
 from mock import patch, Mock
-from nectar.request import DownloadRequest
 
-from pulp.server.content.sources.container import ContentContainer, NectarListener
-from pulp.server.content.sources.model import PrimarySource, ContentSource, Request
+from pulp.server.content.sources import constants
+from pulp.server.content.sources.container import ContentContainer, NectarListener, \
+    DownloadScheduler
+from pulp.server.content.sources.model import PrimarySource, ContentSource, Request, \
+    DownloadReport
+from pulp.server.db.model.content import ContentCatalog
 
 
 class TestContainer(TestCase):
 
-    def test_collated(self):
-        source_id = 1
-        request_list = []
-
-        # simulated requests
-        # 0-8 need to be downloaded and have a next source.
-        # 6-7 have no next source.
-        # 9-10 are already downloaded.
-
-        for n in range(10):
-            r = Mock()
-            r.downloaded = n > 8
-            r.destination = 'path-%d' % n
-            if n < 6:
-                r.next_source.return_value = ('s-%d' % source_id, 'url-%d' % n)
-            else:
-                r.next_source.return_value = None
-            request_list.append(r)
-            if n % 3 == 0:
-                source_id += 1
-
-        # test
-        collated = ContentContainer.collated(request_list)
-
-        # validation
-        self.assertEqual(len(collated), 3)
-
-        for requests in collated.values():
-            for r in requests:
-                self.assertTrue(isinstance(r, DownloadRequest))
-
-        self.assertEqual(
-            [s.__dict__ for s in collated['s-1']],
-            [
-                DownloadRequest('url-0', 'path-0', data=request_list[0]).__dict__
-            ])
-        self.assertEqual(
-            [s.__dict__ for s in collated['s-2']],
-            [
-                DownloadRequest('url-1', 'path-1', data=request_list[1]).__dict__,
-                DownloadRequest('url-2', 'path-2', data=request_list[2]).__dict__,
-                DownloadRequest('url-3', 'path-3', data=request_list[3]).__dict__
-            ])
-        self.assertEqual(
-            [s.__dict__ for s in collated['s-3']],
-            [
-                DownloadRequest('url-4', 'path-4', data=request_list[4]).__dict__,
-                DownloadRequest('url-5', 'path-5', data=request_list[5]).__dict__,
-            ])
-
-    def test_collated_all_downloaded(self):
-        request_list = []
-        for n in range(10):
-            r = Mock()
-            r.downloaded = True
-            request_list.append(r)
-
-        # test
-        collated = ContentContainer.collated(request_list)
-
-        # validation
-        self.assertEqual(len(collated), 0)
-
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     def test_construction(self, fake_load):
         path = 'path-1'
@@ -93,8 +35,10 @@ class TestContainer(TestCase):
         # validation
         fake_load.assert_called_with(path)
 
+    @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
+    @patch('pulp.server.content.sources.container.DownloadScheduler')
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
-    def test_download(self, fake_load):
+    def test_download(self, fake_load, fake_scheduler, fake_manager):
         sources = []
         for n in range(3):
             s = ContentSource('s-%d' % n, {})
@@ -105,19 +49,13 @@ class TestContainer(TestCase):
 
         request_list = []
         for n in range(6):
-            r = Request('T', {}, 'url-%d' % n, 'path-%d' % n)
+            r = Request('T', {'n': n}, 'url-%d' % n, 'path-%d' % n)
             r.find_sources = Mock(return_value=sources[n % 3:])
             request_list.append(r)
 
-        collated = [
-            {
-                sources[0]: ['nectar-1'],
-                sources[1]: ['nectar-2', 'nectar-3', 'nectar-4'],
-                sources[2]: ['nectar-5', 'nectar-6']
-            },
-            {}
-        ]
-        fake_collated = Mock(side_effect=collated)
+        locators = [ContentCatalog.get_locator('T', {'n': n}) for n in range(6)]
+        found = {locators[0]: ['entry-0'], locators[3]: ['entry-3']}
+        fake_manager.return_value.find_all.return_value = found
 
         fake_listener = Mock()
         canceled = FakeEvent()
@@ -126,33 +64,23 @@ class TestContainer(TestCase):
         # test
         container = ContentContainer('')
         container.refresh = Mock()
-        container.collated = fake_collated
         report = container.download(canceled, fake_primary, request_list, fake_listener)
 
         # validation
         container.refresh.assert_called_with(canceled)
 
-        for r in request_list:
-            r.find_sources.assert_called_with(fake_primary, container.sources)
+        fake_manager.return_value.find_all.assert_called_once_with(locators)
+        for n, r in enumerate(request_list):
+            entries = found.get(locators[n], [])
+            r.find_sources.assert_called_with(fake_primary, container.sources, entries)
 
-        self.assertEqual(report.total_passes, 1)
         self.assertEqual(report.total_sources, len(sources))
-        self.assertEqual(len(report.downloads), 3)
-        for source in sources:
-            self.assertEqual(report.downloads[source.id].total_succeeded, 0)
-            self.assertEqual(report.downloads[source.id].total_failed, 0)
-
-        for source in sources:
-            source.get_downloader.assert_called_with()
-            downloader = source.get_downloader()
-            listener = downloader.event_listener
-            self.assertEqual(listener.cancel_event, canceled)
-            self.assertEqual(listener.downloader, downloader)
-            self.assertEqual(listener.listener, fake_listener)
-            downloader.download.assert_called_with(collated[0][source])
+        fake_scheduler.assert_called_with(canceled, report, fake_listener)
+        fake_scheduler.return_value.download.assert_called_with(request_list)
 
+    @patch('pulp.server.content.sources.container.DownloadScheduler')
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
-    def test_download_canceled_before_collated(self, fake_load):
+    def test_download_canceled_before_scheduled(self, fake_load, fake_scheduler):
         fake_load.return_value = []
         canceled = FakeEvent()
         canceled.set()
@@ -160,79 +88,68 @@ class TestContainer(TestCase):
         # test
         container = ContentContainer('')
         container.refresh = Mock()
-        container.collated = Mock()
         report = container.download(canceled, None, [], None)
 
         container.refresh.assert_called_with(canceled)
 
-        self.assertFalse(container.collated.called)
+        self.assertFalse(fake_scheduler.called)
         self.assertEqual(report.total_passes, 0)
         self.assertEqual(report.total_sources, 0)
         self.assertEqual(len(report.downloads), 0)
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
-    def test_download_canceled_after_collated(self, fake_load):
-        sources = []
+    @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
+    def test_refresh(self, fake_manager, fake_load):
+        sources = {}
         for n in range(3):
-            s = ContentSource('s-%d' % n, {})
+            s = ContentSource('s-%d' % n, {constants.BASE_URL: 'http://s-%d' % n})
+            s.refresh_url = Mock(side_effect=lambda c, u, f: u)
+            s.refreshed = Mock()
+            s.get_conduit = Mock()
             s.get_downloader = Mock()
-            sources.append(s)
+            sources[s.id] = s
 
+        fake_manager().has_entries.return_value = False
         fake_load.return_value = sources
 
-        request_list = []
-        for n in range(6):
-            r = Request('T', {}, 'url-%d' % n, 'path-%d' % n)
-            r.find_sources = Mock(return_value=sources[n % 3:])
-            request_list.append(r)
-
-        collated = [
-            {
-                sources[0]: ['nectar-1'],
-                sources[1]: ['nectar-2', 'nectar-3', 'nectar-4'],
-                sources[2]: ['nectar-5', 'nectar-6']
-            },
-            {}
-        ]
-        fake_collated = Mock(side_effect=collated)
-
-        fake_listener = Mock()
-        canceled = Mock()
-        canceled.isSet.side_effect = [False, True, True]
-        fake_primary = PrimarySource(Mock())
-
         # test
+        canceled = FakeEvent()
         container = ContentContainer('')
-        container.refresh = Mock()
-        container.collated = fake_collated
-        report = container.download(canceled, fake_primary, request_list, fake_listener)
+        report = container.refresh(canceled)
 
         # validation
-        container.refresh.assert_called_with(canceled)
-
-        for r in request_list:
-            r.find_sources.assert_called_with(fake_primary, container.sources)
-
-        called = 0
-        for s in sources:
-            if s.get_downloader.called:
-                called += 1
+        for s in sources.values():
+            conduit = s.get_conduit.return_value
+            s.get_conduit.assert_called_with(conduit.generation)
+            s.refresh_url.assert_called_with(conduit, s.base_url, False)
+            s.refreshed.assert_called_with(conduit, [s.base_url])
 
-        self.assertEqual(called, 1)
-        self.assertEqual(report.total_passes, 1)
-        self.assertEqual(report.total_sources, len(sources))
-        self.assertEqual(len(report.downloads), 1)
-        self.assertEqual(report.downloads[sources[2].id].total_succeeded, 0)
-        self.assertEqual(report.downloads[sources[2].id].total_failed, 0)
+        self.assertEqual(report, ['http://s-0', 'http://s-1', 'http://s-2'])
+        self.assertTrue(fake_manager().purge_expired.called)
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
-    def test_refresh(self, fake_manager, fake_load):
+    def test_refresh_concurrent(self, fake_manager, fake_load):
+        urls = ['url-%d' % n for n in range(8)]
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def refresh_url(conduit, url, force):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(url)
+            return url
+
         sources = {}
-        for n in range(3):
+        for n in range(2):
             s = ContentSource('s-%d' % n, {})
-            s.refresh = Mock(return_value=[n])
-            s.get_downloader = Mock()
+            s.get_conduit = Mock()
+            s.refresh_url = Mock(side_effect=refresh_url)
+            s.refreshed = Mock()
             sources[s.id] = s
 
         fake_manager().has_entries.return_value = False
@@ -241,13 +158,12 @@ class TestContainer(TestCase):
         # test
         canceled = FakeEvent()
         container = ContentContainer('')
-        report = container.refresh(canceled)
+        with patch.object(ContentSource, 'urls', urls):
+            report = container.refresh(canceled, threads=3)
 
         # validation
-        for s in sources.values():
-            s.refresh.assert_called_with(canceled)
-
-        self.assertEqual(sorted(report), [0, 1, 2])
+        self.assertEqual(report, urls + urls)
+        self.assertEqual(max(peak), 3)
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
@@ -255,7 +171,8 @@ class TestContainer(TestCase):
         sources = {}
         for n in range(3):
             s = ContentSource('s-%d' % n, {})
-            s.refresh = Mock(side_effect=ValueError('must be int'))
+            s.get_conduit = Mock(side_effect=ValueError('must be int'))
+            s.refresh_url = Mock()
             s.get_downloader = Mock()
             sources[s.id] = s
 
@@ -268,19 +185,23 @@ class TestContainer(TestCase):
         report = container.refresh(canceled)
 
         # validation
+        self.assertEqual(len(report), 3)
         for s in sources.values():
-            s.refresh.assert_called_with(canceled)
+            self.assertFalse(s.refresh_url.called)
 
         for r in report:
-            r.errors = ['must be int']
+            self.assertFalse(r.succeeded)
+            self.assertEqual(r.errors, ['must be int'])
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
     def test_forced_refresh(self, fake_manager, fake_load):
         sources = {}
         for n in range(3):
-            s = ContentSource('s-%d' % n, {})
-            s.refresh = Mock()
+            s = ContentSource('s-%d' % n, {constants.BASE_URL: 'http://s-%d' % n})
+            s.get_conduit = Mock()
+            s.refresh_url = Mock()
+            s.refreshed = Mock()
             sources[s.id] = s
 
         fake_manager().has_entries.return_value = True
@@ -289,11 +210,15 @@ class TestContainer(TestCase):
         # test
         canceled = FakeEvent()
         container = ContentContainer('')
+        container.refresh(canceled)
+        for s in sources.values():
+            self.assertFalse(s.refresh_url.called)
         container.refresh(canceled, force=True)
 
         # validation
         for s in sources.values():
-            s.refresh.assert_called_with(canceled)
+            self.assertEqual(s.refresh_url.call_count, 1)
+            s.refresh_url.assert_called_with(s.get_conduit.return_value, s.base_url, True)
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     @patch('pulp.server.content.sources.container.managers.content_catalog_manager', Mock())
@@ -301,7 +226,7 @@ class TestContainer(TestCase):
         sources = {}
         for n in range(3):
             s = ContentSource('s-%d' % n, {})
-            s.refresh = Mock()
+            s.refresh_url = Mock()
             sources[s.id] = s
 
         fake_load.return_value = sources
@@ -314,7 +239,7 @@ class TestContainer(TestCase):
 
         # validation
         for s in sources.values():
-            self.assertFalse(s.refresh.called)
+            self.assertFalse(s.refresh_url.called)
 
     @patch('pulp.server.content.sources.container.ContentSource.load_all')
     @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
@@ -330,6 +255,105 @@ class TestContainer(TestCase):
         fake_manager().purge_orphans.assert_called_with(fake_load.return_value.keys())
 
 
+class TestDownloadScheduler(TestCase):
+
+    @staticmethod
+    def request(source_urls):
+        request = Request('T', {}, source_urls[-1][1], 'path')
+        request.sources = source_urls
+        return request
+
+    def test_download(self):
+        alternate = FakeSource('alternate', FakeDownloader())
+        primary = FakeSource('primary', FakeDownloader())
+        request_list = [
+            self.request([(alternate, 'bad-1'), (primary, 'url-1')]),
+            self.request([(alternate, 'url-2'), (primary, 'url-2')]),
+            self.request([(primary, 'url-3')]),
+            self.request([(primary, 'bad-4')]),
+        ]
+        request_list[2].downloaded = True
+        listener = Mock()
+        report = DownloadReport()
+
+        # test
+        scheduler = DownloadScheduler(FakeEvent(), report, listener)
+        scheduler.download(request_list)
+
+        # validation
+        self.assertTrue(request_list[0].downloaded)
+        self.assertEqual(request_list[0].errors, ['failed: bad-1'])
+        self.assertTrue(request_list[1].downloaded)
+        self.assertFalse(request_list[3].downloaded)
+        self.assertEqual(alternate.downloader.urls, ['bad-1', 'url-2'])
+        self.assertEqual(sorted(primary.downloader.urls), ['bad-4', 'url-1'])
+        self.assertEqual(listener.download_succeeded.call_count, 2)
+        listener.download_failed.assert_called_once_with(request_list[3])
+        self.assertEqual(report.total_passes, 2)
+        self.assertEqual(report.downloads['alternate'].total_succeeded, 1)
+        self.assertEqual(report.downloads['alternate'].total_failed, 1)
+        self.assertEqual(report.downloads['alternate'].total_bytes, 10)
+        self.assertEqual(report.downloads['primary'].total_succeeded, 1)
+        self.assertEqual(report.downloads['primary'].total_failed, 1)
+        for batch in scheduler.batches.values():
+            self.assertFalse(batch.isAlive())
+
+    def test_download_concurrency_limit(self):
+        downloader = FakeDownloader(threads=4, delay=0.01)
+        source = FakeSource('alternate', downloader, max_concurrent=2)
+        request_list = [self.request([(source, 'url-%d' % n)]) for n in range(10)]
+
+        # test
+        DownloadScheduler(FakeEvent(), DownloadReport()).download(request_list)
+
+        # validation
+        self.assertTrue(all(r.downloaded for r in request_list))
+        self.assertEqual(downloader.max_active, 2)
+
+    def test_download_downloader_raised(self):
+        broken = FakeSource('broken', Mock())
+        broken.downloader.download.side_effect = ValueError()
+        primary = FakeSource('primary', FakeDownloader())
+        request_list = [self.request([(broken, 'url-%d' % n), (primary, 'url-%d' % n)])
+                        for n in range(3)]
+        listener = Mock()
+        report = DownloadReport()
+
+        # test
+        DownloadScheduler(FakeEvent(), report, listener).download(request_list)
+
+        # validation
+        self.assertTrue(all(r.downloaded for r in request_list))
+        self.assertEqual(report.downloads['broken'].total_succeeded, 0)
+        self.assertEqual(report.downloads['primary'].total_succeeded, 3)
+        self.assertFalse(listener.download_failed.called)
+
+    def test_download_canceled(self):
+        canceled = FakeEvent()
+        source = FakeSource('primary', FakeDownloader(on_start=canceled.set))
+        request_list = [self.request([(source, 'url-%d' % n)]) for n in range(5)]
+
+        # test
+        DownloadScheduler(canceled, DownloadReport()).download(request_list)
+
+        # validation
+        self.assertEqual(source.downloader.urls, ['url-0'])
+        self.assertTrue(source.downloader.canceled)
+
+    def test_exhausted(self):
+        listener = Mock()
+        request = Mock()
+
+        # test
+        scheduler = DownloadScheduler(FakeEvent(), DownloadReport(), listener)
+        scheduler.pending = 1
+        scheduler.exhausted(request)
+
+        # validation
+        listener.download_failed.assert_called_once_with(request)
+        self.assertTrue(scheduler.finished.isSet())
+
+
 class TestNectarListener(TestCase):
 
     @patch('pulp.server.content.sources.container.log')
@@ -539,6 +563,99 @@ class TestNectarListener(TestCase):
         self.assertFalse(listener.failed_succeeded.called)
 
 
+    def test_download_succeeded_batch(self):
+        canceled = FakeEvent()
+        batch = Mock()
+        report = Mock()
+
+        # test
+        nectar_listener = NectarListener(canceled, Mock(), None, batch)
+        nectar_listener.download_started(report)
+        nectar_listener.download_succeeded(report)
+
+        # validation
+        batch.started.assert_called_once_with(report.data)
+        batch.succeeded.assert_called_once_with(report.data, report)
+
+    def test_download_failed_and_canceled_batch(self):
+        canceled = FakeEvent()
+        canceled.set()
+        batch = Mock()
+        report = Mock()
+
+        # test
+        nectar_listener = NectarListener(canceled, Mock(), Mock(), batch)
+        nectar_listener.download_failed(report)
+
+        # validation
+        batch.failed.assert_called_once_with(report.data, report)
+
+
+class FakeSource(ContentSource):
+
+    def __init__(self, source_id, downloader, max_concurrent=None):
+        ContentSource.__init__(self, source_id, {'max_concurrent': max_concurrent})
+        self.downloader = downloader
+
+    def get_downloader(self):
+        return self.downloader
+
+
+class FakeDownloader(object):
+    """
+    Consumes the request iterable lazily like the nectar downloaders.
+    Requests with a URL starting with "bad" fail.
+    """
+
+    def __init__(self, threads=1, delay=0, on_start=None):
+        self.threads = threads
+        self.delay = delay
+        self.on_start = on_start
+        self.event_listener = None
+        self.urls = []
+        self.active = 0
+        self.max_active = 0
+        self.canceled = False
+        self.lock = threading.Lock()
+        self.iterator_lock = threading.Lock()
+
+    def cancel(self):
+        self.canceled = True
+
+    def download(self, request_list):
+        iterator = iter(request_list)
+        threads = [threading.Thread(target=self._run, args=(iterator,))
+                   for n in range(self.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _run(self, iterator):
+        while True:
+            with self.iterator_lock:
+                try:
+                    request = iterator.next()
+                except StopIteration:
+                    return
+            with self.lock:
+                self.urls.append(request.url)
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            report = Mock(data=request.data, bytes_downloaded=10,
+                          error_msg='failed: %s' % request.url)
+            self.event_listener.download_started(report)
+            if self.on_start:
+                self.on_start()
+            time.sleep(self.delay)
+            with self.lock:
+                self.active -= 1
+            if request.url.startswith('bad'):
+                self.event_listener.download_failed(report)
+            else:
+                self.event_listener.download_succeeded(report)
+
+
 # using this so nobody thinks the tests are using threads.
 
 
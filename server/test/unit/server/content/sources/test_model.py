@@ -12,12 +12,13 @@
 import os
 import sys
 from unittest import TestCase
-from mock import patch, Mock
+from mock import patch, Mock, call
 
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 from pulp.server.content.sources import constants
 from pulp.server.content.sources.model import Request, PrimarySource, ContentSource, RefreshReport
 from pulp.server.content.sources.model import PRIMARY_ID, DownloadDetails, DownloadReport
+from pulp.server.managers.content.catalog import GRACE_PERIOD
 
 TYPE = '1234'
 TYPE_ID = 'ABCD'
@@ -157,6 +158,25 @@ class TestRequest(TestCase):
         self.assertEqual(request.sources[4][0].id, primary.id)
         self.assertEqual(request.sources[4][1], url)
 
+    @patch('pulp.server.content.sources.container.managers.content_catalog_manager')
+    def test_find_sources_with_entries(self, fake_manager):
+        url = 'http://redhat.com/repository'
+        primary = PrimarySource(None)
+        alternatives = dict([(s, ContentSource(s, d)) for s, d in DESCRIPTOR])
+
+        # test
+
+        request = Request('test_1', 1, url, '/tmp/123')
+        request.find_sources(primary, alternatives, CATALOG[:2])
+
+        # validation
+
+        self.assertFalse(fake_manager().find.called)
+        self.assertEqual(len(request.sources), 3)
+        self.assertEqual(request.sources[0][1], CATALOG[0][constants.URL])
+        self.assertEqual(request.sources[1][1], CATALOG[1][constants.URL])
+        self.assertEqual(request.sources[2][0].id, primary.id)
+
     def test_next_source(self):
         request = Request('', {}, '', '')
         request.sources = [1, 2, 3]
@@ -306,6 +326,12 @@ class TestContentSource(TestCase):
         source = ContentSource('s-1', {constants.EXPIRES: '1h'})
         self.assertEqual(source.expires, 3600)
 
+    def test_max_concurrent(self):
+        source = ContentSource('s-1', {constants.MAX_CONCURRENT: '4'})
+        self.assertEqual(source.max_concurrent, 4)
+        source = ContentSource('s-1', {})
+        self.assertEqual(source.max_concurrent, None)
+
     def test_base_url(self):
         source = ContentSource('s-1', {constants.BASE_URL: 'http://xyz.com'})
         self.assertEqual(source.base_url, 'http://xyz.com')
@@ -412,7 +438,9 @@ class TestContentSource(TestCase):
 
         self.assertEqual(canceled.isSet.call_count, len(urls))
         self.assertEqual(conduit.reset.call_count, len(urls))
+        self.assertEqual(conduit.flush.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        conduit.swap_generation.assert_called_once_with()
 
         n = 0
         added = 10
@@ -454,8 +482,73 @@ class TestContentSource(TestCase):
         self.assertEqual(canceled.isSet.call_count, 1)
         self.assertEqual(conduit.reset.call_count, 0)
         self.assertEqual(cataloger.refresh.call_count, 0)
+        self.assertFalse(conduit.swap_generation.called)
         self.assertEqual(report, [])
 
+    @patch('pulp.server.content.sources.model.ContentSource.urls')
+    def test_refresh_skipped(self, fake_urls):
+        urls = ['url-1', 'url-2']
+        fake_urls.__get__ = Mock(return_value=urls)
+
+        canceled = Mock()
+        canceled.isSet = Mock(return_value=False)
+        conduit = Mock()
+        conduit.get_checksum.side_effect = ['abc', 'xyz']
+        conduit.has_entries.return_value = True
+        cataloger = Mock()
+        cataloger.get_checksum.return_value = 'abc'
+
+        source = ContentSource('s-1', {constants.BASE_URL: 'http://xyz.com'})
+        source.get_conduit = Mock(return_value=conduit)
+        source.get_cataloger = Mock(return_value=cataloger)
+
+        # test
+
+        report = source.refresh(canceled)
+
+        # validation
+
+        self.assertTrue(report[0].succeeded)
+        self.assertTrue(report[0].skipped)
+        self.assertTrue(report[1].succeeded)
+        self.assertFalse(report[1].skipped)
+        cataloger.refresh.assert_called_once_with(conduit, source.descriptor, 'url-2')
+        conduit.set_checksum.assert_called_once_with('url-2', 'abc')
+        self.assertEqual(conduit.reset.call_args_list, [call('url-1'), call('url-2')])
+        conduit.has_entries.assert_called_once_with('url-1', GRACE_PERIOD)
+        conduit.extend_expiration.assert_called_once_with('url-1')
+        # entries of the skipped URL must not be replaced
+        self.assertFalse(conduit.swap_generation.called)
+
+    @patch('pulp.server.content.sources.model.ContentSource.urls')
+    def test_refresh_forced_not_skipped(self, fake_urls):
+        urls = ['url-1']
+        fake_urls.__get__ = Mock(return_value=urls)
+
+        canceled = Mock()
+        canceled.isSet = Mock(return_value=False)
+        conduit = Mock()
+        conduit.get_checksum.return_value = 'abc'
+        conduit.has_entries.return_value = True
+        cataloger = Mock()
+        cataloger.get_checksum.return_value = 'abc'
+
+        source = ContentSource('s-1', {constants.BASE_URL: 'http://xyz.com'})
+        source.get_conduit = Mock(return_value=conduit)
+        source.get_cataloger = Mock(return_value=cataloger)
+
+        # test
+
+        report = source.refresh(canceled, force=True)
+
+        # validation
+
+        self.assertTrue(report[0].succeeded)
+        self.assertFalse(report[0].skipped)
+        cataloger.refresh.assert_called_once_with(conduit, source.descriptor, 'url-1')
+        self.assertFalse(conduit.extend_expiration.called)
+        self.assertTrue(conduit.swap_generation.called)
+
     @patch('pulp.server.content.sources.model.ContentSource.urls')
     def test_refresh_raised(self, fake_urls):
         url = 'http://xyz.com'
@@ -481,6 +574,8 @@ class TestContentSource(TestCase):
         self.assertEqual(canceled.isSet.call_count, len(urls))
         self.assertEqual(conduit.reset.call_count, len(urls))
         self.assertEqual(cataloger.refresh.call_count, len(urls))
+        self.assertFalse(conduit.flush.called)
+        self.assertFalse(conduit.swap_generation.called)
 
         n = 0
         for _url in source.urls:
@@ -548,6 +643,24 @@ class TestPrimarySource(TestCase):
         primary = PrimarySource(None)
         self.assertEqual(primary.priority, sys.maxint)
 
+    def test_max_concurrent(self):
+        primary = PrimarySource(Mock())
+        primary.get_downloader().config.max_concurrent = 7
+        self.assertEqual(primary.max_concurrent, 7)
+        self.assertEqual(PrimarySource(None).max_concurrent, None)
+
+
+DETAILS = {
+    'total_failed': 0,
+    'total_succeeded': 0,
+    'total_bytes': 0,
+    'total_seconds': 0.0,
+    'total_latency': 0.0,
+    'max_latency': 0.0,
+    'throughput': 0.0,
+    'average_latency': 0.0,
+}
+
 
 class TestDownloadDetails(TestCase):
 
@@ -558,7 +671,20 @@ class TestDownloadDetails(TestCase):
 
     def test_dict(self):
         details = DownloadDetails()
-        self.assertEqual(details.dict(), {'total_failed': 0, 'total_succeeded': 0})
+        self.assertEqual(details.dict(), DETAILS)
+
+    def test_add_download(self):
+        details = DownloadDetails()
+        details.add_download(True, 2.0, 300)
+        details.add_download(False, 4.0)
+        details.total_seconds = 3.0
+
+        self.assertEqual(details.total_succeeded, 1)
+        self.assertEqual(details.total_failed, 1)
+        self.assertEqual(details.total_bytes, 300)
+        self.assertEqual(details.max_latency, 4.0)
+        self.assertEqual(details.average_latency, 3.0)
+        self.assertEqual(details.throughput, 100.0)
 
 
 class TestDownloadReport(TestCase):
@@ -577,8 +703,8 @@ class TestDownloadReport(TestCase):
             'total_passes': 0,
             'total_sources': 0,
             'downloads': {
-                's1': {'total_failed': 0, 'total_succeeded': 0},
-                's2': {'total_failed': 0, 'total_succeeded': 0}
+                's1': DETAILS,
+                's2': DETAILS
             },
         }
         self.assertEqual(report.dict(), expected)
@@ -593,6 +719,7 @@ class TestRefreshReport(TestCase):
         self.assertEqual(report.source_id, source_id)
         self.assertEqual(report.url, url)
         self.assertFalse(report.succeeded)
+        self.assertFalse(report.skipped)
         self.assertEqual(report.added_count, 0)
         self.assertEqual(report.deleted_count, 0)
         self.assertEqual(report.errors, [])
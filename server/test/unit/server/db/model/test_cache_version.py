@@ -0,0 +1,27 @@
+"""
+This module contains tests for the pulp.server.db.model.cache_version module.
+"""
+from ....base import PulpServerTests
+from pulp.server.db.model.cache_version import CacheVersion
+
+
+class TestCacheVersion(PulpServerTests):
+    """
+    Test the CacheVersion counters.
+    """
+    def clean(self):
+        super(TestCacheVersion, self).clean()
+        CacheVersion.get_collection().remove()
+
+    def test_get_version_missing(self):
+        self.assertEqual(CacheVersion.get_version('missing'), 0)
+
+    def test_bump_version(self):
+        self.assertEqual(CacheVersion.bump_version(CacheVersion.CREDENTIALS), 1)
+        self.assertEqual(CacheVersion.bump_version(CacheVersion.CREDENTIALS), 2)
+        CacheVersion.bump_version(CacheVersion.PERMISSIONS)
+
+        # counters are independent of each other
+        self.assertEqual(CacheVersion.get_version(CacheVersion.CREDENTIALS), 2)
+        self.assertEqual(CacheVersion.get_version(CacheVersion.PERMISSIONS), 1)
+        self.assertEqual(CacheVersion.get_version(CacheVersion.EVENT_LISTENERS), 0)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the License
+# (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied, including the
+# implied warranties of MERCHANTABILITY, NON-INFRINGEMENT, or FITNESS FOR A
+# PARTICULAR PURPOSE.
+# You should have received a copy of GPLv2 along with this software; if not,
+# see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
+"""
+This module contains tests for the pulp.server.db.connection module.
+"""
+import time
+import unittest
+
+import mock
+from pymongo.errors import AutoReconnect
+
+from ... import base
+from pulp.server import config
+from pulp.server.db import connection, profiler
+
+
+class FakeCollection(object):
+
+    def __init__(self, retries):
+        self.retries = retries
+        self.name = 'fake'
+        self.full_name = 'pulp_unittest.fake'
+
+
+class TestRetryDecorator(unittest.TestCase):
+
+    @mock.patch('time.sleep')
+    def test_retries_exhausted(self, mock_sleep):
+        method = mock.Mock(side_effect=AutoReconnect, __name__='find')
+        decorated = connection._retry_decorator(method)
+        collection = FakeCollection(2)
+
+        self.assertRaises(connection.PulpCollectionFailure, decorated, collection, {'a': 1})
+
+        self.assertEqual(method.call_count, 3)
+        method.assert_called_with(collection, {'a': 1})
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @mock.patch('pulp.server.db.profiler.finish')
+    @mock.patch('pulp.server.db.profiler.start', return_value=100.0)
+    @mock.patch('time.sleep')
+    def test_profiled(self, mock_sleep, mock_start, mock_finish):
+        method = mock.Mock(side_effect=[AutoReconnect, {'n': 4}], __name__='update')
+        decorated = connection._retry_decorator(method)
+
+        decorated(FakeCollection(1), {'a': 1}, {'$set': {'b': 2}})
+
+        self.assertEqual(mock_finish.call_count, 1)
+        self.assertEqual(mock_finish.call_args[0], (100.0, 'fake', 'update'))
+        self.assertEqual(mock_finish.call_args[1],
+                         {'documents': 4, 'spec': {'a': 1}, 'failed': False})
+
+    @mock.patch('time.sleep')
+    def test_recovered(self, mock_sleep):
+        method = mock.Mock(side_effect=[AutoReconnect, 10], __name__='count')
+        decorated = connection._retry_decorator(method)
+
+        result = decorated(FakeCollection(1))
+
+        self.assertEqual(result, 10)
+        self.assertEqual(method.call_count, 2)
+
+    def test_decorated_at_class_level(self):
+        for name in connection.PulpCollection._decorated_methods:
+            method = getattr(connection.PulpCollection, name)
+            self.assertEqual(method.__name__, name)
+            self.assertNotEqual(method.im_func, getattr(connection.Collection, name).im_func)
+
+
+class TestGetCollection(base.PulpServerTests):
+
+    def tearDown(self):
+        super(TestGetCollection, self).tearDown()
+        connection.clear_collections()
+
+    def test_cached(self):
+        collection = connection.get_collection('test_cached')
+
+        self.assertTrue(isinstance(collection, connection.PulpCollection))
+        self.assertTrue(connection.get_collection('test_cached') is collection)
+        self.assertEqual(collection.retries,
+                         config.config.getint('database', 'operation_retries'))
+        # nothing is decorated per instance anymore
+        for name in connection.PulpCollection._decorated_methods:
+            self.assertFalse(name in collection.__dict__)
+
+    def test_create_rebuilds(self):
+        collection = connection.get_collection('test_create_rebuilds')
+        connection.get_database().drop_collection('test_create_rebuilds')
+
+        created = connection.get_collection('test_create_rebuilds', create=True)
+
+        self.assertFalse(created is collection)
+        self.assertTrue(connection.get_collection('test_create_rebuilds') is created)
+        connection.get_database().drop_collection('test_create_rebuilds')
+
+    def test_cleared_on_initialize(self):
+        collection = connection.get_collection('test_cleared')
+
+        connection.initialize()
+
+        self.assertFalse(connection.get_collection('test_cleared') is collection)
+
+    def test_find_profiled(self):
+        collection = connection.get_collection('test_find_profiled')
+        collection.insert([{'a': i} for i in range(3)], safe=True)
+        profiler.reset()
+
+        cursor = collection.find({'a': {'$gte': 1}})
+        self.assertTrue(isinstance(cursor, connection.PulpCursor))
+        self.assertEqual(len(list(cursor)), 2)
+        self.assertEqual(collection.find_one({'a': 0})['a'], 0)
+
+        report = dict(((e['collection'], e['operation']), e) for e in profiler.report())
+        self.assertEqual(report[('test_find_profiled', 'find')]['calls'], 1)
+        self.assertEqual(report[('test_find_profiled', 'find')]['documents'], 2)
+        # the query issued by find_one is not counted as a separate find
+        self.assertEqual(report[('test_find_profiled', 'find_one')]['calls'], 1)
+        self.assertEqual(report[('test_find_profiled', 'find_one')]['documents'], 1)
+        connection.get_database().drop_collection('test_find_profiled')
+
+    def test_uninitialized(self):
+        database = connection._DATABASE
+        connection._DATABASE = None
+        try:
+            self.assertRaises(connection.PulpCollectionFailure,
+                              connection.get_collection, 'test_uninitialized')
+        finally:
+            connection._DATABASE = database
+
+    def test_acquisition_benchmark(self):
+        """
+        Micro-benchmark comparing the cost of acquiring a cached handle with
+        the cost of building a new one for every call.
+        """
+        iterations = 2000
+        retries = config.config.getint('database', 'operation_retries')
+        database = connection.get_database()
+
+        start = time.time()
+        for i in xrange(iterations):
+            config.config.getint('database', 'operation_retries')
+            connection.PulpCollection(database, 'test_benchmark', retries=retries)
+        uncached = time.time() - start
+
+        connection.get_collection('test_benchmark')
+        start = time.time()
+        for i in xrange(iterations):
+            connection.get_collection('test_benchmark')
+        cached = time.time() - start
+
+        self.assertTrue(cached < uncached)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the License
+# (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied, including the
+# implied warranties of MERCHANTABILITY, NON-INFRINGEMENT, or FITNESS FOR A
+# PARTICULAR PURPOSE.
+# You should have received a copy of GPLv2 along with this software; if not,
+# see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
+"""
+This module contains tests for the pulp.server.db.profiler module.
+"""
+import unittest
+
+import mock
+
+from pulp.server.db import profiler
+
+
+class TestOperationStats(unittest.TestCase):
+
+    def test_record(self):
+        stats = profiler.OperationStats()
+        stats.record(0.5, 1, False)
+        stats.record(50, 3, False)
+        stats.record(20000, 0, True)
+
+        data = stats.dict()
+
+        self.assertEqual(data['calls'], 3)
+        self.assertEqual(data['failures'], 1)
+        self.assertEqual(data['documents'], 4)
+        self.assertEqual(data['max_ms'], 20000)
+        self.assertEqual(data['total_ms'], 20050.5)
+        self.assertEqual(data['average_ms'], 6683.5)
+        self.assertEqual(data['histogram'],
+                         {'1': 1, '10': 0, '100': 1, '1000': 0, '10000': 0, 'inf': 1})
+
+    def test_dict_no_calls(self):
+        data = profiler.OperationStats().dict()
+
+        self.assertEqual(data['calls'], 0)
+        self.assertEqual(data['average_ms'], 0.0)
+
+
+@mock.patch('pulp.server.db.profiler._current_task_id', return_value=None)
+@mock.patch('pulp.server.db.profiler._SLOW_QUERY_THRESHOLD', 0)
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        profiler.reset()
+
+    def tearDown(self):
+        profiler.reset()
+
+    def test_report(self, *unused):
+        profiler.finish(profiler.start(), 'repos', 'find_one', documents=1)
+        profiler.finish(profiler.start(), 'repos', 'find_one', documents=0)
+        profiler.finish(profiler.start(), 'consumers', 'update', failed=True)
+
+        report = profiler.report()
+
+        self.assertEqual([(e['collection'], e['operation']) for e in report],
+                         [('consumers', 'update'), ('repos', 'find_one')])
+        self.assertEqual(report[0]['failures'], 1)
+        self.assertEqual(report[1]['calls'], 2)
+        self.assertEqual(report[1]['documents'], 1)
+
+    def test_nested_not_recorded(self, *unused):
+        outer = profiler.start()
+        inner = profiler.start()
+        self.assertTrue(inner is None)
+        profiler.finish(inner, 'repos', 'find')
+        profiler.finish(outer, 'repos', 'find_one')
+
+        report = profiler.report()
+
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]['operation'], 'find_one')
+        # the next operation is no longer nested
+        self.assertFalse(profiler.start() is None)
+        profiler.finish(None, 'repos', 'find')
+
+    def test_task_report(self, mock_task_id):
+        mock_task_id.return_value = 'task-1'
+        profiler.finish(profiler.start(), 'repos', 'find_one', documents=1)
+        mock_task_id.return_value = None
+        profiler.finish(profiler.start(), 'repos', 'find_one', documents=1)
+
+        task_report = profiler.pop_task_report('task-1')
+
+        self.assertEqual(len(task_report), 1)
+        self.assertEqual(task_report[0]['calls'], 1)
+        self.assertEqual(profiler.report()[0]['calls'], 2)
+        self.assertEqual(profiler.pop_task_report('task-1'), [])
+
+    @mock.patch('pulp.server.db.profiler.MAX_TRACKED_TASKS', 2)
+    def test_tracked_tasks_bounded(self, mock_task_id):
+        for task_id in ('task-1', 'task-2', 'task-3'):
+            mock_task_id.return_value = task_id
+            profiler.finish(profiler.start(), 'repos', 'find_one')
+
+        self.assertEqual(len(profiler._TASK_STATS), 2)
+        self.assertTrue('task-3' in profiler._TASK_STATS)
+
+    @mock.patch('pulp.server.db.profiler._LOG')
+    def test_slow_query_logged(self, mock_log, *unused):
+        with mock.patch('pulp.server.db.profiler._SLOW_QUERY_THRESHOLD', 1):
+            with mock.patch('time.time', side_effect=[100.0, 100.5]):
+                started = profiler.start()
+                profiler.finish(started, 'repos', 'find', spec={'id': 'zoo'})
+
+        self.assertEqual(mock_log.warn.call_count, 1)
+        message = mock_log.warn.call_args[0][0]
+        self.assertTrue('500 ms' in message)
+        self.assertTrue("{'id': 'zoo'}" in message)
+
+    @mock.patch('pulp.server.db.profiler._LOG')
+    def test_slow_query_disabled(self, mock_log, *unused):
+        with mock.patch('time.time', side_effect=[100.0, 200.0]):
+            started = profiler.start()
+            profiler.finish(started, 'repos', 'find', spec={'id': 'zoo'})
+
+        self.assertFalse(mock_log.warn.called)
+
+
+class TestCallingManager(unittest.TestCase):
+
+    def test_manager_preferred(self):
+        def manager_call():
+            return profiler._calling_manager()
+        globals_ = {'__name__': 'pulp.server.managers.repo.cud', 'profiler': profiler}
+        manager_call = type(manager_call)(manager_call.func_code, globals_)
+
+        self.assertEqual(manager_call(), 'pulp.server.managers.repo.cud.manager_call')
+
+    def test_pulp_caller(self):
+        self.assertEqual(profiler._calling_manager(), None)
+
+
+class TestConfigure(unittest.TestCase):
+
+    @mock.patch('pulp.server.db.profiler.config')
+    def test_configure(self, mock_config):
+        mock_config.config.getint.return_value = 250
+
+        with mock.patch('pulp.server.db.profiler._SLOW_QUERY_THRESHOLD', None):
+            self.assertEqual(profiler._slow_query_threshold(), 250)
+
+        mock_config.config.getint.assert_called_once_with('database', 'slow_query_threshold')
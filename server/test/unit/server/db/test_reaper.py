@@ -21,7 +21,8 @@ import mock
 from ... import base
 from pulp.server.compat import ObjectId
 from pulp.server.db import reaper
-from pulp.server.db.model import celery_result, consumer, dispatch, repo_group, repository
+from pulp.server.db.model import (celery_result, consumer, dispatch, reaper_base, repo_group,
+                                  repository)
 from pulp.server.db.model.consumer import ConsumerHistoryEvent
 from pulp.server.db.model.reaper_base import _create_expired_object_id, ReaperMixin
 
@@ -80,6 +81,61 @@ class TestCreateExpiredObjectId(unittest.TestCase):
         self.assertTrue(isinstance(expired_oid, ObjectId))
 
 
+class TestReapOldDocuments(unittest.TestCase):
+    """
+    Assert that ReaperMixin.reap_old_documents() removes documents in throttled chunks.
+    """
+
+    @mock.patch('time.sleep')
+    @mock.patch('pulp.server.db.model.reaper_base._create_expired_object_id')
+    @mock.patch('pulp.server.db.model.reaper_base.ReaperMixin.get_collection', create=True)
+    def test_chunked(self, get_collection, create_expired, sleep):
+        expired = ObjectId()
+        create_expired.return_value = expired
+        collection = get_collection.return_value
+        first, second = ObjectId(), ObjectId()
+        cursor = collection.find.return_value.skip.return_value.limit.return_value
+        cursor.__iter__.side_effect = [iter([{'_id': first}]), iter([{'_id': second}]), iter([])]
+        collection.remove.side_effect = [{'n': 10}, {'n': 10}, {'n': 3}]
+
+        reaped = ReaperMixin.reap_old_documents(1.0, chunk_size=10, duty_cycle=0.5)
+
+        self.assertEqual(reaped['removed'], 23)
+        self.assertEqual(reaped['chunks'], 3)
+        collection.find.return_value.skip.assert_called_with(9)
+        self.assertEqual(collection.remove.call_args_list,
+                         [mock.call({'_id': {'$lte': first}}, safe=True),
+                          mock.call({'_id': {'$lte': second}}, safe=True),
+                          mock.call({'_id': {'$lte': expired}}, safe=True)])
+        # throttled after each full chunk
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch('time.sleep')
+    @mock.patch('pulp.server.db.model.reaper_base.ReaperMixin.get_collection', create=True)
+    def test_not_throttled(self, get_collection, sleep):
+        collection = get_collection.return_value
+        cursor = collection.find.return_value.skip.return_value.limit.return_value
+        cursor.__iter__.side_effect = [iter([{'_id': ObjectId()}]), iter([])]
+        collection.remove.return_value = {'n': 1}
+
+        reaped = ReaperMixin.reap_old_documents(1.0, chunk_size=1)
+
+        self.assertEqual(reaped['removed'], 2)
+        self.assertFalse(sleep.called)
+
+
+    @mock.patch('pulp.server.db.model.reaper_base.ReaperMixin.get_collection', create=True)
+    def test_invalid_chunk_size(self, get_collection):
+        collection = get_collection.return_value
+        cursor = collection.find.return_value.skip.return_value.limit.return_value
+        cursor.__iter__.side_effect = [iter([])]
+        collection.remove.return_value = {'n': 0}
+
+        ReaperMixin.reap_old_documents(1.0, chunk_size=0)
+
+        collection.find.return_value.skip.assert_called_with(0)
+
+
 class TestReapInheritance(unittest.TestCase):
     """
     Check class inheritance related to ReaperMixin
@@ -136,7 +192,46 @@ class TestReapExpiredDocuments(base.PulpServerTests):
         # future, which should make the event we just created look old enough to delete
         getfloat.return_value = -1.0
 
-        reaper.reap_expired_documents()
+        metrics = reaper.reap_expired_documents()
 
         # The event should no longer exist
         self.assertTrue(chec.find({'_id': event['_id']}).count() == 0)
+        self.assertEqual(metrics[ConsumerHistoryEvent.collection_name]['removed'], 1)
+
+    @mock.patch('pulp.server.db.reaper.pulp_config.config.getint')
+    @mock.patch('pulp.server.db.reaper.pulp_config.config.getfloat')
+    def test_remove_in_chunks(self, getfloat, getint):
+        chec = ConsumerHistoryEvent.get_collection()
+        for i in range(5):
+            event = ConsumerHistoryEvent('consumer', 'originator', 'consumer_registered', {})
+            chec.insert(event, safe=True)
+        getfloat.return_value = -1.0
+        getint.return_value = 2
+
+        metrics = reaper.reap_expired_documents()
+
+        self.assertEqual(chec.find().count(), 0)
+        reaped = metrics[ConsumerHistoryEvent.collection_name]
+        self.assertEqual(reaped['removed'], 5)
+        self.assertEqual(reaped['chunks'], 3)
+
+    @mock.patch('pulp.server.db.reaper.reaper_base.DEFAULT_CHUNK_SIZE', 4)
+    @mock.patch('pulp.server.db.reaper.pulp_config.config.getint')
+    @mock.patch('pulp.server.db.reaper.pulp_config.config.getfloat')
+    def test_invalid_settings(self, getfloat, getint):
+        chec = ConsumerHistoryEvent.get_collection()
+        for i in range(5):
+            event = ConsumerHistoryEvent('consumer', 'originator', 'consumer_registered', {})
+            chec.insert(event, safe=True)
+        # also used as the duty cycle
+        getfloat.return_value = -1.0
+        getint.return_value = 0
+
+        with mock.patch.object(ConsumerHistoryEvent, 'reap_old_documents',
+                               wraps=ConsumerHistoryEvent.reap_old_documents) as reap:
+            metrics = reaper.reap_expired_documents()
+
+        reap.assert_called_once_with(-1.0, 4, reaper_base.DEFAULT_DUTY_CYCLE)
+        reaped = metrics[ConsumerHistoryEvent.collection_name]
+        self.assertEqual(reaped['removed'], 5)
+        self.assertEqual(reaped['chunks'], 2)
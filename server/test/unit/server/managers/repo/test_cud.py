@@ -11,8 +11,9 @@ from pulp.common.util import encode_unicode
 from pulp.devel import mock_plugins
 from pulp.plugins.loader import api as plugin_api
 from pulp.server.async.tasks import TaskResult
+from pulp.server.compat import SON
 from pulp.server.db.model import dispatch
-from pulp.server.db.model.repository import Repo, RepoImporter, RepoDistributor
+from pulp.server.db.model.repository import Repo, RepoContentUnit, RepoImporter, RepoDistributor
 from pulp.server.tasks import repository
 import pulp.server.exceptions as exceptions
 import pulp.server.managers.factory as manager_factory
@@ -41,6 +42,7 @@ class RepoManagerTests(base.ResourceReservationTests):
         Repo.get_collection().remove()
         RepoImporter.get_collection().remove()
         RepoDistributor.get_collection().remove()
+        RepoContentUnit.get_collection().remove()
 
     @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
     @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
@@ -48,18 +50,22 @@ class RepoManagerTests(base.ResourceReservationTests):
         # platform migration 0004 has a test for this that uses live data
 
         repo_col = mock_get_repo_col.return_value
-        find = mock_get_assoc_col.return_value.find
-        cursor = find.return_value
-        cursor.distinct.return_value = ['rpm', 'srpm']
-        cursor.count.return_value = 6
+        repo_col.find.return_value = [{'id': 'repo1'}]
+        aggregate = mock_get_assoc_col.return_value.aggregate
+        aggregate.return_value = {'result': [
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'rpm'}, 'count': 6},
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'srpm'}, 'count': 6},
+        ]}
 
         self.manager.rebuild_content_unit_counts(['repo1'])
 
-        # once to get the type_ids, then once more for each of the 2 types
-        self.assertEqual(find.call_count, 3)
-        find.assert_any_call({'repo_id': 'repo1'})
-        find.assert_any_call({'repo_id': 'repo1', 'unit_type_id': 'rpm'})
-        find.assert_any_call({'repo_id': 'repo1', 'unit_type_id': 'srpm'})
+        repo_col.find.assert_called_once_with({'id': {'$in': ['repo1']}},
+                                              fields=['id', 'content_unit_counts'],
+                                              snapshot=True, as_class=SON)
+        # a single aggregation for all of the types
+        self.assertEqual(aggregate.call_count, 1)
+        pipeline = aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'repo_id': {'$in': ['repo1']}}})
 
         self.assertEqual(repo_col.update.call_count, 1)
         repo_col.update.assert_called_once_with(
@@ -68,22 +74,62 @@ class RepoManagerTests(base.ResourceReservationTests):
             safe=True
         )
 
+    @mock.patch('pulp.server.managers.repo.cud._UNIT_COUNT_BATCH_SIZE', 2)
     @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
     @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
     def test_rebuild_default_all_repos(self, mock_get_assoc_col, mock_get_repo_col):
         repo_col = mock_get_repo_col.return_value
-        repo_col.find.return_value = [{'id': 'repo1'}, {'id': 'repo2'}]
+        repo_col.find.return_value = [{'id': 'repo1'}, {'id': 'repo2'}, {'id': 'repo3'}]
 
         assoc_col = mock_get_assoc_col.return_value
-        # don't return any type IDs
-        assoc_col.find.return_value.distinct.return_value = []
+        # don't return any counts
+        assoc_col.aggregate.return_value = {'result': []}
 
         self.manager.rebuild_content_unit_counts()
 
-        # makes sure it found these 2 repos and tried to operate on them
-        assoc_col.find.assert_any_call({'repo_id': 'repo1'})
-        assoc_col.find.assert_any_call({'repo_id': 'repo2'})
-        self.assertEqual(assoc_col.find.call_count, 2)
+        # makes sure it found these 3 repos and operated on them in batches
+        repo_col.find.assert_called_once_with({}, fields=['id', 'content_unit_counts'],
+                                              snapshot=True, as_class=SON)
+        self.assertEqual(assoc_col.aggregate.call_count, 2)
+        matched = [c[0][0][0]['$match']['repo_id']['$in'] for c in
+                   assoc_col.aggregate.call_args_list]
+        self.assertEqual(sorted(matched[0]), ['repo1', 'repo2'])
+        self.assertEqual(matched[1], ['repo3'])
+        for repo_id in ('repo1', 'repo2', 'repo3'):
+            repo_col.update.assert_any_call(
+                {'id': repo_id}, {'$set': {'content_unit_counts': {}}}, safe=True)
+
+    @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
+    @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
+    def test_check_content_unit_counts(self, mock_get_assoc_col, mock_get_repo_col):
+        repo_col = mock_get_repo_col.return_value
+        repo_col.find.return_value = [
+            {'id': 'repo1', 'content_unit_counts': {'rpm': 2, 'srpm': 0}},
+            {'id': 'repo2', 'content_unit_counts': {'rpm': 5}},
+            {'id': 'repo3'},
+            {'id': 'repo4', 'content_unit_counts': {'rpm': 1}},
+        ]
+        repo_col.update.side_effect = [{'n': 1}, {'n': 1}, {'n': 0}]
+        mock_get_assoc_col.return_value.aggregate.return_value = {'result': [
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'rpm'}, 'count': 2},
+            {'_id': {'repo_id': 'repo2', 'unit_type_id': 'rpm'}, 'count': 3},
+        ]}
+
+        corrected = self.manager.check_content_unit_counts()
+
+        # only the drifted and missing counts are rewritten, and only when they
+        # were not changed since they were read
+        self.assertEqual(corrected, ['repo2', 'repo3'])
+        self.assertEqual(repo_col.update.call_count, 3)
+        repo_col.update.assert_any_call(
+            {'id': 'repo2', 'content_unit_counts': {'rpm': 5}},
+            {'$set': {'content_unit_counts': {'rpm': 3}}}, safe=True)
+        repo_col.update.assert_any_call(
+            {'id': 'repo3', 'content_unit_counts': None},
+            {'$set': {'content_unit_counts': {}}}, safe=True)
+        repo_col.update.assert_any_call(
+            {'id': 'repo4', 'content_unit_counts': {'rpm': 1}},
+            {'$set': {'content_unit_counts': {}}}, safe=True)
 
     def test_create(self):
         """
@@ -596,7 +642,33 @@ class RepoManagerTests(base.ResourceReservationTests):
         ARGS = ('repo-123', 'rpm', 7)
 
         self.manager.update_unit_count(*ARGS)
-        mock_update.assert_called_once_with({'id': 'repo-123'}, {'$inc': {'content_unit_counts.rpm': 7}}, safe=True)
+        mock_update.assert_called_once_with(
+            {'id': 'repo-123'}, {'$inc': {'content_unit_counts.rpm': 7, 'content_revision': 1}},
+            safe=True)
+
+    def test_update_unit_count_bumps_content_revision(self):
+        self.manager.create_repo('repo-123')
+
+        self.manager.update_unit_count('repo-123', 'rpm', 2)
+        self.manager.update_unit_count('repo-123', 'rpm', -1)
+
+        repo = Repo.get_collection().find_one({'id': 'repo-123'})
+        self.assertEqual(repo['content_revision'], 2)
+
+    def test_bump_content_revision_for_units(self):
+        for repo_id in ('repo-1', 'repo-2', 'repo-3'):
+            self.manager.create_repo(repo_id)
+        RepoContentUnit.get_collection().insert(
+            [RepoContentUnit('repo-1', 'unit-1', 'rpm', 'importer', 'imp'),
+             RepoContentUnit('repo-2', 'unit-1', 'rpm', 'importer', 'imp'),
+             RepoContentUnit('repo-3', 'unit-2', 'rpm', 'importer', 'imp')], safe=True)
+
+        self.manager.bump_content_revision_for_units('rpm', ['unit-1'])
+
+        revisions = dict((r['id'], r['content_revision']) for r in Repo.get_collection().find())
+        self.assertEqual(revisions, {'repo-1': 1, 'repo-2': 1, 'repo-3': 0})
+        repo = Repo.get_collection().find_one({'id': 'repo-1'})
+        self.assertEqual(repo['content_unit_counts'], {})
 
     def test_update_unit_count_with_db(self):
         """
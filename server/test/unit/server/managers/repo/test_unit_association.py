@@ -429,6 +429,49 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
 
         mock_call.assert_called_once_with(self.repo_id, 'type-1', 2)
 
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_associate_all_existing_other_owner(self, mock_call):
+        """
+        Units already associated by a different owner get a new association
+        but do not count toward the repo's unit count.
+        """
+        self.manager.associate_unit_by_id(
+            self.repo_id, 'type-1', 'foo', OWNER_TYPE_IMPORTER, 'test-importer', False)
+
+        self.manager.associate_all_by_ids(
+            self.repo_id, 'type-1', ['foo', 'bar'], OWNER_TYPE_USER, 'admin')
+
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', 1)
+        repo_units = list(RepoContentUnit.get_collection().find({'repo_id': self.repo_id}))
+        self.assertEqual(3, len(repo_units))
+
+    def test_associate_all_existing_same_owner(self):
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ['foo'], OWNER_TYPE_USER, 'admin')
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ['foo', 'bar'],
+                                          OWNER_TYPE_USER, 'admin')
+
+        repo_units = list(RepoContentUnit.get_collection().find({'repo_id': self.repo_id}))
+        self.assertEqual(2, len(repo_units))
+
+    @mock.patch('pulp.server.managers.repo.unit_association.ASSOCIATION_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_associate_all_multiple_batches(self, mock_call):
+        ids = ['unit-%d' % i for i in range(5)]
+
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ids, OWNER_TYPE_USER, 'admin')
+
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', len(ids))
+        repo_units = list(RepoContentUnit.get_collection().find({'repo_id': self.repo_id}))
+        self.assertEqual(sorted(u['unit_id'] for u in repo_units), ids)
+
+    def test_associated_unit_ids(self):
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ['foo', 'bar'],
+                                          OWNER_TYPE_USER, 'admin')
+
+        associated = self.manager.associated_unit_ids(self.repo_id, 'type-1', ['foo', 'baz'])
+
+        self.assertEqual(associated, set(['foo']))
+
     def test_unassociate_all(self):
         """
         Tests unassociating multiple units in a single call.
@@ -462,6 +505,29 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
         self.assertTrue(unit_coll.find_one({'repo_id' : self.repo_id, 'unit_type_id' : 'type-2', 'unit_id' : 'unit-1'}) is not None)
         self.assertTrue(unit_coll.find_one({'repo_id' : self.repo_id, 'unit_type_id' : 'type-2', 'unit_id' : 'unit-2'}) is not None)
 
+    @mock.patch('pulp.server.managers.repo.unit_association.ASSOCIATION_BATCH_SIZE', 1)
+    def test_unassociate_all_batched(self):
+        # Setup
+        self.manager.associate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id, OWNER_TYPE_USER, 'admin')
+        self.manager.associate_unit_by_id(self.repo_id, self.unit_type_id, self.unit_id_2, OWNER_TYPE_USER, 'admin')
+        query_manager = manager_factory.repo_unit_association_query_manager()
+
+        # Test
+        with mock.patch.object(query_manager.__class__, 'get_units',
+                               wraps=query_manager.get_units) as mock_get_units:
+            results = self.manager.unassociate_all_by_ids(self.repo_id, self.unit_type_id,
+                                                          [self.unit_id, self.unit_id_2, self.unit_id],
+                                                          OWNER_TYPE_USER, 'admin')
+
+        # Verify
+        self.assertEqual(len(results['units_successful']), 2)
+        self.assertEqual(mock_get_units.call_count, 2)
+        for call in mock_get_units.call_args_list:
+            criteria = call[1]['criteria']
+            self.assertEqual(len(criteria.association_filters['unit_id']['$in']), 1)
+        unit_coll = RepoContentUnit.get_collection()
+        self.assertEqual(0, unit_coll.find({'repo_id': self.repo_id}).count())
+
     @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
     def test_unassociate_by_id_calls_update_unit_count(self, mock_call):
         self.manager.associate_unit_by_id(
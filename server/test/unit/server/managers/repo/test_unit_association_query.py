@@ -11,6 +11,7 @@ import mock
 from .... import base
 from pulp.common import dateutils
 from pulp.plugins.types import database, model
+from pulp.server import exceptions
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
 import pulp.server.managers.repo.unit_association as association_manager
@@ -416,6 +417,132 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             self.assertFalse('created' in u)
             self.assertFalse('updated' in u)
 
+    # -- keyset pagination tests ----------------------------------------------
+
+    def test_get_units_page_walks_all_units(self):
+        # Test
+        pages = []
+        after = association_query_manager.FIRST_PAGE
+        while after is not None:
+            criteria = UnitAssociationCriteria(limit=2, after=after)
+            page = self.manager.get_units_page('repo-1', criteria)
+            pages.append(page['units'])
+            after = page['next']
+
+        # Verify
+        units = [u for p in pages for u in p]
+        self.assertEqual(self.repo_1_count, len(units))
+
+        unit_ids = [(u['unit_type_id'], u['unit_id']) for u in units]
+        self.assertEqual(sorted(unit_ids), unit_ids)
+
+        # both gamma associations are on the same page
+        for page in pages:
+            page_unit_ids = set((u['unit_type_id'], u['unit_id']) for u in page)
+            self.assertTrue(len(page_unit_ids) <= 2)
+
+        for u in units:
+            self._assert_unit_integrity(u)
+
+    def test_get_units_page_small_batches(self):
+        # Setup
+        all_units = self.manager.get_units_page('repo-1', UnitAssociationCriteria())['units']
+
+        # Test
+        with mock.patch.object(association_query_manager, 'KEYSET_BATCH_SIZE', 1):
+            criteria = UnitAssociationCriteria(limit=5, after=association_query_manager.FIRST_PAGE)
+            page = self.manager.get_units_page('repo-1', criteria)
+
+        # Verify
+        self.assertEqual(5, len(page['units']))
+        self.assertEqual(all_units[:5], page['units'])
+        self.assertEqual(page['next'], association_query_manager.encode_page_token(
+            page['units'][-1]['unit_type_id'], page['units'][-1]['unit_id']))
+
+    def test_get_units_page_unit_filters(self):
+        # Test
+        criteria = UnitAssociationCriteria(type_ids=['beta'], unit_filters={'md_2': 1}, limit=1,
+                                           after=association_query_manager.FIRST_PAGE)
+        first = self.manager.get_units_page('repo-1', criteria)
+
+        criteria = UnitAssociationCriteria(type_ids=['beta'], unit_filters={'md_2': 1}, limit=1,
+                                           after=first['next'])
+        second = self.manager.get_units_page('repo-1', criteria)
+
+        criteria = UnitAssociationCriteria(type_ids=['beta'], unit_filters={'md_2': 1}, limit=1,
+                                           after=second['next'])
+        third = self.manager.get_units_page('repo-1', criteria)
+
+        # Verify
+        self.assertEqual(['balloon'], [u['unit_id'] for u in first['units']])
+        self.assertEqual(['boardwalk'], [u['unit_id'] for u in second['units']])
+        self.assertEqual([], third['units'])
+        self.assertTrue(third['next'] is None)
+
+    def test_get_units_page_unit_id_filter(self):
+        # Test
+        unit_ids = []
+        after = association_query_manager.FIRST_PAGE
+        with mock.patch.object(association_query_manager, 'KEYSET_BATCH_SIZE', 1):
+            while after is not None:
+                criteria = UnitAssociationCriteria(
+                    type_ids=['beta'], limit=1, after=after,
+                    association_filters={'unit_id': {'$in': ['ball', 'bat', 'boardwalk']}})
+                page = self.manager.get_units_page('repo-1', criteria)
+                unit_ids.extend(u['unit_id'] for u in page['units'])
+                after = page['next']
+
+        # Verify
+        self.assertEqual(['ball', 'bat', 'boardwalk'], unit_ids)
+
+    def test_get_units_page_remove_duplicates(self):
+        # Test
+        criteria = UnitAssociationCriteria(type_ids=['gamma'], remove_duplicates=True,
+                                           after=association_query_manager.FIRST_PAGE)
+        page = self.manager.get_units_page('repo-1', criteria)
+
+        # Verify
+        self.assertEqual(self.units['gamma'], [u['unit_id'] for u in page['units']])
+        # the earliest association is kept
+        for u in page['units']:
+            self.assertEqual(OWNER_TYPE_USER, u['owner_type'])
+        self.assertTrue(page['next'] is None)
+
+    def test_get_units_page_unassociated_concurrently(self):
+        # Setup
+        keyset_associations = association_query_manager.RepoUnitAssociationQueryManager.\
+            _keyset_associations
+
+        def unassociated(repo_id, unit_type_id, criteria, unit_ids):
+            associations = keyset_associations(repo_id, unit_type_id, criteria, unit_ids)
+            associations.pop('bat', None)
+            return associations
+
+        # Test
+        with mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                               '_keyset_associations', side_effect=unassociated):
+            criteria = UnitAssociationCriteria(type_ids=['beta'],
+                                               after=association_query_manager.FIRST_PAGE)
+            page = self.manager.get_units_page('repo-1', criteria)
+
+        # Verify
+        unit_ids = [u['unit_id'] for u in page['units']]
+        self.assertFalse('bat' in unit_ids)
+        self.assertTrue('boardwalk' in unit_ids)
+
+    def test_get_units_with_after(self):
+        # Test
+        after = association_query_manager.encode_page_token('beta', 'bat')
+        units = self.manager.get_units('repo-1', UnitAssociationCriteria(after=after))
+
+        # Verify
+        self.assertEqual(['boardwalk', 'garden', 'garden', 'gnome', 'gnome'],
+                         [u['unit_id'] for u in units])
+
+    def test_decode_page_token_invalid(self):
+        self.assertRaises(exceptions.InvalidValue, association_query_manager.decode_page_token,
+                          'not-a-token')
+
     # -- get_units_by_type tests ----------------------------------------------
 
     def test_get_units_by_type_no_criteria(self):
@@ -638,7 +765,7 @@ class UnitAssociationQueryTests(base.PulpServerTests):
         c1 = UnitAssociationCriteria()
         c2 = UnitAssociationCriteria(type_ids=['a'], association_filters={'a':'a'}, unit_filters={'b':'b'},
                       association_sort=['c'], unit_sort=['d'], limit=1, skip=2, association_fields=['e'],
-                      unit_fields=['f'], remove_duplicates=True)
+                      unit_fields=['f'], remove_duplicates=True, after='g')
 
         # Test no exceptions are raised
         str(c1)
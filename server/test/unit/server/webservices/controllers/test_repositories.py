@@ -1230,6 +1230,38 @@ class RepoUnitAssociationQueryTests(RepoControllersTests):
             isinstance(self.association_query_mock.get_units_across_types.call_args[1]['criteria'],
                        UnitAssociationCriteria))
 
+    def test_post_keyset_page(self):
+        """
+        Passes in a page token to ensure the page and next token are returned.
+        """
+
+        # Setup
+        page = {'units': [], 'next': 'token-2'}
+        self.association_query_mock.get_units_page.return_value = page
+
+        query = {'type_ids': ['rpm'], 'limit': 10, 'after': 'token-1'}
+
+        params = {'criteria': query}
+        status, body = self.post('/v2/repositories/repo-1/search/units/', params=params)
+
+        # Verify
+        self.assertEqual(200, status)
+        self.assertEqual(page, body)
+
+        self.assertEqual(0, self.association_query_mock.get_units_by_type.call_count)
+        self.assertEqual(0, self.association_query_mock.get_units_across_types.call_count)
+        criteria = self.association_query_mock.get_units_page.call_args[0][1]
+        self.assertEqual('token-1', criteria.after)
+        self.assertEqual(10, criteria.limit)
+
+    def test_post_keyset_with_skip(self):
+        # Test
+        params = {'criteria': {'after': '', 'skip': 10}}
+        status, body = self.post('/v2/repositories/repo-1/search/units/', params=params)
+
+        # Verify
+        self.assertEqual(400, status)
+
     def test_post_missing_query(self):
         # Test
         status, body = self.post('/v2/repositories/repo-1/search/units/')
@@ -1642,6 +1674,26 @@ class TestRepoApplicabilityRegeneration(base.PulpWebserviceTests):
         self.assertEquals(status, 202)
         self.assertTrue('task_id' in body['spawned_tasks'][0])
 
+    @mock.patch('pulp.server.async.tasks._reserve_resource.apply_async')
+    def test_regenerate_applicability_force(self, _reserve_resource):
+        # Setup
+        _reserve_resource.return_value = ReservedResourceApplyAsync()
+        self.populate()
+        self.populate_bindings()
+        # Test
+        request_body = dict(repo_criteria={'filters': self.REPO_FILTER}, force=True)
+        status, body = self.post(self.PATH, request_body)
+        # Verify
+        self.assertEquals(status, 202)
+        self.assertTrue('task_id' in body['spawned_tasks'][0])
+
+    def test_regenerate_applicability_invalid_force(self):
+        # Test
+        request_body = dict(repo_criteria={'filters': self.REPO_FILTER}, force='yes')
+        status, body = self.post(self.PATH, request_body)
+        # Verify
+        self.assertEquals(status, 400)
+
     @mock.patch('pulp.server.async.tasks._reserve_resource.apply_async')
     def test_regenerate_applicability_no_consumer(self, _reserve_resource):
         # Test
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+import mock
+
+import base
+from pulp.server.db.model.auth import User, Role
+from pulp.server.db.model.cache_version import CacheVersion
+from pulp.server.db.model.consumer import Consumer
+from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth import authentication
+from pulp.server.managers.auth.authentication import CredentialCache, USER, CONSUMER
+
+
+class CredentialCacheTests(unittest.TestCase):
+
+    def test_key(self):
+        key = CredentialCache.key('password', 'admin', 'secret')
+
+        self.assertEqual(key, CredentialCache.key('password', 'admin', 'secret'))
+        self.assertEqual(key, CredentialCache.key('password', u'admin', u'secret'))
+        self.assertNotEqual(key, CredentialCache.key('password', 'admin', 'other'))
+        self.assertNotEqual(key, CredentialCache.key('password', 'admins', 'ecret'))
+        # no password and an empty password are different credentials
+        self.assertNotEqual(CredentialCache.key('password', 'admin', None),
+                            CredentialCache.key('password', 'admin', ''))
+        self.assertFalse('secret' in key)
+
+    def test_get_put(self):
+        cache = CredentialCache(60, 10)
+
+        self.assertEqual(cache.get('k1'), None)
+        cache.put('k1', 'admin', (USER, 'admin'))
+
+        self.assertEqual(cache.get('k1'), 'admin')
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'evictions': 0, 'invalidations': 0,
+                          'entries': 1})
+
+    @mock.patch('time.time')
+    def test_expired(self, mock_time):
+        cache = CredentialCache(60, 10)
+        mock_time.return_value = 1000.0
+        cache.put('k1', 'admin', (USER, 'admin'))
+
+        mock_time.return_value = 1059.0
+        self.assertEqual(cache.get('k1'), 'admin')
+        mock_time.return_value = 1060.0
+        self.assertEqual(cache.get('k1'), None)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    @mock.patch('time.time')
+    def test_evict_oldest(self, mock_time):
+        cache = CredentialCache(60, 2)
+        for i, key in enumerate(('k1', 'k2', 'k3')):
+            mock_time.return_value = 1000.0 + i
+            cache.put(key, 'admin', (USER, 'admin'))
+
+        self.assertEqual(cache.get('k1'), None)
+        self.assertEqual(cache.get('k2'), 'admin')
+        self.assertEqual(cache.get('k3'), 'admin')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    @mock.patch('time.time')
+    def test_evict_expired(self, mock_time):
+        cache = CredentialCache(60, 3)
+        mock_time.return_value = 1000.0
+        cache.put('k1', 'a', (USER, 'a'))
+        cache.put('k2', 'b', (USER, 'b'))
+        mock_time.return_value = 1050.0
+        cache.put('k3', 'c', (USER, 'c'))
+
+        mock_time.return_value = 1070.0
+        cache.put('k4', 'd', (USER, 'd'))
+
+        self.assertEqual(cache.stats()['evictions'], 2)
+        self.assertEqual(cache.get('k3'), 'c')
+        self.assertEqual(cache.get('k4'), 'd')
+
+    def test_invalidate_owner(self):
+        cache = CredentialCache(60, 10)
+        cache.put('k1', 'admin', (USER, 'admin'))
+        cache.put('k2', 'admin', (USER, 'admin'))
+        cache.put('k3', 'admin', (CONSUMER, 'admin'))
+
+        cache.invalidate((USER, 'admin'))
+
+        self.assertEqual(cache.get('k1'), None)
+        self.assertEqual(cache.get('k2'), None)
+        self.assertEqual(cache.get('k3'), 'admin')
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+    def test_invalidate_all(self):
+        cache = CredentialCache(60, 10)
+        cache.put('k1', 'admin', (USER, 'admin'))
+        cache.put('k2', 'c1', (CONSUMER, 'c1'))
+
+        cache.invalidate()
+
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+    def test_version_changed(self):
+        cache = CredentialCache(60, 10)
+        cache.put('k1', 'admin', (USER, 'admin'), 1)
+
+        self.assertEqual(cache.get('k1', 1), 'admin')
+        self.assertEqual(cache.get('k1', 2), None)
+        self.assertEqual(cache.version, 2)
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_put_stale_version(self):
+        cache = CredentialCache(60, 10)
+        cache.get('k1', 2)
+
+        # verified before the change that produced version 2
+        cache.put('k1', 'admin', (USER, 'admin'), 1)
+
+        self.assertEqual(cache.get('k1', 2), None)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_disabled(self):
+        cache = CredentialCache(0, 10)
+        cache.put('k1', 'admin', (USER, 'admin'))
+
+        self.assertEqual(cache.get('k1'), None)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+@mock.patch('pulp.server.managers.auth.authentication._CREDENTIAL_CACHE', None)
+class AuthenticationManagerCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        super(AuthenticationManagerCacheTests, self).setUp()
+        patcher = mock.patch('pulp.server.managers.auth.authentication.CacheVersion')
+        self.mock_version = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_version.get_version.return_value = 1
+        self.mock_version.bump_version.return_value = 2
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_check_username_password_local')
+    def test_password_cached(self, mock_check):
+        mock_check.return_value = {'login': 'admin'}
+        manager = authentication.AuthenticationManager()
+
+        self.assertEqual(manager.check_username_password('admin', 'secret'), 'admin')
+        self.assertEqual(manager.check_username_password('admin', 'secret'), 'admin')
+
+        self.assertEqual(mock_check.call_count, 1)
+        self.assertEqual(manager.credential_cache_stats()['hits'], 1)
+
+        manager.invalidate_user_credentials('admin')
+        self.assertEqual(self.mock_version.bump_version.call_count, 1)
+        self.assertEqual(manager.check_username_password('admin', 'secret'), 'admin')
+        self.assertEqual(mock_check.call_count, 2)
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_check_username_password_local')
+    def test_changed_in_other_process(self, mock_check):
+        mock_check.return_value = {'login': 'admin'}
+        manager = authentication.AuthenticationManager()
+
+        self.assertEqual(manager.check_username_password('admin', 'secret'), 'admin')
+        # another process changed the user and incremented the version
+        self.mock_version.get_version.return_value = 2
+        mock_check.return_value = None
+
+        self.assertEqual(manager.check_username_password('admin', 'secret'), None)
+        self.assertEqual(mock_check.call_count, 2)
+
+    @mock.patch('pulp.server.managers.auth.authentication.config')
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_check_username_password_local', return_value=None)
+    def test_failure_not_cached(self, mock_check, mock_config):
+        mock_config.getboolean.return_value = False
+        mock_config.getint.side_effect = [60, 1000]
+        manager = authentication.AuthenticationManager()
+
+        self.assertEqual(manager.check_username_password('admin', 'wrong'), None)
+        self.assertEqual(manager.check_username_password('admin', 'wrong'), None)
+
+        self.assertEqual(mock_check.call_count, 2)
+
+    @mock.patch('pulp.server.managers.factory.cert_generation_manager')
+    @mock.patch('pulp.server.managers.factory.certificate_manager')
+    def test_consumer_cert_cached(self, mock_certificate_manager, mock_cert_gen_manager):
+        mock_certificate_manager.return_value.subject.return_value = {'CN': 'consumer-1'}
+        mock_cert_gen_manager.return_value.verify_cert.return_value = True
+        manager = authentication.AuthenticationManager()
+
+        self.assertEqual(manager.check_consumer_cert('PEM'), 'consumer-1')
+        self.assertEqual(manager.check_consumer_cert('PEM'), 'consumer-1')
+
+        self.assertEqual(mock_cert_gen_manager.return_value.verify_cert.call_count, 1)
+
+        manager.invalidate_consumer_credentials('consumer-1')
+        self.assertEqual(self.mock_version.bump_version.call_count, 1)
+        self.assertEqual(manager.check_consumer_cert('PEM'), 'consumer-1')
+        self.assertEqual(mock_cert_gen_manager.return_value.verify_cert.call_count, 2)
+
+    @mock.patch('pulp.server.managers.factory.cert_generation_manager')
+    @mock.patch('pulp.server.managers.factory.certificate_manager')
+    def test_foreign_cert_not_cached(self, mock_certificate_manager, mock_cert_gen_manager):
+        mock_certificate_manager.return_value.subject.return_value = {'CN': 'consumer-1'}
+        mock_cert_gen_manager.return_value.verify_cert.return_value = False
+        manager = authentication.AuthenticationManager()
+
+        self.assertEqual(manager.check_consumer_cert('PEM'), None)
+        self.assertEqual(manager.check_consumer_cert('PEM'), None)
+
+        self.assertEqual(mock_cert_gen_manager.return_value.verify_cert.call_count, 2)
+
+
+class CredentialInvalidationTests(base.PulpServerTests):
+
+    def setUp(self):
+        super(CredentialInvalidationTests, self).setUp()
+        self.user_manager = manager_factory.user_manager()
+        self.role_manager = manager_factory.role_manager()
+        self.auth_manager = manager_factory.authentication_manager()
+
+    def clean(self):
+        super(CredentialInvalidationTests, self).clean()
+        User.get_collection().remove()
+        Role.get_collection().remove()
+        Consumer.get_collection().remove()
+        CacheVersion.get_collection().remove()
+
+    def test_password_change(self):
+        self.user_manager.create_user('cache-user', 'old-password')
+        self.assertEqual(self.auth_manager.check_username_password('cache-user', 'old-password'),
+                         'cache-user')
+
+        self.user_manager.update_user('cache-user', {'password': 'new-password'})
+
+        self.assertEqual(self.auth_manager.check_username_password('cache-user', 'old-password'),
+                         None)
+        self.assertEqual(self.auth_manager.check_username_password('cache-user', 'new-password'),
+                         'cache-user')
+
+    def test_version_incremented(self):
+        version = self.auth_manager.credential_version()
+
+        self.auth_manager.invalidate_user_credentials('cache-user')
+        self.auth_manager.invalidate_consumer_credentials('cache-consumer')
+
+        self.assertEqual(self.auth_manager.credential_version(), version + 2)
+
+    def test_user_deleted(self):
+        self.user_manager.create_user('cache-user', 'password')
+        self.assertEqual(self.auth_manager.check_username_password('cache-user', 'password'),
+                         'cache-user')
+
+        self.user_manager.delete_user('cache-user')
+
+        self.assertEqual(self.auth_manager.check_username_password('cache-user', 'password'),
+                         None)
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                'invalidate_user_credentials')
+    def test_role_change(self, mock_invalidate):
+        self.user_manager.create_user('cache-user', 'password')
+        self.role_manager.create_role('cache-role')
+
+        self.role_manager.add_user_to_role('cache-role', 'cache-user')
+        self.role_manager.remove_user_from_role('cache-role', 'cache-user')
+
+        self.assertEqual(mock_invalidate.call_args_list,
+                         [mock.call('cache-user'), mock.call('cache-user')])
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                'invalidate_consumer_credentials')
+    @mock.patch('pulp.server.managers.consumer.agent.AgentManager.unregistered')
+    def test_consumer_registration(self, mock_unregistered, mock_invalidate):
+        consumer_manager = manager_factory.consumer_manager()
+
+        consumer_manager.register('cache-consumer')
+        consumer_manager.unregister('cache-consumer')
+
+        self.assertEqual(mock_invalidate.call_args_list,
+                         [mock.call('cache-consumer'), mock.call('cache-consumer')])
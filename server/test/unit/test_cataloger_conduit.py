@@ -11,9 +11,11 @@
 
 from uuid import uuid4
 
+from mock import patch
+
 from base import PulpServerTests
 
-from pulp.server.db.model.content import ContentCatalog
+from pulp.server.db.model.content import ContentCatalog, ContentCatalogChecksum
 from pulp.plugins.conduits.cataloger import CatalogerConduit
 
 
@@ -51,6 +53,8 @@ class TestCatalogerConduit(PulpServerTests):
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
         collection = ContentCatalog.get_collection()
+        self.assertEqual(0, collection.find().count())
+        conduit.flush()
         self.assertEqual(conduit.source_id, SOURCE_ID)
         self.assertEqual(conduit.expires, EXPIRES)
         self.assertEqual(len(units), collection.find().count())
@@ -68,6 +72,7 @@ class TestCatalogerConduit(PulpServerTests):
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
         for unit_key, url in units:
             conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.flush()
         collection = ContentCatalog.get_collection()
         self.assertEqual(len(units), collection.find().count())
         unit_key, url = units[5]
@@ -77,16 +82,97 @@ class TestCatalogerConduit(PulpServerTests):
         self.assertEqual(entry['unit_key'], unit_key)
         self.assertEqual(entry['url'], url)
         conduit.delete_entry(TYPE_ID, unit_key)
+        conduit.flush()
         self.assertEqual(len(units) - 1, collection.find().count())
         self.assertEqual(conduit.added_count, len(units))
         self.assertEqual(conduit.deleted_count, 1)
         entry = collection.find_one({'locator': locator})
         self.assertTrue(entry is None)
 
+    @patch('pulp.plugins.conduits.cataloger.BATCH_SIZE', 4)
+    def test_batched(self):
+        units = self.units(0, 10)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(8, collection.find().count())
+        conduit.flush()
+        self.assertEqual(len(units), collection.find().count())
+        for entry in collection.find():
+            self.assertEqual(entry['generation'], conduit.generation)
+
+    def test_delete_buffered(self):
+        units = self.units(0, 3)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        # deleted after being added
+        conduit.add_entry(TYPE_ID, units[0][0], units[0][1])
+        conduit.delete_entry(TYPE_ID, units[0][0])
+        # added again after being deleted
+        conduit.add_entry(TYPE_ID, units[1][0], units[1][1])
+        conduit.delete_entry(TYPE_ID, units[1][0])
+        conduit.add_entry(TYPE_ID, units[1][0], units[1][1])
+        conduit.add_entry(TYPE_ID, units[2][0], units[2][1])
+        conduit.flush()
+        collection = ContentCatalog.get_collection()
+        urls = sorted([e['url'] for e in collection.find()])
+        self.assertEqual(urls, [units[1][1], units[2][1]])
+        self.assertEqual(conduit.added_count, 4)
+        self.assertEqual(conduit.deleted_count, 2)
+
+    def test_swap_generation(self):
+        units = self.units(0, 10)
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        for unit_key, url in units:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.flush()
+        other = CatalogerConduit('other', EXPIRES)
+        other.add_entry(TYPE_ID, units[0][0], units[0][1])
+        other.flush()
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        for unit_key, url in units[5:]:
+            conduit.add_entry(TYPE_ID, unit_key, url)
+        conduit.swap_generation()
+        collection = ContentCatalog.get_collection()
+        entries = list(collection.find({'source_id': SOURCE_ID}))
+        self.assertEqual(len(entries), 5)
+        for entry in entries:
+            self.assertEqual(entry['generation'], conduit.generation)
+        self.assertEqual(collection.find({'source_id': 'other'}).count(), 1)
+
+    def test_checksum(self):
+        conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
+        self.assertEqual(conduit.get_checksum('url-1'), None)
+        self.assertFalse(conduit.has_entries())
+        conduit.set_checksum('url-1', 'abc')
+        conduit.set_checksum('url-1', 'xyz')
+        conduit.reset('url-1')
+        conduit.add_entry(TYPE_ID, {'name': 'unit'}, 'file://redhat.com/unit')
+        conduit.flush()
+        self.assertEqual(conduit.get_checksum('url-1'), 'xyz')
+        self.assertEqual(conduit.get_checksum('url-2'), None)
+        self.assertEqual(CatalogerConduit('other', EXPIRES).get_checksum('url-1'), None)
+        self.assertTrue(conduit.has_entries())
+        self.assertTrue(conduit.has_entries('url-1'))
+        self.assertFalse(conduit.has_entries('url-2'))
+        ContentCatalogChecksum.get_collection().remove()
+
+    def test_extend_expiration(self):
+        conduit = CatalogerConduit(SOURCE_ID, -1)
+        conduit.reset('url-1')
+        conduit.add_entry(TYPE_ID, {'name': 'unit'}, 'file://redhat.com/unit')
+        conduit.flush()
+        self.assertFalse(conduit.has_entries('url-1'))
+        CatalogerConduit(SOURCE_ID, EXPIRES).extend_expiration('url-1')
+        self.assertTrue(conduit.has_entries('url-1'))
+
     def test_reset(self):
         conduit = CatalogerConduit(SOURCE_ID, EXPIRES)
         conduit.added_count = 10
         conduit.deleted_count = 10
+        conduit.add_entry(TYPE_ID, {'name': 'unit'}, 'file://redhat.com/unit')
         conduit.reset()
+        conduit.flush()
         self.assertEqual(conduit.added_count, 0)
-        self.assertEqual(conduit.deleted_count, 0)
\ No newline at end of file
+        self.assertEqual(conduit.deleted_count, 0)
+        self.assertEqual(ContentCatalog.get_collection().find().count(), 0)
\ No newline at end of file
@@ -566,6 +566,73 @@ class AddUnitMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.save_unit, None)
 
+    @mock.patch('pulp.plugins.types.database.type_units_unit_key')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_multiple_units_by_keys_dicts')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.associate_all_by_ids')
+    def test_save_units(self, mock_associate, mock_add, mock_update, mock_get, mock_key):
+        # Setup
+        mock_key.return_value = ['k']
+        mock_get.return_value = ({'_id': 'existing', 'k': 'v1'},)
+        mock_add.return_value = ['new-unit-id']
+        units = [Unit('t', {'k': 'v1'}, {'m': 'm1'}, None),
+                 Unit('t', {'k': 'v2'}, {'m': 'm2'}, None)]
+
+        # Test
+        saved = self.mixin.save_units(units)
+
+        # Verify
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual(1, mock_update.call_count)
+        self.assertEqual('existing', mock_update.call_args[0][1])
+        self.assertEqual(1, mock_add.call_count)
+        self.assertEqual(1, len(mock_add.call_args[0][1]))
+        mock_associate.assert_called_once_with(self.repo_id, 't', ['existing', 'new-unit-id'],
+                                               self.association_owner_type,
+                                               self.association_owner_id)
+        self.assertEqual(1, self.mixin._added_count)
+        self.assertEqual(1, self.mixin._updated_count)
+        self.assertEqual(['existing', 'new-unit-id'], [u.id for u in saved])
+
+    @mock.patch('pulp.plugins.types.database.type_units_unit_key')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_content_unit_by_keys_dict')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.get_multiple_units_by_keys_dicts')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_unit')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.associate_all_by_ids')
+    def test_save_units_race_condition(self, mock_associate, mock_add, mock_update, mock_get,
+                                       mock_get_single, mock_key):
+        """
+        A unit added by another workflow between the key lookup and the bulk
+        insert should be updated instead.
+        """
+        # Setup
+        mock_key.return_value = ['k']
+        mock_get.return_value = ()
+        mock_add.return_value = [None]
+        mock_get_single.return_value = {'_id': 'existing'}
+        units = [Unit('t', {'k': 'v1'}, {'m': 'm1'}, None)]
+
+        # Test
+        saved = self.mixin.save_units(units)
+
+        # Verify
+        self.assertEqual(1, mock_update.call_count)
+        self.assertEqual(1, mock_associate.call_count)
+        self.assertEqual(0, self.mixin._added_count)
+        self.assertEqual(1, self.mixin._updated_count)
+        self.assertEqual('existing', saved[0].id)
+
+    @mock.patch('pulp.plugins.types.database.type_units_unit_key')
+    def test_save_units_with_error(self, mock_key):
+        # Setup
+        mock_key.side_effect = Exception()
+        units = [Unit('t', {'k': 'v1'}, {'m': 'm1'}, None)]
+
+        # Test
+        self.assertRaises(mixins.ImporterConduitException, self.mixin.save_units, units)
+
     @mock.patch('pulp.server.managers.content.cud.ContentManager.link_referenced_content_units')
     def test_link_unit(self, mock_link):
         # Setup
@@ -92,6 +92,32 @@ class TestCatalogManager(PulpServerTests):
         entry = collection.find_one({'locator': locator})
         self.assertTrue(entry is None)
 
+    def test_bulk_add_delete(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, unit_key, url) for unit_key, url in units]
+        manager.add_entries(SOURCE_ID, EXPIRATION, entries, 'g-1')
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(len(units), collection.find({'generation': 'g-1'}).count())
+        manager.delete_entries(SOURCE_ID, [(TYPE_ID, k) for k, u in units[:4]])
+        manager.delete_entries(SOURCE_ID, [])
+        self.assertEqual(6, collection.find().count())
+        for unit_key, url in units[:4]:
+            locator = ContentCatalog.get_locator(TYPE_ID, unit_key)
+            self.assertTrue(collection.find_one({'locator': locator}) is None)
+
+    def test_purge_generations(self):
+        manager = ContentCatalogManager()
+        for unit_key, url in self.units(0, 10):
+            manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, unit_key, url)
+        entries = [(TYPE_ID, k, u) for k, u in self.units(10, 5)]
+        manager.add_entries(SOURCE_ID, EXPIRATION, entries, 'g-1')
+        manager.add_entries('other', EXPIRATION, entries, 'g-0')
+        manager.purge_generations(SOURCE_ID, 'g-1')
+        collection = ContentCatalog.get_collection()
+        self.assertEqual(collection.find({'source_id': SOURCE_ID}).count(), 5)
+        self.assertEqual(collection.find({'source_id': 'other'}).count(), 5)
+
     def test_purge(self):
         source_a = 'A'
         source_b = 'B'
@@ -129,6 +155,39 @@ class TestCatalogManager(PulpServerTests):
         self.assertFalse(manager.has_entries(source_b))
         self.assertFalse(manager.has_entries(source_c))
 
+    def test_has_entries_by_url(self):
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, k, u) for k, u in self.units(0, 10)]
+        manager.add_entries(SOURCE_ID, EXPIRATION, entries, 'g-1', 'url-1')
+        manager.add_entries(SOURCE_ID, -1, entries, 'g-1', 'url-2')
+        self.assertTrue(manager.has_entries(SOURCE_ID))
+        self.assertTrue(manager.has_entries(SOURCE_ID, 'url-1'))
+        self.assertFalse(manager.has_entries(SOURCE_ID, 'url-2'))
+        self.assertFalse(manager.has_entries(SOURCE_ID, 'url-3'))
+
+    def test_has_entries_grace_period(self):
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, k, u) for k, u in self.units(0, 10)]
+        manager.add_entries(SOURCE_ID, -10, entries, 'g-1', 'url-1')
+        self.assertFalse(manager.has_entries(SOURCE_ID, 'url-1'))
+        self.assertFalse(manager.has_entries(SOURCE_ID, 'url-1', 5))
+        self.assertTrue(manager.has_entries(SOURCE_ID, 'url-1', 60))
+
+    def test_extend_expiration(self):
+        manager = ContentCatalogManager()
+        entries = [(TYPE_ID, k, u) for k, u in self.units(0, 10)]
+        manager.add_entries(SOURCE_ID, -1, entries, 'g-1', 'url-1')
+        manager.add_entries(SOURCE_ID, -1, entries, 'g-1', 'url-2')
+        manager.add_entries('other', -1, entries, 'g-1', 'url-1')
+        manager.extend_expiration(SOURCE_ID, 'url-1', EXPIRATION)
+        collection = ContentCatalog.get_collection()
+        now = ContentCatalog.get_expiration(0)
+        extended = collection.find({'expiration': {'$gte': now}})
+        self.assertEqual(extended.count(), 10)
+        for entry in extended:
+            self.assertEqual(entry['source_id'], SOURCE_ID)
+            self.assertEqual(entry['source_url'], 'url-1')
+
     def test_purge_expired(self):
         source_a = 'A'
         source_b = 'B'
@@ -180,6 +239,26 @@ class TestCatalogManager(PulpServerTests):
             self.assertEqual(entry['unit_key'], unit_key)
             self.assertEqual(entry['url'], url)
 
+    def test_find_all(self):
+        units = self.units(0, 10)
+        manager = ContentCatalogManager()
+        for unit_key, url in units:
+            manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, unit_key, url)
+        # a newer entry for the same unit and source replaces the older one
+        manager.add_entry(SOURCE_ID, EXPIRATION, TYPE_ID, units[0][0], 'file://newer')
+        manager.add_entry('other', EXPIRATION, TYPE_ID, units[0][0], 'file://other')
+        locators = [ContentCatalog.get_locator(TYPE_ID, k) for k, u in units]
+        locators.append(ContentCatalog.get_locator(TYPE_ID, {'name': 'missing'}))
+        found = manager.find_all(locators, batch_size=3)
+        self.assertEqual(len(found), len(units))
+        urls = sorted([e['url'] for e in found[locators[0]]])
+        self.assertEqual(urls, ['file://newer', 'file://other'])
+        for locator, (unit_key, url) in zip(locators[1:], units[1:]):
+            entries = found[locator]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]['unit_key'], unit_key)
+            self.assertEqual(entries[0]['url'], url)
+
     def test_expired(self):
         units = self.units(0, 10)
         manager = ContentCatalogManager()
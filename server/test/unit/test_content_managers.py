@@ -73,6 +73,26 @@ class PulpContentCUDTests(PulpContentTests):
         self.assertEqual(len(units), 1)
         self.assertTrue('_last_updated' in units[0])
 
+    def test_add_content_units(self):
+        unit_ids = self.cud_manager.add_content_units(TYPE_1_DEF.id, TYPE_1_UNITS)
+        self.assertEqual(len(unit_ids), len(TYPE_1_UNITS))
+        self.assertTrue(None not in unit_ids)
+        units = self.query_manager.list_content_units(TYPE_1_DEF.id)
+        self.assertEqual(len(units), len(TYPE_1_UNITS))
+        self.assertTrue('_last_updated' in units[0])
+
+    def test_add_content_units_duplicate(self):
+        self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[1])
+        unit_ids = self.cud_manager.add_content_units(TYPE_1_DEF.id, TYPE_1_UNITS)
+        self.assertNotEqual(unit_ids[0], None)
+        self.assertEqual(unit_ids[1], None)
+        self.assertNotEqual(unit_ids[2], None)
+        units = self.query_manager.list_content_units(TYPE_1_DEF.id)
+        self.assertEqual(len(units), len(TYPE_1_UNITS))
+
+    def test_add_content_units_empty(self):
+        self.assertEqual(self.cud_manager.add_content_units(TYPE_1_DEF.id, []), [])
+
     def test_update_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
         unit = self.query_manager.get_content_unit_by_id(TYPE_1_DEF.id, unit_id)
@@ -82,6 +102,14 @@ class PulpContentCUDTests(PulpContentTests):
         self.assertTrue(unit['search-1'] == 'two')
         self.assertTrue('_last_updated' in unit)
 
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.bump_content_revision_for_units')
+    def test_update_content_unit_bumps_repo_revisions(self, mock_bump):
+        unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
+
+        self.cud_manager.update_content_unit(TYPE_1_DEF.id, unit_id, {'search-1': 'two'})
+
+        mock_bump.assert_called_once_with(TYPE_1_DEF.id, [unit_id])
+
     def test_delete_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
         units = self.query_manager.list_content_units(TYPE_1_DEF.id)
@@ -15,6 +15,7 @@ import random
 import shutil
 import string
 import tempfile
+import time
 import traceback
 from pprint import pformat
 
@@ -72,8 +73,8 @@ def gen_buttload_of_content_units(content_type_id, content_root, num_units):
         gen_content_unit(content_type_id, content_root, unit_name)
 
 
-def associate_content_unit_with_repo(content_unit):
-    repo_content_unit = RepoContentUnit(PHONY_REPO_ID,
+def associate_content_unit_with_repo(content_unit, repo_id=PHONY_REPO_ID):
+    repo_content_unit = RepoContentUnit(repo_id,
                                         content_unit['_id'],
                                         content_unit['_content_type_id'],
                                         RepoContentUnit.OWNER_TYPE_USER,
@@ -172,6 +173,30 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         orphans_2 = list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_2.id))
         self.assertEqual(len(orphans_2), 1)
 
+    def test_list_orphans_mixed_with_associated_units(self):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(10)]
+        associated = units[::2]
+        for unit in associated:
+            associate_content_unit_with_repo(unit)
+        # associations to more than one repo must not confuse the merge
+        associate_content_unit_with_repo(dict(associated[0]), 'other_repo')
+        # associations of another type with a matching id are not relevant
+        associate_content_unit_with_repo({'_id': units[1]['_id'],
+                                          '_content_type_id': PHONY_TYPE_2.id})
+
+        orphans = list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id))
+        expected_ids = set(u['_id'] for u in units[1::2])
+        self.assertEqual(set(o['_id'] for o in orphans), expected_ids)
+        self.assertEqual(self.orphan_manager.orphans_count_by_type(PHONY_TYPE_1.id), 5)
+
+    def test_get_associated_orphan(self):
+        unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        associate_content_unit_with_repo(unit)
+
+        self.assertRaises(pulp_exceptions.MissingResource,
+                          self.orphan_manager.get_orphan,
+                          PHONY_TYPE_1.id, unit['_id'])
+
     def test_get_orphan_using_generators(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
 
@@ -250,6 +275,50 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertFalse(os.path.exists(unit_1['_storage_path']))
         self.assertTrue(os.path.exists(unit_2['_storage_path']))
 
+    # NOTE this test is disabled for normal test runs
+    def _test_generate_orphans_performance_against_per_unit_queries(self):
+        num_units = 30000
+        gen_buttload_of_content_units(PHONY_TYPE_1.id, self.content_root, num_units)
+        content_units_collection = content_type_db.type_units_collection(PHONY_TYPE_1.id)
+        for i, unit in enumerate(content_units_collection.find()):
+            if i % 3:
+                associate_content_unit_with_repo(unit)
+
+        def per_unit_query_orphans():
+            # the orphan detection used prior to the merge of sorted cursors
+            repo_content_units_collection = RepoContentUnit.get_collection()
+            for content_unit in content_units_collection.find({}, fields=['_id']):
+                if repo_content_units_collection.find(
+                        {'unit_id': content_unit['_id']}).count() > 0:
+                    continue
+                yield content_unit
+
+        start = time.time()
+        expected = set(o['_id'] for o in per_unit_query_orphans())
+        per_unit_duration = time.time() - start
+
+        start = time.time()
+        orphans = set(o['_id'] for o in
+                      self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id))
+        merge_duration = time.time() - start
+
+        self.assertEqual(orphans, expected)
+        self.assertTrue(merge_duration < per_unit_duration)
+
+    def test_delete_by_id_skips_associated_units(self):
+        unit_1 = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        unit_2 = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        associate_content_unit_with_repo(unit_2)
+
+        json_objs = [{'content_type_id': u['_content_type_id'], 'unit_id': u['_id']}
+                     for u in (unit_1, unit_2)]
+        self.orphan_manager.delete_orphans_by_id(json_objs)
+
+        self.assertFalse(os.path.exists(unit_1['_storage_path']))
+        self.assertTrue(os.path.exists(unit_2['_storage_path']))
+        content_units_collection = content_type_db.type_units_collection(PHONY_TYPE_1.id)
+        self.assertEqual(content_units_collection.find().count(), 1)
+
     def test_delete_by_id_using_generators(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
 
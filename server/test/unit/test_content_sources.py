@@ -322,20 +322,16 @@ class TestDownloading(ContainerTest):
     def test_download_cancelled_during_refreshing(self):
         downloader = LocalFileDownloader(DownloaderConfig())
         container = ContentContainer(path=self.tmp_dir)
-        container.collated = Mock()
         event = CancelEvent(1)
         report = container.download(event, downloader, [])
-        self.assertFalse(container.collated.called)
         self.assertEqual(report.total_passes, 0)
         self.assertEqual(report.total_sources, 2)
         self.assertEqual(len(report.downloads), 0)
 
     def test_download_cancelled_in_download(self):
         container = ContentContainer(path=self.tmp_dir)
-        container.collated = Mock()
         event = CancelEvent(1)
         report = container.download(event, None, [])
-        self.assertFalse(container.collated.called)
         self.assertEqual(report.total_passes, 0)
         self.assertEqual(report.total_sources, 2)
         self.assertEqual(len(report.downloads), 0)
@@ -360,13 +356,16 @@ class TestDownloading(ContainerTest):
         downloader = LocalFileDownloader(DownloaderConfig())
         container = ContentContainer(path=self.tmp_dir)
         container.refresh = Mock()
-        event = CancelEvent(2)
-        report = container.download(event, downloader, request_list)
+        event = Event()
+        listener = Mock()
+        listener.download_started.side_effect = lambda r: event.set()
+        report = container.download(event, downloader, request_list, listener)
         self.assertTrue(mock_cancel.called)
         self.assertEqual(report.total_passes, 1)
         self.assertEqual(report.total_sources, 2)
         self.assertEqual(len(report.downloads), 1)
-        self.assertEqual(report.downloads[PRIMARY_ID].total_succeeded, 5)
+        # no more requests are handed to the downloader once canceled
+        self.assertEqual(report.downloads[PRIMARY_ID].total_succeeded, 1)
         self.assertEqual(report.downloads[PRIMARY_ID].total_failed, 0)
 
     @patch('nectar.downloaders.base.Downloader.cancel')
@@ -390,14 +389,15 @@ class TestDownloading(ContainerTest):
         downloader = LocalFileDownloader(DownloaderConfig())
         container = ContentContainer(path=self.tmp_dir)
         container.refresh = Mock()
-        event = CancelEvent(2)
+        event = Event()
+        mock_started.side_effect = lambda r: event.set()
         report = container.download(event, downloader, request_list)
         self.assertTrue(mock_started.called)
         self.assertTrue(mock_cancel.called)
         self.assertEqual(report.total_passes, 1)
         self.assertEqual(report.total_sources, 2)
         self.assertEqual(len(report.downloads), 1)
-        self.assertEqual(report.downloads[PRIMARY_ID].total_succeeded, 5)
+        self.assertEqual(report.downloads[PRIMARY_ID].total_succeeded, 1)
         self.assertEqual(report.downloads[PRIMARY_ID].total_failed, 0)
 
     @patch('nectar.downloaders.base.Downloader.cancel')
@@ -420,7 +420,8 @@ class TestDownloading(ContainerTest):
         downloader = HTTPThreadedDownloader(DownloaderConfig())
         container = ContentContainer(path=self.tmp_dir)
         container.refresh = Mock()
-        event = CancelEvent(2)
+        event = Event()
+        mock_started.side_effect = lambda r: event.set()
         report = container.download(event, downloader, request_list)
         self.assertTrue(mock_started.called)
         self.assertTrue(mock_cancel.called)
@@ -428,7 +429,8 @@ class TestDownloading(ContainerTest):
         self.assertEqual(report.total_sources, 2)
         self.assertEqual(len(report.downloads), 1)
         self.assertEqual(report.downloads[PRIMARY_ID].total_succeeded, 0)
-        self.assertEqual(report.downloads[PRIMARY_ID].total_failed, 5)
+        # the requests already handed to the downloader still report
+        self.assertTrue(report.downloads[PRIMARY_ID].total_failed >= 1)
 
     def test_download_with_errors(self):
         request_list = []
@@ -14,10 +14,12 @@
 import base
 import mock
 
+from pulp.server.db.model.cache_version import CacheVersion
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import notifiers
 from pulp.server.event import data as event_data
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event.fire import ListenerCache
 
 
 class EventFireManagerTests(base.PulpServerTests):
@@ -32,6 +34,7 @@ class EventFireManagerTests(base.PulpServerTests):
         super(EventFireManagerTests, self).tearDown()
 
         EventListener.get_collection().remove()
+        CacheVersion.get_collection().remove()
         notifiers.reset()
 
     # -- plumbing tests -------------------------------------------------------
@@ -117,6 +120,95 @@ class EventFireManagerTests(base.PulpServerTests):
         self.assertEqual({'2' : '2'}, notifier_2.fire.call_args[0][0])
         self.assertEqual(event, notifier_2.fire.call_args[0][1])
 
+    def test_do_fire_listeners_cached(self):
+        # Setup
+        notifiers.NOTIFIER_FUNCTIONS.clear()
+
+        notifier_1 = mock.Mock()
+        notifier_2 = mock.Mock()
+
+        notifiers.NOTIFIER_FUNCTIONS['notifier_1'] = notifier_1.fire
+        notifiers.NOTIFIER_FUNCTIONS['notifier_2'] = notifier_2.fire
+
+        self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
+
+        # Test
+        with mock.patch.object(EventListener, 'get_collection',
+                               wraps=EventListener.get_collection) as mock_get_collection:
+            self.manager._do_fire(event)
+            self.manager._do_fire(event)
+        self.assertEqual(1, mock_get_collection.call_count)
+
+        # a new listener invalidates the cache
+        self.event_manager.create('notifier_2', {}, ['*'])
+        self.manager._do_fire(event)
+
+        # Verify
+        self.assertEqual(3, notifier_1.fire.call_count)
+        self.assertEqual(1, notifier_2.fire.call_count)
+
+    def test_listeners_deleted(self):
+        # Setup
+        notifiers.NOTIFIER_FUNCTIONS.clear()
+
+        notifier_1 = mock.Mock()
+        notifiers.NOTIFIER_FUNCTIONS['notifier_1'] = notifier_1.fire
+
+        created = self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
+        self.manager._do_fire(event)
+
+        # Test
+        self.event_manager.update(created['_id'], event_types=[event_data.TYPE_REPO_SYNC_FINISHED])
+        self.manager._do_fire(event)
+        self.event_manager.delete(created['_id'])
+        self.manager._do_fire(event_data.Event(event_data.TYPE_REPO_SYNC_FINISHED, 'payload'))
+
+        # Verify
+        self.assertEqual(1, notifier_1.fire.call_count)
+
+    @mock.patch('time.time')
+    def test_listener_cache_expired(self, mock_time):
+        cache = ListenerCache(30)
+        mock_time.return_value = 1000.0
+        self.assertEqual(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED), [])
+
+        # created by another process, so the cache isn't invalidated
+        EventListener.get_collection().save(
+            EventListener('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED]), safe=True)
+
+        mock_time.return_value = 1029.0
+        self.assertEqual(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED), [])
+        mock_time.return_value = 1030.0
+        self.assertEqual(len(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)), 1)
+
+    def test_listener_cache_version_changed(self):
+        cache = ListenerCache(30)
+        self.assertEqual(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED), [])
+
+        # created by another process, which increments the listener version
+        EventListener.get_collection().save(
+            EventListener('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED]), safe=True)
+        CacheVersion.bump_version(CacheVersion.EVENT_LISTENERS)
+
+        self.assertEqual(len(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)), 1)
+
+    def test_invalidate_listeners(self):
+        self.manager.invalidate_listeners()
+        self.manager.invalidate_listeners()
+
+        self.assertEqual(CacheVersion.get_version(CacheVersion.EVENT_LISTENERS), 2)
+
+    def test_listener_cache_disabled(self):
+        cache = ListenerCache(0)
+        cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+
+        EventListener.get_collection().save(
+            EventListener('notifier_1', {}, ['*']), safe=True)
+
+        self.assertEqual(len(cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)), 1)
+
     # -- event format tests ---------------------------------------------------
 
     def test_fire_repo_sync_started(self):
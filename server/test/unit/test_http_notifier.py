@@ -11,7 +11,11 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import BaseHTTPServer
 import httplib
+import socket
+import SocketServer
+import threading
 import time
 
 import mock
@@ -28,6 +32,10 @@ import base
 
 class TestHTTPNotifierTests(base.PulpServerTests):
 
+    def tearDown(self):
+        super(TestHTTPNotifierTests, self).tearDown()
+        http.reset()
+
     @mock.patch('pulp.server.event.http._create_connection')
     def test_handle_event(self, mock_create):
         # Setup
@@ -136,3 +144,169 @@ class TestHTTPNotifierTests(base.PulpServerTests):
         # Test HTTP
         conn = http._create_connection('http', 'foo')
         self.assertTrue(isinstance(conn, httplib.HTTPConnection))
+
+
+class RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Records the body and client port of every POST and answers with 200.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.client_address[1], json.loads(body)))
+        self.send_response(httplib.OK)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), RecordingHandler)
+        self.requests = []
+
+
+class TestNotificationDispatcher(base.PulpServerTests):
+
+    def setUp(self):
+        super(TestNotificationDispatcher, self).setUp()
+        self.server = RecordingServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.url = 'http://127.0.0.1:%s/api/' % self.server.server_address[1]
+
+    def tearDown(self):
+        super(TestNotificationDispatcher, self).tearDown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        dispatcher = http.NotificationDispatcher(1, 10, 0, 2, 100)
+
+        for i in range(3):
+            dispatcher.submit({'url': self.url}, json.dumps({'i': i}))
+        dispatcher.queue.join()
+
+        self.assertEqual([r[1] for r in self.server.requests], [{'i': 0}, {'i': 1}, {'i': 2}])
+        # all requests were made on the same connection
+        self.assertEqual(len(set([r[0] for r in self.server.requests])), 1)
+        stats = dispatcher.stats()
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['idle_connections'], 1)
+
+    def test_batch_interval(self):
+        dispatcher = http.NotificationDispatcher(2, 10, 0, 2, 100)
+        notifier_config = {'url': self.url, 'batch_interval': '0.2'}
+
+        for i in range(3):
+            dispatcher.submit(notifier_config, json.dumps({'i': i}))
+        self.assertEqual(dispatcher.stats()['batched'], 3)
+        time.sleep(.5)
+        dispatcher.queue.join()
+
+        self.assertEqual([r[1] for r in self.server.requests], [[{'i': 0}, {'i': 1}, {'i': 2}]])
+        stats = dispatcher.stats()
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['batched'], 0)
+
+    def test_batch_full(self):
+        dispatcher = http.NotificationDispatcher(1, 10, 0, 2, 2)
+        notifier_config = {'url': self.url, 'batch_interval': 60}
+
+        for i in range(3):
+            dispatcher.submit(notifier_config, json.dumps({'i': i}))
+        dispatcher.queue.join()
+
+        self.assertEqual([r[1] for r in self.server.requests], [[{'i': 0}, {'i': 1}]])
+        self.assertEqual(dispatcher.stats()['batched'], 1)
+
+    @mock.patch('pulp.server.event.http.NotificationDispatcher._send_post')
+    def test_queue_full(self, mock_send_post):
+        sending = threading.Event()
+        release = threading.Event()
+
+        def send_post(endpoint, body):
+            sending.set()
+            release.wait()
+            return True
+        mock_send_post.side_effect = send_post
+        dispatcher = http.NotificationDispatcher(1, 1, 0, 2, 100)
+
+        dispatcher.submit({'url': self.url}, '{}')
+        sending.wait(5)
+        dispatcher.submit({'url': self.url}, '{}')
+        dispatcher.submit({'url': self.url}, '{}')
+        release.set()
+        dispatcher.queue.join()
+
+        stats = dispatcher.stats()
+        self.assertEqual(stats['events'], 3)
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(stats['dropped'], 1)
+
+    @mock.patch('pulp.server.event.http._create_connection')
+    def test_stale_connection(self, mock_create):
+        stale = mock.Mock()
+        stale.request.side_effect = socket.error
+        fresh = mock.Mock()
+        fresh.getresponse.return_value.status = httplib.OK
+        fresh.getresponse.return_value.will_close = False
+        mock_create.return_value = fresh
+        dispatcher = http.NotificationDispatcher(1, 10, 0, 2, 100)
+        dispatcher._pool('http', 'localhost').idle.append(stale)
+
+        sent = dispatcher._send_post(('http', 'localhost', '/api/', None), '{}')
+
+        self.assertTrue(sent)
+        self.assertTrue(stale.close.called)
+        self.assertEqual(fresh.request.call_count, 1)
+        self.assertEqual(dispatcher._pool('http', 'localhost').idle, [fresh])
+
+    @mock.patch('pulp.server.event.http._create_connection')
+    def test_stale_connection_closed_before_response(self, mock_create):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = httplib.BadStatusLine('')
+        fresh = mock.Mock()
+        fresh.getresponse.return_value.status = httplib.OK
+        fresh.getresponse.return_value.will_close = False
+        mock_create.return_value = fresh
+        dispatcher = http.NotificationDispatcher(1, 10, 0, 2, 100)
+        dispatcher._pool('http', 'localhost').idle.append(stale)
+
+        sent = dispatcher._send_post(('http', 'localhost', '/api/', None), '{}')
+
+        self.assertTrue(sent)
+        self.assertEqual(fresh.request.call_count, 1)
+
+    @mock.patch('pulp.server.event.http._create_connection')
+    def test_response_timeout_not_resent(self, mock_create):
+        stale = mock.Mock()
+        stale.getresponse.side_effect = socket.timeout('timed out')
+        dispatcher = http.NotificationDispatcher(1, 10, 0, 2, 100)
+        dispatcher._pool('http', 'localhost').idle.append(stale)
+
+        self.assertRaises(socket.timeout, dispatcher._send_post,
+                          ('http', 'localhost', '/api/', None), '{}')
+
+        self.assertTrue(stale.close.called)
+        self.assertEqual(stale.request.call_count, 1)
+        self.assertFalse(mock_create.called)
+
+    def test_dispatcher_per_process(self):
+        dispatcher = http.dispatcher()
+        self.assertTrue(http.dispatcher() is dispatcher)
+
+        with mock.patch('os.getpid', return_value=dispatcher.pid + 1):
+            self.assertFalse(http.dispatcher() is dispatcher)
+        http.reset()
@@ -15,11 +15,16 @@ import base
 import random
 import string
 
+import mock
+
 from pulp.server.auth import authorization
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth.role.cud import SUPER_USER_ROLE
+from pulp.server.managers.auth.user.query import authorization_index
 import pulp.server.exceptions as exceptions
 
-from pulp.server.db.model.auth import Role
+from pulp.server.db.model.auth import Permission, Role
+from pulp.server.db.model.cache_version import CacheVersion
 
 # -- test cases ---------------------------------------------------------------
 
@@ -46,6 +51,7 @@ class PermissionManagerTests(base.PulpServerTests):
     def clean(self):
         base.PulpServerTests.clean(self)
         Role.get_collection().remove()
+        CacheVersion.get_collection().remove()
 
     # test data generation
 
@@ -199,3 +205,80 @@ class PermissionManagerTests(base.PulpServerTests):
         self.assertEqual(pm.operation_value_to_name('RANDOM'), None)
         self.assertEqual(pm.operation_value_to_name(99), None)
         self.assertEqual(pm.operation_value_to_name(-2), None)
+
+    # authorization index
+
+    def test_version_incremented(self):
+        u = self._create_user()
+        r = self._create_resource()
+        version = self.permission_query_manager.get_version()
+
+        self.permission_manager.grant(r, u['login'], [authorization.READ])
+        self.assertEqual(self.permission_query_manager.get_version(), version + 1)
+
+        self.permission_manager.revoke(r, u['login'], [authorization.READ])
+        self.assertEqual(self.permission_query_manager.get_version(), version + 2)
+
+    def test_no_version(self):
+        self.assertEqual(self.permission_query_manager.get_version(), 0)
+
+    def test_index_parent_resource(self):
+        u = self._create_user()
+        self.permission_manager.grant('/v2/repositories/', u['login'], [authorization.READ])
+        self.permission_manager.grant('/', u['login'], [authorization.DELETE])
+
+        is_authorized = self.user_query_manager.is_authorized
+        self.assertTrue(is_authorized('/v2/repositories/zoo/', u['login'], authorization.READ))
+        self.assertTrue(is_authorized('/v2/repositories/', u['login'], authorization.READ))
+        self.assertTrue(is_authorized('/v2/repositories/zoo/', u['login'], authorization.DELETE))
+        self.assertFalse(is_authorized('/v2/', u['login'], authorization.READ))
+        self.assertFalse(is_authorized('/v2/repositories/zoo/', u['login'],
+                                       authorization.UPDATE))
+
+    def test_index_not_canonical_resource(self):
+        u = self._create_user()
+        # only resources in the /a/b/ form are ever matched
+        self.permission_manager.grant('/v2/repositories', u['login'], [authorization.READ])
+
+        self.assertFalse(self.user_query_manager.is_authorized(
+            '/v2/repositories/zoo/', u['login'], authorization.READ))
+
+    def test_index_missing_user(self):
+        self.assertRaises(exceptions.MissingResource, self.user_query_manager.is_authorized,
+                          '/v2/', 'missing', authorization.READ)
+
+    def test_index_single_query(self):
+        u = self._create_user()
+        r = self._create_resource()
+        self.permission_manager.grant(r, u['login'], [authorization.READ])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], authorization.READ))
+
+        with mock.patch.object(Permission, 'get_collection') as mock_get_collection:
+            with mock.patch.object(CacheVersion, 'get_collection',
+                                   wraps=CacheVersion.get_collection) as mock_version:
+                self.assertTrue(self.user_query_manager.is_authorized(r, u['login'],
+                                                                      authorization.READ))
+                self.assertFalse(self.user_query_manager.is_authorized(r, u['login'],
+                                                                       authorization.DELETE))
+
+        self.assertFalse(mock_get_collection.called)
+        self.assertEqual(mock_version.call_count, 2)
+
+    def test_index_rebuilt_on_change(self):
+        u = self._create_user()
+        r = self._create_resource()
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], authorization.READ))
+        version = authorization_index().version
+
+        self.permission_manager.grant(r, u['login'], [authorization.READ])
+
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], authorization.READ))
+        self.assertNotEqual(authorization_index().version, version)
+
+    def test_index_superuser_role_change(self):
+        u = self._create_user()
+        r = self._create_resource()
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], authorization.READ))
+
+        self.role_manager.add_user_to_role(SUPER_USER_ROLE, u['login'])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], authorization.READ))
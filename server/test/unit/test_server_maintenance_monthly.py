@@ -33,3 +33,13 @@ class TestMain(unittest.TestCase):
         monthly.monthly_maintenance()
 
         remove_orphans.assert_called_once_with()
+
+    @mock.patch('pulp.server.maintenance.monthly.RepoManager.check_content_unit_counts')
+    @mock.patch('pulp.server.maintenance.monthly.RepoProfileApplicabilityManager.remove_orphans')
+    def test_monthly_maintenance_checks_unit_counts(self, remove_orphans, check_counts):
+        """
+        Assert that the main() function checks the repository content unit counts.
+        """
+        monthly.monthly_maintenance()
+
+        check_counts.assert_called_once_with()
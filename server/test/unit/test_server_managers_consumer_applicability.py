@@ -307,6 +307,93 @@ class ApplicabilityRegenerationManagerTests(base.PulpServerTests):
         self.assertEqual(applicability_list[0]['applicability'], expected_applicability)
 
 
+    @mock.patch('pulp.server.managers.consumer.applicability.REGENERATION_BATCH_SIZE', 1)
+    def test_regenerate_applicability_for_repos_multiple_batches(self):
+        # Setup
+        self.populate_consumers_different_profiles()
+        self.populate_bindings()
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+        RepoProfileApplicability.get_collection().update({}, {'$set': {'applicability': {}}},
+                                                         multi=True, safe=True)
+        Repo.get_collection().update({'id': {'$in': self.REPO_IDS}},
+                                     {'$inc': {'content_revision': 1}}, multi=True, safe=True)
+        # Test
+        manager.regenerate_applicability_for_repos(self.REPO_CRITERIA)
+        # Verify
+        applicability_list = list(RepoProfileApplicability.get_collection().find())
+        self.assertEqual(len(applicability_list), 4)
+        expected_applicability = {'rpm': ['rpm-1', 'rpm-2'], 'erratum': ['errata-1', u'errata-2']}
+        for applicability in applicability_list:
+            self.assertEqual(applicability['applicability'], expected_applicability)
+            self.assertTrue(applicability['profile'] in [self.PROFILE1, self.PROFILE2])
+
+    @mock.patch('pulp.server.async.task_status_manager.TaskStatusManager.update_task_status')
+    @mock.patch('pulp.server.managers.consumer.applicability.get_current_task_id')
+    def test_regenerate_applicability_for_repos_reports_progress(self, mock_task_id,
+                                                                 mock_update):
+        # Setup
+        mock_task_id.return_value = 'task-1'
+        self.populate_consumers_different_profiles()
+        self.populate_bindings()
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+        # Test
+        manager.regenerate_applicability_for_repos(self.REPO_CRITERIA, force=True)
+        # Verify
+        task_id, delta = mock_update.call_args[0]
+        self.assertEqual(task_id, 'task-1')
+        report = delta['progress_report']['applicability_regeneration']
+        self.assertEqual(report['repos_total'], 2)
+        self.assertEqual(report['repos_processed'], 2)
+        self.assertEqual(report['applicabilities_processed'], 4)
+        self.assertTrue('applicabilities_per_second' in report)
+
+
+    def test_regenerate_applicability_for_repos_skips_unchanged_repos(self):
+        # Setup
+        self.populate_consumers()
+        self.populate_bindings()
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        profiler.calculate_applicable_units.reset_mock()
+        # Test
+        manager.regenerate_applicability_for_repos(self.REPO_CRITERIA)
+        # Verify
+        self.assertEqual(profiler.calculate_applicable_units.call_count, 0)
+
+    def test_regenerate_applicability_for_repos_content_changed(self):
+        # Setup
+        self.populate_consumers()
+        self.populate_bindings()
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+        factory.repo_manager().update_unit_count(self.REPO_IDS[0], 'rpm', 1)
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        profiler.calculate_applicable_units.reset_mock()
+        # Test
+        manager.regenerate_applicability_for_repos(self.REPO_CRITERIA)
+        # Verify
+        self.assertEqual(profiler.calculate_applicable_units.call_count, 1)
+        applicability = RepoProfileApplicability.get_collection().find_one(
+            {'repo_id': self.REPO_IDS[0]})
+        self.assertEqual(applicability['repo_content_revision'], 1)
+
+    def test_regenerate_applicability_for_repos_force(self):
+        # Setup
+        self.populate_consumers()
+        self.populate_bindings()
+        manager = factory.applicability_regeneration_manager()
+        manager.regenerate_applicability_for_consumers(self.CONSUMER_CRITERIA)
+        profiler, cfg = plugins.get_profiler_by_type('rpm')
+        profiler.calculate_applicable_units.reset_mock()
+        # Test
+        manager.regenerate_applicability_for_repos(self.REPO_CRITERIA, force=True)
+        # Verify
+        self.assertEqual(profiler.calculate_applicable_units.call_count, 2)
+
+
 class TestRepoProfileApplicabilityManager(base.PulpServerTests):
     """
     Test the RepoProfileApplicabilityManager.
@@ -9,8 +9,13 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+from cStringIO import StringIO
+import hashlib
 import os
 import shutil
+import threading
+
+import mock
 
 import base
 
@@ -21,6 +26,7 @@ from pulp.server.db.model.auth import User
 from pulp.server.db.model.repository import Repo, RepoImporter
 from pulp.server.exceptions import (MissingResource, PulpDataException, PulpExecutionException,
                                     InvalidValue)
+from pulp.server.managers.content import upload
 from pulp.server.managers.repo.unit_association import OWNER_TYPE_USER
 import pulp.server.managers.factory as manager_factory
 
@@ -41,6 +47,7 @@ class ContentUploadManagerTests(base.PulpServerTests):
 
         upload_storage_dir = self.upload_manager._upload_storage_dir()
         shutil.rmtree(upload_storage_dir)
+        upload._UPLOAD_STATES.clear()
 
     def clean(self):
         base.PulpServerTests.clean(self)
@@ -137,6 +144,142 @@ class ContentUploadManagerTests(base.PulpServerTests):
         self.assertTrue(id1 in ids)
         self.assertTrue(id2 in ids)
 
+    def test_list_upload_ids_hides_state(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+        self.assertTrue(os.path.exists(self.upload_manager._upload_state_path(upload_id)))
+
+        self.assertEqual(self.upload_manager.list_upload_ids(), [upload_id])
+
+    def test_save_negative_offset(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.assertRaises(InvalidValue, self.upload_manager.save_data, upload_id, -1, 'bar')
+
+    # -- streaming and checksums ----------------------------------------------
+
+    @mock.patch('pulp.server.managers.content.upload.CHUNK_SIZE', 4)
+    def test_save_stream_chunked(self):
+        upload_id = self.upload_manager.initialize_upload()
+        data = StringIO('abcdefghij-not-part-of-the-segment')
+        stream = mock.Mock(read=mock.Mock(side_effect=data.read))
+
+        self.upload_manager.save_stream(upload_id, 0, stream, 10)
+
+        self.assertEqual(self.upload_manager.read_upload(upload_id), 'abcdefghij')
+        self.assertEqual([c[0][0] for c in stream.read.call_args_list], [4, 4, 2])
+
+    def test_checksums_in_order(self):
+        upload_id = self.upload_manager.initialize_upload()
+        for offset, data in ((0, 'abc'), (3, 'de'), (5, 'fghi')):
+            self.upload_manager.save_data(upload_id, offset, data)
+
+        # the file is not read again
+        with mock.patch('hashlib.new') as mock_new:
+            checksums = [self.upload_manager.upload_checksum(upload_id, t)
+                         for t in upload.CHECKSUM_TYPES]
+        self.assertFalse(mock_new.called)
+
+        self.assertEqual(checksums, [hashlib.new(t, 'abcdefghi').hexdigest()
+                                     for t in upload.CHECKSUM_TYPES])
+
+    def test_checksums_out_of_order(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 6, 'ghi')
+        self.upload_manager.save_data(upload_id, 3, 'def')
+        state = upload._upload_state(upload_id)
+        self.assertEqual(state.size, 0)
+        self.assertEqual(state.pending, {3: 6, 6: 9})
+
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+
+        self.assertEqual(state.size, 9)
+        self.assertEqual(state.pending, {})
+        state_path = self.upload_manager._upload_state_path(upload_id)
+        self.assertTrue(os.path.exists(state_path))
+        self.assertEqual(self.upload_manager.upload_checksum(upload_id, 'sha256'),
+                         hashlib.sha256('abcdefghi').hexdigest())
+
+    def test_checksums_overlapping_segments(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abcdef')
+        self.upload_manager.save_data(upload_id, 3, 'DEF')
+
+        self.assertFalse(upload._upload_state(upload_id).valid)
+        state_path = self.upload_manager._upload_state_path(upload_id)
+        self.assertFalse(os.path.exists(state_path))
+        # calculated from the file instead
+        self.assertEqual(self.upload_manager.upload_checksum(upload_id, 'md5'),
+                         hashlib.md5('abcDEF').hexdigest())
+
+    def test_checksums_concurrent_segments(self):
+        upload_id = self.upload_manager.initialize_upload()
+        streaming = threading.Event()
+        release = threading.Event()
+
+        class SlowStream(object):
+            def __init__(self):
+                self.data = StringIO('abc')
+
+            def read(self, size):
+                streaming.set()
+                release.wait()
+                return self.data.read(size)
+
+        thread = threading.Thread(target=self.upload_manager.save_stream,
+                                  args=(upload_id, 0, SlowStream(), 3))
+        thread.start()
+        streaming.wait(5)
+        # written while the first segment is still being streamed
+        self.upload_manager.save_data(upload_id, 3, 'def')
+        release.set()
+        thread.join()
+
+        self.assertEqual(upload._upload_state(upload_id).size, 6)
+        self.assertEqual(self.upload_manager.upload_checksum(upload_id, 'sha1'),
+                         hashlib.sha1('abcdef').hexdigest())
+
+    def test_checksum_other_type(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+
+        self.assertEqual(self.upload_manager.upload_checksum(upload_id, 'sha512'),
+                         hashlib.sha512('fus ro dah').hexdigest())
+
+    def test_checksum_file_changed(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+
+        # written by another process
+        f = open(self.upload_manager._upload_file_path(upload_id), 'a')
+        f.write('!')
+        f.close()
+
+        self.assertEqual(self.upload_manager.upload_checksum(upload_id, 'sha256'),
+                         hashlib.sha256('fus ro dah!').hexdigest())
+
+    def test_checksum_missing_upload(self):
+        self.assertRaises(MissingResource, self.upload_manager.upload_checksum, 'foo', 'md5')
+
+    def test_delete_upload_state(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+        state_path = self.upload_manager._upload_state_path(upload_id)
+
+        self.upload_manager.delete_upload(upload_id)
+
+        self.assertFalse(os.path.exists(state_path))
+        self.assertFalse(upload_id in upload._UPLOAD_STATES)
+
+    @mock.patch('pulp.server.managers.content.upload.MAX_UPLOAD_STATES', 2)
+    def test_upload_states_bounded(self):
+        upload_ids = [self.upload_manager.initialize_upload() for i in range(3)]
+        for upload_id in upload_ids:
+            self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+
+        self.assertFalse(upload_ids[0] in upload._UPLOAD_STATES)
+        self.assertTrue(upload_ids[2] in upload._UPLOAD_STATES)
+
     # -- import functionality -------------------------------------------------
 
     def test_is_valid_upload(self):
@@ -198,6 +341,7 @@ class ContentUploadManagerTests(base.PulpServerTests):
         conduit = call_args[5]
         self.assertTrue(isinstance(conduit, UploadConduit))
         self.assertEqual(call_args[5].repo_id, 'repo-u')
+        self.assertEqual(call_args[5].upload_id, upload_id)
         self.assertEqual(conduit.association_owner_type, OWNER_TYPE_USER)
         self.assertEqual(conduit.association_owner_id, fake_user.login)
 
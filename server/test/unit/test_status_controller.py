@@ -11,6 +11,8 @@
 # You should have received a copy of GPLv2 along with this software; if not,
 # see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
 
+import mock
+
 import base
 
 
@@ -22,3 +24,23 @@ class StatusControllerTests(base.PulpWebserviceTests):
 
         self.assertEqual(status, 200)
         self.assertTrue('api_version' in body)
+        self.assertFalse('db_operations' in body)
+        self.assertFalse('credential_cache' in body)
+        self.assertFalse('http_notifications' in body)
+
+    def test_get_statistics(self):
+
+        status, body = self.get('/v2/status/statistics/')
+
+        self.assertEqual(status, 200)
+        self.assertTrue('hits' in body['credential_cache'])
+        self.assertTrue(isinstance(body['db_operations'], list))
+        self.assertTrue('dropped' in body['http_notifications'])
+        self.assertTrue('backpressure' in body['http_notifications'])
+
+    @mock.patch.object(base.PulpWebserviceTests, 'HEADERS', spec=dict)
+    def test_get_statistics_unauthenticated(self, mock_headers):
+
+        status, body = self.get('/v2/status/statistics/')
+
+        self.assertEqual(status, 401)
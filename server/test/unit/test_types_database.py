@@ -260,6 +260,84 @@ class TypesDatabaseTests(base.PulpServerTests):
         # Verify
         self.assertTrue(indexes is None)
 
+    def test_type_definition_cached(self):
+        """
+        Tests type definitions are only read from the database once.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        stats = types_db.type_cache_stats()
+
+        # Test
+        type_def = types_db.type_definition(DEF_1.id)
+        types_db.type_definition(DEF_1.id)
+        types_db.type_units_unit_key(DEF_1.id)
+
+        # Verify
+        self.assertEqual(DEF_1.id, type_def['id'])
+        new_stats = types_db.type_cache_stats()
+        self.assertEqual(stats['hits'] + 3, new_stats['hits'])
+        self.assertEqual(stats['misses'], new_stats['misses'])
+
+    def test_type_definition_copied(self):
+        """
+        Tests changes made to a returned type definition don't reach the cache.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+
+        # Test
+        type_def = types_db.type_definition(DEF_1.id)
+        type_def['unit_key'].append('extra')
+        type_def['_href'] = '/v2/content/types/%s/' % DEF_1.id
+        types_db.type_units_unit_key(DEF_1.id).append('extra')
+
+        # Verify
+        type_def = types_db.type_definition(DEF_1.id)
+        self.assertEqual(DEF_1.unit_key, type_def['unit_key'])
+        self.assertFalse('_href' in type_def)
+
+    def test_type_definition_cache_refreshed_on_update(self):
+        """
+        Tests updating the types replaces the cached definitions.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        types_db.type_definition(DEF_1.id)
+        changed = TypeDefinition(DEF_1.id, DEF_1.display_name, DEF_1.description,
+                                 ['single_2'], [], [])
+
+        # Test
+        types_db.update_database([changed])
+
+        # Verify
+        self.assertEqual(['single_2'], types_db.type_units_unit_key(DEF_1.id))
+
+    def test_type_definition_cache_invalidated_on_clean(self):
+        # Setup
+        types_db.update_database([DEF_1])
+        types_db.type_definition(DEF_1.id)
+
+        # Test
+        types_db.clean()
+
+        # Verify
+        self.assertTrue(types_db.type_definition(DEF_1.id) is None)
+
+    def test_type_units_collection_cached(self):
+        # Setup
+        types_db.update_database([DEF_1])
+
+        # Test
+        collection_1 = types_db.type_units_collection(DEF_1.id)
+        collection_2 = types_db.type_units_collection(DEF_1.id)
+
+        # Verify
+        self.assertTrue(collection_1 is collection_2)
+
     # -- utility method tests ------------------------------------------------
 
     def test_create_or_update_type_collection(self):